@@ -11,9 +11,14 @@ class Core:
     # is_running = True
     # has_stopped = False
 
-    def __init__(self, data_path, plugin_path):
+    def __init__(self, data_path, plugin_path, network_workers=None):
         # some initialize at instance level
 
+        # network_workers: if set, the network interface is served by
+        # that many worker processes sharing its port, 0 meaning one
+        # per CPU; see NetworkInterface
+        self.network_workers = network_workers
+
         # setup defaults
 
         # registries
@@ -51,7 +56,7 @@ class Core:
 
         # TODO network instance, and engine interface
         self.network = Network()
-        self.network.register_interface(NetworkInterface())
+        self.network.register_interface(NetworkInterface(self.network_workers))
 
         # TODO game loop
         self.start_server()
@@ -60,12 +65,15 @@ class Core:
         loop = asyncio.get_event_loop()
         self.tick_counter = 0
         try:
+            # network engine, on the same loop as the ticks
+            loop.run_until_complete(self.network.start_interfaces())
             # worker
             asyncio.ensure_future(self.tick_processor())
             loop.run_forever()
         except KeyboardInterrupt:
             pass
         finally:
+            self.network.shutdown_interfaces()
             loop.close()
 
     async def tick_processor(self):
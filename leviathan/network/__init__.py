@@ -24,6 +24,14 @@ class Network:  # network handler
             except Exception:
                 pass
 
+    async def start_interfaces(self):
+        for interface in self.interfaces:
+            await interface.start()
+
+    def shutdown_interfaces(self):
+        for interface in self.interfaces:
+            interface.shutdown()
+
     def register_interface(self, interface):
         self.interfaces.add(interface)
 
@@ -41,11 +49,13 @@ class Network:  # network handler
         pass
 
     # network control
-    def block_address(self, address):
-        pass
+    def block_address(self, address, timeout=None):
+        for interface in self.interfaces:
+            interface.block_address(address, timeout)
 
     def unblock_address(self, address):
-        pass
+        for interface in self.interfaces:
+            interface.unblock_address(address)
 
     # registries
     def register_packet(self, packet_id, packet_class):
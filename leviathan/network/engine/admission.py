@@ -0,0 +1,206 @@
+"""
+Admission control of inbound datagrams, per source IP.
+Classes:
+    AdmissionControl: Rate limits, connection caps and temporary
+        bans of source IPs.
+"""
+
+import collections
+
+from leviathan.network.engine import constants, pacing
+
+
+class _Source(object):
+
+    """Tracking state of a source IP."""
+
+    __slots__ = ('datagrams', 'bytes', 'violations')
+
+    def __init__(self, datagrams, byte_bucket):
+        self.datagrams = datagrams
+        self.bytes = byte_bucket
+        self.violations = None
+
+
+class AdmissionControl(object):
+
+    """
+    Per-IP admission control of a multiplexer.
+    Every datagram is charged against two token buckets of its source
+    IP, one in datagrams and one in bytes, before it is decoded;
+    datagrams exceeding either rate are dropped. Dropped datagrams,
+    undecodable ones and connection attempts beyond the cap count as
+    violations; an IP with too many violations in a short time is
+    banned for a while. The tables of tracked and banned IPs are
+    bounded, and forget their least recently seen entries first; a
+    forgotten IP merely starts over with full buckets.
+    """
+
+    def __init__(
+        self,
+        datagram_rate=constants.ADMISSION_DATAGRAM_RATE,
+        byte_rate=constants.ADMISSION_BYTE_RATE,
+        burst=constants.ADMISSION_BURST,
+        max_connections=constants.ADMISSION_MAX_CONNECTIONS,
+        ban_threshold=constants.ADMISSION_BAN_THRESHOLD,
+        ban_window=constants.ADMISSION_BAN_WINDOW,
+        ban_duration=constants.ADMISSION_BAN_DURATION,
+        max_sources=constants.ADMISSION_MAX_SOURCES,
+        max_bans=constants.ADMISSION_MAX_BANS
+    ):
+        """
+        Create a new admission control, tracking no IP.
+        Args:
+            datagram_rate: Datagrams per second an IP may send.
+            byte_rate: Bytes per second an IP may send.
+            burst: Seconds of traffic at those rates an IP may send
+                at once.
+            max_connections: Maximum number of connections
+                registered under an IP.
+            ban_threshold: Number of violations within `ban_window`
+                after which an IP is banned.
+            ban_window: Period over which violations are counted,
+                in seconds.
+            ban_duration: Duration of a ban, in seconds.
+            max_sources: Maximum number of IPs tracked at once.
+            max_bans: Maximum number of IPs banned at once.
+        """
+        self.datagram_rate = datagram_rate
+        self.byte_rate = byte_rate
+        self.burst = burst
+        self.max_connections = max_connections
+        self.ban_threshold = ban_threshold
+        self.ban_window = ban_window
+        self.ban_duration = ban_duration
+        self.max_sources = max_sources
+        self.max_bans = max_bans
+
+        # Tracking state and end of ban, by IP, from the least
+        # recently seen; and number of connections, by IP.
+        self._sources = collections.OrderedDict()
+        self._bans = collections.OrderedDict()
+        self._connections = collections.Counter()
+
+        self.dropped_datagrams = 0
+        self.bans = 0
+
+    def __repr__(self):
+        return '{0}(sources={1}, banned={2}, dropped_datagrams={3})'.format(
+            self.__class__.__name__,
+            len(self._sources),
+            len(self._bans),
+            self.dropped_datagrams
+        )
+
+    def admit(self, ip, size, now):
+        """
+        Charge a received datagram to its source IP.
+        Args:
+            ip: The IP the datagram was received from, as a string.
+            size: The length of the datagram, in bytes.
+            now: The current time, in seconds.
+        Returns:
+            True if the datagram should be processed; False if it
+            should be dropped undecoded.
+        """
+        if self._bans and self.is_banned(ip, now):
+            self.dropped_datagrams += 1
+            return False
+        source = self._sources.get(ip)
+        if source is None:
+            source = self._track(ip, now)
+        else:
+            self._sources.move_to_end(ip)
+        if source.datagrams.take(1, now) and source.bytes.take(size, now):
+            return True
+        self.dropped_datagrams += 1
+        self._add_violation(ip, source, now)
+        return False
+
+    def is_banned(self, ip, now):
+        """
+        Check whether an IP is banned, lifting expired bans.
+        Args:
+            ip: The IP, as a string.
+            now: The current time, in seconds.
+        """
+        banned_until = self._bans.get(ip)
+        if banned_until is None:
+            return False
+        if now < banned_until:
+            return True
+        del self._bans[ip]
+        return False
+
+    def on_violation(self, ip, now):
+        """
+        Count a violation other than exceeding the rates, such as an
+        undecodable datagram.
+        Args:
+            ip: The offending IP, as a string.
+            now: The current time, in seconds.
+        """
+        source = self._sources.get(ip)
+        if source is None:
+            source = self._track(ip, now)
+        self._add_violation(ip, source, now)
+
+    def can_connect(self, ip):
+        """
+        Check whether another connection may be registered under an
+        IP.
+        Args:
+            ip: The IP, as a string.
+        """
+        return self._connections[ip] < self.max_connections
+
+    def on_connection_made(self, ip):
+        """
+        Count a connection registered under an IP.
+        Args:
+            ip: The IP, as a string.
+        """
+        self._connections[ip] += 1
+
+    def on_connection_lost(self, ip):
+        """
+        Count a connection unregistered from under an IP.
+        Args:
+            ip: The IP, as a string.
+        """
+        count = self._connections[ip] - 1
+        if count > 0:
+            self._connections[ip] = count
+        else:
+            del self._connections[ip]
+
+    def _track(self, ip, now):
+        """Start tracking an IP, forgetting the least recent if full."""
+        if len(self._sources) >= self.max_sources:
+            self._sources.popitem(last=False)
+        source = _Source(
+            pacing.TokenBucket(
+                self.datagram_rate,
+                self.datagram_rate * self.burst,
+                now
+            ),
+            pacing.TokenBucket(self.byte_rate, self.byte_rate * self.burst, now)
+        )
+        self._sources[ip] = source
+        return source
+
+    def _add_violation(self, ip, source, now):
+        """Count a violation, and ban the IP once too many add up."""
+        if source.violations is None:
+            source.violations = pacing.TokenBucket(
+                self.ban_threshold / self.ban_window,
+                self.ban_threshold,
+                now
+            )
+        if source.violations.take(1, now):
+            return
+        if len(self._bans) >= self.max_bans:
+            self._bans.popitem(last=False)
+        self._bans[ip] = now + self.ban_duration
+        self.bans += 1
+        del self._sources[ip]
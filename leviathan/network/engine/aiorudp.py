@@ -0,0 +1,284 @@
+"""Reliable UDP implementation using asyncio."""
+
+import asyncio
+import socket
+
+from leviathan.network.engine import batchio, multiplexer, scheduler
+
+
+class AsyncioConnectionMultiplexer(
+    multiplexer.BaseConnectionMultiplexer,
+    asyncio.DatagramProtocol
+):
+
+    """
+    Multiplexer of RUDP connections over a datagram endpoint of an
+    asyncio event loop, of any implementation, such as uvloop; see
+    multiplexer.BaseConnectionMultiplexer.
+    The multiplexer and its connections schedule their timers on the
+    loop as well, so that a server runs on a single loop, without
+    Twisted. Any datagram endpoint serves; servers use one created by
+    create_batching_endpoint, which saves system calls.
+    """
+
+    transport = None
+
+    def __init__(self, connection_factory, public_ip, loop=None, **kwargs):
+        """
+        Create a new multiplexer, not yet bound to an endpoint.
+        Args:
+            connection_factory: See BaseConnectionMultiplexer.
+            public_ip: See BaseConnectionMultiplexer.
+            loop: The asyncio event loop to schedule timers on; if
+                None, the current event loop.
+            kwargs: The other arguments of BaseConnectionMultiplexer,
+                but the clock.
+        """
+        super(AsyncioConnectionMultiplexer, self).__init__(
+            connection_factory,
+            public_ip,
+            clock=scheduler.AsyncioClock(loop),
+            **kwargs
+        )
+
+    def connection_made(self, transport):
+        """Keep the transport and cache listening port."""
+        self.transport = transport
+        self.port = transport.get_extra_info('sockname')[1]
+
+    def connection_lost(self, exc):
+        """Forget the closed transport."""
+        self.transport = None
+
+    def datagram_received(self, data, addr):
+        """
+        Handle a received datagram.
+        Args:
+            data: The datagram, as bytes.
+            addr: Sender address; the flow and scope of IPv6
+                addresses are dropped.
+        """
+        self.datagramReceived(data, addr[:2])
+
+    def error_received(self, exc):
+        """
+        Ignore the ICMP errors of previous sends; unreachable hosts
+        are left to the timeouts of their connections.
+        """
+
+    def send_datagram(self, datagram, addr):
+        """
+        Send RUDP datagram to the given address.
+        Args:
+            datagram: Prepared RUDP datagram, as a string.
+            addr: Tuple of destination address (ip, port).
+        """
+        self.transport.sendto(datagram, addr)
+
+    def _close_transport(self):
+        """Close the endpoint, if open."""
+        if self.transport is not None:
+            self.transport.close()
+
+
+class BatchingDatagramTransport(asyncio.DatagramTransport):
+
+    """
+    Datagram transport reading and writing in batches.
+    Each readiness event of the socket drains it, up to
+    BATCH_RECEIVE_BUDGET datagrams, and the datagrams sent during a
+    turn of the loop are written together at the start of the next,
+    with as few system calls as the platform allows; see
+    batchio.DatagramSocket. Datagrams the socket has no room for
+    wait until it is writable again.
+    The loop only watches the socket's file descriptor, which any
+    event loop supports, uvloop included. The batchio.DatagramSocket
+    is the 'datagram_socket' extra info of the transport.
+    """
+
+    def __init__(self, loop, sock, protocol, waiter=None, **kwargs):
+        """
+        Create a new transport, and connect the protocol to it on the
+        next turn of the loop.
+        Args:
+            loop: The asyncio event loop.
+            sock: The bound UDP socket.socket, which the transport
+                owns; it is made non-blocking.
+            protocol: The asyncio.DatagramProtocol.
+            waiter: Future set once the protocol is connected.
+            kwargs: Arguments of batchio.DatagramSocket.
+        """
+        sock.setblocking(False)
+        self._datagram_socket = batchio.DatagramSocket(sock, **kwargs)
+        super(BatchingDatagramTransport, self).__init__({
+            'socket': sock,
+            'sockname': sock.getsockname(),
+            'peername': None,
+            'datagram_socket': self._datagram_socket,
+        })
+        self._loop = loop
+        self._sock = sock
+        self._fileno = sock.fileno()
+        self._protocol = protocol
+        self._outbox = []
+        self._flush_handle = None
+        self._writing = False
+        self._closing = False
+        loop.call_soon(protocol.connection_made, self)
+        loop.call_soon(self._start_reading, waiter)
+
+    def __repr__(self):
+        return '{0}({1}, queued={2})'.format(
+            self.__class__.__name__,
+            self._datagram_socket,
+            len(self._outbox)
+        )
+
+    def is_closing(self):
+        """Return True if the transport is closing or closed."""
+        return self._closing
+
+    def get_protocol(self):
+        """Return the protocol of the transport."""
+        return self._protocol
+
+    def get_write_buffer_size(self):
+        """Return the number of bytes waiting to be written."""
+        return sum(len(data) for data, _ in self._outbox)
+
+    def sendto(self, data, addr=None):
+        """
+        Queue a datagram, to be written on the next turn of the loop.
+        Args:
+            data: The datagram, as bytes.
+            addr: The destination, as an (ip, port) tuple.
+        Raises:
+            ValueError: No address was given; the socket is not
+                connected.
+        """
+        if addr is None:
+            raise ValueError('Batching transports need a destination address.')
+        if self._closing:
+            return
+        self._outbox.append((data, addr))
+        if self._flush_handle is None and not self._writing:
+            self._flush_handle = self._loop.call_soon(self._flush)
+
+    def close(self):
+        """Write the queued datagrams, if possible, then close."""
+        self._close(flush=True)
+
+    def abort(self):
+        """Close at once, dropping the queued datagrams."""
+        self._close(flush=False)
+
+    def _close(self, flush):
+        """Stop reading and writing, and disconnect the protocol."""
+        if self._closing:
+            return
+        self._closing = True
+        self._loop.remove_reader(self._fileno)
+        if self._writing:
+            self._loop.remove_writer(self._fileno)
+            self._writing = False
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if flush and self._outbox:
+            self._datagram_socket.send_batch(self._outbox)
+        self._outbox = []
+        self._loop.call_soon(self._call_connection_lost, None)
+
+    def _start_reading(self, waiter):
+        """Watch the socket, unless already closed, and wake the waiter."""
+        if not self._closing:
+            self._loop.add_reader(self._fileno, self._read_ready)
+        if waiter is not None and not waiter.cancelled():
+            waiter.set_result(None)
+
+    def _call_connection_lost(self, exc):
+        """Disconnect the protocol, and close the socket."""
+        try:
+            self._protocol.connection_lost(exc)
+        finally:
+            self._sock.close()
+
+    def _read_ready(self):
+        """Drain the socket into the protocol."""
+        try:
+            datagrams = self._datagram_socket.recv_batch()
+        except OSError as exc:
+            self._protocol.error_received(exc)
+            return
+        datagram_received = self._protocol.datagram_received
+        for data, addr in datagrams:
+            datagram_received(data, addr)
+
+    def _write_ready(self):
+        """Resume writing once the socket has room."""
+        self._loop.remove_writer(self._fileno)
+        self._writing = False
+        self._flush()
+
+    def _flush(self):
+        """Write the queued datagrams, or as many as the socket takes."""
+        self._flush_handle = None
+        written = self._datagram_socket.send_batch(
+            self._outbox,
+            self._protocol.error_received
+        )
+        if written == len(self._outbox):
+            self._outbox = []
+        else:
+            del self._outbox[:written]
+            self._writing = True
+            self._loop.add_writer(self._fileno, self._write_ready)
+
+
+async def create_batching_endpoint(
+    protocol_factory,
+    local_addr=None,
+    sock=None,
+    loop=None,
+    **kwargs
+):
+    """
+    Create a datagram endpoint on a BatchingDatagramTransport, as
+    loop.create_datagram_endpoint does on the loop's own transport.
+    Args:
+        protocol_factory: Callable returning the protocol.
+        local_addr: The (host, port) to bind to; ignored if sock is
+            given.
+        sock: An already bound UDP socket.socket to use, which the
+            transport takes over.
+        loop: The asyncio event loop; if None, the current one.
+        kwargs: Arguments of batchio.DatagramSocket.
+    Returns:
+        The (transport, protocol) pair, once connected.
+    Raises:
+        OSError: The socket cannot be bound.
+    """
+    loop = asyncio.get_event_loop() if loop is None else loop
+    if sock is None:
+        family = socket.AF_INET6 if ':' in local_addr[0] else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_DGRAM)
+        try:
+            sock.bind(local_addr)
+        except OSError:
+            sock.close()
+            raise
+    protocol = protocol_factory()
+    waiter = loop.create_future()
+    transport = BatchingDatagramTransport(
+        loop,
+        sock,
+        protocol,
+        waiter,
+        **kwargs
+    )
+    try:
+        await waiter
+    except BaseException:
+        transport.abort()
+        raise
+    return transport, protocol
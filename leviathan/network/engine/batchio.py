@@ -0,0 +1,497 @@
+"""
+Batched I/O on non-blocking UDP sockets.
+On Linux, datagrams are read and written many per system call with
+recvmmsg and sendmmsg, called through ctypes, and runs of datagrams
+of the same size to the same address are written as one buffer with
+UDP generic segmentation offload (GSO), which the kernel splits.
+Elsewhere, each datagram takes a system call of its own.
+Classes:
+    DatagramSocket: Reads and writes batches of datagrams, counting
+        the system calls it makes.
+"""
+
+import ctypes
+import errno
+import os
+import socket
+import struct
+import sys
+
+from leviathan.network.engine import constants
+
+# Level and option of UDP generic segmentation offload, from
+# linux/udp.h; the socket module lacks the latter.
+SOL_UDP = getattr(socket, 'SOL_UDP', 17)
+UDP_SEGMENT = 103
+
+# Size of a struct sockaddr_storage.
+_SOCKADDR_SIZE = 128
+
+# Errors of the *mmsg calls meaning the socket is not ready.
+_BLOCKING_ERRORS = frozenset((errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR))
+
+# Errors of a GSO write meaning the socket, or the device of the
+# route, cannot segment it.
+_GSO_ERRORS = frozenset((
+    errno.EIO, errno.EINVAL, errno.ENOPROTOOPT, errno.EOPNOTSUPP
+))
+
+_FAMILY = struct.Struct('=H')
+_PORT_V4 = struct.Struct('!H')
+_PORT_V6 = struct.Struct('!HI')
+_SCOPE_V6 = struct.Struct('=I')
+_SEGMENT_SIZE = struct.Struct('=H')
+_CMSG_HEADER = struct.Struct('@Nii')
+
+# Encoded destination addresses are cached, up to that many.
+_MAX_CACHED_ADDRESSES = 65536
+
+
+class _IOVec(ctypes.Structure):
+
+    """struct iovec"""
+
+    _fields_ = [
+        ('iov_base', ctypes.c_void_p),
+        ('iov_len', ctypes.c_size_t),
+    ]
+
+
+class _MsgHdr(ctypes.Structure):
+
+    """struct msghdr"""
+
+    _fields_ = [
+        ('msg_name', ctypes.c_void_p),
+        ('msg_namelen', ctypes.c_uint32),
+        ('msg_iov', ctypes.POINTER(_IOVec)),
+        ('msg_iovlen', ctypes.c_size_t),
+        ('msg_control', ctypes.c_void_p),
+        ('msg_controllen', ctypes.c_size_t),
+        ('msg_flags', ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+
+    """struct mmsghdr"""
+
+    _fields_ = [
+        ('msg_hdr', _MsgHdr),
+        ('msg_len', ctypes.c_uint),
+    ]
+
+
+def _load_mmsg():
+    """Return the recvmmsg and sendmmsg functions of libc, or None."""
+    if not sys.platform.startswith('linux'):
+        return None, None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        recvmmsg = libc.recvmmsg
+        sendmmsg = libc.sendmmsg
+    except (OSError, AttributeError):
+        return None, None
+    recvmmsg.argtypes = (
+        ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int,
+        ctypes.c_void_p
+    )
+    recvmmsg.restype = ctypes.c_int
+    sendmmsg.argtypes = (
+        ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int
+    )
+    sendmmsg.restype = ctypes.c_int
+    return recvmmsg, sendmmsg
+
+
+_recvmmsg, _sendmmsg = _load_mmsg()
+
+
+def _encode_address(addr, family):
+    """
+    Encode an address tuple as a struct sockaddr of a family; IPv4
+    addresses are mapped for IPv6 sockets.
+    """
+    ip, port = addr[0], addr[1]
+    if family == socket.AF_INET:
+        return b''.join((
+            _FAMILY.pack(socket.AF_INET),
+            _PORT_V4.pack(port),
+            socket.inet_pton(socket.AF_INET, ip),
+            bytes(8)
+        ))
+    if ':' not in ip:
+        ip = '::ffff:' + ip
+    return b''.join((
+        _FAMILY.pack(socket.AF_INET6),
+        _PORT_V6.pack(port, addr[2] if len(addr) > 2 else 0),
+        socket.inet_pton(socket.AF_INET6, ip),
+        _SCOPE_V6.pack(addr[3] if len(addr) > 3 else 0)
+    ))
+
+
+def _decode_address(name):
+    """
+    Decode a struct sockaddr as the address tuple the socket module
+    would return.
+    """
+    family = _FAMILY.unpack_from(name)[0]
+    if family == socket.AF_INET:
+        return (
+            socket.inet_ntop(socket.AF_INET, name[4:8]),
+            _PORT_V4.unpack_from(name, 2)[0]
+        )
+    port, flowinfo = _PORT_V6.unpack_from(name, 2)
+    return (
+        socket.inet_ntop(socket.AF_INET6, name[8:24]),
+        port,
+        flowinfo,
+        _SCOPE_V6.unpack_from(name, 24)[0]
+    )
+
+
+def _segment_control(segment_size):
+    """
+    Return the ancillary data of a GSO write, a struct cmsghdr with a
+    UDP_SEGMENT option, padded as CMSG_SPACE would.
+    """
+    align = ctypes.sizeof(ctypes.c_size_t)
+    header = -(-_CMSG_HEADER.size // align) * align
+    space = header - (-_SEGMENT_SIZE.size // align) * align
+    return b''.join((
+        _CMSG_HEADER.pack(header + _SEGMENT_SIZE.size, SOL_UDP, UDP_SEGMENT),
+        bytes(header - _CMSG_HEADER.size),
+        _SEGMENT_SIZE.pack(segment_size),
+        bytes(space - header - _SEGMENT_SIZE.size)
+    ))
+
+
+def _error(code):
+    """Return the OSError of an errno."""
+    return OSError(code, os.strerror(code))
+
+
+class DatagramSocket(object):
+
+    """
+    Non-blocking UDP socket reading and writing datagrams in batches.
+    Reads drain the socket, up to a budget, and report datagrams
+    larger than constants.BATCH_BUFFER_SIZE as dropped. Writes take
+    a list of datagrams, in order, and coalesce the longest runs they
+    can: datagrams to the same address, all of the size of the first
+    but the last, which may be shorter, make a single GSO write. The
+    writes, GSO ones included, are made BATCH_SIZE per sendmmsg.
+    The counters tell the number of system calls made, including
+    those that found the socket not ready, and of datagrams received
+    and sent.
+    """
+
+    def __init__(self, sock, mmsg=True, gso=True):
+        """
+        Create a new batched socket.
+        Args:
+            sock: The bound, non-blocking UDP socket.socket.
+            mmsg: If True, use recvmmsg and sendmmsg, if available.
+            gso: If True, use GSO, if the socket supports it.
+        """
+        self.sock = sock
+        self.syscalls = 0
+        self.received = 0
+        self.sent = 0
+        self.mmsg = mmsg and _recvmmsg is not None
+        self.gso = gso and self._supports_gso(sock)
+        self._fileno = sock.fileno()
+        self._family = sock.family
+        self._names = {}
+        self._controls = {}
+        if self.mmsg:
+            self._setup_mmsg()
+
+    def __repr__(self):
+        return '{0}({1}, mmsg={2}, gso={3})'.format(
+            self.__class__.__name__,
+            self.sock,
+            self.mmsg,
+            self.gso
+        )
+
+    @staticmethod
+    def _supports_gso(sock):
+        """Return True if the socket accepts GSO writes."""
+        try:
+            sock.getsockopt(SOL_UDP, UDP_SEGMENT)
+        except OSError:
+            return False
+        return True
+
+    @property
+    def syscalls_per_1000_packets(self):
+        """Get the system calls made per 1000 datagrams handled."""
+        packets = self.received + self.sent
+        if not packets:
+            return 0.0
+        return 1000 * self.syscalls / packets
+
+    def _setup_mmsg(self):
+        """Allocate the message headers and receive buffers."""
+        count = constants.BATCH_SIZE
+        size = constants.BATCH_BUFFER_SIZE
+        self._buffers = ctypes.create_string_buffer(count * size)
+        self._buffer_names = ctypes.create_string_buffer(count * _SOCKADDR_SIZE)
+        self._recv_iovecs = (_IOVec * count)()
+        self._recv_messages = (_MMsgHdr * count)()
+        self._send_iovecs = (_IOVec * count)()
+        self._send_messages = (_MMsgHdr * count)()
+        buffers = ctypes.addressof(self._buffers)
+        names = ctypes.addressof(self._buffer_names)
+        for index in range(count):
+            self._recv_iovecs[index].iov_base = buffers + index * size
+            self._recv_iovecs[index].iov_len = size
+            header = self._recv_messages[index].msg_hdr
+            header.msg_name = names + index * _SOCKADDR_SIZE
+            header.msg_namelen = _SOCKADDR_SIZE
+            header.msg_iov = ctypes.pointer(self._recv_iovecs[index])
+            header.msg_iovlen = 1
+            header = self._send_messages[index].msg_hdr
+            header.msg_iov = ctypes.pointer(self._send_iovecs[index])
+            header.msg_iovlen = 1
+
+    def recv_batch(self, budget=constants.BATCH_RECEIVE_BUDGET):
+        """
+        Read the datagrams waiting on the socket.
+        Args:
+            budget: Maximum number of datagrams to read.
+        Returns:
+            A list of (data, addr) tuples, with data as bytes and addr
+            as the socket module would give it; empty if the socket
+            had none.
+        Raises:
+            OSError: Reading failed before any datagram was read.
+        """
+        datagrams = []
+        if self.mmsg:
+            self._recv_mmsg(datagrams, budget)
+        else:
+            self._recv_each(datagrams, budget)
+        self.received += len(datagrams)
+        return datagrams
+
+    def _recv_each(self, datagrams, budget):
+        """Read datagrams with a recvmsg call each."""
+        recvmsg = self.sock.recvmsg
+        size = constants.BATCH_BUFFER_SIZE
+        while len(datagrams) < budget:
+            self.syscalls += 1
+            try:
+                data, _, flags, addr = recvmsg(size)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                if datagrams:
+                    return
+                raise
+            if not flags & socket.MSG_TRUNC:
+                datagrams.append((data, addr))
+
+    def _recv_mmsg(self, datagrams, budget):
+        """Read datagrams BATCH_SIZE per recvmmsg call."""
+        messages = self._recv_messages
+        buffers = ctypes.addressof(self._buffers)
+        names = ctypes.addressof(self._buffer_names)
+        size = constants.BATCH_BUFFER_SIZE
+        while len(datagrams) < budget:
+            count = min(constants.BATCH_SIZE, budget - len(datagrams))
+            self.syscalls += 1
+            received = _recvmmsg(
+                self._fileno,
+                messages,
+                count,
+                socket.MSG_DONTWAIT,
+                None
+            )
+            if received < 0:
+                code = ctypes.get_errno()
+                if code in _BLOCKING_ERRORS or datagrams:
+                    return
+                raise _error(code)
+            for index in range(received):
+                message = messages[index]
+                header = message.msg_hdr
+                if not header.msg_flags & socket.MSG_TRUNC:
+                    datagrams.append((
+                        ctypes.string_at(buffers + index * size, message.msg_len),
+                        _decode_address(ctypes.string_at(
+                            names + index * _SOCKADDR_SIZE,
+                            header.msg_namelen
+                        ))
+                    ))
+                header.msg_namelen = _SOCKADDR_SIZE
+            if received < count:
+                return
+
+    def send_batch(self, datagrams, on_error=None):
+        """
+        Write datagrams, in order, until the socket's buffer is full.
+        Args:
+            datagrams: A list of (data, addr) tuples, with data as
+                bytes, or a bytearray, and addr as an (ip, port)
+                tuple.
+            on_error: Callable invoked with the OSError of each
+                write that failed; the datagrams of a failed write
+                are dropped, as the network would.
+        Returns:
+            The number of datagrams, from the head of the list, that
+            were written or dropped; fewer than given if the socket's
+            buffer is full.
+        """
+        send = self._send_mmsg if self.mmsg else self._send_each
+        limit = constants.BATCH_SIZE if self.mmsg else 1
+        total = len(datagrams)
+        index = 0
+        while index < total:
+            done, blocked = send(self._plan(datagrams, index, limit), on_error)
+            index += done
+            if blocked:
+                break
+        return index
+
+    def _plan(self, datagrams, start, limit):
+        """
+        Return up to `limit` writes of the datagrams from `start`, as
+        (data, addr, segment size or None, number of datagrams).
+        """
+        writes = []
+        total = len(datagrams)
+        index = start
+        while index < total and len(writes) < limit:
+            data, addr = datagrams[index]
+            run = self._gso_run(datagrams, index) if self.gso else 1
+            if run > 1:
+                writes.append((
+                    b''.join(d for d, _ in datagrams[index:index + run]),
+                    addr,
+                    len(data),
+                    run
+                ))
+            else:
+                # The system calls take the address of the bytes.
+                if type(data) is not bytes:
+                    data = bytes(data)
+                writes.append((data, addr, None, 1))
+            index += run
+        return writes
+
+    @staticmethod
+    def _gso_run(datagrams, start):
+        """Return the number of datagrams a GSO write could hold."""
+        data, addr = datagrams[start]
+        size = len(data)
+        total = size
+        end = min(len(datagrams), start + constants.GSO_MAX_SEGMENTS)
+        index = start + 1
+        while index < end:
+            data, next_addr = datagrams[index]
+            if (
+                next_addr != addr or
+                len(data) > size or
+                total + len(data) > constants.GSO_MAX_BYTES
+            ):
+                break
+            total += len(data)
+            index += 1
+            if len(data) < size:
+                break
+        return index - start
+
+    def _on_write_error(self, exc, segment_size, on_error):
+        """
+        Handle the error of a write; return True if its datagrams are
+        dropped, or False if GSO is unsupported after all, and they
+        are to be written again, datagram by datagram.
+        """
+        if segment_size is not None and exc.errno in _GSO_ERRORS:
+            self.gso = False
+            return False
+        if on_error is not None:
+            on_error(exc)
+        return True
+
+    def _send_each(self, writes, on_error):
+        """
+        Perform writes with a system call each. Return the number of
+        datagrams written or dropped, and whether the socket's buffer
+        is full.
+        """
+        sock = self.sock
+        done = 0
+        for data, addr, segment_size, count in writes:
+            self.syscalls += 1
+            try:
+                if segment_size is None:
+                    sock.sendto(data, addr)
+                else:
+                    sock.sendmsg(
+                        [data],
+                        [(SOL_UDP, UDP_SEGMENT, _SEGMENT_SIZE.pack(segment_size))],
+                        0,
+                        addr
+                    )
+            except (BlockingIOError, InterruptedError):
+                return done, True
+            except OSError as exc:
+                if not self._on_write_error(exc, segment_size, on_error):
+                    return done, False
+            else:
+                self.sent += count
+            done += count
+        return done, False
+
+    def _send_mmsg(self, writes, on_error):
+        """
+        Perform up to BATCH_SIZE writes with a sendmmsg call. Return
+        the number of datagrams written or dropped, and whether the
+        socket's buffer is full.
+        """
+        messages = self._send_messages
+        iovecs = self._send_iovecs
+        names = self._names
+        controls = self._controls
+        # The headers point into the cached names, which should stay
+        # alive until the call returns; the cache is only cleared
+        # before the batch is built, and may exceed its bound by one
+        # batch.
+        if len(names) + len(writes) > _MAX_CACHED_ADDRESSES:
+            names.clear()
+        for offset, (data, addr, segment_size, _) in enumerate(writes):
+            name = names.get(addr)
+            if name is None:
+                name = names[addr] = _encode_address(addr, self._family)
+            header = messages[offset].msg_hdr
+            header.msg_name = ctypes.cast(name, ctypes.c_void_p)
+            header.msg_namelen = len(name)
+            if segment_size is None:
+                header.msg_control = None
+                header.msg_controllen = 0
+            else:
+                control = controls.get(segment_size)
+                if control is None:
+                    control = controls[segment_size] = _segment_control(segment_size)
+                header.msg_control = ctypes.cast(control, ctypes.c_void_p)
+                header.msg_controllen = len(control)
+            iovecs[offset].iov_base = ctypes.cast(data, ctypes.c_void_p)
+            iovecs[offset].iov_len = len(data)
+
+        self.syscalls += 1
+        sent = _sendmmsg(self._fileno, messages, len(writes), socket.MSG_DONTWAIT)
+        if sent < 0:
+            code = ctypes.get_errno()
+            if code in _BLOCKING_ERRORS:
+                return 0, True
+            # The first write failed; the others were not attempted.
+            _, _, segment_size, count = writes[0]
+            if self._on_write_error(_error(code), segment_size, on_error):
+                return count, False
+            return 0, False
+        done = sum(write[3] for write in writes[:sent])
+        self.sent += done
+        return done, False
@@ -0,0 +1,208 @@
+"""
+Congestion control for RUDP connections.
+Classes:
+    CongestionController: Abstract base class of controllers.
+    NewReno: Loss-based AIMD controller.
+    Vegas: Delay-based controller.
+"""
+
+import abc
+
+from leviathan.network.engine import constants
+
+
+class CongestionController(object):
+
+    """
+    Abstract base class for congestion controllers.
+    A controller maintains a congestion window (cwnd), in bytes,
+    which bounds the bytes a connection may have in flight. It is
+    driven by the connection through the `on_*` callbacks.
+    """
+
+    __metaclass__ = abc.ABCMeta
+
+    def __init__(
+        self,
+        segment_size=constants.UDP_SAFE_SEGMENT_SIZE,
+        initial_cwnd=constants.INITIAL_CWND,
+        max_cwnd=constants.WINDOW_SIZE
+    ):
+        """
+        Create a new controller.
+        Args:
+            segment_size: Maximum segment size, in bytes.
+            initial_cwnd: Initial window, in segments.
+            max_cwnd: Upper bound of the window, in segments.
+        """
+        self.segment_size = segment_size
+        self.max_cwnd = max_cwnd * segment_size
+        self.cwnd = min(initial_cwnd * segment_size, self.max_cwnd)
+        self.ssthresh = self.max_cwnd
+        self.loss_events = 0
+        self.timeout_events = 0
+
+    def __repr__(self):
+        return '{0}(cwnd={1}, ssthresh={2}, loss_events={3})'.format(
+            self.__class__.__name__,
+            self.cwnd,
+            self.ssthresh,
+            self.loss_events
+        )
+
+    def can_send(self, bytes_in_flight):
+        """
+        Check whether another packet may be sent.
+        Args:
+            bytes_in_flight: Bytes sent but not yet ACKed.
+        """
+        return bytes_in_flight < self.cwnd
+
+    def set_segment_size(self, segment_size):
+        """
+        Adapt the window to a new maximum segment size, as the path
+        MTU search resizes segments. The window, its threshold and
+        its upper bound keep their size in segments.
+        Args:
+            segment_size: The new maximum segment size, in bytes.
+        """
+        old_size = self.segment_size
+        self.segment_size = segment_size
+        self.max_cwnd = self.max_cwnd * segment_size // old_size
+        self.cwnd = self.cwnd * segment_size // old_size
+        self.ssthresh = self.ssthresh * segment_size // old_size
+
+    @abc.abstractmethod
+    def on_ack(self, acked_bytes, bytes_in_flight):
+        """
+        Grow the window as packets are (selectively) ACKed.
+        Args:
+            acked_bytes: Bytes newly ACKed.
+            bytes_in_flight: Bytes still in flight.
+        """
+
+    def on_rtt_sample(self, sample, now):
+        """
+        Observe a round-trip time measurement.
+        Args:
+            sample: The measured round-trip time, in seconds.
+            now: The current time, in seconds.
+        """
+
+    def on_loss(self, bytes_in_flight):
+        """
+        Shrink the window upon a loss detected by duplicate ACKs.
+        Called at most once per window of data.
+        Args:
+            bytes_in_flight: Bytes in flight when loss was detected.
+        """
+        self.loss_events += 1
+        self.ssthresh = self._halve(bytes_in_flight)
+        self.cwnd = self.ssthresh
+
+    def on_timeout(self, bytes_in_flight):
+        """
+        Collapse the window upon a retransmission timeout.
+        Called at most once per window of data.
+        Args:
+            bytes_in_flight: Bytes in flight when the timer expired.
+        """
+        self.loss_events += 1
+        self.timeout_events += 1
+        self.ssthresh = self._halve(bytes_in_flight)
+        self.cwnd = self.segment_size
+
+    def _halve(self, bytes_in_flight):
+        """Return the multiplicative decrease of the window."""
+        return max(bytes_in_flight // 2, 2 * self.segment_size)
+
+
+class NewReno(CongestionController):
+
+    """
+    Loss-based AIMD congestion control, after RFC 5681/6582.
+    The window grows by the ACKed bytes in slow start, by one
+    segment per window in congestion avoidance, and is halved on
+    every loss event.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(NewReno, self).__init__(*args, **kwargs)
+        self._acked_bytes = 0
+
+    def on_ack(self, acked_bytes, bytes_in_flight):
+        if self.cwnd < self.ssthresh:
+            # Appropriate byte counting, with L = 2 segments.
+            self.cwnd += min(acked_bytes, 2 * self.segment_size)
+        else:
+            self._acked_bytes += acked_bytes
+            if self._acked_bytes >= self.cwnd:
+                self._acked_bytes -= self.cwnd
+                self.cwnd += self.segment_size
+        self.cwnd = min(self.cwnd, self.max_cwnd)
+
+
+class Vegas(CongestionController):
+
+    """
+    Delay-based congestion control, after TCP Vegas.
+    Once per round trip, the expected throughput (cwnd / base RTT)
+    is compared with the actual one (cwnd / RTT); their difference
+    estimates the segments queued in the network. The window grows
+    while fewer than ALPHA segments are queued and shrinks when
+    more than BETA are, so that queues are kept short before loss
+    occurs.
+    """
+
+    # Bounds of the queued segments, in segments.
+    ALPHA = 2
+    BETA = 4
+    GAMMA = 1
+
+    def __init__(self, *args, **kwargs):
+        super(Vegas, self).__init__(*args, **kwargs)
+        self.base_rtt = None
+        self._min_rtt = None
+        self._epoch_end = 0
+
+    def on_ack(self, acked_bytes, bytes_in_flight):
+        # Between adjustments, only slow start grows the window.
+        if self.cwnd < self.ssthresh:
+            self.cwnd = min(
+                self.cwnd + min(acked_bytes, 2 * self.segment_size),
+                self.max_cwnd
+            )
+
+    def on_rtt_sample(self, sample, now):
+        # Samples are only as precise as the timer, and may be 0.
+        sample = max(sample, constants.TIMER_GRANULARITY)
+        if self.base_rtt is None or sample < self.base_rtt:
+            self.base_rtt = sample
+        if self._min_rtt is None or sample < self._min_rtt:
+            self._min_rtt = sample
+        if now < self._epoch_end:
+            return
+
+        segments = self.cwnd / self.segment_size
+        queued = segments * (1 - self.base_rtt / self._min_rtt)
+        if self.cwnd < self.ssthresh:
+            if queued > self.GAMMA:
+                # Leave slow start before queues build up.
+                self.ssthresh = self.cwnd = max(
+                    self.cwnd - self.segment_size,
+                    2 * self.segment_size
+                )
+        elif queued < self.ALPHA:
+            self.cwnd = min(self.cwnd + self.segment_size, self.max_cwnd)
+        elif queued > self.BETA:
+            self.cwnd = max(self.cwnd - self.segment_size, 2 * self.segment_size)
+
+        self._min_rtt = None
+        self._epoch_end = now + sample
+
+    def on_loss(self, bytes_in_flight):
+        self.loss_events += 1
+        self.ssthresh = self.cwnd = max(
+            self.cwnd * 3 // 4,
+            2 * self.segment_size
+        )
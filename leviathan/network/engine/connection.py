@@ -10,12 +10,10 @@ import collections
 import enum
 import random
 
-from twisted.internet import reactor, task
-
-from leviathan.network.engine import constants, heap, packet
-
-
-REACTOR = reactor
+from leviathan.network.engine import (
+    congestion, constants, cookie, fec, packet, pmtu, reorder, rtt,
+    scheduler, stats, window
+)
 
 State = enum.Enum('State', ('CONNECTING', 'CONNECTED', 'SHUTDOWN'))
 
@@ -27,30 +25,67 @@ class Connection(object):
     It sequences inbound and outbound packets, acknowledges inbound
     packets, and retransmits lost outbound packets. It may also relay
     packets via other connections, to help with NAT traversal.
+    Messages are ordered per channel: a message is delivered as soon
+    as it and the earlier messages of its channel are received, no
+    matter the packets missing on other channels. Messages of the
+    unreliable classes bypass sequencing and retransmission.
+    Connections have no instance dictionary, and allocate their
+    looping calls on first use, so that idle ones stay small.
     """
 
+    __slots__ = (
+        'own_addr', 'dest_addr', 'relay_addr', 'handler', 'send_budget',
+        'ack_delay', 'auto_flush', 'header_format', '_proto', '_timers',
+        '_state', '_next_sequence_number', '_next_expected_seqnum',
+        '_next_order_index', '_next_delivered_index',
+        '_next_sequenced_index', '_next_accepted_index', '_last_acknum',
+        '_dup_ack_count', '_recovery_point', '_segment_queue',
+        '_unreliable_queue', '_sending_window', '_bytes_in_flight',
+        '_congestion', '_pacer', '_receive_buffer', '_large_message',
+        '_pending_messages',
+        '_ready_messages', '_rtt', '_stats', '_looping_send',
+        '_looping_receive', '_ack_handle', '_pacing_handle',
+        '_flush_handle', '_last_sent_acknum', '_last_activity',
+        '_pmtu', '_segment_size', '_probe_handle', '_fec_encoder',
+        '_fec_decoder'
+    )
+
     _Address = collections.namedtuple('Address', ['ip', 'port'])
 
     class ScheduledPacket(object):
 
         """A packet scheduled for sending or currently in flight."""
 
-        def __init__(self, rudp_packet, timeout, timeout_cb, retries=0):
+        __slots__ = ('rudp_packet', 'timeout', 'timeout_cb', 'retries', 'sent_at')
+
+        def __init__(
+            self,
+            rudp_packet,
+            timeout,
+            timeout_cb,
+            retries=0,
+            sent_at=None
+        ):
             """
             Create a new scheduled packet.
             Args:
-                rudp_packet: A packet.Packet in string format.
+                rudp_packet: A packet.Packet in string format; a
+                    bytearray once its ACK number is patched.
                 timeout: Seconds to wait before activating timeout_cb,
-                    as an integer.
-                timeout_cb: Callback to invoke upon timer expiration;
-                    the callback should implement a `cancel` method.
+                    as a float; it backs off after every expiration.
+                timeout_cb: Retransmission timer of the packet, or None
+                    if not yet sent; the timer should implement
+                    `active` and `cancel` methods.
                 retries: Number of times this package has already
                     been sent, as an integer.
+                sent_at: Time of the first transmission, in seconds,
+                    or None if not yet sent.
             """
             self.rudp_packet = rudp_packet
             self.timeout = timeout
             self.timeout_cb = timeout_cb
             self.retries = retries
+            self.sent_at = sent_at
 
         def __repr__(self):
             return '{0}({1}, {2}, {3}, {4})'.format(
@@ -61,7 +96,19 @@ class Connection(object):
                 self.retries
             )
 
-    def __init__(self, proto, handler, own_addr, dest_addr, relay_addr=None):
+    def __init__(
+        self,
+        proto,
+        handler,
+        own_addr,
+        dest_addr,
+        relay_addr=None,
+        congestion_controller=None,
+        pacer=None,
+        path_mtu_search=None,
+        fec_encoder=None,
+        header_format=packet.HeaderFormat.COMPACT
+    ):
         """
         Create a new connection and register it with the protocol.
         Args:
@@ -72,6 +119,22 @@ class Connection(object):
             own_addr: Tuple of local host address (ip, port).
             dest_addr: Tuple of remote host address (ip, port).
             relay_addr: Tuple of relay host address (ip, port).
+            congestion_controller: The congestion.CongestionController
+                bounding the bytes in flight; if None, NewReno is used.
+            pacer: A pacing.Pacer spacing out outbound packets; if
+                None, packets are sent as soon as the windows allow.
+            path_mtu_search: A pmtu.PathMTUSearch sizing segments to
+                the path, once the connection is established; if
+                None, segments are UDP_SAFE_SEGMENT_SIZE bytes.
+            fec_encoder: A fec.ParityEncoder sending parity packets
+                along with the reliable segments; if None, lost
+                segments are only recovered by retransmission.
+                Parity packets from the remote host are decoded
+                either way.
+            header_format: The packet.HeaderFormat of the packets
+                sent, unless the remote host opens the connection
+                with a SYN in another one, which is followed; LEGACY
+                reaches hosts that predate the compact header.
         If a relay address is specified, all outgoing packets are
         sent to that adddress, but the packets contain the address
         of their final destination. This is used for routing.
@@ -86,34 +149,189 @@ class Connection(object):
         self.handler = handler
 
         self._proto = proto
+        self._timers = proto.timer_wheel
         self._state = State.CONNECTING
 
         self._next_sequence_number = random.randrange(2**16 - 2)
         self._next_expected_seqnum = 0
-        self._next_delivered_seqnum = 0
 
+        # Index of the next message sent and of the next message
+        # delivered, per channel.
+        self._next_order_index = [0] * constants.MAX_CHANNELS
+        self._next_delivered_index = [0] * constants.MAX_CHANNELS
+
+        # Index of the next unreliable sequenced message sent, and
+        # the lowest index still accepted, per channel.
+        self._next_sequenced_index = [0] * constants.MAX_CHANNELS
+        self._next_accepted_index = [0] * constants.MAX_CHANNELS
+
+        # Highest cumulative ACK received, number of duplicate
+        # selective ACKs since, and the seqnum that has to be ACKed
+        # to leave fast recovery.
+        self._last_acknum = 0
+        self._dup_ack_count = 0
+        self._recovery_point = 0
+
+        # Channel, reliability class, order index, the message and
+        # its segment generator, or None if it fits in a segment, of
+        # the queued messages; unreliable ones are queued apart, as
+        # they bypass the windows.
         self._segment_queue = collections.deque()
-        self._sending_window = collections.OrderedDict()
+        self._unreliable_queue = collections.deque()
+        self._sending_window = window.SendWindow()
+        self._bytes_in_flight = 0
+
+        if congestion_controller is None:
+            congestion_controller = congestion.NewReno()
+        self._congestion = congestion_controller
+        self._pacer = pacer
+
+        # Maximum size of a segment; it grows as path MTU probes
+        # are answered.
+        self._pmtu = path_mtu_search
+        self._segment_size = constants.UDP_SAFE_SEGMENT_SIZE
+
+        # Forward error correction of outbound segments, and of
+        # inbound ones, created upon the first parity packet.
+        self._fec_encoder = fec_encoder
+        self._fec_decoder = None
+
+        self._receive_buffer = reorder.ReorderBuffer()
+
+        # Fragments taken out of the reorder buffer so far, of the
+        # message at its base that has more segments than it holds.
+        self._large_message = []
+
+        # Received messages waiting for earlier messages of their
+        # channel, by (channel, order index), and messages ready for
+        # delivery, in order.
+        self._pending_messages = {}
+        self._ready_messages = collections.deque()
 
-        self._receive_heap = heap.Heap()
+        self._rtt = rtt.RTTEstimator()
 
-        self._looping_send = task.LoopingCall(self._dequeue_outbound_message)
-        self._looping_receive = task.LoopingCall(self._pop_received_packet)
+        # Maximum number of segments sent per reactor turn.
+        self.send_budget = constants.SEND_BUDGET
+
+        # Maximum delay of an ACK, in seconds; should exceed the
+        # interval of messages expected from the application, so
+        # that ACKs are piggybacked on them.
+        self.ack_delay = constants.BARE_ACK_TIMEOUT
+
+        # Whether queued messages are flushed at the end of each
+        # reactor turn; if False, the application should call
+        # `flush`, e.g. once per server tick.
+        self.auto_flush = True
+
+        # Wire format of the packets sent; the format of the SYN
+        # received while connecting is taken up, so that the host
+        # opening the connection chooses.
+        self.header_format = header_format
+
+        self._stats = stats.ConnectionStats()
+
+        # Looping calls continuing to send and deliver on the
+        # following reactor turns, or None until first needed.
+        self._looping_send = None
+        self._looping_receive = None
 
         # Initiate SYN sequence after receiving any pending SYN message.
-        REACTOR.callLater(0, self._send_syn)
+        self._timers.clock.callLater(0, self._send_syn)
 
         # Setup and immediately cancel the ACK loop; it should only
         # be activated once the connection is in CONNECTED state.
         # However, initializing here helps avoiding `is None` checks.
-        self._ack_handle = REACTOR.callLater(1, self._send_ack)
+        self._ack_handle = self._timers.call_later(1, self._send_ack)
         self._ack_handle.cancel()
 
+        # Likewise, the timer resuming sending once pacing allows.
+        self._pacing_handle = self._timers.call_later(
+            1,
+            self._attempt_enabling_looping_send
+        )
+        self._pacing_handle.cancel()
+
+        # Likewise, the timeout of the outstanding path MTU probe, or
+        # the timer of the next search.
+        self._probe_handle = self._timers.call_later(1, self._send_probe)
+        self._probe_handle.cancel()
+
+        # The flush of the messages queued in this turn, or None;
+        # unlike the timers, the call is not kept once done.
+        self._flush_handle = None
+
+        # ACK number last sent to the remote host, on any packet.
+        self._last_sent_acknum = 0
+
+        # Time the latest packet was received from the remote host.
+        self._last_activity = self._timers.seconds()
+
     @property
     def state(self):
         """Get the current state."""
         return self._state
 
+    @property
+    def rtt(self):
+        """Get the round-trip time estimator, as a rtt.RTTEstimator."""
+        return self._rtt
+
+    @property
+    def congestion(self):
+        """Get the congestion.CongestionController of this connection."""
+        return self._congestion
+
+    @property
+    def pacer(self):
+        """Get the pacing.Pacer of this connection, or None."""
+        return self._pacer
+
+    @property
+    def path_mtu_search(self):
+        """Get the pmtu.PathMTUSearch of this connection, or None."""
+        return self._pmtu
+
+    @property
+    def fec_encoder(self):
+        """Get the fec.ParityEncoder of this connection, or None."""
+        return self._fec_encoder
+
+    @property
+    def segment_size(self):
+        """Get the maximum size of a segment, in bytes."""
+        return self._segment_size
+
+    @property
+    def bytes_in_flight(self):
+        """Get the number of bytes sent but not yet ACKed."""
+        return self._bytes_in_flight
+
+    @property
+    def last_activity(self):
+        """
+        Get the time the latest packet was received from the remote
+        host, or the connection was created, in seconds.
+        """
+        return self._last_activity
+
+    @property
+    def stats(self):
+        """
+        Get the stats.ConnectionStats of this connection.
+        The gauges are refreshed in place; no object is allocated.
+        """
+        connection_stats = self._stats
+        connection_stats.srtt = self._rtt.srtt
+        connection_stats.rto = self._rtt.rto
+        connection_stats.cwnd = self._congestion.cwnd
+        connection_stats.bytes_in_flight = self._bytes_in_flight
+        connection_stats.window = len(self._sending_window)
+        connection_stats.queued_messages = (
+            len(self._segment_queue) + len(self._unreliable_queue)
+        )
+        connection_stats.reorder_depth = self._receive_buffer.span
+        return connection_stats
+
     def set_relay_address(self, relay_addr):
         """
         Change the relay address used on this connection.
@@ -122,18 +340,123 @@ class Connection(object):
         """
         self.relay_addr = self._Address(*relay_addr)
 
-    def send_message(self, message):
+    def send_message(
+        self,
+        message,
+        channel=constants.DEFAULT_CHANNEL,
+        reliability=packet.Reliability.RELIABLE_ORDERED
+    ):
         """
         Send a message to the connected remote host, asynchronously.
-        If the message is too large for proper transmission over UDP,
-        it is first segmented appropriately.
+        The message is queued until the next flush, which coalesces
+        consecutive small messages of a channel and reliability class
+        into shared segments.
+        If the message is larger than the segment size of the
+        connection, it is segmented appropriately as it is sent. Segments are
+        views of the message, so the message is never copied before
+        its segments are encoded into datagrams.
+        Messages of the unreliable classes are sent on flush, outside
+        the send and congestion windows, and are dropped if the
+        connection is not yet established. As in RakNet, those that
+        need segmenting are sent reliably instead, since losing any
+        segment would lose the whole message.
         Args:
-            message: The message to be sent, as bytes.
+            message: The message to be sent, as bytes. Mutable
+                bytes-like objects are copied once, since they may
+                be modified while queued.
+            channel: The ordering channel of the message, one of
+                the CHANNEL_* constants of leviathan.network.Network.
+                Messages are delivered in order within their channel
+                only.
+            reliability: The packet.Reliability class of the message.
+        Raises:
+            ValueError: The channel is out of range, or the message
+                is larger than constants.MAX_MESSAGE_SIZE, which the
+                receiving end would refuse to reassemble.
+        """
+        if not 0 <= channel < constants.MAX_CHANNELS:
+            raise ValueError('Bad channel: {0}.'.format(channel))
+        if isinstance(message, (bytearray, memoryview)):
+            message = bytes(message)
+        if len(message) > constants.MAX_MESSAGE_SIZE:
+            raise ValueError(
+                'Message too large: {0} bytes.'.format(len(message))
+            )
+        if not message:
+            return
+
+        segments = None
+        if len(message) > self._segment_size:
+            segments = self._gen_segments(message)
+
+        if reliability in packet.UNRELIABLE_CLASSES:
+            if segments is None:
+                if self._state != State.CONNECTED:
+                    return
+                sequenced_index = 0
+                if reliability == packet.Reliability.UNRELIABLE_SEQUENCED:
+                    sequenced_index = self._next_sequenced_index[channel]
+                    self._next_sequenced_index[channel] = sequenced_index + 1
+                self._unreliable_queue.append(
+                    (channel, reliability, sequenced_index, message, None)
+                )
+                self._stats.sent_messages += 1
+                self._schedule_flush()
+                return
+            if reliability == packet.Reliability.UNRELIABLE:
+                reliability = packet.Reliability.RELIABLE
+            else:
+                reliability = packet.Reliability.RELIABLE_ORDERED
+
+        order_index = 0
+        if reliability == packet.Reliability.RELIABLE_ORDERED:
+            order_index = self._next_order_index[channel]
+            self._next_order_index[channel] = order_index + 1
+        self._segment_queue.append(
+            (channel, reliability, order_index, message, segments)
+        )
+        self._stats.sent_messages += 1
+        self._schedule_flush()
+
+    def flush(self):
         """
-        for segment in self._gen_segments(message):
-            self._segment_queue.append(segment)
+        Send the queued messages, as far as the windows allow.
+        Called at the end of each reactor turn in which messages were
+        queued if `auto_flush` is set. Reliable messages left queued
+        are sent as the windows open, coalesced with any messages
+        queued in the meantime.
+        """
+        self._cancel_flush()
+        if self._state != State.CONNECTED:
+            return
+        while self._unreliable_queue:
+            self._send_unreliable(
+                *self._pop_segment(self._unreliable_queue, self._segment_size)
+            )
         self._attempt_enabling_looping_send()
 
+    def send_keepalive(self):
+        """
+        Probe the remote host with an empty reliable packet.
+        The packet is sequenced and retransmitted like any other, so
+        its ACK refreshes `last_activity`, while a vanished remote
+        host eventually exhausts its retransmissions and breaks the
+        connection. Nothing is sent unless the connection is
+        established and its send window is empty; packets in flight
+        already probe the remote host.
+        """
+        if self._state != State.CONNECTED or self._sending_window:
+            return
+        keepalive_packet = packet.Packet.from_data(
+            self._get_next_sequence_number(),
+            self.dest_addr,
+            self.own_addr,
+            ack=self._next_expected_seqnum,
+            sack=self._get_sack_blocks(),
+            reliability=packet.Reliability.RELIABLE
+        )
+        self._schedule_send_in_order(keepalive_packet, self._rtt.rto)
+
     def receive_packet(self, rudp_packet, from_addr):
         """
         Process received packet and update connection state.
@@ -155,11 +478,23 @@ class Connection(object):
         if from_addr not in (rudp_packet.source_addr, self.relay_addr):
             self.set_relay_address(from_addr)
 
+        self._last_activity = self._timers.seconds()
+        self._stats.received_datagrams += 1
+        self._stats.received_bytes += rudp_packet.size
         if rudp_packet.fin:
             self._process_fin_packet(rudp_packet)
+        elif rudp_packet.probe_size or rudp_packet.probe_ack:
+            if self._state == State.CONNECTED:
+                self._process_probe_packet(rudp_packet)
+        elif rudp_packet.parity_count:
+            if self._state == State.CONNECTED:
+                self._process_parity_packet(rudp_packet)
         elif rudp_packet.syn:
             if self._state == State.CONNECTING:
                 self._process_syn_packet(rudp_packet)
+        elif rudp_packet.cookie:
+            if self._state == State.CONNECTING:
+                self._process_cookie_packet(rudp_packet)
         else:
             if self._state == State.CONNECTED:
                 self._process_casual_packet(rudp_packet)
@@ -179,6 +514,10 @@ class Connection(object):
 
         self._send_fin()
         self._cancel_ack_timeout()
+        self._pacing_handle.cancel()
+        self._probe_handle.cancel()
+        self._cancel_flush()
+        self._unreliable_queue.clear()
         self._attempt_disabling_looping_send(force=True)
         self._attempt_disabling_looping_receive()
         self._clear_sending_window()
@@ -195,38 +534,130 @@ class Connection(object):
         creating and destroying connections endlessly.
         """
         assert self.state == State.SHUTDOWN
+        self._proto.retire_stats(self.stats)
         del self._proto[self.dest_addr]
 
-    @staticmethod
-    def _gen_segments(message):
+    def _gen_segments(self, message):
         """
-        Split a message into segments appropriate for transmission.
+        Split a message into segments of the current segment size.
         Args:
-            message: The message to sent, as a string.
+            message: The message to sent, as bytes.
         Yields:
-            Tuples of two elements; the first element is the number
-            of remaining segments, the second is the actual string
-            segment.
+            Tuples of three elements; the index of the segment, the
+            number of remaining segments, and the actual segment, as
+            a memoryview of the message.
         """
-        max_size = constants.UDP_SAFE_SEGMENT_SIZE
+        view = memoryview(message)
+        max_size = self._segment_size
         count = (len(message) + max_size - 1) // max_size
-        segments = (
-            (count - i - 1, message[i * max_size: (i + 1) * max_size])
-            for i in range(count)
+        for i in range(count):
+            yield i, count - i - 1, view[i * max_size: (i + 1) * max_size]
+
+    @staticmethod
+    def _pop_segment(queue, segment_size):
+        """
+        Pop the next segment off a queue of messages.
+        A message that fits in a segment is coalesced with any
+        following messages of the same channel and reliability class
+        that fit in the segment too.
+        Args:
+            queue: A deque of queued messages.
+            segment_size: Maximum size of the segment, in bytes.
+        Returns:
+            Tuple of the channel, reliability class and order index
+            of the segment, its fragment index, the number of
+            remaining segments, whether it is coalesced, and the
+            segment itself, as a bytes-like object.
+        """
+        channel, reliability, order_index, message, segments = queue[0]
+        if segments is not None:
+            fragment_index, more_fragments, segment = next(segments)
+            if not more_fragments:
+                queue.popleft()
+            return (
+                channel, reliability, order_index,
+                fragment_index, more_fragments, False, segment
+            )
+
+        queue.popleft()
+        header_size = packet.FRAME_HEADER.size
+        size = header_size + len(message)
+        messages = None
+        while queue:
+            next_channel, next_reliability, _, next_message, next_segments = queue[0]
+            if (
+                next_segments is not None or
+                next_channel != channel or
+                next_reliability != reliability or
+                size + header_size + len(next_message) > segment_size
+            ):
+                break
+            if messages is None:
+                messages = [message]
+            messages.append(next_message)
+            size += header_size + len(next_message)
+            queue.popleft()
+
+        if messages is None:
+            return channel, reliability, order_index, 0, 0, False, message
+        return (
+            channel, reliability, order_index,
+            0, 0, True, packet.pack_frames(messages)
         )
-        return segments
+
+    def _schedule_flush(self):
+        """Flush at the end of the reactor turn, if so configured."""
+        if self.auto_flush and self._flush_handle is None:
+            self._flush_handle = self._timers.clock.callLater(0, self.flush)
+
+    def _cancel_flush(self):
+        """Cancel the flush scheduled for this turn, if any."""
+        if self._flush_handle is not None:
+            if self._flush_handle.active():
+                self._flush_handle.cancel()
+            self._flush_handle = None
+
+    def _can_send_in_order(self):
+        """
+        Check whether both the send window and the congestion
+        window have room for another packet.
+        The send window spans WINDOW_SIZE sequence numbers from the
+        lowest unACKed packet, so that SACKed packets beyond a hole
+        do not make room for more; this bounds the reorder buffer
+        of the remote host.
+        """
+        if self._sending_window:
+            span = self._next_sequence_number - self._sending_window.lowest
+            if span >= constants.WINDOW_SIZE:
+                return False
+        return self._congestion.can_send(self._bytes_in_flight)
 
     def _attempt_enabling_looping_send(self):
         """
-        Enable dequeuing if a packet can be scheduled immediately.
+        Dequeue immediately if a packet can be scheduled.
+        A burst of up to `send_budget` packets is sent right away;
+        looping send is only enabled to continue on the following
+        reactor turns if the budget runs out before the windows do.
         """
         if (
-            not self._looping_send.running and
+            not self._is_looping_send() and
+            not self._pacing_handle.active() and
             self._state == State.CONNECTED and
-            len(self._sending_window) < constants.WINDOW_SIZE and
+            self._can_send_in_order() and
             len(self._segment_queue)
         ):
-            self._looping_send.start(0, now=True)
+            self._dequeue_outbound_messages()
+            if (
+                not self._pacing_handle.active() and
+                self._can_send_in_order() and
+                len(self._segment_queue)
+            ):
+                if self._looping_send is None:
+                    self._looping_send = scheduler.LoopingCall(
+                        self._timers.clock,
+                        self._dequeue_outbound_messages
+                    )
+                self._looping_send.start(now=False)
 
     def _attempt_disabling_looping_send(self, force=False):
         """
@@ -235,14 +666,19 @@ class Connection(object):
             force: If True, force disabling.
         """
         if (
-            self._looping_send.running and (
+            self._is_looping_send() and (
                 force or
-                len(self._sending_window) >= constants.WINDOW_SIZE or
+                self._pacing_handle.active() or
+                not self._can_send_in_order() or
                 not len(self._segment_queue)
             )
         ):
             self._looping_send.stop()
 
+    def _is_looping_send(self):
+        """Check whether looping send is active."""
+        return self._looping_send is not None and self._looping_send.running
+
     def _get_next_sequence_number(self):
         """Return-then-increment the next available sequence number."""
         cur = self._next_sequence_number
@@ -253,16 +689,33 @@ class Connection(object):
         """
         Create and schedule the initial SYN packet.
         The current ACK number is included; if it is greater than
-        0, then this actually is a SYNACK packet.
+        0, then this actually is a SYNACK packet. The packet carries
+        a blank cookie, which entitles it to a cookie in reply from
+        a remote host that does not know this one yet.
         """
-        syn_packet = packet.Packet.from_data(
+        syn_packet = self._make_syn_packet(
             self._get_next_sequence_number(),
+            bytes(1 + cookie.MAC_SIZE)
+        )
+        self._schedule_send_in_order(syn_packet, self._rtt.rto)
+
+    def _make_syn_packet(self, seqnum, syn_cookie):
+        """
+        Create a SYN packet.
+        Args:
+            seqnum: The sequence number of the SYN.
+            syn_cookie: The cookie to echo, as bytes.
+        Returns:
+            A packet.Packet with SYN set.
+        """
+        return packet.Packet.from_data(
+            seqnum,
             self.dest_addr,
             self.own_addr,
             ack=self._next_expected_seqnum,
-            syn=True
+            syn=True,
+            cookie=syn_cookie
         )
-        self._schedule_send_in_order(syn_packet, constants.PACKET_TIMEOUT)
 
     def _send_ack(self):
         """
@@ -273,14 +726,83 @@ class Connection(object):
         host's ACK number may have advanced in the meantime. Instead,
         each ACK timeout sends the latest ACK number available.
         """
+        self._on_ack_sent()
         ack_packet = packet.Packet.from_data(
             0,
             self.dest_addr,
             self.own_addr,
-            ack=self._next_expected_seqnum
+            ack=self._next_expected_seqnum,
+            sack=self._get_sack_blocks()
         )
         self._schedule_send_out_of_order(ack_packet)
 
+    def _send_unreliable(
+        self,
+        channel,
+        reliability,
+        sequenced_index,
+        fragment_index,
+        more_fragments,
+        coalesced,
+        segment
+    ):
+        """
+        Create and send a packet of an unreliable class.
+        Unreliable packets are sent out-of-order and do not have a
+        meaningful sequence number; they are neither ACKed nor
+        retransmitted. They carry the current ACK number, but no
+        SACK blocks, lest they count as duplicate ACKs.
+        Args:
+            channel: The channel of the segment.
+            reliability: packet.Reliability.UNRELIABLE or
+                UNRELIABLE_SEQUENCED.
+            sequenced_index: The index of the (first) message among
+                the sequenced messages of its channel.
+            fragment_index: Unused; unreliable messages are never
+                fragmented.
+            more_fragments: Unused, likewise.
+            coalesced: Whether the segment holds several messages.
+            segment: The segment, as a bytes-like object.
+        """
+        unreliable_packet = packet.Packet.from_data(
+            0,
+            self.dest_addr,
+            self.own_addr,
+            segment,
+            ack=self._next_expected_seqnum,
+            channel=channel,
+            order_index=sequenced_index,
+            reliability=reliability,
+            coalesced=coalesced
+        )
+        self._on_ack_sent()
+        self._schedule_send_out_of_order(unreliable_packet)
+
+    def _send_parity(self, parity_base, parity_count, parity):
+        """
+        Create and send a forward error correction parity packet.
+        Parity packets are sent out-of-order, like unreliable ones;
+        a lost one is not retransmitted, since the segments it
+        covers are.
+        Args:
+            parity_base: The sequence number of the first segment
+                of the group.
+            parity_count: The number of segments in the group.
+            parity: The parity of the group, as bytes.
+        """
+        parity_packet = packet.Packet.from_data(
+            0,
+            self.dest_addr,
+            self.own_addr,
+            parity,
+            ack=self._next_expected_seqnum,
+            parity_base=parity_base,
+            parity_count=parity_count
+        )
+        self._stats.parity_sent += 1
+        self._on_ack_sent()
+        self._schedule_send_out_of_order(parity_packet)
+
     def _send_fin(self):
         """
         Create and schedule a FIN packet.
@@ -307,42 +829,83 @@ class Connection(object):
             rudp_packet: The packet.Packet to be sent.
         """
         final_packet = self._finalize_packet(rudp_packet)
-        self._proto.send_datagram(final_packet, self.relay_addr)
+        if self._pacer is not None and rudp_packet.payload:
+            self._pacer.on_send(len(final_packet), self._timers.seconds())
+        self._send_datagram(final_packet)
 
     def _schedule_send_in_order(self, rudp_packet, timeout):
         """
-        Schedule a package to be sent and set the timeout timer.
+        Send a package immediately and set the timeout timer.
         Args:
             rudp_packet: The packet.Packet to be sent.
             timeout: The timeout for this packet type.
         """
         final_packet = self._finalize_packet(rudp_packet)
         seqnum = rudp_packet.sequence_number
-        timeout_cb = REACTOR.callLater(0, self._do_send_packet, seqnum)
         self._sending_window[seqnum] = self.ScheduledPacket(
             final_packet,
             timeout,
-            timeout_cb,
+            None,
             0
         )
-
-    def _dequeue_outbound_message(self):
+        self._bytes_in_flight += len(final_packet)
+        if self._pacer is not None:
+            self._pacer.on_send(len(final_packet), self._timers.seconds())
+        self._do_send_packet(seqnum)
+        # The packet carries the current ACK number; piggybacking
+        # makes a pending bare ACK redundant.
+        self._on_ack_sent()
+
+    def _dequeue_outbound_messages(self):
         """
-        Deque a message, wrap it into an RUDP packet and schedule it.
-        Pause dequeueing if it would overflow the send window.
+        Deque messages, wrap them into RUDP packets and schedule them.
+        Fill the send and congestion windows in a single pass, but
+        send at most `send_budget` packets per reactor turn. Pause
+        dequeueing if it would overflow either window, or until the
+        pacer allows the next packet.
         """
         assert self._segment_queue, 'Looping send active despite empty queue.'
-        more_fragments, message = self._segment_queue.popleft()
-
-        rudp_packet = packet.Packet.from_data(
-            self._get_next_sequence_number(),
-            self.dest_addr,
-            self.own_addr,
-            message,
-            more_fragments,
-            ack=self._next_expected_seqnum
-        )
-        self._schedule_send_in_order(rudp_packet, constants.PACKET_TIMEOUT)
+        sack = self._get_sack_blocks()
+        if self._pacer is not None:
+            self._pacer.update(
+                self._congestion,
+                self._rtt.srtt,
+                self._timers.seconds()
+            )
+        for _ in range(self.send_budget):
+            if not (self._segment_queue and self._can_send_in_order()):
+                break
+            if self._pacer is not None:
+                delay = self._pacer.delay(self._timers.seconds())
+                if delay > 0:
+                    self._pacing_handle = self._timers.call_later(
+                        delay,
+                        self._attempt_enabling_looping_send
+                    )
+                    break
+            (
+                channel, reliability, order_index,
+                fragment_index, more_fragments, coalesced, segment
+            ) = self._pop_segment(self._segment_queue, self._segment_size)
+            rudp_packet = packet.Packet.from_data(
+                self._get_next_sequence_number(),
+                self.dest_addr,
+                self.own_addr,
+                segment,
+                more_fragments,
+                ack=self._next_expected_seqnum,
+                sack=sack,
+                channel=channel,
+                order_index=order_index,
+                fragment_index=fragment_index,
+                reliability=reliability,
+                coalesced=coalesced
+            )
+            self._schedule_send_in_order(rudp_packet, self._rtt.rto)
+            if self._fec_encoder is not None:
+                parity = self._fec_encoder.add(rudp_packet)
+                if parity is not None:
+                    self._send_parity(*parity)
 
         self._attempt_disabling_looping_send()
 
@@ -356,49 +919,119 @@ class Connection(object):
         Args:
             rudp_packet: A packet.Packet
         Returns:
-            The protobuf-encoded version of the packet, as bytes.
+            The packet encoded in the header format of the
+            connection, as bytes.
         """
+        rudp_packet.header_format = self.header_format
         return rudp_packet.to_bytes()
 
-    def _do_send_packet(self, seqnum):
+    def _get_sack_blocks(self):
+        """Return SACK blocks describing out-of-order received packets."""
+        return self._receive_buffer.sack_blocks(
+            self._next_expected_seqnum,
+            constants.MAX_SACK_BLOCKS
+        )
+
+    def _do_send_packet(self, seqnum, backoff=True):
         """
         Immediately dispatch packet with given sequence number.
         The packet must have been previously scheduled, that is, it
         should reside in the send window. Upon successful dispatch,
         the timeout timer for this packet is reset and the
-        retransmission counter is incremented. If the retries exceed a
-        given limit, the connection is considered broken and the
-        shutdown sequence is initiated. Finally, the timeout for the
-        looping ACK sender is reset.
+        retransmission counter is incremented; a retransmission
+        doubles the timeout of the packet. If the packet is still
+        unacknowledged MAX_PACKET_DELAY seconds after its first
+        transmission, the connection is considered broken and the
+        shutdown sequence is initiated.
         Args:
             seqnum: Sequence number of a ScheduledPacket, as an integer.
+            backoff: If False, a retransmission keeps the timeout of
+                the packet, as the previous one did not expire.
         Raises:
             KeyError: No such packet exists in the send window; some
                 invariant has been violated.
         """
         sch_packet = self._sending_window[seqnum]
-        if sch_packet.retries >= constants.MAX_RETRANSMISSIONS:
+        now = self._timers.seconds()
+        if (
+            sch_packet.retries and
+            now - sch_packet.sent_at >= constants.MAX_PACKET_DELAY
+        ):
             self.shutdown()
         else:
-            self._proto.send_datagram(sch_packet.rudp_packet, self.relay_addr)
-            sch_packet.timeout_cb = REACTOR.callLater(
+            if sch_packet.retries:
+                self._stats.retransmissions += 1
+                if backoff:
+                    sch_packet.timeout = self._rtt.backoff(sch_packet.timeout)
+                    self._on_timeout(seqnum)
+                    self._detect_black_hole(sch_packet)
+                self._refresh_ack(sch_packet)
+            else:
+                sch_packet.sent_at = now
+            self._send_datagram(sch_packet.rudp_packet)
+            sch_packet.timeout_cb = self._timers.call_later(
                 sch_packet.timeout,
                 self._do_send_packet,
                 seqnum
             )
             sch_packet.retries += 1
-            self._cancel_ack_timeout()
 
-    def _reset_ack_timeout(self, timeout):
+    def _refresh_ack(self, sch_packet):
         """
-        Reset timeout for next bare ACK packet.
+        Bring the ACK number of a packet about to be retransmitted up
+        to date, in place, if its header format allows; the packet
+        is copied into a bytearray on its first retransmission.
         Args:
-            timeout: Seconds until a bare ACK packet is sent.
+            sch_packet: The ScheduledPacket.
         """
-        if self._ack_handle.active():
-            self._ack_handle.reset(timeout)
-        else:
-            self._ack_handle = REACTOR.callLater(timeout, self._send_ack)
+        datagram = sch_packet.rudp_packet
+        if packet.detect_format(datagram) == packet.HeaderFormat.LEGACY:
+            return
+        if not isinstance(datagram, bytearray):
+            datagram = sch_packet.rudp_packet = bytearray(datagram)
+        packet.patch_ack(datagram, self._next_expected_seqnum)
+        self._on_ack_sent()
+
+    def _send_datagram(self, datagram):
+        """
+        Hand a datagram to the protocol, for the relay address.
+        Args:
+            datagram: A finalized packet, as bytes.
+        """
+        self._stats.sent_datagrams += 1
+        self._stats.sent_bytes += len(datagram)
+        self._proto.send_datagram(datagram, self.relay_addr)
+
+    def _schedule_ack(self, immediate=False):
+        """
+        Acknowledge newly received in-order segments.
+        A bare ACK is sent once ACK_FREQUENCY segments are unACKed;
+        otherwise it is sent `ack_delay` seconds after the first
+        unACKed segment, unless outbound data carries the ACK number
+        before then. The timeout is not pushed back by later
+        segments. If looping send is active, the next burst carries
+        the ACK.
+        Args:
+            immediate: If True, send any pending ACK right away.
+        """
+        unacked = self._next_expected_seqnum - self._last_sent_acknum
+        if unacked <= 0:
+            return
+        if immediate or (
+            unacked >= constants.ACK_FREQUENCY and
+            not self._is_looping_send()
+        ):
+            self._send_ack()
+        elif not self._ack_handle.active():
+            self._ack_handle = self._timers.call_later(
+                self.ack_delay,
+                self._send_ack
+            )
+
+    def _on_ack_sent(self):
+        """Note that the current ACK number has been sent."""
+        self._last_sent_acknum = self._next_expected_seqnum
+        self._cancel_ack_timeout()
 
     def _cancel_ack_timeout(self):
         """Cancel timeout for next bare ACK packet."""
@@ -411,20 +1044,42 @@ class Connection(object):
         Cancel all retransmission timers.
         """
         for sch_packet in self._sending_window.values():
-            if sch_packet.timeout_cb.active():
+            if sch_packet.timeout_cb is not None:
                 sch_packet.timeout_cb.cancel()
         self._sending_window.clear()
+        self._bytes_in_flight = 0
 
     def _process_ack_packet(self, rudp_packet):
         """
-        Process the ACK field on a received packet.
+        Process the ACK and SACK fields on a received packet.
+        Bare ACKs that carry SACK blocks without advancing the ACK
+        number are counted as duplicates; once enough of them are
+        received, the holes they reveal are fast-retransmitted.
         Args:
             rudp_packet: A packet.Packet with positive ACK field.
         """
+        acknum = min(rudp_packet.ack, self._next_sequence_number)
+        if acknum > self._last_acknum:
+            self._last_acknum = acknum
+            self._dup_ack_count = 0
+        elif rudp_packet.sack and not rudp_packet.sequence_number:
+            self._dup_ack_count += 1
+
         if self._sending_window:
-            self._retire_packets_with_seqnum_up_to(
-                min(rudp_packet.ack, self._next_sequence_number)
-            )
+            bytes_in_flight = self._bytes_in_flight
+            self._retire_packets_with_seqnum_up_to(acknum)
+            highest_sacked = self._retire_sacked_packets(rudp_packet.sack)
+            if self._bytes_in_flight < bytes_in_flight:
+                self._congestion.on_ack(
+                    bytes_in_flight - self._bytes_in_flight,
+                    self._bytes_in_flight
+                )
+            if (
+                self._dup_ack_count >= constants.DUP_ACK_THRESHOLD and
+                self._last_acknum >= self._recovery_point
+            ):
+                self._fast_retransmit(highest_sacked)
+            self._attempt_enabling_looping_send()
 
     def _process_fin_packet(self, rudp_packet):
         """
@@ -441,20 +1096,130 @@ class Connection(object):
         Process received packet.
         This method can only be called if the connection has been
         established; ignore status of SYN flag.
+        The sequence number is processed before the ACK field, so
+        that any data the ACK releases carries the newest ACK number.
         Args:
             rudp_packet: A packet.Packet with SYN and FIN flags unset.
         """
+        if rudp_packet.reliability in packet.UNRELIABLE_CLASSES:
+            self._process_unreliable_packet(rudp_packet)
+            return
+
+        seqnum = rudp_packet.sequence_number
+        # Segments beyond the reorder buffer are dropped.
+        pushed = (
+            seqnum >= self._next_expected_seqnum and
+            self._receive_buffer.push(rudp_packet)
+        )
+        in_order = (
+            seqnum == self._next_expected_seqnum and
+            seqnum in self._receive_buffer
+        )
+        filled_hole = False
+        if in_order:
+            # Also ACK any run of packets received beyond it.
+            self._next_expected_seqnum += 1
+            filled_hole = self._next_expected_seqnum in self._receive_buffer
+            while self._next_expected_seqnum in self._receive_buffer:
+                self._next_expected_seqnum += 1
+
         if rudp_packet.ack > 0:
             self._process_ack_packet(rudp_packet)
 
-        seqnum = rudp_packet.sequence_number
-        if seqnum > 0:
-            self._reset_ack_timeout(constants.BARE_ACK_TIMEOUT)
-            if seqnum >= self._next_expected_seqnum:
-                self._receive_heap.push(rudp_packet)
-                if seqnum == self._next_expected_seqnum:
-                    self._next_expected_seqnum += 1
-                    self._attempt_enabling_looping_receive()
+        if pushed:
+            if self._fec_decoder is not None:
+                self._fec_decoder.add(rudp_packet)
+            self._collect_message(rudp_packet)
+            if self._state == State.SHUTDOWN:
+                return
+
+        if in_order:
+            self._schedule_ack(immediate=filled_hole)
+        elif 0 < seqnum < self._next_expected_seqnum or seqnum in self._receive_buffer:
+            # Report holes to the sender without delay. A duplicate
+            # means that the previous ACK was probably lost.
+            if not pushed:
+                self._stats.duplicates_received += 1
+            self._send_ack()
+
+    def _process_unreliable_packet(self, rudp_packet):
+        """
+        Process a received packet of an unreliable class.
+        Its sequence number is ignored and it is not ACKed. A
+        sequenced message is dropped if a later message of its
+        channel has already been delivered.
+        Args:
+            rudp_packet: A packet.Packet of an unreliable class.
+        """
+        if rudp_packet.ack > 0:
+            self._process_ack_packet(rudp_packet)
+
+        if rudp_packet.coalesced:
+            messages = packet.unpack_frames(rudp_packet.payload)
+        else:
+            messages = (rudp_packet.payload,)
+
+        if rudp_packet.reliability == packet.Reliability.UNRELIABLE_SEQUENCED:
+            channel = rudp_packet.channel
+            end_index = rudp_packet.order_index + len(messages)
+            stale = self._next_accepted_index[channel] - rudp_packet.order_index
+            if stale >= len(messages):
+                return
+            if stale > 0:
+                messages = messages[stale:]
+            self._next_accepted_index[channel] = end_index
+
+        self._ready_messages.extend(messages)
+        self._attempt_enabling_looping_receive()
+
+    def _process_parity_packet(self, rudp_packet):
+        """
+        Process a received forward error correction parity packet.
+        If exactly one segment of its group is missing, it is
+        rebuilt and processed as if received, which ACKs it before
+        its retransmission timeout. The first parity packet enables
+        the keeping of received segments, so the group it covers is
+        usually not recoverable.
+        Args:
+            rudp_packet: A packet.Packet with positive parity_count.
+        """
+        if rudp_packet.ack > 0:
+            self._process_ack_packet(rudp_packet)
+
+        if self._fec_decoder is None:
+            self._fec_decoder = fec.ParityDecoder()
+            return
+        recovered = self._fec_decoder.recover(rudp_packet)
+        if recovered is None:
+            return
+        seqnum = recovered.sequence_number
+        if seqnum < self._next_expected_seqnum or seqnum in self._receive_buffer:
+            return
+        self._stats.recovered_segments += 1
+        self._process_casual_packet(recovered)
+
+    def _process_cookie_packet(self, rudp_packet):
+        """
+        Echo the cookie the remote host answered the SYN with.
+        The SYN still in flight is replaced by one carrying the
+        cookie, which is sent at once; it then counts as a first
+        transmission.
+        Args:
+            rudp_packet: A packet.Packet with a cookie, and SYN unset.
+        """
+        seqnum = self._sending_window.lowest
+        if seqnum is None:
+            return
+        sch_packet = self._sending_window[seqnum]
+        syn_packet = self._finalize_packet(
+            self._make_syn_packet(seqnum, rudp_packet.cookie)
+        )
+        if sch_packet.timeout_cb is not None:
+            sch_packet.timeout_cb.cancel()
+        self._bytes_in_flight += len(syn_packet) - len(sch_packet.rudp_packet)
+        sch_packet.rudp_packet = syn_packet
+        sch_packet.retries = 0
+        self._do_send_packet(seqnum)
 
     def _process_syn_packet(self, rudp_packet):
         """
@@ -469,19 +1234,137 @@ class Connection(object):
         if rudp_packet.ack > 0:
             self._process_ack_packet(rudp_packet)
 
+        self.header_format = rudp_packet.header_format
         self._update_next_expected_seqnum(rudp_packet.sequence_number)
-        self._update_next_delivered_seqnum(rudp_packet.sequence_number)
+        self._receive_buffer.reset(rudp_packet.sequence_number + 1)
         self._state = State.CONNECTED
         self._attempt_enabling_looping_send()
+        if self._pmtu is not None:
+            self._send_probe()
+
+    def _send_probe(self):
+        """
+        Send a path MTU probe of the next size to try.
+        The probe is padded up to that size, and is neither
+        sequenced nor retransmitted; if no answer arrives within the
+        retransmission timeout, it is deemed lost.
+        """
+        size = self._pmtu.probe_size
+        if size is None or self._state != State.CONNECTED:
+            return
+        probe_packet = packet.Packet.from_data(
+            0,
+            self.dest_addr,
+            self.own_addr,
+            probe_size=size
+        )
+        probe_packet.header_format = self.header_format
+        probe_packet.pad(size)
+        self._pmtu.on_probe_sent()
+        self._schedule_send_out_of_order(probe_packet)
+        self._probe_handle = self._timers.call_later(
+            self._rtt.rto,
+            self._on_probe_timeout
+        )
+
+    def _on_probe_timeout(self):
+        """Try the next size, or wait to search again."""
+        self._pmtu.on_probe_lost()
+        if self._pmtu.probe_size is not None:
+            self._send_probe()
+        else:
+            self._schedule_probe_raise()
+
+    def _schedule_probe_raise(self):
+        """Search again later, if the path may fit larger datagrams."""
+        if self._pmtu.can_raise:
+            self._probe_handle = self._timers.call_later(
+                constants.PMTU_RAISE_INTERVAL,
+                self._raise_probe
+            )
+
+    def _raise_probe(self):
+        """Restart the path MTU search."""
+        self._pmtu.restart()
+        self._send_probe()
+
+    def _detect_black_hole(self, sch_packet):
+        """
+        Fall back to the safe segment size once a segment larger than
+        it has timed out PMTU_BLACK_HOLE_TIMEOUTS times, as when the
+        path MTU shrinks without notice, and search the path MTU
+        again. Segments already sequenced keep their size.
+        Args:
+            sch_packet: The ScheduledPacket that timed out.
+        """
+        if (
+            self._pmtu is None or
+            self._pmtu.datagram_size is None or
+            sch_packet.retries != constants.PMTU_BLACK_HOLE_TIMEOUTS
+        ):
+            return
+        safe_size = constants.UDP_SAFE_SEGMENT_SIZE + packet.max_header_size(
+            self.dest_addr,
+            self.own_addr,
+            self.header_format
+        )
+        if len(sch_packet.rudp_packet) <= safe_size:
+            return
+        self._pmtu.on_black_hole()
+        self._set_segment_size(constants.UDP_SAFE_SEGMENT_SIZE)
+        self._probe_handle.cancel()
+        self._send_probe()
+
+    def _process_probe_packet(self, rudp_packet):
+        """
+        Answer a path MTU probe, or process the answer to one.
+        A probe is answered with its size, as received. An answer
+        grows the segment size by as much as the probe exceeds the
+        largest header of the connection, and ends the search.
+        Args:
+            rudp_packet: A packet.Packet with positive probe_size or
+                probe_ack field.
+        """
+        if rudp_packet.probe_size:
+            probe_ack_packet = packet.Packet.from_data(
+                0,
+                self.dest_addr,
+                self.own_addr,
+                probe_ack=rudp_packet.size
+            )
+            self._schedule_send_out_of_order(probe_ack_packet)
+            return
+
+        if self._pmtu is None:
+            return
+        self._probe_handle.cancel()
+        self._pmtu.on_probe_acked(rudp_packet.probe_ack)
+        header_size = packet.max_header_size(
+            self.dest_addr,
+            self.own_addr,
+            self.header_format
+        )
+        self._set_segment_size(max(
+            constants.UDP_SAFE_SEGMENT_SIZE,
+            self._pmtu.datagram_size - header_size
+        ))
+        self._schedule_probe_raise()
+
+    def _set_segment_size(self, segment_size):
+        """
+        Resize the segments sequenced from now on, and the congestion
+        window along with them.
+        Args:
+            segment_size: The new maximum segment size, in bytes.
+        """
+        if segment_size != self._segment_size:
+            self._segment_size = segment_size
+            self._congestion.set_segment_size(segment_size)
 
     def _update_next_expected_seqnum(self, seqnum):
         if self._next_expected_seqnum <= seqnum:
             self._next_expected_seqnum = seqnum + 1
 
-    def _update_next_delivered_seqnum(self, seqnum):
-        if self._next_delivered_seqnum <= seqnum:
-            self._next_delivered_seqnum = seqnum + 1
-
     def _retire_packets_with_seqnum_up_to(self, acknum):
         """
         Remove from send window any ACKed packets.
@@ -489,54 +1372,252 @@ class Connection(object):
             acknum: Acknowledgement number of next expected
                 outbound packet.
         """
-        if not self._sending_window:
-            return
-        lowest_seqnum = iter(self._sending_window).__next__()
-        if acknum >= lowest_seqnum:
-            for seqnum in range(lowest_seqnum, acknum):
-                self._retire_scheduled_packet_with_seqnum(seqnum)
-            self._attempt_enabling_looping_send()
+        sch_packet = None
+        while self._sending_window:
+            seqnum = self._sending_window.lowest
+            if seqnum >= acknum:
+                break
+            sch_packet = self._retire_scheduled_packet_with_seqnum(seqnum)
+        if sch_packet is not None:
+            self._sample_rtt(sch_packet)
+
+    def _retire_sacked_packets(self, sack):
+        """
+        Remove from send window any selectively ACKed packets.
+        Args:
+            sack: Tuple of (start, end) SACK blocks.
+        Returns:
+            The highest SACKed sequence number plus one, or 0.
+        """
+        sch_packet = None
+        highest_sacked = 0
+        for start, end in sack:
+            if not self._sending_window:
+                break
+            start = max(start, self._sending_window.lowest)
+            end = min(end, self._next_sequence_number)
+            for seqnum in range(start, end):
+                retired = self._retire_scheduled_packet_with_seqnum(seqnum)
+                if retired is not None:
+                    sch_packet = retired
+            highest_sacked = max(highest_sacked, end)
+        if sch_packet is not None:
+            self._sample_rtt(sch_packet)
+        return highest_sacked
 
     def _retire_scheduled_packet_with_seqnum(self, seqnum):
         """
-        Retire ScheduledPacket with given seqnum.
+        Retire ScheduledPacket with given seqnum, if in send window.
         Args:
             seqnum: Sequence number of retired packet.
+        Returns:
+            The retired ScheduledPacket, or None.
         """
-        sch_packet = self._sending_window.pop(seqnum)
-        sch_packet.timeout_cb.cancel()
+        sch_packet = self._sending_window.pop(seqnum, None)
+        if sch_packet is not None:
+            sch_packet.timeout_cb.cancel()
+            self._bytes_in_flight -= len(sch_packet.rudp_packet)
+        return sch_packet
+
+    def _fast_retransmit(self, highest_sacked):
+        """
+        Retransmit the packets that selective ACKs reveal as lost.
+        Every packet still in the send window below the highest
+        SACKed seqnum is a hole. Fast retransmit is not entered
+        again until all packets sent so far have been ACKed.
+        Args:
+            highest_sacked: The highest SACKed seqnum plus one.
+        """
+        self._recovery_point = self._next_sequence_number
+        self._dup_ack_count = 0
+        self._congestion.on_loss(self._bytes_in_flight)
+        for seqnum in tuple(self._sending_window):
+            if seqnum >= highest_sacked or self._state == State.SHUTDOWN:
+                break
+            self._sending_window[seqnum].timeout_cb.cancel()
+            self._do_send_packet(seqnum, backoff=False)
+
+    def _sample_rtt(self, sch_packet):
+        """
+        Measure the round-trip time of a newly ACKed packet.
+        Following Karn's rule, retransmitted packets are ignored,
+        since it is unknown which transmission was ACKed.
+        Args:
+            sch_packet: The newest ScheduledPacket retired by an ACK.
+        """
+        if sch_packet.retries == 1:
+            sample = self._timers.seconds() - sch_packet.sent_at
+            self._rtt.update(sample)
+            self._congestion.on_rtt_sample(sample, self._timers.seconds())
+
+    def _on_timeout(self, seqnum):
+        """
+        Signal a retransmission timeout to the congestion controller.
+        Only the first timeout of a window of data is a new loss
+        event; packets sent before it are expected to time out too.
+        Args:
+            seqnum: Sequence number of the timed-out packet.
+        """
+        if seqnum >= self._recovery_point:
+            self._recovery_point = self._next_sequence_number
+            self._congestion.on_timeout(self._bytes_in_flight)
+
+    def _is_looping_receive(self):
+        """Check whether looping receive is active."""
+        return self._looping_receive is not None and self._looping_receive.running
 
     def _attempt_enabling_looping_receive(self):
         """Activate looping receive."""
         if (
-            not self._looping_receive.running and
+            not self._is_looping_receive() and
             self._state == State.CONNECTED and
-            self._receive_heap
+            self._ready_messages
         ):
-            self._looping_receive.start(0, now=True)
+            if self._looping_receive is None:
+                self._looping_receive = scheduler.LoopingCall(
+                    self._timers.clock,
+                    self._pop_ready_message
+                )
+            self._looping_receive.start(now=True)
 
     def _attempt_disabling_looping_receive(self):
         """Deactivate looping receive."""
-        if self._looping_receive.running:
+        if self._is_looping_receive():
             self._looping_receive.stop()
 
-    def _pop_received_packet(self):
+    def _collect_message(self, rudp_packet):
         """
-        Attempt to reconstruct a received packet and process payload.
-        If successful, advance ACK number.
+        Reconstruct the message of a received packet, if complete.
+        A complete ordered message is delivered once all earlier
+        messages of its channel are; any later messages it unblocks
+        follow it. Ordered messages further than ORDER_WINDOW ahead
+        of their channel are dropped, so that a remote host cannot
+        make them pile up. Unordered messages are delivered at once.
+        Args:
+            rudp_packet: A packet.Packet just stored in the reorder
+                buffer.
         """
-        fragments = self._receive_heap.pop_min_and_all_fragments()
-        if fragments is None:
-            self._attempt_disabling_looping_receive()
+        fragment_index = rudp_packet.fragment_index
+        fragments = self._receive_buffer.pop_fragments(
+            rudp_packet.sequence_number - fragment_index,
+            fragment_index + rudp_packet.more_fragments + 1
+        )
+        if fragments is not None:
+            self._deliver_fragments(fragments)
+        # The base may have reached, or be held by, a message with
+        # more segments than the buffer holds.
+        self._drain_large_message()
+
+    def _drain_large_message(self):
+        """
+        Take the fragments of a message with more segments than the
+        reorder buffer holds out of it, as they reach its base, so
+        that their slots take the next fragments; the message is
+        delivered once complete. A remote host announcing more than
+        MAX_MESSAGE_SEGMENTS segments is disconnected.
+        """
+        buffer = self._receive_buffer
+        fragments = self._large_message
+        head = buffer.peek_min()
+        while head is not None:
+            count = head.fragment_index + head.more_fragments + 1
+            if count <= buffer.capacity:
+                return
+            if (
+                count > constants.MAX_MESSAGE_SEGMENTS or
+                head.fragment_index != len(fragments)
+            ):
+                self.shutdown()
+                return
+            fragments.extend(buffer.pop_min_run(
+                buffer.base + count - head.fragment_index
+            ))
+            if len(fragments) < count:
+                return
+            self._large_message = []
+            self._deliver_fragments(fragments)
+            fragments = self._large_message
+            head = buffer.peek_min()
+
+    def _deliver_fragments(self, fragments):
+        """
+        Deliver the message of a complete set of fragments, in order.
+        Args:
+            fragments: Sequence of packet.Packet(s), ordered by
+                increasing seqnum.
+        """
+        first = fragments[0]
+        if len(fragments) > 1:
+            messages = (self._reassemble(fragments),)
+        elif first.coalesced:
+            messages = packet.unpack_frames(first.payload)
+        elif first.payload:
+            messages = (first.payload,)
         else:
-            last_seqnum = fragments[-1].sequence_number
-            self._update_next_expected_seqnum(last_seqnum)
-            self._update_next_delivered_seqnum(last_seqnum)
-            payload = b''.join(f.payload for f in fragments)
-            self.handler.receive_message(payload)
+            # A keepalive; there is no message to deliver.
+            return
+
+        if first.reliability == packet.Reliability.RELIABLE:
+            self._ready_messages.extend(messages)
+            self._attempt_enabling_looping_receive()
+            return
+
+        channel = first.channel
+        order_index = first.order_index
+        next_index = self._next_delivered_index[channel]
+        pending = self._pending_messages
+        for message in messages:
+            if order_index == next_index:
+                self._ready_messages.append(message)
+                next_index += 1
+            elif 0 < order_index - next_index < constants.ORDER_WINDOW:
+                pending[channel, order_index] = message
+            order_index += 1
+        if next_index == self._next_delivered_index[channel]:
+            return
+
+        message = pending.pop((channel, next_index), None)
+        while message is not None:
+            self._ready_messages.append(message)
+            next_index += 1
+            message = pending.pop((channel, next_index), None)
+        self._next_delivered_index[channel] = next_index
+        self._attempt_enabling_looping_receive()
+
+    def _pop_ready_message(self):
+        """Deliver the next message ready for the handler."""
+        if self._ready_messages:
+            self._stats.received_messages += 1
+            self.handler.receive_message(self._ready_messages.popleft())
+        if not self._ready_messages:
+            self._attempt_disabling_looping_receive()
 
-            if self._next_delivered_seqnum not in self._receive_heap:
-                self._attempt_disabling_looping_receive()
+    @staticmethod
+    def _reassemble(fragments):
+        """
+        Write the payloads of fragments into a single buffer.
+        The buffer is allocated once, sized for as many segments
+        as the first fragment announces, each as long as the first
+        one, since every fragment but the last is a full segment.
+        Should a remote host segment irregularly, the payloads are
+        joined instead.
+        Args:
+            fragments: Sequence of packet.Packet(s), ordered by
+                increasing seqnum.
+        Returns:
+            The message, as a memoryview or bytes.
+        """
+        payloads = [fragment.payload for fragment in fragments]
+        segment_size = len(payloads[0])
+        view = memoryview(bytearray(len(payloads) * segment_size))
+        end = 0
+        for payload in payloads:
+            start = end
+            end += len(payload)
+            if end > len(view):
+                return b''.join(payloads)
+            view[start:end] = payload
+        return view[:end]
 
 
 class Handler(object):
@@ -559,7 +1640,9 @@ class Handler(object):
         """
         Receive a message from the given connection.
         Args:
-            message: The payload of a Packet, as a string.
+            message: The payload of a Packet, as bytes, or the
+                reassembled payloads of its fragments, as a
+                memoryview.
         """
 
     @abc.abstractmethod
@@ -589,14 +1672,40 @@ class ConnectionFactory(object):
     Subclass according to need.
     """
 
-    def __init__(self, handler_factory):
+    def __init__(
+        self,
+        handler_factory,
+        congestion_controller_factory=None,
+        pacer_factory=None,
+        path_mtu_search_factory=pmtu.PathMTUSearch,
+        fec_encoder_factory=None,
+        header_format=packet.HeaderFormat.COMPACT
+    ):
         """
         Create a new ConnectionFactory.
         Args:
             handler_factory: An instance of a HandlerFactory,
                 providing a `make_new_handler` method.
+            congestion_controller_factory: Callable returning a new
+                congestion.CongestionController for each connection;
+                if None, connections use NewReno.
+            pacer_factory: Callable returning a new pacing.Pacer for
+                each connection; if None, connections are not paced.
+            path_mtu_search_factory: Callable returning a new
+                pmtu.PathMTUSearch for each connection; if None,
+                connections keep UDP_SAFE_SEGMENT_SIZE segments.
+            fec_encoder_factory: Callable returning a new
+                fec.ParityEncoder for each connection; if None,
+                connections send no parity packets.
+            header_format: The packet.HeaderFormat of the connections
+                opened by the local host; see Connection.
         """
         self.handler_factory = handler_factory
+        self.congestion_controller_factory = congestion_controller_factory
+        self.pacer_factory = pacer_factory
+        self.path_mtu_search_factory = path_mtu_search_factory
+        self.fec_encoder_factory = fec_encoder_factory
+        self.header_format = header_format
 
     def make_new_connection(
         self,
@@ -614,12 +1723,29 @@ class ConnectionFactory(object):
             source_addr,
             relay_addr
         )
+        congestion_controller = None
+        if self.congestion_controller_factory is not None:
+            congestion_controller = self.congestion_controller_factory()
+        pacer = None
+        if self.pacer_factory is not None:
+            pacer = self.pacer_factory()
+        path_mtu_search = None
+        if self.path_mtu_search_factory is not None:
+            path_mtu_search = self.path_mtu_search_factory()
+        fec_encoder = None
+        if self.fec_encoder_factory is not None:
+            fec_encoder = self.fec_encoder_factory()
         connection = Connection(
             proto_handle,
             handler,
             own_addr,
             source_addr,
-            relay_addr
+            relay_addr,
+            congestion_controller,
+            pacer,
+            path_mtu_search,
+            fec_encoder,
+            self.header_format
         )
         handler.connection = connection
         return connection
@@ -6,18 +6,203 @@ UDP_SAFE_SEGMENT_SIZE = 1000
 # [length]
 WINDOW_SIZE = 65535 // UDP_SAFE_SEGMENT_SIZE
 
+# Datagram sizes probed by path MTU discovery, from the largest
+# down: the UDP payloads that fit 1500-byte Ethernet over IPv4 and
+# over IPv6, a 1420-byte tunnel over IPv4, and the IPv6 minimum MTU.
+# [bytes]
+PMTU_PROBE_SIZES = (1472, 1452, 1392, 1232)
+
+# Number of unanswered probes after which a size is deemed not to
+# fit the path.
+# [length]
+PMTU_MAX_PROBES = 3
+
+# Interval after which a connection whose path might fit larger
+# datagrams probes again.
+# [seconds]
+PMTU_RAISE_INTERVAL = 600
+
+# Number of retransmission timeouts of a segment larger than
+# UDP_SAFE_SEGMENT_SIZE after which the path is deemed to have
+# stopped passing datagrams of the confirmed size (a black hole);
+# the connection then falls back to the safe size and searches the
+# path MTU again.
+# [length]
+PMTU_BLACK_HOLE_TIMEOUTS = 3
+
+# Number of data segments covered by each forward error correction
+# parity packet; the overhead of FEC is one packet per group.
+# [length]
+FEC_GROUP_SIZE = 8
+
+# Number of recently received segments a connection keeps to
+# rebuild a lost segment from a parity packet.
+# [length]
+FEC_HISTORY = 64
+
+# Interval after which a multiplexer issues SYN cookies for a new
+# time slot; a cookie is accepted during the interval it was issued
+# in and the next one.
+# [seconds]
+SYN_COOKIE_INTERVAL = 8
+
+# Default rates a source IP may send datagrams and bytes at, under
+# admission control, and the time of traffic at those rates its
+# buckets hold for bursts.
+# [datagrams/second]
+ADMISSION_DATAGRAM_RATE = 1000
+# [bytes/second]
+ADMISSION_BYTE_RATE = 1000000
+# [seconds]
+ADMISSION_BURST = 1
+
+# Default maximum number of connections registered under an IP.
+# [length]
+ADMISSION_MAX_CONNECTIONS = 16
+
+# Number of datagrams an IP may have dropped within
+# ADMISSION_BAN_WINDOW before it is banned, and the duration of the
+# ban.
+# [length]
+ADMISSION_BAN_THRESHOLD = 1000
+# [seconds]
+ADMISSION_BAN_WINDOW = 10
+# [seconds]
+ADMISSION_BAN_DURATION = 60
+
+# Maximum number of source IPs tracked, and of IPs banned, at once;
+# the least recently seen ones are forgotten first.
+# [length]
+ADMISSION_MAX_SOURCES = 16384
+ADMISSION_MAX_BANS = 4096
+
+# Interval at which each worker process of a pool checks for
+# commands from the launcher and reports its statistics to it.
+# [seconds]
+WORKER_REPORT_INTERVAL = 1
+
+# Time the launcher gives workers to shut down before killing them.
+# [seconds]
+WORKER_STOP_TIMEOUT = 5
+
+# Maximum number of datagrams read or written per system call,
+# where recvmmsg and sendmmsg are available.
+# [length]
+BATCH_SIZE = 64
+
+# Maximum number of datagrams read per readiness event of a socket,
+# lest a flood starve the other events of the loop.
+# [length]
+BATCH_RECEIVE_BUDGET = 256
+
+# Size of the buffer each datagram is read into; larger datagrams,
+# which no RUDP peer sends, are dropped.
+# [bytes]
+BATCH_BUFFER_SIZE = 2048
+
+# Maximum number of datagrams of the same size to the same address
+# sent as one buffer with UDP generic segmentation offload, and the
+# maximum size of that buffer.
+# [length]
+GSO_MAX_SEGMENTS = 64
+# [bytes]
+GSO_MAX_BYTES = 65000
+
+# Number of sequence numbers a connection can hold for reordering
+# and reassembly, as a power of two. Segments beyond it are dropped
+# without being ACKed. Messages of more segments are reassembled
+# out of it, as their segments reach its base.
+# [length]
+REORDER_BUFFER_SIZE = 1024
+
+# Size of the largest message that can be sent, which bounds the
+# memory a remote host can make a connection hold for reassembly;
+# and the number of segments of such a message, at the smallest
+# segment size.
+# [bytes]
+MAX_MESSAGE_SIZE = 16 * 2 ** 20
+# [length]
+MAX_MESSAGE_SEGMENTS = -(-MAX_MESSAGE_SIZE // UDP_SAFE_SEGMENT_SIZE)
+
+# Number of independent ordering channels of a connection, and
+# the channel of messages sent without one; these match
+# leviathan.network.Network.CHANNEL_END and CHANNEL_NONE.
+MAX_CHANNELS = 32
+DEFAULT_CHANNEL = 0
+
+# Number of order indexes, from the next one to be delivered, within
+# which a channel holds messages received early; messages further
+# ahead are dropped. Every message the remote host may have in
+# flight fits: its send window holds at most WINDOW_SIZE segments,
+# each of messages of at least one byte and a 2-byte length.
+# [length]
+ORDER_WINDOW = WINDOW_SIZE * PMTU_PROBE_SIZES[0] // 3
+
+# Maximum number of segments a connection dequeues and sends
+# in a single reactor turn.
+# [length]
+SEND_BUDGET = 64
+
+# Minimum number of segments a paced connection may send
+# back-to-back.
+# [length]
+PACING_BURST = 4
+
+# Initial congestion window.
+# [length]
+INITIAL_CWND = 10
+
+# Retransmission timeout used until a round-trip time has been
+# measured on a connection.
 # [seconds]
 PACKET_TIMEOUT = 0.6
 
+# Bounds of the adaptive retransmission timeout.
+# [seconds]
+MIN_RTO = 0.1
+MAX_RTO = 3
+
+# Default maximum delay of an ACK, since the first unACKed segment
+# was received, before it is sent on a bare ACK packet. Outbound
+# data sent in the meantime carries the ACK instead.
+# [seconds]
+BARE_ACK_TIMEOUT = 0.05
+
+# Number of in-order segments after which an ACK is sent without
+# waiting for BARE_ACK_TIMEOUT.
+# [length]
+ACK_FREQUENCY = 2
+
+# Granularity of the timer wheel shared by all connections.
 # [seconds]
-BARE_ACK_TIMEOUT = 0.01
+TIMER_GRANULARITY = 0.01
 
+# Maximum number of selective acknowledgement blocks per packet.
+MAX_SACK_BLOCKS = 4
+
+# Number of duplicate selective ACKs after which the holes they
+# reveal are retransmitted without waiting for a timeout.
+DUP_ACK_THRESHOLD = 3
+
+# If a packet stays unacknowledged that long after its first
+# transmission, the connection should be considered broken.
 # [seconds]
 MAX_PACKET_DELAY = 15
 
-# If a packet is retransmitted more than that many times,
-# the connection should be considered broken.
-MAX_RETRANSMISSIONS = int(MAX_PACKET_DELAY // PACKET_TIMEOUT)
+# Time without any packet from the remote host after which a
+# connection is expired by its multiplexer.
+# [seconds]
+IDLE_TIMEOUT = 60
+
+# Interval of the idle sweeps of a multiplexer.
+# [seconds]
+IDLE_SWEEP_INTERVAL = 1
+
+# Maximum number of connections checked per idle sweep; a full
+# pass over N connections takes ceil(N / IDLE_SWEEP_BATCH) sweeps.
+# [length]
+IDLE_SWEEP_BATCH = 1024
+
 
 # packet related
 OFFLINE_MESSAGE_DATA_ID = bytearray.fromhex("00 ff ff 00 fe fe fe fe fd fd fd fd 12 34 56 78")
@@ -0,0 +1,108 @@
+"""Stateless SYN cookies for the RUDP handshake."""
+
+import hashlib
+import hmac
+import os
+import struct
+
+from leviathan.network.engine import constants
+
+# Fields authenticated by a cookie besides the IP addresses: the
+# time slot, the sequence number of the SYN and the two ports.
+_COOKIE_FIELDS = struct.Struct('!IQHH')
+
+# Length of the MAC of a cookie.
+# [bytes]
+MAC_SIZE = 8
+
+
+class SynCookies(object):
+
+    """
+    Issuer and verifier of stateless handshake cookies.
+    A cookie is the low byte of the current time slot followed by a
+    keyed BLAKE2b MAC of the slot, the SYN sequence number, the
+    source address the SYN claims and the address it came from. A
+    host answering SYNs with cookies only creates a connection for a
+    SYN that echoes a valid cookie, which proves that the sender
+    receives packets at its address; spoofed SYNs cost no state.
+    """
+
+    def __init__(self, secret=None, interval=constants.SYN_COOKIE_INTERVAL):
+        """
+        Create a new cookie issuer.
+        Args:
+            secret: The MAC key, as bytes of at most 64; if None,
+                a random one is drawn.
+            interval: Duration of a time slot, in seconds.
+        """
+        if secret is None:
+            secret = os.urandom(32)
+        self._secret = secret
+        self.interval = interval
+
+    def __repr__(self):
+        return '{0}(interval={1})'.format(self.__class__.__name__, self.interval)
+
+    def _mac(self, slot, sequence_number, source_addr, from_addr):
+        """Return the MAC of the given fields, as bytes."""
+        message = _COOKIE_FIELDS.pack(
+            slot & 0xffffffff,
+            sequence_number,
+            source_addr[1],
+            from_addr[1]
+        )
+        message += (source_addr[0] + '|' + from_addr[0]).encode()
+        return hashlib.blake2b(
+            message,
+            key=self._secret,
+            digest_size=MAC_SIZE
+        ).digest()
+
+    def make(self, sequence_number, source_addr, from_addr, now):
+        """
+        Issue a cookie for a SYN.
+        Args:
+            sequence_number: The sequence number of the SYN.
+            source_addr: The source address of the SYN, as a tuple
+                (ip, port).
+            from_addr: The address the SYN was received from, as a
+                tuple (ip, port).
+            now: The current time, in seconds.
+        Returns:
+            The cookie, as bytes.
+        """
+        slot = int(now // self.interval)
+        return bytes((slot & 0xff,)) + self._mac(
+            slot,
+            sequence_number,
+            source_addr,
+            from_addr
+        )
+
+    def check(self, cookie, sequence_number, source_addr, from_addr, now):
+        """
+        Verify the cookie echoed on a SYN.
+        Args:
+            cookie: The cookie of the SYN, as bytes.
+            sequence_number: The sequence number of the SYN.
+            source_addr: The source address of the SYN, as a tuple
+                (ip, port).
+            from_addr: The address the SYN was received from, as a
+                tuple (ip, port).
+            now: The current time, in seconds.
+        Returns:
+            True if the cookie was issued for these values during
+            the current time slot or the previous one.
+        """
+        if len(cookie) != 1 + MAC_SIZE:
+            return False
+        slot = int(now // self.interval)
+        if cookie[0] != slot & 0xff:
+            slot -= 1
+            if cookie[0] != slot & 0xff:
+                return False
+        return hmac.compare_digest(
+            cookie[1:],
+            self._mac(slot, sequence_number, source_addr, from_addr)
+        )
@@ -0,0 +1,199 @@
+"""
+Forward error correction for RUDP connections.
+Classes:
+    ParityEncoder: Computes the XOR parity of groups of segments.
+    ParityDecoder: Rebuilds a lost segment from a parity packet.
+"""
+
+import struct
+
+from leviathan.network.engine import constants, packet
+
+# Fields of a segment covered by the parity besides its payload:
+# the payload length, channel, reliability class, coalesced flag,
+# number of remaining fragments, order index and fragment index.
+PARITY_HEADER = struct.Struct('!HBBBQQQ')
+
+
+def _encode(rudp_packet):
+    """
+    Return the parity contribution of a segment.
+    The fields and payload of the segment are read as one
+    little-endian integer, so that XORing contributions of different
+    lengths pads the shorter ones with trailing zeros.
+    Args:
+        rudp_packet: A packet.Packet of a reliable class.
+    Returns:
+        The contribution, as an integer.
+    """
+    payload = rudp_packet.payload
+    header = PARITY_HEADER.pack(
+        len(payload),
+        rudp_packet.channel,
+        rudp_packet.reliability,
+        rudp_packet.coalesced,
+        rudp_packet.more_fragments,
+        rudp_packet.order_index,
+        rudp_packet.fragment_index
+    )
+    return int.from_bytes(header + payload, 'little')
+
+
+class ParityEncoder(object):
+
+    """
+    Sender side of XOR forward error correction.
+    Consecutive segments are gathered in groups of `group_size`; once
+    a group is complete, the XOR of the group's segments is sent in
+    a parity packet, from which the receiver can rebuild any single
+    segment of the group that it lost without waiting for a
+    retransmission. A gap in sequence numbers starts a new group.
+    """
+
+    def __init__(self, group_size=constants.FEC_GROUP_SIZE):
+        """
+        Create a new encoder, with an empty group.
+        Args:
+            group_size: Number of segments per parity packet; the
+                overhead is one packet in `group_size`.
+        Raises:
+            ValueError: The group size is not positive.
+        """
+        if group_size <= 0:
+            raise ValueError('Group size must be positive.')
+        self.group_size = group_size
+        self._base = 0
+        self._count = 0
+        self._parity = 0
+        self._size = 0
+
+    def __repr__(self):
+        return '{0}(group_size={1})'.format(self.__class__.__name__, self.group_size)
+
+    @property
+    def overhead(self):
+        """Get the ratio of parity packets to data segments."""
+        return 1 / self.group_size
+
+    def add(self, rudp_packet):
+        """
+        Add a newly sent segment to the current group.
+        Args:
+            rudp_packet: A sequenced packet.Packet of a reliable class.
+        Returns:
+            Tuple of the first sequence number of the group, the
+            number of segments in it and the parity payload, as
+            bytes, if the segment completes the group; else None.
+        """
+        seqnum = rudp_packet.sequence_number
+        if self._count and seqnum != self._base + self._count:
+            self._count = 0
+        if not self._count:
+            self._base = seqnum
+            self._parity = 0
+            self._size = 0
+        self._parity ^= _encode(rudp_packet)
+        self._size = max(self._size, PARITY_HEADER.size + len(rudp_packet.payload))
+        self._count += 1
+        if self._count < self.group_size:
+            return None
+        self._count = 0
+        return self._base, self.group_size, self._parity.to_bytes(self._size, 'little')
+
+
+class ParityDecoder(object):
+
+    """
+    Receiver side of XOR forward error correction.
+    Recently received segments are kept in a ring of `history`
+    slots, indexed by sequence number, so that a parity packet
+    arriving after its group can be XORed with the segments that
+    were received.
+    """
+
+    def __init__(self, history=constants.FEC_HISTORY):
+        """
+        Create a new decoder, with no segment kept.
+        Args:
+            history: Number of recent segments kept.
+        """
+        self._slots = [None] * history
+
+    def __repr__(self):
+        return '{0}(history={1})'.format(self.__class__.__name__, len(self._slots))
+
+    def add(self, rudp_packet):
+        """
+        Keep a newly received segment.
+        Args:
+            rudp_packet: A sequenced packet.Packet of a reliable class.
+        """
+        self._slots[rudp_packet.sequence_number % len(self._slots)] = rudp_packet
+
+    def _get(self, seqnum):
+        """Return the kept segment with given seqnum, or None."""
+        rudp_packet = self._slots[seqnum % len(self._slots)]
+        if rudp_packet is not None and rudp_packet.sequence_number == seqnum:
+            return rudp_packet
+        return None
+
+    def recover(self, parity_packet):
+        """
+        Rebuild the segment a parity packet's group is missing.
+        Args:
+            parity_packet: A packet.Packet with positive parity_count.
+        Returns:
+            The rebuilt packet.Packet, addressed like the parity
+            packet and without an ACK number, or None if not
+            exactly one segment of the group is missing or the
+            parity is corrupt.
+        """
+        base = parity_packet.parity_base
+        count = parity_packet.parity_count
+        if count > len(self._slots):
+            return None
+        payload = parity_packet.payload
+        if len(payload) < PARITY_HEADER.size:
+            return None
+        parity = int.from_bytes(payload, 'little')
+        missing = None
+        for seqnum in range(base, base + count):
+            rudp_packet = self._get(seqnum)
+            if rudp_packet is None:
+                if missing is not None:
+                    return None
+                missing = seqnum
+            elif PARITY_HEADER.size + len(rudp_packet.payload) > len(payload):
+                return None
+            else:
+                parity ^= _encode(rudp_packet)
+        if missing is None:
+            return None
+
+        data = parity.to_bytes(len(payload), 'little')
+        (
+            size, channel, reliability, coalesced,
+            more_fragments, order_index, fragment_index
+        ) = PARITY_HEADER.unpack_from(data)
+        if PARITY_HEADER.size + size > len(data):
+            return None
+        rudp_packet = packet.Packet.from_data(
+            missing,
+            parity_packet.dest_addr,
+            parity_packet.source_addr,
+            data[PARITY_HEADER.size:PARITY_HEADER.size + size],
+            more_fragments,
+            channel=channel,
+            order_index=order_index,
+            fragment_index=fragment_index,
+            reliability=reliability,
+            coalesced=bool(coalesced)
+        )
+        try:
+            packet.Packet.validate(rudp_packet)
+        except packet.ValidationError:
+            return None
+        if rudp_packet.reliability in packet.UNRELIABLE_CLASSES:
+            return None
+        self.add(rudp_packet)
+        return rudp_packet
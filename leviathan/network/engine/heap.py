@@ -73,3 +73,25 @@ class Heap(collections.Container, collections.Sized):
             self._pop_min()
             for _ in range(min_packet.more_fragments + 1)
         )
+
+    def sack_blocks(self, start, max_blocks):
+        """
+        Describe the packets held beyond a given sequence number.
+        Args:
+            start: The lowest sequence number to report, as an
+                integer; usually the next expected seqnum.
+            max_blocks: The maximum number of blocks to report.
+        Returns:
+            Tuple of (start, end) tuples, ordered by increasing
+            seqnum, each covering the contiguous run of held
+            seqnums from start through end - 1.
+        """
+        blocks = []
+        for seqnum in sorted(s for s in self._seqnum_set if s >= start):
+            if blocks and blocks[-1][1] == seqnum:
+                blocks[-1][1] += 1
+            elif len(blocks) < max_blocks:
+                blocks.append([seqnum, seqnum + 1])
+            else:
+                break
+        return tuple((first, end) for first, end in blocks)
@@ -0,0 +1,333 @@
+"""
+Ban and allow lists of IP networks.
+Classes:
+    IPFilter: Prefix rules, with expirations, matched against packed
+        addresses in a radix trie.
+Functions:
+    pack_ip: Convert an IP string to its packed binary form.
+"""
+
+import datetime
+import ipaddress
+import json
+import socket
+
+# Format of the dates of the ban list file, and the expiration of
+# bans that never expire.
+BAN_LIST_DATE_FORMAT = '%Y-%m-%d %H:%M:%S %z'
+BAN_LIST_FOREVER = 'forever'
+
+# Prefix of IPv4-mapped IPv6 addresses, which are matched against
+# IPv4 rules.
+_V4_MAPPED_PREFIX = bytes(10) + b'\xff\xff'
+
+
+def pack_ip(ip):
+    """
+    Convert an IP to its packed binary form.
+    IPv4-mapped IPv6 addresses are converted to the IPv4 address
+    they map, and a zone index is ignored.
+    Args:
+        ip: An IPv4/IPv6 address, as a string.
+    Returns:
+        The address, as 4 or 16 bytes.
+    Raises:
+        ValueError: The string is not an IP address.
+    """
+    try:
+        if ':' not in ip:
+            return socket.inet_pton(socket.AF_INET, ip)
+        packed = socket.inet_pton(socket.AF_INET6, ip.partition('%')[0])
+    except OSError:
+        raise ValueError('Bad IP: {0}.'.format(ip))
+    if packed.startswith(_V4_MAPPED_PREFIX):
+        return packed[12:]
+    return packed
+
+
+class _Rule(object):
+
+    """Ban or allow rule on a network."""
+
+    __slots__ = ('length', 'allowed', 'until')
+
+    def __init__(self, length, allowed, until):
+        self.length = length
+        self.allowed = allowed
+        self.until = until
+
+    def is_active(self, now):
+        """Return True if the rule has not expired."""
+        return self.until is None or now < self.until
+
+
+class _Node(object):
+
+    """
+    Node of the trie, covering the networks that share the bytes
+    leading to it.
+    Rules are held by the node of the byte their prefix ends in, by
+    the prefix bits of that byte; each of the byte values a rule
+    covers also maps to the most specific rule covering it, so that
+    a lookup reads one entry per byte.
+    """
+
+    __slots__ = ('children', 'rules', 'expanded')
+
+    def __init__(self):
+        self.children = {}
+        self.rules = {}
+        self.expanded = {}
+
+    def best_rule(self, byte, now=None):
+        """
+        Return the most specific rule of the node covering a byte
+        value, skipping expired ones if `now` is given, or None.
+        """
+        rules = self.rules
+        for bits in range(8, -1, -1):
+            rule = rules.get((byte >> (8 - bits), bits))
+            if rule is not None and (now is None or rule.is_active(now)):
+                return rule
+        return None
+
+
+class IPFilter(object):
+
+    """
+    Ban and allow rules on IP networks.
+    Rules are kept in a radix trie per address family, branching on
+    each byte of the packed address; a rule whose prefix ends within
+    a byte is expanded to all the values of that byte it covers. A
+    lookup thus takes at most one step per byte of the address,
+    however many rules there are. The most specific rule matching an
+    address applies, so that an allow rule on a host or a small
+    network carves an exception out of a ban on a larger one. A rule
+    may expire; expired rules are ignored by lookups, and reclaimed
+    by `expire`.
+    """
+
+    def __init__(self):
+        """Create a new filter, without rules."""
+        # Roots of the IPv4 and IPv6 tries, by packed address length.
+        self._roots = {4: _Node(), 16: _Node()}
+        self._rules = 0
+
+    def __repr__(self):
+        return '{0}(rules={1})'.format(self.__class__.__name__, self._rules)
+
+    def __len__(self):
+        """Return the number of rules, expired or not."""
+        return self._rules
+
+    def ban(self, network, until=None):
+        """
+        Ban a network, replacing any rule on it.
+        Args:
+            network: An IP address or network in CIDR notation, as a
+                string; host bits are ignored.
+            until: The time the ban expires at, in seconds, or None
+                if it never does.
+        Raises:
+            ValueError: The network is malformed.
+        """
+        self._insert(network, False, until)
+
+    def allow(self, network, until=None):
+        """
+        Allow a network, replacing any rule on it.
+        Args:
+            network: An IP address or network in CIDR notation, as a
+                string; host bits are ignored.
+            until: The time the rule expires at, in seconds, or None
+                if it never does.
+        Raises:
+            ValueError: The network is malformed.
+        """
+        self._insert(network, True, until)
+
+    def remove(self, network):
+        """
+        Remove the rule on a network.
+        Args:
+            network: An IP address or network in CIDR notation, as a
+                string; host bits are ignored.
+        Raises:
+            KeyError: There is no rule on the network.
+            ValueError: The network is malformed.
+        """
+        packed, length = self._parse(network)
+        depth, key = self._locate(packed, length)
+        path = [self._roots[len(packed)]]
+        for byte in packed[:depth]:
+            node = path[-1].children.get(byte)
+            if node is None:
+                raise KeyError(network)
+            path.append(node)
+        node = path[-1]
+        rule = node.rules.pop(key, None)
+        if rule is None:
+            raise KeyError(network)
+        self._rules -= 1
+
+        start = key[0] << (8 - key[1])
+        for byte in range(start, start + (1 << (8 - key[1]))):
+            if node.expanded.get(byte) is rule:
+                best = node.best_rule(byte)
+                if best is None:
+                    del node.expanded[byte]
+                else:
+                    node.expanded[byte] = best
+
+        # Drop the nodes left empty.
+        while len(path) > 1 and not (node.rules or node.children):
+            path.pop()
+            depth -= 1
+            del path[-1].children[packed[depth]]
+            node = path[-1]
+
+    def is_banned(self, packed_ip, now):
+        """
+        Check whether an address is banned.
+        Args:
+            packed_ip: The address, in packed binary form, as 4 or
+                16 bytes; see pack_ip.
+            now: The current time, in seconds.
+        Returns:
+            True if the most specific unexpired rule matching the
+            address is a ban.
+        """
+        node = self._roots[len(packed_ip)]
+        allowed = None
+        for byte in packed_ip:
+            rule = node.expanded.get(byte)
+            if rule is not None:
+                if rule.until is not None and now >= rule.until:
+                    rule = node.best_rule(byte, now)
+                if rule is not None:
+                    allowed = rule.allowed
+            node = node.children.get(byte)
+            if node is None:
+                break
+        return allowed is False
+
+    def expire(self, now):
+        """
+        Remove the rules that have expired.
+        Args:
+            now: The current time, in seconds.
+        Returns:
+            The number of rules removed.
+        """
+        expired = []
+        for size, root in self._roots.items():
+            stack = [(root, b'')]
+            while stack:
+                node, prefix = stack.pop()
+                for (value, bits), rule in node.rules.items():
+                    if not rule.is_active(now):
+                        expired.append(self._format(prefix, value, bits, size))
+                stack.extend(
+                    (child, prefix + bytes((byte,)))
+                    for byte, child in node.children.items()
+                )
+        for network in expired:
+            self.remove(network)
+        return len(expired)
+
+    def load(self, path):
+        """
+        Add the bans of a ban list file.
+        The file holds a JSON array of objects, each with an "ip"
+        address or network and an "expires" date formatted as
+        BAN_LIST_DATE_FORMAT, or BAN_LIST_FOREVER; other keys, such
+        as the reason of the ban, are ignored.
+        Args:
+            path: The path of the file, usually banned-ips.json.
+        Returns:
+            The number of entries loaded.
+        Raises:
+            OSError: The file cannot be read.
+            ValueError: The file is not a valid ban list.
+        """
+        with open(path) as ban_list:
+            entries = json.load(ban_list)
+        if not isinstance(entries, list):
+            raise ValueError('Ban list is not an array.')
+        for entry in entries:
+            try:
+                network = entry['ip']
+                expires = entry.get('expires', BAN_LIST_FOREVER)
+            except (KeyError, TypeError, AttributeError):
+                raise ValueError('Bad ban list entry: {0}.'.format(entry))
+            until = None
+            if expires != BAN_LIST_FOREVER:
+                try:
+                    until = datetime.datetime.strptime(
+                        expires,
+                        BAN_LIST_DATE_FORMAT
+                    ).timestamp()
+                except TypeError:
+                    raise ValueError('Bad expiration: {0}.'.format(expires))
+            self.ban(network, until)
+        return len(entries)
+
+    @staticmethod
+    def _parse(network):
+        """Return the packed address and length of a network string."""
+        try:
+            parsed = ipaddress.ip_network(network, strict=False)
+        except (TypeError, ValueError):
+            raise ValueError('Bad network: {0}.'.format(network))
+        if parsed.version == 6 and parsed.prefixlen >= 96:
+            mapped = parsed.network_address.ipv4_mapped
+            if mapped is not None:
+                parsed = ipaddress.IPv4Network(
+                    (mapped, parsed.prefixlen - 96)
+                )
+        return parsed.network_address.packed, parsed.prefixlen
+
+    @staticmethod
+    def _locate(packed, length):
+        """
+        Return the depth of the node holding the rule on a network,
+        and the key of the rule in that node: the prefix bits of the
+        last byte, and their number.
+        """
+        depth = max(0, (length - 1) // 8)
+        bits = length - 8 * depth
+        return depth, (packed[depth] >> (8 - bits), bits)
+
+    @staticmethod
+    def _format(prefix, value, bits, size):
+        """Return the network of a rule, in CIDR notation."""
+        packed = prefix + bytes((value << (8 - bits),))
+        packed += bytes(size - len(packed))
+        return '{0}/{1}'.format(
+            ipaddress.ip_address(packed),
+            8 * len(prefix) + bits
+        )
+
+    def _insert(self, network, allowed, until):
+        """Set the rule on a network, adding nodes as needed."""
+        packed, length = self._parse(network)
+        depth, key = self._locate(packed, length)
+        node = self._roots[len(packed)]
+        for byte in packed[:depth]:
+            child = node.children.get(byte)
+            if child is None:
+                child = node.children[byte] = _Node()
+            node = child
+
+        rule = node.rules.get(key)
+        if rule is not None:
+            rule.allowed = allowed
+            rule.until = until
+            return
+        rule = node.rules[key] = _Rule(length, allowed, until)
+        self._rules += 1
+        start = key[0] << (8 - key[1])
+        for byte in range(start, start + (1 << (8 - key[1]))):
+            best = node.expanded.get(byte)
+            if best is None or best.length < length:
+                node.expanded[byte] = rule
@@ -0,0 +1,520 @@
+"""
+Event-loop-agnostic core of the RUDP multiplexer.
+Classes:
+    BaseConnectionMultiplexer: Multiplexer of connections over a UDP
+        socket, whichever event loop drives it.
+"""
+
+import abc
+import collections
+import itertools
+
+from google.protobuf import message
+
+from leviathan.network.engine import (
+    connection, constants, cookie, ipfilter, packet, stats, timer
+)
+
+
+class BaseConnectionMultiplexer(collections.MutableMapping):
+
+    """
+    Multiplexes many virtual connections over single UDP socket.
+    Handles graceful shutdown of active connections.
+    Owns the timer wheel on which all connections schedule their
+    retransmission, ACK and shutdown timeouts, and aggregates the
+    statistics of all connections.
+    A single periodic sweep expires connections that have received
+    nothing for `idle_timeout` seconds and, if `keepalive_interval`
+    is set, probes connections idle for that long. Each sweep checks
+    at most IDLE_SWEEP_BATCH connections, resuming where the previous
+    one stopped, so that no connection needs a timer of its own.
+    Each pass also removes the ban and allow rules that have expired.
+    A SYN from an unknown address is answered with a stateless
+    cookie; the connection is only created once a SYN echoes it, so
+    that SYNs from spoofed addresses allocate nothing.
+    Subclasses bind the multiplexer to the transport of an event
+    loop: they feed received datagrams to `datagramReceived`, and
+    implement `send_datagram` and `_close_transport`.
+    """
+
+    timer_wheel = None
+
+    def __init__(
+        self,
+        connection_factory,
+        public_ip,
+        relaying=False,
+        logger=None,
+        idle_timeout=constants.IDLE_TIMEOUT,
+        keepalive_interval=None,
+        syn_cookies=True,
+        admission_control=None,
+        ip_filter=None,
+        clock=None
+    ):
+        """
+        Initialize a new multiplexer.
+        Args:
+            connection_factory: The connection factory used to
+                instantiate new connections, as a
+                connection.ConnectionFactory.
+            public_ip: The external IPv4/IPv6 this node publishes as its
+                reception address; it is kept in canonical form, as
+                the addresses of received packets are.
+            relaying: If True, the multiplexer will silently forward
+                packets that are not targeting this node (i.e. messages
+                that have a destination IP different than `public_ip`.)
+                If False, this node will drop such messages.
+            logger: A logging.Logger instance to dump invalid received
+                packets into; if None, dumping is disabled.
+            idle_timeout: Seconds without any packet from the remote
+                host after which a connection is shut down and
+                unregistered.
+            keepalive_interval: Seconds without any packet from the
+                remote host after which a keepalive is sent, or None
+                to send none. Connections that only send unreliable
+                messages get no ACKs, so they should set it well
+                below `idle_timeout`.
+            syn_cookies: If True, connections are only created for
+                SYNs echoing a cookie; if False, for any SYN. Remote
+                hosts should run this handshake too.
+            admission_control: An admission.AdmissionControl rate
+                limiting and capping the connections of each source
+                IP; if None, only banned IPs are refused. Connections
+                are counted under the IP their datagrams come from,
+                which the sender cannot choose; those reached through
+                a relay count against the relay.
+            ip_filter: The ipfilter.IPFilter of banned and allowed
+                networks; if None, an empty one is created.
+            clock: The clock driving the timers of the multiplexer
+                and of its connections, as described in the
+                scheduler module; if None, the Twisted reactor.
+        """
+        super(BaseConnectionMultiplexer, self).__init__()
+        self.connection_factory = connection_factory
+        self.public_ip = packet.normalize_ip(public_ip)
+        self.port = None
+        self.relaying = relaying
+        self._active_connections = {}
+
+        # IP each connection is counted under by admission control,
+        # by the address it is registered under.
+        self._connection_ips = {}
+        self._ip_filter = ipfilter.IPFilter() if ip_filter is None else ip_filter
+        self._logger = logger
+        self.timer_wheel = timer.TimerWheel(clock=clock)
+        self._syn_cookies = cookie.SynCookies() if syn_cookies else None
+        self._admission = admission_control
+
+        # Counters of the unregistered connections, and totals over
+        # all connections, refreshed in place.
+        self._closed_stats = stats.AggregateStats()
+        self._stats = stats.AggregateStats()
+
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+
+        # Connections left to check in the current pass of the idle
+        # sweep, or None between passes.
+        self._sweep_cursor = None
+
+        # Setup and immediately cancel the idle sweep; it is only
+        # scheduled while connections or IP rules are registered.
+        self._sweep_handle = self.timer_wheel.call_later(
+            constants.IDLE_SWEEP_INTERVAL,
+            self._sweep_idle_connections
+        )
+        self._sweep_handle.cancel()
+        if self._ip_filter:
+            self._schedule_sweep()
+
+    def __len__(self):
+        """Return the number of live connections."""
+        return len(self._active_connections)
+
+    def __getitem__(self, addr):
+        """
+        Return the handling connection of the given address.
+        Args:
+            addr: Tuple of destination address (ip, port).
+        Raises:
+            KeyError: No connection is handling the given address.
+        """
+        return self._active_connections[addr]
+
+    def __setitem__(self, addr, con):
+        """
+        Register a handling connection for a given remote address.
+        If another connection is already bound to that address, it
+        is shutdown, its stats are retired, and then it is replaced.
+        Args:
+            key: Tuple of destination address (ip, port).
+            value: The connection to register, as a Connection.
+        """
+        prev_con = self._active_connections.get(addr)
+        if prev_con is not None and prev_con is not con:
+            prev_con.shutdown()
+            self.retire_stats(prev_con.stats)
+        self._active_connections[addr] = con
+        if self._admission is not None:
+            self._count_connection(addr, con.relay_addr[0])
+        self._schedule_sweep()
+
+    def __delitem__(self, addr):
+        """
+        Unregister a handling connection for a given remote address.
+        Args:
+            addr: Tuple of destination address (ip, port).
+        Raises:
+            KeyError: No connection is handling the given address.
+        """
+        del self._active_connections[addr]
+        self._count_connection(addr, None)
+
+    def __iter__(self):
+        """Return iterator over the active contacts."""
+        return iter(self._active_connections)
+
+    @property
+    def ip_filter(self):
+        """Get the ipfilter.IPFilter of banned and allowed networks."""
+        return self._ip_filter
+
+    @property
+    def admission_control(self):
+        """Get the admission.AdmissionControl, or None."""
+        return self._admission
+
+    @property
+    def stats(self):
+        """
+        Get the stats.AggregateStats of all connections.
+        The same object is refreshed in place on every access, so
+        that it can be polled every server tick without allocating.
+        """
+        aggregate = self._stats
+        aggregate.reset(self._closed_stats)
+        for con in self._active_connections.values():
+            aggregate.add(con.stats)
+        return aggregate
+
+    def retire_stats(self, connection_stats):
+        """
+        Keep the counters of a connection about to be unregistered.
+        Args:
+            connection_stats: The stats.ConnectionStats of the
+                connection.
+        """
+        self._closed_stats.add_counters(connection_stats)
+
+    def ban_ip(self, ip_address, duration=None):
+        """
+        Add an IP address or network to the ban list. No connections
+        will be made to it and packets will be dropped.
+        Args:
+            ip_address: a `String` IP address (without port), or
+                network in CIDR notation.
+            duration: Seconds until the ban expires, or None if it
+                never does.
+        Raises:
+            ValueError: The address is malformed.
+        """
+        until = None
+        if duration is not None:
+            until = self.timer_wheel.wall_seconds() + duration
+        self._ip_filter.ban(ip_address, until)
+        self._schedule_sweep()
+
+    def allow_ip(self, ip_address, duration=None):
+        """
+        Exempt an IP address or network from the bans of the larger
+        networks it is part of.
+        Args:
+            ip_address: a `String` IP address (without port), or
+                network in CIDR notation.
+            duration: Seconds until the exemption expires, or None if
+                it never does.
+        Raises:
+            ValueError: The address is malformed.
+        """
+        until = None
+        if duration is not None:
+            until = self.timer_wheel.wall_seconds() + duration
+        self._ip_filter.allow(ip_address, until)
+        self._schedule_sweep()
+
+    def remove_ip_ban(self, ip_address):
+        """
+        Remove the ban, or exemption, of an IP address or network.
+        Args:
+            ip_address: a `String` IP address (without port), or
+                network in CIDR notation.
+        """
+        try:
+            self._ip_filter.remove(ip_address)
+        except (KeyError, ValueError):
+            pass
+
+    def datagramReceived(self, datagram, addr):
+        """
+        Called when a datagram is received.
+        If the datagram isn't meant for us, immediately relay it.
+        Otherwise, delegate handling to the appropriate connection.
+        If no such connection exists, create one. Datagrams from
+        banned IPs, and those admission control refuses, are dropped
+        before they are decoded. Always take care
+        to avoid mistaking a relay address for the original sender's
+        address.
+        Args:
+            datagram: Datagram string received from transport layer.
+            addr: Sender address, as a tuple of an IPv4/IPv6 address
+                and a port, in that order. If this address is
+                different from the packet's source address, the packet
+                is being relayed; future outbound packets should also
+                be relayed through the specified relay address.
+        """
+        if self._ip_filter and self._is_banned(addr[0]):
+            return
+        if self._admission is not None and not self._admission.admit(
+            addr[0],
+            len(datagram),
+            self.timer_wheel.seconds()
+        ):
+            return
+
+        try:
+            rudp_packet = packet.Packet.from_bytes(datagram)
+        except (message.DecodeError, TypeError, ValueError):
+            self._on_bad_datagram(addr)
+            if self._logger is not None:
+                self._logger.info(
+                    'Bad packet (bad protobuf format): {0}'.format(datagram)
+                )
+        except packet.ValidationError:
+            self._on_bad_datagram(addr)
+            if self._logger is not None:
+                self._logger.info(
+                    'Bad packet (invalid RUDP packet): {0}'.format(datagram)
+                )
+        else:
+            if self._ip_filter and self._is_banned(rudp_packet.source_addr[0]):
+                return
+            if rudp_packet.dest_addr[0] != self.public_ip:
+                if self.relaying:
+                    self.send_datagram(datagram, rudp_packet.dest_addr)
+            else:
+                con = self._active_connections.get(rudp_packet.source_addr)
+                if con is None and rudp_packet.get_syn():
+                    if not self._check_cookie(rudp_packet, addr):
+                        self._send_cookie(rudp_packet, addr)
+                        return
+                    if not self._can_connect(addr):
+                        return
+                    con = self.make_new_connection(
+                        (self.public_ip, self.port),
+                        rudp_packet.source_addr,
+                        addr
+                    )
+                if con is not None:
+                    con.receive_packet(rudp_packet, addr)
+
+    def make_new_connection(self, own_addr, source_addr, relay_addr=None):
+        """
+        Create a new connection to handle the given address.
+        Args:
+            own_addr: Local host address, as a (ip, port) tuple.
+            source_addr: Remote host address, as a (ip, port) tuple.
+            relay_addr: Remote host address, as a (ip, port) tuple.
+        Returns:
+            A new connection.Connection
+        """
+        con = self.connection_factory.make_new_connection(
+            self,
+            own_addr,
+            source_addr,
+            relay_addr
+        )
+        self._active_connections[source_addr] = con
+        self._count_connection(source_addr, (relay_addr or source_addr)[0])
+        self._schedule_sweep()
+        return con
+
+    @abc.abstractmethod
+    def send_datagram(self, datagram, addr):
+        """
+        Send RUDP datagram to the given address.
+        Args:
+            datagram: Prepared RUDP datagram, as a string.
+            addr: Tuple of destination address (ip, port).
+        This is essentially a wrapper so that the transport layer is
+        not exposed to the connections.
+        """
+
+    def _is_banned(self, ip):
+        """
+        Check an IP against the ban list; one that cannot be parsed
+        counts as banned.
+        Args:
+            ip: The IP, as a string.
+        """
+        try:
+            packed_ip = ipfilter.pack_ip(ip)
+        except ValueError:
+            return True
+        return self._ip_filter.is_banned(
+            packed_ip,
+            self.timer_wheel.wall_seconds()
+        )
+
+    def _on_bad_datagram(self, addr):
+        """
+        Count an undecodable datagram against its sender.
+        Args:
+            addr: The address the datagram was received from.
+        """
+        if self._admission is not None:
+            self._admission.on_violation(addr[0], self.timer_wheel.seconds())
+
+    def _can_connect(self, addr):
+        """
+        Check whether the sender of a SYN may open another connection;
+        a refused attempt counts as a violation of the sender.
+        Args:
+            addr: The address the SYN was received from.
+        """
+        if self._admission is None or self._admission.can_connect(addr[0]):
+            return True
+        self._admission.on_violation(addr[0], self.timer_wheel.seconds())
+        return False
+
+    def _count_connection(self, addr, ip):
+        """
+        Move the connection registered under an address to the count
+        of another IP, for admission control.
+        Args:
+            addr: The address the connection is registered under.
+            ip: The IP its datagrams come from, or None once it is
+                unregistered.
+        """
+        if self._admission is None:
+            return
+        prev_ip = self._connection_ips.pop(addr, None)
+        if prev_ip is not None:
+            self._admission.on_connection_lost(prev_ip)
+        if ip is not None:
+            self._connection_ips[addr] = ip
+            self._admission.on_connection_made(ip)
+
+    def _check_cookie(self, rudp_packet, addr):
+        """
+        Check whether a SYN from an unknown address may create a
+        connection.
+        Args:
+            rudp_packet: The received packet.Packet, with SYN set.
+            addr: The address the packet was received from.
+        Returns:
+            True if SYN cookies are disabled, or the packet echoes
+            a valid cookie.
+        """
+        if self._syn_cookies is None:
+            return True
+        return bool(rudp_packet.cookie) and self._syn_cookies.check(
+            rudp_packet.cookie,
+            rudp_packet.sequence_number,
+            rudp_packet.source_addr,
+            addr,
+            self.timer_wheel.seconds()
+        )
+
+    def _send_cookie(self, rudp_packet, addr):
+        """
+        Answer a SYN from an unknown address with a cookie.
+        SYNs without a cookie carry a blank one, so that the answer
+        is no larger than the SYN; SYNs that are smaller are not
+        answered, lest spoofed ones be reflected with amplification.
+        Args:
+            rudp_packet: The received packet.Packet, with SYN set.
+            addr: The address the packet was received from.
+        """
+        cookie_packet = packet.Packet.from_data(
+            0,
+            rudp_packet.source_addr,
+            (self.public_ip, self.port),
+            cookie=self._syn_cookies.make(
+                rudp_packet.sequence_number,
+                rudp_packet.source_addr,
+                addr,
+                self.timer_wheel.seconds()
+            )
+        )
+        cookie_packet.header_format = rudp_packet.header_format
+        datagram = cookie_packet.to_bytes()
+        if len(datagram) <= rudp_packet.size:
+            self.send_datagram(datagram, addr)
+
+    def _schedule_sweep(self):
+        """Schedule the next idle sweep, unless already scheduled."""
+        if not self._sweep_handle.active():
+            self._sweep_handle = self.timer_wheel.call_later(
+                constants.IDLE_SWEEP_INTERVAL,
+                self._sweep_idle_connections
+            )
+
+    def _sweep_idle_connections(self):
+        """
+        Check the next batch of connections for idleness.
+        A pass works on a snapshot of the registered connections;
+        connections registered during a pass are checked in the next
+        one, and connections unregistered during it are skipped.
+        Expired IP rules are removed as each pass starts.
+        """
+        if self._sweep_cursor is None:
+            if self._ip_filter:
+                self._ip_filter.expire(self.timer_wheel.wall_seconds())
+            self._sweep_cursor = iter(tuple(self._active_connections.items()))
+        now = self.timer_wheel.seconds()
+        checked = 0
+        for addr, con in itertools.islice(
+            self._sweep_cursor,
+            constants.IDLE_SWEEP_BATCH
+        ):
+            checked += 1
+            if self._active_connections.get(addr) is con:
+                self._check_idle_connection(addr, con, now)
+        if checked < constants.IDLE_SWEEP_BATCH:
+            self._sweep_cursor = None
+        if self._active_connections or self._ip_filter:
+            self._schedule_sweep()
+
+    def _check_idle_connection(self, addr, con, now):
+        """
+        Expire an idle connection, or send it a keepalive.
+        Args:
+            addr: The address the connection is registered under.
+            con: The connection.Connection to check.
+            now: The current time, in seconds.
+        """
+        idle_time = now - con.last_activity
+        if idle_time >= self.idle_timeout:
+            if con.state != connection.State.SHUTDOWN:
+                con.shutdown()
+            # The handler may have unregistered the connection already.
+            if self._active_connections.get(addr) is con:
+                con.unregister()
+        elif (
+            self.keepalive_interval is not None and
+            idle_time >= self.keepalive_interval
+        ):
+            con.send_keepalive()
+
+    def shutdown(self):
+        """Shutdown all active connections and then terminate protocol."""
+        for con in self._active_connections.values():
+            con.shutdown()
+        self.timer_wheel.stop()
+        self._close_transport()
+
+    @abc.abstractmethod
+    def _close_transport(self):
+        """Close the transport, if connected."""
@@ -0,0 +1,206 @@
+"""
+Pacing of outbound packets of RUDP connections.
+Classes:
+    TokenBucket: Token bucket rate limiter.
+    Pacer: Paces the packets of a connection at a rate derived
+        from its congestion window and round-trip time.
+"""
+
+from leviathan.network.engine import constants
+
+
+class TokenBucket(object):
+
+    """
+    A token bucket.
+    Tokens accrue at a fixed rate up to the capacity of the bucket.
+    Consuming tokens may leave the bucket in debt, which has to be
+    repaid before tokens are available again; hence a single large
+    packet is never blocked forever by a small capacity.
+    """
+
+    __slots__ = ('rate', 'capacity', 'tokens', '_last_refill')
+
+    def __init__(self, rate, capacity, now=0):
+        """
+        Create a new, full token bucket.
+        Args:
+            rate: Tokens accrued per second.
+            capacity: Maximum number of tokens held.
+            now: The current time, in seconds.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._last_refill = now
+
+    def __repr__(self):
+        return '{0}(rate={1}, capacity={2}, tokens={3})'.format(
+            self.__class__.__name__,
+            self.rate,
+            self.capacity,
+            self.tokens
+        )
+
+    def refill(self, now):
+        """
+        Add the tokens accrued since the last refill.
+        Args:
+            now: The current time, in seconds.
+        """
+        elapsed = max(now - self._last_refill, 0)
+        self.tokens = min(self.tokens + elapsed * self.rate, self.capacity)
+        self._last_refill = now
+
+    def consume(self, amount, now):
+        """
+        Take tokens from the bucket, possibly leaving it in debt.
+        Args:
+            amount: Number of tokens to take.
+            now: The current time, in seconds.
+        """
+        self.refill(now)
+        self.tokens -= amount
+
+    def take(self, amount, now):
+        """
+        Take tokens from the bucket, only if enough are available.
+        Args:
+            amount: Number of tokens to take.
+            now: The current time, in seconds.
+        Returns:
+            True if the tokens were taken.
+        """
+        self.refill(now)
+        if self.tokens < amount:
+            return False
+        self.tokens -= amount
+        return True
+
+    def delay(self, now):
+        """
+        Return the seconds until the bucket is out of debt.
+        Args:
+            now: The current time, in seconds.
+        """
+        self.refill(now)
+        if self.tokens >= 0:
+            return 0
+        return -self.tokens / self.rate
+
+
+class Pacer(object):
+
+    """
+    Token-bucket pacer of the packets of a connection.
+    Packets leave at GAIN times cwnd / SRTT, further bounded by an
+    optional bandwidth cap, so that a window opening does not send
+    a burst that overflows the buffers of the path. The bucket holds
+    at least `burst` segments, and as many bytes as the rate yields
+    per tick of the timer driving the pacer, so that the timer
+    granularity does not lower the rate. Until the round-trip time
+    is known, only the bandwidth cap applies.
+    """
+
+    # Gain over cwnd / SRTT, in slow start and congestion avoidance
+    # respectively, so that the window can still grow.
+    SLOW_START_GAIN = 2
+    CONGESTION_AVOIDANCE_GAIN = 1.25
+
+    def __init__(
+        self,
+        max_rate=None,
+        burst=constants.PACING_BURST,
+        segment_size=constants.UDP_SAFE_SEGMENT_SIZE,
+        granularity=constants.TIMER_GRANULARITY
+    ):
+        """
+        Create a new pacer.
+        Args:
+            max_rate: Bandwidth cap, in bytes per second, or None.
+            burst: Minimum capacity of the bucket, in segments.
+            segment_size: Maximum segment size, in bytes.
+            granularity: Granularity of the timer driving the pacer,
+                in seconds.
+        Raises:
+            ValueError: The bandwidth cap is not positive.
+        """
+        if max_rate is not None and max_rate <= 0:
+            raise ValueError('Bandwidth cap must be positive.')
+        self.max_rate = max_rate
+        self.min_capacity = burst * segment_size
+        self.granularity = granularity
+        self._bucket = None
+        self.sent_packets = 0
+        self.sent_bytes = 0
+        self.paced_packets = 0
+        self.paced_time = 0
+
+    def __repr__(self):
+        return '{0}(rate={1}, sent_packets={2}, paced_packets={3})'.format(
+            self.__class__.__name__,
+            self.rate,
+            self.sent_packets,
+            self.paced_packets
+        )
+
+    @property
+    def rate(self):
+        """Get the pacing rate, in bytes per second, or None."""
+        return None if self._bucket is None else self._bucket.rate
+
+    def update(self, congestion, srtt, now):
+        """
+        Derive the pacing rate from the state of the connection.
+        Args:
+            congestion: The congestion.CongestionController of the
+                connection.
+            srtt: The smoothed round-trip time, in seconds, or None.
+            now: The current time, in seconds.
+        """
+        rate = self.max_rate
+        if srtt:
+            if congestion.cwnd < congestion.ssthresh:
+                gain = self.SLOW_START_GAIN
+            else:
+                gain = self.CONGESTION_AVOIDANCE_GAIN
+            window_rate = gain * congestion.cwnd / srtt
+            rate = window_rate if rate is None else min(rate, window_rate)
+
+        if rate is None:
+            self._bucket = None
+            return
+        capacity = max(self.min_capacity, rate * self.granularity)
+        if self._bucket is None:
+            self._bucket = TokenBucket(rate, capacity, now)
+        else:
+            self._bucket.refill(now)
+            self._bucket.rate = rate
+            self._bucket.capacity = capacity
+
+    def delay(self, now):
+        """
+        Return the seconds until the next packet may be sent.
+        A positive delay counts as a paced packet.
+        Args:
+            now: The current time, in seconds.
+        """
+        if self._bucket is None:
+            return 0
+        delay = self._bucket.delay(now)
+        if delay > 0:
+            self.paced_packets += 1
+            self.paced_time += delay
+        return delay
+
+    def on_send(self, size, now):
+        """
+        Account for a sent packet.
+        Args:
+            size: Size of the packet, in bytes.
+            now: The current time, in seconds.
+        """
+        self.sent_packets += 1
+        self.sent_bytes += size
+        if self._bucket is not None:
+            self._bucket.consume(size, now)
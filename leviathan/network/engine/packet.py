@@ -1,27 +1,285 @@
 """
 Specification of RUDP packet structure.
 Classes:
+    Reliability: Delivery guarantees of a message.
+    HeaderFormat: Wire formats of packets.
     Packet: An RUDP packet implementing a total ordering and
-        serializing to/from protobuf.
+        serializing to/from a compact header, or protobuf.
+Functions:
+    pack_frames: Coalesce messages into a single payload.
+    unpack_frames: Split a coalesced payload into its messages.
+    max_header_size: Largest overhead of a packet between two
+        addresses.
+    detect_format: Wire format of a datagram.
+    patch_ack: Update the ACK number of an encoded packet in place.
+    normalize_ip: Canonical text of an IP address.
 """
 
+import enum
 import functools
-import re
+import socket
+import struct
+
+from leviathan.network.engine import constants, packet_pb2
+
+# Length prefix of each message of a coalesced payload.
+FRAME_HEADER = struct.Struct('!H')
+
+# Fixed part of a compact header: version, flags, optional fields
+# present, sequence number and ACK number.
+COMPACT_HEADER = struct.Struct('!BBBQQ')
+
+# The ACK number, which ends the fixed part of a compact header.
+_ACK = struct.Struct('!Q')
+_ACK_OFFSET = COMPACT_HEADER.size - _ACK.size
+
+# Bits of the flags byte.
+_SYN = 0x01
+_FIN = 0x02
+_COALESCED = 0x04
+_DEST_IPV6 = 0x08
+_SOURCE_IPV6 = 0x10
+_FLAGS = _SYN | _FIN | _COALESCED | _DEST_IPV6 | _SOURCE_IPV6
+
+# Destination and source addresses, each a packed IP address and a
+# port, by IPv6 flags.
+_ADDRESSES = {
+    0: struct.Struct('!4sH4sH'),
+    _DEST_IPV6: struct.Struct('!16sH4sH'),
+    _SOURCE_IPV6: struct.Struct('!4sH16sH'),
+    _DEST_IPV6 | _SOURCE_IPV6: struct.Struct('!16sH16sH'),
+}
+
+# Bits of the optional fields byte, in the order the fields follow
+# the addresses.
+_FRAGMENTS = 0x01
+_ORDER = 0x02
+_SACK = 0x04
+_PROBE = 0x08
+_PARITY = 0x10
+_COOKIE = 0x20
+_FIELDS = _FRAGMENTS | _ORDER | _SACK | _PROBE | _PARITY | _COOKIE
+
+# Optional fields: more fragments and fragment index; channel,
+# reliability and order index; SACK block count, then each block;
+# probe size and probe ACK; parity base and parity count; cookie
+# length, then the cookie.
+_FRAGMENT_FIELDS = struct.Struct('!QQ')
+_ORDER_FIELDS = struct.Struct('!BBQ')
+_COUNT = struct.Struct('!B')
+_SACK_BLOCK = struct.Struct('!QQ')
+_PROBE_FIELDS = struct.Struct('!HH')
+_PARITY_FIELDS = struct.Struct('!QI')
+
+# Number of IP addresses whose packed and text forms are cached.
+_MAX_CACHED_ADDRESSES = 1024
 
-from leviathan.network.engine import packet_pb2
 
-# IP validation regexes from the Regular Expressions Cookbook.
-# For now, only standard (non-compressed) IPv6 addresses are
-# supported. This might change in the future.
-_IPV4_REGEX = r'^(?:(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)$'
-_IPV6_REGEX = r'^(?:[A-F0-9]{1,4}:){7}[A-F0-9]{1,4}$'
+class ValidationError(Exception):
 
-_IP_MATCHER = re.compile('({0})|({1})'.format(_IPV4_REGEX, _IPV6_REGEX))
+    """Exception raised due to invalid data (e.g. bad IP)."""
 
 
-class ValidationError(Exception):
+class Reliability(enum.IntEnum):
+
+    """
+    Delivery guarantees of a message, after those of RakNet.
+    RELIABLE_ORDERED: Retransmitted until ACKed, and delivered in
+        order within its channel.
+    RELIABLE: Retransmitted until ACKed, and delivered as soon as
+        it is received.
+    UNRELIABLE: Sent once, without a sequence number, and
+        delivered if it is received.
+    UNRELIABLE_SEQUENCED: Sent once, and delivered if it is
+        received and no later message of its channel was.
+    """
+
+    RELIABLE_ORDERED = 0
+    RELIABLE = 1
+    UNRELIABLE = 2
+    UNRELIABLE_SEQUENCED = 3
+
+
+# Classes of messages that are neither ACKed nor retransmitted.
+UNRELIABLE_CLASSES = frozenset(
+    (Reliability.UNRELIABLE, Reliability.UNRELIABLE_SEQUENCED)
+)
+
+
+class HeaderFormat(enum.IntEnum):
+
+    """
+    Wire formats of packets.
+    LEGACY: The protobuf encoding of packet_pb2.Packet, with the
+        addresses as text; kept for hosts that predate the compact
+        header.
+    COMPACT: Version 1 of the compact header; see Packet.
+    A compact datagram starts with its version, which no protobuf
+    encoding starts with, since field number 0 is reserved; later
+    versions may take values up to 7.
+    """
+
+    LEGACY = 0
+    COMPACT = 1
+
+
+# Header formats of compact datagrams, by first byte.
+_COMPACT_VERSIONS = {1: HeaderFormat.COMPACT}
+
+
+def pack_frames(messages):
+    """
+    Coalesce messages into a single payload.
+    Each message is prefixed with its length, as a FRAME_HEADER.
+    Args:
+        messages: Sequence of bytes-like objects, each shorter
+            than 64 KiB.
+    Returns:
+        The payload, as a bytearray.
+    """
+    header_size = FRAME_HEADER.size
+    payload = bytearray(
+        sum(len(message) for message in messages) +
+        header_size * len(messages)
+    )
+    offset = 0
+    for message in messages:
+        FRAME_HEADER.pack_into(payload, offset, len(message))
+        offset += header_size
+        payload[offset:offset + len(message)] = message
+        offset += len(message)
+    return payload
+
+
+def unpack_frames(payload):
+    """
+    Split a coalesced payload into its messages.
+    Args:
+        payload: A payload built by pack_frames, as bytes.
+    Returns:
+        List of messages, as memoryviews of the payload.
+    Raises:
+        ValidationError: The framing is corrupt.
+    """
+    view = memoryview(payload)
+    header_size = FRAME_HEADER.size
+    messages = []
+    offset = 0
+    while offset < len(view):
+        if offset + header_size > len(view):
+            raise ValidationError('Truncated frame header.')
+        start = offset + header_size
+        offset = start + FRAME_HEADER.unpack_from(view, offset)[0]
+        if offset > len(view):
+            raise ValidationError('Truncated frame.')
+        messages.append(view[start:offset])
+    return messages
+
+
+def max_header_size(dest_addr, source_addr, header_format=HeaderFormat.COMPACT):
+    """
+    Return the largest overhead of a data packet between two hosts.
+    The overhead depends on the lengths of the addresses, and on
+    the values of the numeric fields; those are taken far beyond
+    anything a connection reaches, with all SACK blocks present.
+    Args:
+        dest_addr: Tuple of destination address (ip, port).
+        source_addr: Tuple of source address (ip, port).
+        header_format: The HeaderFormat of the packets.
+    Returns:
+        The number of bytes a packet adds to its payload.
+    """
+    large = 2 ** 42
+    payload_size = 2 ** 14
+    rudp_packet = Packet.from_data(
+        large,
+        dest_addr,
+        source_addr,
+        bytes(payload_size),
+        more_fragments=large,
+        ack=large,
+        sack=tuple(
+            (large + 2 * i, large + 2 * i + 1)
+            for i in range(constants.MAX_SACK_BLOCKS)
+        ),
+        channel=constants.MAX_CHANNELS - 1,
+        order_index=large,
+        fragment_index=large,
+        reliability=max(Reliability),
+        coalesced=True
+    )
+    rudp_packet.header_format = header_format
+    return len(rudp_packet.to_bytes()) - payload_size
+
+
+def detect_format(datagram):
+    """
+    Return the wire format of a datagram, from its first byte.
+    Args:
+        datagram: The datagram, as a bytes-like object.
+    Returns:
+        The HeaderFormat of the datagram.
+    Raises:
+        ValidationError: The datagram is in an unknown version of
+            the compact header.
+    """
+    if datagram and datagram[0] <= 7:
+        header_format = _COMPACT_VERSIONS.get(datagram[0])
+        if header_format is None:
+            raise ValidationError(
+                'Unknown header version: {0}.'.format(datagram[0])
+            )
+        return header_format
+    return HeaderFormat.LEGACY
+
+
+def patch_ack(datagram, ack):
+    """
+    Set the ACK number of a packet encoded in a compact header, in
+    place; a retransmission thus acknowledges the packets received
+    since the first transmission, without being encoded again.
+    Args:
+        datagram: The encoded packet, as a bytearray.
+        ack: The ACK number, as an int.
+    """
+    _ACK.pack_into(datagram, _ACK_OFFSET, ack)
 
-    """Exception raised due to invalid data (e.g. bad IP)."""
+
+@functools.lru_cache(maxsize=_MAX_CACHED_ADDRESSES)
+def _pack_ip(ip):
+    """
+    Return whether an IP address is an IPv6 one, and its packed form.
+    Raises:
+        ValidationError: The address is not a valid IPv4 or IPv6
+            address, in any of their text forms.
+    """
+    try:
+        if ':' in ip:
+            return True, socket.inet_pton(socket.AF_INET6, ip)
+        return False, socket.inet_pton(socket.AF_INET, ip)
+    except (OSError, TypeError, ValueError):
+        raise ValidationError('Bad IP: {0}.'.format(ip))
+
+
+@functools.lru_cache(maxsize=_MAX_CACHED_ADDRESSES)
+def _unpack_ip(packed):
+    """Return the canonical text of a packed IP address."""
+    family = socket.AF_INET6 if len(packed) == 16 else socket.AF_INET
+    return socket.inet_ntop(family, packed)
+
+
+def normalize_ip(ip):
+    """
+    Return the canonical text of an IP address, as the socket module
+    gives it: IPv6 addresses are compressed and in lowercase.
+    Args:
+        ip: An IPv4 or IPv6 address, as a string.
+    Returns:
+        The address, as a string.
+    Raises:
+        ValidationError: The address is invalid.
+    """
+    return _unpack_ip(_pack_ip(ip)[1])
 
 
 @functools.total_ordering
@@ -29,15 +287,57 @@ class Packet(object):
 
     """
     An RUDP packet.
-    This class serves as a wrapper class for the protobuf
-    serialization class. The wrapping is necessary in order to
-    enable extra functionality (e.g. total ordering) without
-    disrupting the metaclass of the protobuf class.
+    A packet serializes to either HeaderFormat, the compact one by
+    default. A compact datagram is laid out as:
+        COMPACT_HEADER: version, flags, bits of the optional fields
+            present, sequence number and ACK number;
+        the destination and source addresses, each a packed IPv4 or
+            IPv6 address, as the flags tell, and a port;
+        the optional fields present, each a fixed-size struct,
+            but for the SACK blocks and the cookie, which are
+            prefixed with their count and length;
+        the payload, up to the end of the datagram.
+    It is decoded by unpacking precompiled structs at their offsets
+    in the datagram, and its ACK number sits at a fixed offset; see
+    patch_ack.
     """
 
+    __slots__ = (
+        'header_format', 'size', '_syn', '_fin', '_sequence_number',
+        '_more_fragments', '_ack', '_sack', '_channel', '_order_index',
+        '_fragment_index', '_reliability', '_coalesced', '_probe_size',
+        '_probe_ack', '_parity_base', '_parity_count', '_cookie',
+        '_payload', '_dest_addr', '_source_addr'
+    )
+
     def __init__(self):
         """Create a new empty Packet."""
-        self._packet = packet_pb2.Packet()
+        # Wire format of the packet, when serialized or as decoded.
+        self.header_format = HeaderFormat.COMPACT
+
+        # Length of the datagram the packet was decoded from, in
+        # bytes, or 0.
+        self.size = 0
+
+        self._syn = False
+        self._fin = False
+        self._sequence_number = 0
+        self._more_fragments = 0
+        self._ack = 0
+        self._sack = ()
+        self._channel = 0
+        self._order_index = 0
+        self._fragment_index = 0
+        self._reliability = Reliability.RELIABLE_ORDERED
+        self._coalesced = False
+        self._probe_size = 0
+        self._probe_ack = 0
+        self._parity_base = 0
+        self._parity_count = 0
+        self._cookie = b''
+        self._payload = b''
+        self._dest_addr = ('', 0)
+        self._source_addr = ('', 0)
 
     @classmethod
     def from_data(
@@ -50,6 +350,17 @@ class Packet(object):
         ack=0,
         fin=False,
         syn=False,
+        sack=(),
+        channel=constants.DEFAULT_CHANNEL,
+        order_index=0,
+        fragment_index=0,
+        reliability=Reliability.RELIABLE_ORDERED,
+        coalesced=False,
+        probe_size=0,
+        probe_ack=0,
+        parity_base=0,
+        parity_count=0,
+        cookie=b''
     ):
         """
         Create a Packet with the given fields.
@@ -57,7 +368,7 @@ class Packet(object):
             sequence_number: The packet's sequence number, as an int.
             dest_addr: Tuple of destination addres (ip, port).
             source_addr: Tuple of local host addres (ip, port).
-            payload: The packet's payload, as a string.
+            payload: The packet's payload, as a bytes-like object.
             more_fragments: The number of segments that follow this
                 packet and are delivering remaining parts of the same
                 payload.
@@ -66,6 +377,30 @@ class Packet(object):
                 ignore.
             fin: When True, signals that this packet ends the connection.
             syn: When True, signals the start of a new conenction.
+            sack: Selective acknowledgement blocks, as an iterable of
+                (start, end) tuples of sequence numbers; each block
+                covers packets start through end - 1, which the
+                receiver holds beyond the ACK number.
+            channel: The ordering channel of the payload, as an int.
+            order_index: The index of the message among the messages
+                of its channel, as an int.
+            fragment_index: The number of segments that precede this
+                packet and are delivering earlier parts of the same
+                payload.
+            reliability: The Reliability class of the payload.
+            coalesced: When True, the payload holds several
+                messages of the channel, framed by pack_frames; the
+                order index is that of the first one.
+            probe_size: If positive, the packet is a path MTU probe
+                of that many bytes; its payload is padding.
+            probe_ack: If positive, the size of a probe received
+                from the remote host, in bytes.
+            parity_base: The sequence number of the first packet
+                covered by the parity payload.
+            parity_count: If positive, the packet carries the parity
+                of that many consecutive packets as its payload.
+            cookie: The handshake cookie issued by the remote host,
+                as bytes; see cookie.SynCookies.
         Return:
             An initialized Packet.
         Raises:
@@ -81,6 +416,17 @@ class Packet(object):
         new_packet.sequence_number = sequence_number
         new_packet.more_fragments = more_fragments
         new_packet.ack = ack
+        new_packet.sack = sack
+        new_packet.channel = channel
+        new_packet.order_index = order_index
+        new_packet.fragment_index = fragment_index
+        new_packet.reliability = reliability
+        new_packet.coalesced = coalesced
+        new_packet.probe_size = probe_size
+        new_packet.probe_ack = probe_ack
+        new_packet.parity_base = parity_base
+        new_packet.parity_count = parity_count
+        new_packet.cookie = cookie
 
         new_packet.payload = payload
 
@@ -93,20 +439,25 @@ class Packet(object):
         """
         Return a serialized version of this packet.
         Returns:
-            A protobuf-encoded bytestring.
+            The packet encoded in its header format, as bytes.
         Raises:
-            protobuf.message.EncodeError: Serialization was
-                unsuccessful; maybe the object attributes have
-                not been instatiated with proper values.
+            ValidationError: A field does not fit the compact header,
+                or an IP address is invalid.
+            TypeError: A field has an inappropriate type.
+            ValueError: A field is out of range for protobuf.
         """
-        return self._packet.SerializeToString()
+        if self.header_format == HeaderFormat.LEGACY:
+            return self._to_legacy()
+        return self._to_compact()
 
     @classmethod
     def from_bytes(cls, data):
         """
         Create a Packet from an unvalidated bytestring.
+        The header format is told by the first byte of the datagram.
+        Addresses are made canonical, as by normalize_ip.
         Args:
-            data: A protobuf-encoded bytestring.
+            data: A datagram, as a bytes-like object.
         Returns:
             A new Packet instance, populated with the contents
             of the bytestring.
@@ -115,11 +466,255 @@ class Packet(object):
                 into Packet was unsuccessful.
             ValidationError: One or more values was invalid.
         """
+        if detect_format(data) == HeaderFormat.LEGACY:
+            new_packet = cls._from_legacy(data)
+        else:
+            new_packet = cls._from_compact(data)
+        new_packet.size = len(data)
+        return new_packet
+
+    def _to_compact(self):
+        """Return the packet encoded in the compact header."""
+        dest_ip, dest_port = self._dest_addr
+        source_ip, source_port = self._source_addr
+        dest_ipv6, dest_ip = _pack_ip(dest_ip)
+        source_ipv6, source_ip = _pack_ip(source_ip)
+        flags = (
+            (_SYN if self._syn else 0) |
+            (_FIN if self._fin else 0) |
+            (_COALESCED if self._coalesced else 0) |
+            (_DEST_IPV6 if dest_ipv6 else 0) |
+            (_SOURCE_IPV6 if source_ipv6 else 0)
+        )
+        fields = 0
+        try:
+            parts = [
+                None,
+                _ADDRESSES[flags & (_DEST_IPV6 | _SOURCE_IPV6)].pack(
+                    dest_ip,
+                    dest_port,
+                    source_ip,
+                    source_port
+                )
+            ]
+            if self._more_fragments or self._fragment_index:
+                fields |= _FRAGMENTS
+                parts.append(_FRAGMENT_FIELDS.pack(
+                    self._more_fragments,
+                    self._fragment_index
+                ))
+            if self._channel or self._reliability or self._order_index:
+                fields |= _ORDER
+                parts.append(_ORDER_FIELDS.pack(
+                    self._channel,
+                    self._reliability,
+                    self._order_index
+                ))
+            if self._sack:
+                fields |= _SACK
+                parts.append(_COUNT.pack(len(self._sack)))
+                parts.extend(
+                    _SACK_BLOCK.pack(start, end) for start, end in self._sack
+                )
+            if self._probe_size or self._probe_ack:
+                fields |= _PROBE
+                parts.append(_PROBE_FIELDS.pack(self._probe_size, self._probe_ack))
+            if self._parity_count:
+                fields |= _PARITY
+                parts.append(_PARITY_FIELDS.pack(
+                    self._parity_base,
+                    self._parity_count
+                ))
+            if self._cookie:
+                fields |= _COOKIE
+                parts.append(_COUNT.pack(len(self._cookie)))
+                parts.append(self._cookie)
+            parts[0] = COMPACT_HEADER.pack(
+                HeaderFormat.COMPACT,
+                flags,
+                fields,
+                self._sequence_number,
+                self._ack
+            )
+        except struct.error as exc:
+            raise ValidationError('Field out of range: {0}.'.format(exc))
+        parts.append(self._payload)
+        return b''.join(parts)
+
+    @classmethod
+    def _from_compact(cls, data):
+        """Decode and validate a datagram in the compact header."""
+        new_packet = cls()
+        try:
+            (
+                _, flags, fields, new_packet._sequence_number, new_packet._ack
+            ) = COMPACT_HEADER.unpack_from(data)
+            if flags & ~_FLAGS or fields & ~_FIELDS:
+                raise ValidationError(
+                    'Unknown flags: {0:#x}, {1:#x}.'.format(flags, fields)
+                )
+            addresses = _ADDRESSES[flags & (_DEST_IPV6 | _SOURCE_IPV6)]
+            (
+                dest_ip, dest_port, source_ip, source_port
+            ) = addresses.unpack_from(data, COMPACT_HEADER.size)
+            offset = COMPACT_HEADER.size + addresses.size
+            if fields:
+                offset = new_packet._unpack_fields(data, offset, fields)
+        except struct.error:
+            raise ValidationError('Truncated header.')
+        # Addresses are valid as packed; the other fields are checked
+        # as in validate, on the values at hand.
+        if not dest_port:
+            raise ValidationError('Bad destination port: 0.')
+        if not source_port:
+            raise ValidationError('Bad source port: 0.')
+        new_packet._syn = bool(flags & _SYN)
+        new_packet._fin = bool(flags & _FIN)
+        new_packet._dest_addr = (_unpack_ip(dest_ip), dest_port)
+        new_packet._source_addr = (_unpack_ip(source_ip), source_port)
+        new_packet._payload = payload = bytes(data[offset:])
+        if flags & _COALESCED:
+            new_packet._coalesced = True
+            if new_packet._more_fragments or new_packet._fragment_index:
+                raise ValidationError('Fragmented coalesced payload.')
+            unpack_frames(payload)
+        return new_packet
+
+    def _unpack_fields(self, data, offset, fields):
+        """
+        Decode the optional fields of a compact header, from the
+        offset of the first one; return the offset of the payload.
+        """
+        if fields & _FRAGMENTS:
+            (
+                self._more_fragments, self._fragment_index
+            ) = _FRAGMENT_FIELDS.unpack_from(data, offset)
+            offset += _FRAGMENT_FIELDS.size
+        if fields & _ORDER:
+            (
+                self._channel, self._reliability, self._order_index
+            ) = _ORDER_FIELDS.unpack_from(data, offset)
+            offset += _ORDER_FIELDS.size
+            if self._channel >= constants.MAX_CHANNELS:
+                raise ValidationError(
+                    'Bad channel: {0}.'.format(self._channel)
+                )
+            if self._reliability >= len(Reliability):
+                raise ValidationError(
+                    'Bad reliability: {0}.'.format(self._reliability)
+                )
+        if fields & _SACK:
+            count = _COUNT.unpack_from(data, offset)[0]
+            offset += _COUNT.size
+            self._sack = tuple(
+                _SACK_BLOCK.unpack_from(data, offset + i * _SACK_BLOCK.size)
+                for i in range(count)
+            )
+            offset += count * _SACK_BLOCK.size
+            if any(start >= end for start, end in self._sack):
+                raise ValidationError(
+                    'Bad SACK blocks: {0}.'.format(list(self._sack))
+                )
+        if fields & _PROBE:
+            (
+                self._probe_size, self._probe_ack
+            ) = _PROBE_FIELDS.unpack_from(data, offset)
+            offset += _PROBE_FIELDS.size
+        if fields & _PARITY:
+            (
+                self._parity_base, self._parity_count
+            ) = _PARITY_FIELDS.unpack_from(data, offset)
+            offset += _PARITY_FIELDS.size
+        if fields & _COOKIE:
+            length = _COUNT.unpack_from(data, offset)[0]
+            offset += _COUNT.size
+            if offset + length > len(data):
+                raise ValidationError('Truncated cookie.')
+            self._cookie = bytes(data[offset:offset + length])
+            offset += length
+        return offset
+
+    def _to_legacy(self):
+        """Return the packet encoded in protobuf."""
+        dest_ip, dest_port = self._dest_addr
+        source_ip, source_port = self._source_addr
+        return packet_pb2.Packet(
+            syn=self._syn,
+            fin=self._fin,
+            sequence_number=self._sequence_number,
+            more_fragments=self._more_fragments,
+            ack=self._ack,
+            payload=bytes(self._payload),
+            dest_ip=dest_ip,
+            dest_port=dest_port,
+            source_ip=source_ip,
+            source_port=source_port,
+            sack=[seqnum for block in self._sack for seqnum in block],
+            channel=self._channel,
+            order_index=self._order_index,
+            fragment_index=self._fragment_index,
+            reliability=self._reliability,
+            coalesced=self._coalesced,
+            probe_size=self._probe_size,
+            probe_ack=self._probe_ack,
+            parity_base=self._parity_base,
+            parity_count=self._parity_count,
+            cookie=self._cookie
+        ).SerializeToString()
+
+    @classmethod
+    def _from_legacy(cls, data):
+        """Decode and validate a protobuf-encoded datagram."""
+        legacy = packet_pb2.Packet()
+        legacy.ParseFromString(data)
+        sack = legacy.sack
+        if len(sack) % 2:
+            raise ValidationError('Bad SACK blocks: {0}.'.format(list(sack)))
         new_packet = cls()
-        new_packet._packet.ParseFromString(data)
+        new_packet.header_format = HeaderFormat.LEGACY
+        new_packet._syn = legacy.syn
+        new_packet._fin = legacy.fin
+        new_packet._sequence_number = legacy.sequence_number
+        new_packet._more_fragments = legacy.more_fragments
+        new_packet._ack = legacy.ack
+        new_packet._sack = tuple(zip(sack[::2], sack[1::2]))
+        new_packet._channel = legacy.channel
+        new_packet._order_index = legacy.order_index
+        new_packet._fragment_index = legacy.fragment_index
+        new_packet._reliability = legacy.reliability
+        new_packet._coalesced = legacy.coalesced
+        new_packet._probe_size = legacy.probe_size
+        new_packet._probe_ack = legacy.probe_ack
+        new_packet._parity_base = legacy.parity_base
+        new_packet._parity_count = legacy.parity_count
+        new_packet._cookie = legacy.cookie
+        new_packet._payload = legacy.payload
+        new_packet._dest_addr = (legacy.dest_ip, legacy.dest_port)
+        new_packet._source_addr = (legacy.source_ip, legacy.source_port)
         cls.validate(new_packet)
+        new_packet._dest_addr = (normalize_ip(legacy.dest_ip), legacy.dest_port)
+        new_packet._source_addr = (
+            normalize_ip(legacy.source_ip),
+            legacy.source_port
+        )
         return new_packet
 
+    def pad(self, size):
+        """
+        Set the payload to padding, so that the packet serializes to
+        the given size in its header format.
+        Args:
+            size: The size of the datagram, in bytes; it should
+                leave from 128 to 16383 bytes of padding.
+        """
+        self._payload = b''
+        padding = size - len(self.to_bytes())
+        if self.header_format == HeaderFormat.LEGACY:
+            # The tag and the length of the payload, which takes two
+            # bytes at any such size.
+            padding -= 3
+        self._payload = bytes(padding)
+
     def __eq__(self, other):
         if isinstance(other, Packet):
             return self.sequence_number == other.sequence_number
@@ -142,7 +737,9 @@ class Packet(object):
             ValidationError: One or more values was invalid.
         """
         dest_ip, dest_port = packet.dest_addr
-        if _IP_MATCHER.match(dest_ip) is None:
+        try:
+            _pack_ip(dest_ip)
+        except ValidationError:
             raise ValidationError(
                 'Bad destination IP: {0}.'.format(dest_ip)
             )
@@ -153,7 +750,9 @@ class Packet(object):
             )
 
         source_ip, source_port = packet.source_addr
-        if _IP_MATCHER.match(source_ip) is None:
+        try:
+            _pack_ip(source_ip)
+        except ValidationError:
             raise ValidationError(
                 'Bad source IP: {0}.'.format(source_ip)
             )
@@ -163,115 +762,258 @@ class Packet(object):
                 'Bad source port: {0}.'.format(source_port)
             )
 
+        if any(start >= end for start, end in packet.sack):
+            raise ValidationError(
+                'Bad SACK blocks: {0}.'.format(list(packet.sack))
+            )
+
+        if packet.channel >= constants.MAX_CHANNELS:
+            raise ValidationError(
+                'Bad channel: {0}.'.format(packet.channel)
+            )
+
+        if packet.reliability >= len(Reliability):
+            raise ValidationError(
+                'Bad reliability: {0}.'.format(packet.reliability)
+            )
+
+        if packet.coalesced:
+            # The number of messages should be known before the
+            # packet is ACKed, since each takes an order index.
+            if packet.more_fragments or packet.fragment_index:
+                raise ValidationError('Fragmented coalesced payload.')
+            unpack_frames(packet.payload)
+
     def get_syn(self):
-        return self._packet.syn
+        return self._syn
 
     def set_syn(self, value):
         """
         Set the Packet's SYN flag.
         Args:
             value: True or False.
-        Raises:
-            TypeError: Value has inappropriate type.
         """
-        self._packet.syn = value
+        self._syn = value
 
     def get_fin(self):
-        return self._packet.fin
+        return self._fin
 
     def set_fin(self, value):
         """
         Set the Packet's FIN flag.
         Args:
             value: True or False.
-        Raises:
-            TypeError: Value has inappropriate type.
         """
-        self._packet.fin = value
+        self._fin = value
 
     def get_sequence_number(self):
-        return self._packet.sequence_number
+        return self._sequence_number
 
     def set_sequence_number(self, value):
         """
         Set the Packet's sequence number.
         Args:
             value: A non-negative integer.
-        Raises:
-            TypeError: Value has inappropriate type.
         """
-        self._packet.sequence_number = value
+        self._sequence_number = value
 
     def get_more_fragments(self):
-        return self._packet.more_fragments
+        return self._more_fragments
 
     def set_more_fragments(self, value):
         """
         Set the number of fragments following this Packet.
         Args:
             value: A non-negative integer.
-        Raises:
-            TypeError: Value has inappropriate type.
         """
-        self._packet.more_fragments = value
+        self._more_fragments = value
 
     def get_ack(self):
-        return self._packet.ack
+        return self._ack
 
     def set_ack(self, value):
         """
         Set the Packet's acknowledgement number.
         Args:
             value: A non-negative integer.
-        Raises:
-            TypeError: Value has inappropriate type.
         """
-        self._packet.ack = value
+        self._ack = value
+
+    def get_sack(self):
+        return self._sack
+
+    def set_sack(self, value):
+        """
+        Set the Packet's selective acknowledgement blocks.
+        Args:
+            value: An iterable of (start, end) tuples.
+        """
+        self._sack = tuple((start, end) for start, end in value)
+
+    def get_channel(self):
+        return self._channel
+
+    def set_channel(self, value):
+        """
+        Set the Packet's ordering channel.
+        Args:
+            value: A non-negative integer.
+        """
+        self._channel = value
+
+    def get_order_index(self):
+        return self._order_index
+
+    def set_order_index(self, value):
+        """
+        Set the index of the Packet's message within its channel.
+        Args:
+            value: A non-negative integer.
+        """
+        self._order_index = value
+
+    def get_fragment_index(self):
+        return self._fragment_index
+
+    def set_fragment_index(self, value):
+        """
+        Set the number of fragments preceding this Packet.
+        Args:
+            value: A non-negative integer.
+        """
+        self._fragment_index = value
+
+    def get_reliability(self):
+        return self._reliability
+
+    def set_reliability(self, value):
+        """
+        Set the Packet's reliability class.
+        Args:
+            value: A Reliability, or the equivalent integer.
+        """
+        self._reliability = value
+
+    def get_coalesced(self):
+        return self._coalesced
+
+    def set_coalesced(self, value):
+        """
+        Set the Packet's coalesced flag.
+        Args:
+            value: True or False.
+        """
+        self._coalesced = value
+
+    def get_probe_size(self):
+        return self._probe_size
+
+    def set_probe_size(self, value):
+        """
+        Set the size of the Packet as a path MTU probe.
+        Args:
+            value: A non-negative integer; 0 if not a probe.
+        """
+        self._probe_size = value
+
+    def get_probe_ack(self):
+        return self._probe_ack
+
+    def set_probe_ack(self, value):
+        """
+        Set the size of the probe the Packet acknowledges.
+        Args:
+            value: A non-negative integer; 0 if none.
+        """
+        self._probe_ack = value
+
+    def get_parity_base(self):
+        return self._parity_base
+
+    def set_parity_base(self, value):
+        """
+        Set the first sequence number covered by the Packet's parity.
+        Args:
+            value: A non-negative integer.
+        """
+        self._parity_base = value
+
+    def get_parity_count(self):
+        return self._parity_count
+
+    def set_parity_count(self, value):
+        """
+        Set the number of packets covered by the Packet's parity.
+        Args:
+            value: A non-negative integer; 0 if not a parity packet.
+        """
+        self._parity_count = value
+
+    def get_cookie(self):
+        return self._cookie
+
+    def set_cookie(self, value):
+        """
+        Set the Packet's handshake cookie.
+        Args:
+            value: The cookie, as bytes; empty if none.
+        """
+        self._cookie = value
 
     def get_payload(self):
-        return self._packet.payload
+        return self._payload
 
     def set_payload(self, value):
         """
         Set the Packet's payload.
         Args:
-            value: Packet's payload, in bytes.
-        Raises:
-            TypeError: Value has inappropriate type.
+            value: Packet's payload, in bytes or any other bytes-like
+                object, such as a memoryview. It is kept as it is,
+                so that it is only copied into the datagram, and
+                should not be modified until the packet is encoded.
         """
-        self._packet.payload = value
+        self._payload = value
 
     def get_dest_addr(self):
-        return self._packet.dest_ip, self._packet.dest_port
+        return self._dest_addr
 
     def set_dest_addr(self, value):
         """
         Set the Packet's destination address.
         Args:
             value: An (IP, port) tuple.
-        Raises:
-            TypeError: Value has inappropriate type.
         """
-        self._packet.dest_ip, self._packet.dest_port = value
+        ip, port = value
+        self._dest_addr = (ip, port)
 
     def get_source_addr(self):
-        return self._packet.source_ip, self._packet.source_port
+        return self._source_addr
 
     def set_source_addr(self, value):
         """
         Set the Packet's source address.
         Args:
             value: An (IP, port) tuple.
-        Raises:
-            TypeError: Value has inappropriate type.
         """
-        self._packet.source_ip, self._packet.source_port = value
+        ip, port = value
+        self._source_addr = (ip, port)
 
     syn = property(get_syn, set_syn)
     fin = property(get_fin, set_fin)
     sequence_number = property(get_sequence_number, set_sequence_number)
     more_fragments = property(get_more_fragments, set_more_fragments)
     ack = property(get_ack, set_ack)
+    sack = property(get_sack, set_sack)
+    channel = property(get_channel, set_channel)
+    order_index = property(get_order_index, set_order_index)
+    fragment_index = property(get_fragment_index, set_fragment_index)
+    reliability = property(get_reliability, set_reliability)
+    coalesced = property(get_coalesced, set_coalesced)
+    probe_size = property(get_probe_size, set_probe_size)
+    probe_ack = property(get_probe_ack, set_probe_ack)
+    parity_base = property(get_parity_base, set_parity_base)
+    parity_count = property(get_parity_count, set_parity_count)
+    cookie = property(get_cookie, set_cookie)
     payload = property(get_payload, set_payload)
     dest_addr = property(get_dest_addr, set_dest_addr)
     source_addr = property(get_source_addr, set_source_addr)
@@ -18,7 +18,7 @@ DESCRIPTOR = _descriptor.FileDescriptor(
   package='leviathan',
   syntax='proto3',
   serialized_options=b'H\003',
-  serialized_pb=b'\n\x0cpacket.proto\x12\tleviathan\"\xbd\x01\n\x06Packet\x12\x0b\n\x03syn\x18\x01 \x01(\x08\x12\x0b\n\x03\x66in\x18\x02 \x01(\x08\x12\x17\n\x0fsequence_number\x18\x03 \x01(\x04\x12\x16\n\x0emore_fragments\x18\x04 \x01(\x04\x12\x0b\n\x03\x61\x63k\x18\x05 \x01(\x04\x12\x0f\n\x07payload\x18\x06 \x01(\x0c\x12\x0f\n\x07\x64\x65st_ip\x18\x07 \x01(\t\x12\x11\n\tdest_port\x18\x08 \x01(\r\x12\x11\n\tsource_ip\x18\t \x01(\t\x12\x13\n\x0bsource_port\x18\n \x01(\rB\x02H\x03\x62\x06proto3'
+  serialized_pb=b'\n\x0cpacket.proto\x12\tleviathan\"\x93\x03\n\x06Packet\x12\x0b\n\x03syn\x18\x01 \x01(\x08\x12\x0b\n\x03\x66in\x18\x02 \x01(\x08\x12\x17\n\x0fsequence_number\x18\x03 \x01(\x04\x12\x16\n\x0emore_fragments\x18\x04 \x01(\x04\x12\x0b\n\x03\x61\x63k\x18\x05 \x01(\x04\x12\x0f\n\x07payload\x18\x06 \x01(\x0c\x12\x0f\n\x07\x64\x65st_ip\x18\x07 \x01(\t\x12\x11\n\tdest_port\x18\x08 \x01(\r\x12\x11\n\tsource_ip\x18\t \x01(\t\x12\x13\n\x0bsource_port\x18\n \x01(\r\x12\x0c\n\x04sack\x18\x0b \x03(\x04\x12\x0f\n\x07\x63hannel\x18\x0c \x01(\r\x12\x13\n\x0border_index\x18\r \x01(\x04\x12\x16\n\x0e\x66ragment_index\x18\x0e \x01(\x04\x12\x13\n\x0breliability\x18\x0f \x01(\r\x12\x11\n\tcoalesced\x18\x10 \x01(\x08\x12\x12\n\nprobe_size\x18\x11 \x01(\r\x12\x11\n\tprobe_ack\x18\x12 \x01(\r\x12\x13\n\x0bparity_base\x18\x13 \x01(\x04\x12\x14\n\x0cparity_count\x18\x14 \x01(\r\x12\x0e\n\x06\x63ookie\x18\x15 \x01(\x0c\x42\x02H\x03\x62\x06proto3'
 )
 
 
@@ -101,6 +101,83 @@ _PACKET = _descriptor.Descriptor(
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='sack', full_name='leviathan.Packet.sack', index=10,
+      number=11, type=4, cpp_type=4, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='channel', full_name='leviathan.Packet.channel', index=11,
+      number=12, type=13, cpp_type=3, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='order_index', full_name='leviathan.Packet.order_index', index=12,
+      number=13, type=4, cpp_type=4, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='fragment_index', full_name='leviathan.Packet.fragment_index', index=13,
+      number=14, type=4, cpp_type=4, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='reliability', full_name='leviathan.Packet.reliability', index=14,
+      number=15, type=13, cpp_type=3, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='coalesced', full_name='leviathan.Packet.coalesced', index=15,
+      number=16, type=8, cpp_type=7, label=1,
+      has_default_value=False, default_value=False,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='probe_size', full_name='leviathan.Packet.probe_size', index=16,
+      number=17, type=13, cpp_type=3, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='probe_ack', full_name='leviathan.Packet.probe_ack', index=17,
+      number=18, type=13, cpp_type=3, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='parity_base', full_name='leviathan.Packet.parity_base', index=18,
+      number=19, type=4, cpp_type=4, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='parity_count', full_name='leviathan.Packet.parity_count', index=19,
+      number=20, type=13, cpp_type=3, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='cookie', full_name='leviathan.Packet.cookie', index=20,
+      number=21, type=12, cpp_type=9, label=1,
+      has_default_value=False, default_value=b"",
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
   ],
   extensions=[
   ],
@@ -114,7 +191,7 @@ _PACKET = _descriptor.Descriptor(
   oneofs=[
   ],
   serialized_start=28,
-  serialized_end=217,
+  serialized_end=431,
 )
 
 DESCRIPTOR.message_types_by_name['Packet'] = _PACKET
@@ -0,0 +1,108 @@
+"""Path MTU discovery for RUDP connections."""
+
+from leviathan.network.engine import constants
+
+
+class PathMTUSearch(object):
+
+    """
+    Packetization-layer path MTU search, after RFC 8899.
+    Probes are padded datagrams of the candidate sizes, which the
+    remote host acknowledges by echoing their size. Candidates are
+    tried from the largest down, each up to `max_probes` times, so
+    that the common 1500-byte path is confirmed by the first probe.
+    The first size confirmed ends the search; until then, or if no
+    probe is answered, the connection keeps its base segment size.
+    Probes are never retransmitted, and their loss is not taken
+    as a sign of congestion. If datagrams of the confirmed size stop
+    crossing the path later on (a black hole), the size is forgotten
+    and the search starts over.
+    """
+
+    def __init__(
+        self,
+        probe_sizes=constants.PMTU_PROBE_SIZES,
+        max_probes=constants.PMTU_MAX_PROBES
+    ):
+        """
+        Create a new search, with no size confirmed.
+        Args:
+            probe_sizes: Candidate datagram sizes, in bytes.
+            max_probes: Number of unanswered probes after which a
+                candidate is given up.
+        """
+        self.probe_sizes = tuple(sorted(probe_sizes, reverse=True))
+        self.max_probes = max_probes
+        self.datagram_size = None
+        self.probes_sent = 0
+        self.probes_lost = 0
+        self.black_holes = 0
+        self._candidate = 0
+        self._attempts = 0
+
+    def __repr__(self):
+        return '{0}(datagram_size={1}, probe_size={2})'.format(
+            self.__class__.__name__,
+            self.datagram_size,
+            self.probe_size
+        )
+
+    @property
+    def probe_size(self):
+        """Get the size of the next probe, or None if done."""
+        if self._candidate < len(self.probe_sizes):
+            return self.probe_sizes[self._candidate]
+        return None
+
+    @property
+    def can_raise(self):
+        """Check whether a larger size than the confirmed one remains."""
+        return (
+            self.datagram_size is None or
+            self.datagram_size < self.probe_sizes[0]
+        )
+
+    def on_probe_sent(self):
+        """Account for a probe of the current size."""
+        self.probes_sent += 1
+        self._attempts += 1
+
+    def on_probe_acked(self, size):
+        """
+        Confirm that a datagram of the given size crossed the path.
+        Confirming a size ends the search.
+        Args:
+            size: Size of the received probe, as reported by the
+                remote host, in bytes.
+        """
+        size = min(size, self.probe_sizes[0])
+        if self.datagram_size is None or size > self.datagram_size:
+            self.datagram_size = size
+        self._candidate = len(self.probe_sizes)
+
+    def on_probe_lost(self):
+        """Give up the current size after enough unanswered probes."""
+        self.probes_lost += 1
+        if self._attempts >= self.max_probes:
+            self._candidate += 1
+            self._attempts = 0
+            if (
+                self.datagram_size is not None and
+                self.probe_size is not None and
+                self.probe_size <= self.datagram_size
+            ):
+                self._candidate = len(self.probe_sizes)
+
+    def on_black_hole(self):
+        """
+        Forget the confirmed size, which the path no longer passes,
+        and search again from the largest size.
+        """
+        self.black_holes += 1
+        self.datagram_size = None
+        self.restart()
+
+    def restart(self):
+        """Search again for sizes larger than the confirmed one."""
+        self._candidate = 0
+        self._attempts = 0
@@ -0,0 +1,277 @@
+"""Circular reorder buffer for received packets."""
+
+import collections
+
+from leviathan.network.engine import constants
+
+
+# Marks the slot of a packet popped ahead of the base; it is still
+# counted as received until the base advances past it.
+_CONSUMED = object()
+
+# Number of slots allocated at first; the slots double, up to the
+# capacity, as packets arrive further ahead of the base.
+_INITIAL_SLOTS = 16
+
+
+class ReorderBuffer(collections.Container, collections.Sized):
+
+    """
+    A fixed-capacity ring of packets, indexed by sequence number.
+    The buffer spans `capacity` sequence numbers from its base, the
+    next sequence number to be popped. Packets are stored in slot
+    `seqnum % capacity`, so that inserting, looking up and popping
+    a packet cost O(1), without comparing packets to each other.
+    Messages may also be popped ahead of the base, as soon as all
+    their fragments are held; their slots keep reporting the
+    packets as received until the base reaches them.
+    Only as many slots as the packets held need are allocated, so
+    that the buffers of connections receiving in order stay small.
+    """
+
+    def __init__(self, capacity=constants.REORDER_BUFFER_SIZE, base=0):
+        """
+        Create a new (empty) ReorderBuffer.
+        Args:
+            capacity: Number of slots, as a power of two.
+            base: The lowest sequence number accepted.
+        Raises:
+            ValueError: The capacity is not a power of two.
+        """
+        if capacity <= 0 or capacity & (capacity - 1):
+            raise ValueError('Capacity must be a power of two.')
+        self._capacity = capacity
+        self._slots = [None] * min(capacity, _INITIAL_SLOTS)
+        self._mask = len(self._slots) - 1
+        self._base = base
+        self._end = base
+        self._count = 0
+
+    def __contains__(self, sequence_number):
+        """
+        Check whether the buffer contains a packet with given seqnum.
+        Packets popped ahead of the base are still contained.
+        Args:
+            sequence_number: The sequence_number, as an integer.
+        """
+        return (
+            self._base <= sequence_number < self._end and
+            self._slots[sequence_number & self._mask] is not None
+        )
+
+    def __len__(self):
+        """Return the number of packets in the buffer."""
+        return self._count
+
+    @property
+    def base(self):
+        """Get the lowest sequence number accepted."""
+        return self._base
+
+    @property
+    def span(self):
+        """
+        Get the number of sequence numbers from the base through the
+        highest one held, holes and packets popped ahead included.
+        """
+        return self._end - self._base
+
+    @property
+    def capacity(self):
+        """Get the maximum number of slots."""
+        return self._capacity
+
+    def reset(self, base):
+        """
+        Empty the buffer and anchor it at a new base.
+        Args:
+            base: The lowest sequence number accepted.
+        """
+        self._slots = [None] * min(self._capacity, _INITIAL_SLOTS)
+        self._mask = len(self._slots) - 1
+        self._base = base
+        self._end = base
+        self._count = 0
+
+    def push(self, rudp_packet):
+        """
+        Store a new packet in the buffer.
+        Args:
+            rudp_packet: A packet.Packet.
+        Returns:
+            True if the packet was stored; False if it is a duplicate
+            or its seqnum lies outside the buffer.
+        """
+        seqnum = rudp_packet.sequence_number
+        if not 0 <= seqnum - self._base <= self._mask:
+            if not 0 <= seqnum - self._base < self._capacity:
+                return False
+            self._grow(seqnum - self._base + 1)
+        index = seqnum & self._mask
+        if self._slots[index] is not None:
+            return False
+        self._slots[index] = rudp_packet
+        self._count += 1
+        if seqnum >= self._end:
+            self._end = seqnum + 1
+        return True
+
+    def _grow(self, size):
+        """
+        Reallocate the slots, to span at least `size` seqnums.
+        Args:
+            size: Number of seqnums from the base to be spanned, at
+                most the capacity.
+        """
+        count = len(self._slots)
+        while count < size:
+            count *= 2
+        slots = [None] * count
+        mask = count - 1
+        for seqnum in range(self._base, self._end):
+            slots[seqnum & mask] = self._slots[seqnum & self._mask]
+        self._slots = slots
+        self._mask = mask
+
+    def pop_min_and_all_fragments(self):
+        """
+        Attempt to pop the packet at the base, and its fragments.
+        For the operation to succeed, all the fragments of the packet
+        should reside in the buffer. If so, all fragments are popped
+        from the buffer and returned in order, and the base advances
+        past them.
+        Returns:
+            Tuple of packet.Packet(s), ordered by increasing seqnum,
+            or None if operation was unsuccessful for any reason.
+        """
+        slots = self._slots
+        mask = self._mask
+        base = self._base
+        first = slots[base & mask]
+        if first is None or first is _CONSUMED:
+            return None
+
+        more_fragments = first.more_fragments
+        if not more_fragments:
+            slots[base & mask] = None
+            self._count -= 1
+            self._base = base + 1
+            return (first,)
+
+        end = base + more_fragments + 1
+        if end > self._end:
+            return None
+        indexes = [seqnum & mask for seqnum in range(base, end)]
+        for index in indexes:
+            if slots[index] is None or slots[index] is _CONSUMED:
+                return None
+
+        fragments = tuple(slots[index] for index in indexes)
+        for index in indexes:
+            slots[index] = None
+        self._count -= len(fragments)
+        self._base = end
+        return fragments
+
+    def peek_min(self):
+        """
+        Get the packet at the base, without popping it.
+        Returns:
+            The packet.Packet, or None if the base is a hole.
+        """
+        return self._slots[self._base & self._mask]
+
+    def pop_min_run(self, end):
+        """
+        Pop the packets held from the base on, up to the first hole
+        or a given sequence number, and advance the base past them.
+        Args:
+            end: The sequence number to stop before.
+        Returns:
+            List of packet.Packet(s), ordered by increasing seqnum;
+            empty if the base is a hole.
+        """
+        slots = self._slots
+        mask = self._mask
+        base = self._base
+        end = min(end, self._end)
+        run = []
+        while base < end:
+            rudp_packet = slots[base & mask]
+            if rudp_packet is None or rudp_packet is _CONSUMED:
+                break
+            run.append(rudp_packet)
+            slots[base & mask] = None
+            base += 1
+        self._count -= len(run)
+
+        while base < self._end and slots[base & mask] is _CONSUMED:
+            slots[base & mask] = None
+            base += 1
+        self._base = base
+        return run
+
+    def pop_fragments(self, first, count):
+        """
+        Attempt to pop the fragments of a message, anywhere.
+        For the operation to succeed, all the fragments should reside
+        in the buffer. Their slots are marked as consumed, and the
+        base advances past any consumed slots it reaches.
+        Args:
+            first: The sequence number of the first fragment.
+            count: The number of fragments.
+        Returns:
+            Tuple of packet.Packet(s), ordered by increasing seqnum,
+            or None if operation was unsuccessful for any reason.
+        """
+        end = first + count
+        if first < self._base or end > self._end:
+            return None
+        slots = self._slots
+        mask = self._mask
+        if count == 1:
+            fragments = (slots[first & mask],)
+            if fragments[0] is None or fragments[0] is _CONSUMED:
+                return None
+        else:
+            fragments = tuple(slots[seqnum & mask] for seqnum in range(first, end))
+            for fragment in fragments:
+                if fragment is None or fragment is _CONSUMED:
+                    return None
+
+        for seqnum in range(first, end):
+            slots[seqnum & mask] = _CONSUMED
+        self._count -= count
+
+        base = self._base
+        while base < self._end and slots[base & mask] is _CONSUMED:
+            slots[base & mask] = None
+            base += 1
+        self._base = base
+        return fragments
+
+    def sack_blocks(self, start, max_blocks):
+        """
+        Describe the packets held beyond a given sequence number.
+        Args:
+            start: The lowest sequence number to report, as an
+                integer; usually the next expected seqnum.
+            max_blocks: The maximum number of blocks to report.
+        Returns:
+            Tuple of (start, end) tuples, ordered by increasing
+            seqnum, each covering the contiguous run of held
+            seqnums from start through end - 1.
+        """
+        slots = self._slots
+        mask = self._mask
+        blocks = []
+        seqnum = max(start, self._base)
+        while seqnum < self._end and len(blocks) < max_blocks:
+            if slots[seqnum & mask] is None:
+                seqnum += 1
+                continue
+            first = seqnum
+            while seqnum < self._end and slots[seqnum & mask] is not None:
+                seqnum += 1
+            blocks.append((first, seqnum))
+        return tuple(blocks)
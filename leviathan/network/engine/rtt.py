@@ -0,0 +1,79 @@
+"""Round-trip time estimation for RUDP connections."""
+
+from leviathan.network.engine import constants
+
+
+class RTTEstimator(object):
+
+    """
+    Jacobson/Karels estimator of the retransmission timeout.
+    Keeps a smoothed round-trip time and its mean deviation, and
+    derives the retransmission timeout (RTO) from them, as in
+    RFC 6298. Samples should only be taken from packets that were
+    transmitted exactly once (Karn's rule), since the ACK of a
+    retransmitted packet is ambiguous.
+    """
+
+    # Gains of the smoothed RTT and the RTT variance, respectively.
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+
+    # Weight of the RTT variance in the RTO.
+    K = 4
+
+    def __init__(
+        self,
+        initial_rto=constants.PACKET_TIMEOUT,
+        min_rto=constants.MIN_RTO,
+        max_rto=constants.MAX_RTO,
+        granularity=constants.TIMER_GRANULARITY
+    ):
+        """
+        Create a new estimator with no samples.
+        Args:
+            initial_rto: RTO used until the first sample, in seconds.
+            min_rto: Lower bound of the RTO, in seconds.
+            max_rto: Upper bound of the RTO, in seconds.
+            granularity: Granularity of the retransmission timers,
+                in seconds.
+        """
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.granularity = granularity
+        self.srtt = None
+        self.rttvar = None
+        self.rto = initial_rto
+
+    def __repr__(self):
+        return '{0}(srtt={1}, rttvar={2}, rto={3})'.format(
+            self.__class__.__name__,
+            self.srtt,
+            self.rttvar,
+            self.rto
+        )
+
+    def update(self, sample):
+        """
+        Feed a new round-trip time measurement and update the RTO.
+        Args:
+            sample: The measured round-trip time, in seconds.
+        """
+        if self.srtt is None:
+            self.srtt = sample
+            self.rttvar = sample / 2
+        else:
+            self.rttvar += self.BETA * (abs(self.srtt - sample) - self.rttvar)
+            self.srtt += self.ALPHA * (sample - self.srtt)
+
+        rto = self.srtt + max(self.granularity, self.K * self.rttvar)
+        self.rto = min(max(rto, self.min_rto), self.max_rto)
+
+    def backoff(self, timeout):
+        """
+        Return the timeout to use after a timeout expired.
+        Args:
+            timeout: The timeout that just expired, in seconds.
+        Returns:
+            The doubled timeout, bounded by the maximum RTO.
+        """
+        return min(2 * timeout, self.max_rto)
@@ -0,0 +1,161 @@
+"""
+Event loop adapters of the RUDP engine.
+The engine schedules its work on a clock: any object providing
+`seconds()`, the current time in seconds, and
+`callLater(delay, func, *args, **kwargs)`, which returns a handle
+with `active()` and `cancel()`. A clock may also provide
+`wall_seconds()`, the time of the wall clock in seconds since the
+epoch, to which ban expirations are compared; otherwise, `seconds()`
+should tell it. Twisted's reactor and twisted.internet.task.Clock
+are clocks as they are; AsyncioClock adapts an asyncio event loop.
+Classes:
+    AsyncioClock: Clock driven by an asyncio event loop.
+    LoopingCall: Repeats a call on every turn of a clock's loop.
+"""
+
+import asyncio
+import time
+
+
+class _AsyncioCall(object):
+
+    """Handle of a call scheduled by an AsyncioClock."""
+
+    __slots__ = ('_handle', 'func', 'args', 'kwargs')
+
+    def __init__(self, func, args, kwargs):
+        self._handle = None
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def active(self):
+        """Return True if the call has neither run nor been cancelled."""
+        return self._handle is not None
+
+    def cancel(self):
+        """Unschedule the call; cancelling an inactive one does nothing."""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _run(self):
+        """Run the call, once."""
+        self._handle = None
+        if self.kwargs is None:
+            self.func(*self.args)
+        else:
+            self.func(*self.args, **self.kwargs)
+
+
+class AsyncioClock(object):
+
+    """
+    Clock scheduling on an asyncio event loop, of any implementation,
+    such as uvloop.
+    It tells the time of the loop's monotonic clock, on which the
+    loop measures delays, so that timers are not disturbed when the
+    wall clock is set; the wall clock is only told for ban
+    expirations.
+    """
+
+    def __init__(self, loop=None):
+        """
+        Create a new clock.
+        Args:
+            loop: The asyncio event loop to schedule calls on; if
+                None, the current event loop.
+        """
+        self.loop = asyncio.get_event_loop() if loop is None else loop
+
+    def __repr__(self):
+        return '{0}({1})'.format(self.__class__.__name__, self.loop)
+
+    def seconds(self):
+        """Return the current time of the loop, in seconds."""
+        return self.loop.time()
+
+    @staticmethod
+    def wall_seconds():
+        """Return the current time, in seconds since the epoch."""
+        return time.time()
+
+    def callLater(self, delay, func, *args, **kwargs):
+        """
+        Schedule a call.
+        Args:
+            delay: Seconds until func is invoked; calls without
+                delay run on the next turn of the loop.
+            func: The callable to invoke.
+            args, kwargs: Arguments to invoke func with.
+        Returns:
+            A handle, which can be cancelled.
+        """
+        call = _AsyncioCall(func, args, kwargs or None)
+        if delay > 0:
+            call._handle = self.loop.call_later(delay, call._run)
+        else:
+            call._handle = self.loop.call_soon(call._run)
+        return call
+
+
+class LoopingCall(object):
+
+    """
+    Repeats a call on every turn of the event loop driving a clock,
+    until stopped; the subset of Twisted's LoopingCall the engine
+    uses, with no interval, on any clock.
+    """
+
+    def __init__(self, clock, func):
+        """
+        Create a new, stopped looping call.
+        Args:
+            clock: The clock to schedule the calls on.
+            func: The callable to repeat, without arguments.
+        """
+        self.clock = clock
+        self.func = func
+        self.running = False
+        self._call = None
+
+    def __repr__(self):
+        return '{0}({1}, running={2})'.format(
+            self.__class__.__name__,
+            self.func,
+            self.running
+        )
+
+    def start(self, now=True):
+        """
+        Start repeating the call.
+        Args:
+            now: If True, the first call is made at once; else, on
+                the next turn.
+        """
+        assert not self.running, 'Tried to start an already running LoopingCall.'
+        self.running = True
+        if now:
+            self._run()
+        else:
+            self._call = self.clock.callLater(0, self._run)
+
+    def stop(self):
+        """Stop repeating the call."""
+        assert self.running, 'Tried to stop a LoopingCall that was not running.'
+        self.running = False
+        if self._call is not None:
+            if self._call.active():
+                self._call.cancel()
+            self._call = None
+
+    def _run(self):
+        """Make the call, and schedule the next one unless stopped."""
+        self._call = None
+        try:
+            self.func()
+        except Exception:
+            self.running = False
+            raise
+        if self.running and self._call is None:
+            self._call = self.clock.callLater(0, self._run)
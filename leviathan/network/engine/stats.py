@@ -0,0 +1,180 @@
+"""
+Transport statistics of RUDP connections.
+Classes:
+    ConnectionStats: Counters and gauges of a connection.
+    AggregateStats: Totals over the connections of a multiplexer.
+"""
+
+
+class ConnectionStats(object):
+
+    """
+    Counters and gauges of a connection.
+    Counters only ever grow; the connection increments them as it
+    goes, so keeping them costs an addition per event. Gauges
+    describe the current state of the connection; they are
+    refreshed whenever the connection hands out its statistics.
+    """
+
+    __slots__ = (
+        'sent_bytes', 'sent_datagrams', 'sent_messages', 'received_bytes',
+        'received_datagrams', 'received_messages', 'retransmissions',
+        'duplicates_received', 'parity_sent', 'recovered_segments',
+        'srtt', 'rto', 'cwnd', 'bytes_in_flight', 'window',
+        'queued_messages', 'reorder_depth'
+    )
+
+    def __init__(self):
+        """Create new statistics, with all counters at zero."""
+        self.sent_bytes = 0
+        self.sent_datagrams = 0
+        self.sent_messages = 0
+        self.received_bytes = 0
+        self.received_datagrams = 0
+        self.received_messages = 0
+
+        # Retransmitted packets, and received packets that had
+        # already been received.
+        self.retransmissions = 0
+        self.duplicates_received = 0
+
+        # Forward error correction parity packets sent, and lost
+        # segments rebuilt from received ones.
+        self.parity_sent = 0
+        self.recovered_segments = 0
+
+        # Smoothed round-trip time, or None before a sample, and
+        # retransmission timeout, in seconds.
+        self.srtt = None
+        self.rto = 0
+
+        # Congestion window and bytes in flight, in bytes, packets in
+        # the send window, and messages queued for sending.
+        self.cwnd = 0
+        self.bytes_in_flight = 0
+        self.window = 0
+        self.queued_messages = 0
+
+        # Sequence numbers spanned by the reorder buffer, from the
+        # lowest one missing through the highest one received.
+        self.reorder_depth = 0
+
+    def __repr__(self):
+        return (
+            '{0}(sent_datagrams={1}, received_datagrams={2}, '
+            'retransmissions={3}, srtt={4}, window={5})'
+        ).format(
+            self.__class__.__name__,
+            self.sent_datagrams,
+            self.received_datagrams,
+            self.retransmissions,
+            self.srtt,
+            self.window
+        )
+
+
+class AggregateStats(ConnectionStats):
+
+    """
+    Totals of the statistics of many connections.
+    Counters sum over all connections, closed ones included; gauges
+    sum over live connections, except for the round-trip time and
+    the timeout, which are the worst among them. An instance is
+    meant to be refreshed in place, so that polling it does not
+    allocate any objects.
+    """
+
+    __slots__ = ('connections',)
+
+    def __init__(self):
+        """Create new, empty totals."""
+        super(AggregateStats, self).__init__()
+        self.connections = 0
+
+    def __repr__(self):
+        return '{0}(connections={1}, sent_datagrams={2}, received_datagrams={3})'.format(
+            self.__class__.__name__,
+            self.connections,
+            self.sent_datagrams,
+            self.received_datagrams
+        )
+
+    def add_counters(self, stats):
+        """
+        Add the counters of other statistics to these.
+        Args:
+            stats: A ConnectionStats.
+        """
+        self.sent_bytes += stats.sent_bytes
+        self.sent_datagrams += stats.sent_datagrams
+        self.sent_messages += stats.sent_messages
+        self.received_bytes += stats.received_bytes
+        self.received_datagrams += stats.received_datagrams
+        self.received_messages += stats.received_messages
+        self.retransmissions += stats.retransmissions
+        self.duplicates_received += stats.duplicates_received
+        self.parity_sent += stats.parity_sent
+        self.recovered_segments += stats.recovered_segments
+
+    def add(self, stats):
+        """
+        Account for a live connection.
+        Args:
+            stats: The refreshed ConnectionStats of the connection.
+        """
+        self.add_counters(stats)
+        self.connections += 1
+        if stats.srtt is not None and (self.srtt is None or stats.srtt > self.srtt):
+            self.srtt = stats.srtt
+        if stats.rto > self.rto:
+            self.rto = stats.rto
+        self.cwnd += stats.cwnd
+        self.bytes_in_flight += stats.bytes_in_flight
+        self.window += stats.window
+        self.queued_messages += stats.queued_messages
+        self.reorder_depth += stats.reorder_depth
+
+    def merge(self, other):
+        """
+        Account for the connections of other totals, such as those of
+        another multiplexer.
+        Args:
+            other: An AggregateStats.
+        """
+        self.add_counters(other)
+        self.connections += other.connections
+        if other.srtt is not None and (self.srtt is None or other.srtt > self.srtt):
+            self.srtt = other.srtt
+        if other.rto > self.rto:
+            self.rto = other.rto
+        self.cwnd += other.cwnd
+        self.bytes_in_flight += other.bytes_in_flight
+        self.window += other.window
+        self.queued_messages += other.queued_messages
+        self.reorder_depth += other.reorder_depth
+
+    def reset(self, closed):
+        """
+        Start over from the totals of closed connections.
+        Args:
+            closed: AggregateStats holding the counters of the
+                closed connections.
+        """
+        self.sent_bytes = closed.sent_bytes
+        self.sent_datagrams = closed.sent_datagrams
+        self.sent_messages = closed.sent_messages
+        self.received_bytes = closed.received_bytes
+        self.received_datagrams = closed.received_datagrams
+        self.received_messages = closed.received_messages
+        self.retransmissions = closed.retransmissions
+        self.duplicates_received = closed.duplicates_received
+        self.parity_sent = closed.parity_sent
+        self.recovered_segments = closed.recovered_segments
+        self.connections = 0
+        self.srtt = None
+        self.rto = 0
+        self.cwnd = 0
+        self.bytes_in_flight = 0
+        self.window = 0
+        self.queued_messages = 0
+        self.reorder_depth = 0
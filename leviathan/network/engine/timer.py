@@ -0,0 +1,289 @@
+"""
+Hierarchical timer wheel shared by RUDP connections.
+Classes:
+    Timer: Handle of a single scheduled callback.
+    TimerWheel: Fixed-granularity timer wheel, driven by one
+        call of a clock regardless of the number of pending timers.
+"""
+
+import math
+
+from leviathan.network.engine import constants
+
+# Each level of the wheel has 2**_LEVEL_BITS slots; with 4 levels
+# and a 10ms granularity, the wheel spans more than a year.
+_LEVEL_BITS = 8
+_LEVEL_SIZE = 1 << _LEVEL_BITS
+_LEVEL_MASK = _LEVEL_SIZE - 1
+_LEVEL_COUNT = 4
+_WHEEL_SPAN = 1 << (_LEVEL_BITS * _LEVEL_COUNT)
+
+# Tolerance used when converting seconds to ticks, so that float
+# rounding never delays a timer by a whole tick.
+_EPSILON = 1e-6
+
+
+class Timer(object):
+
+    """
+    A callback scheduled on a TimerWheel.
+    The interface mirrors the relevant subset of Twisted's
+    DelayedCall, so a Timer can be used wherever a DelayedCall
+    would only be activated, reset or cancelled.
+    """
+
+    __slots__ = ('_wheel', '_slot', 'expires', 'func', 'args', 'kwargs')
+
+    def __init__(self, wheel, expires, func, args, kwargs):
+        """
+        Create a new (not yet scheduled) timer.
+        Args:
+            wheel: The owning TimerWheel.
+            expires: Tick on which the timer expires, as an integer.
+            func: Callable to invoke upon expiration.
+            args: Positional arguments of func, as a tuple.
+            kwargs: Keyword arguments of func, as a dict, or None.
+        """
+        self._wheel = wheel
+        self._slot = None
+        self.expires = expires
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def __repr__(self):
+        return '{0}({1}, {2}, {3})'.format(
+            self.__class__.__name__,
+            self.expires,
+            self.func,
+            self.active()
+        )
+
+    def active(self):
+        """Return True if the timer has neither fired nor been cancelled."""
+        return self._slot is not None
+
+    def cancel(self):
+        """
+        Unschedule the timer, in O(1).
+        Cancelling an inactive timer has no effect.
+        """
+        if self._slot is not None:
+            self._wheel._remove(self)
+
+    def reset(self, delay):
+        """
+        Reschedule the timer to expire `delay` seconds from now.
+        Args:
+            delay: Seconds until expiration, as a float.
+        """
+        self.cancel()
+        self.expires = self._wheel._expiry_tick(delay)
+        self._wheel._add(self)
+
+
+class TimerWheel(object):
+
+    """
+    A hierarchical timer wheel.
+    Time is divided into ticks of fixed granularity. Timers are
+    hashed into the slots of the lowest level that can hold them
+    and cascade to lower levels as time advances, so that both
+    scheduling and cancelling cost O(1). The wheel is driven by a
+    single call of its clock, which is only active while timers are
+    pending. Timers never fire early; they may fire up to one
+    granularity late.
+    """
+
+    def __init__(self, granularity=constants.TIMER_GRANULARITY, clock=None):
+        """
+        Create a new, empty timer wheel.
+        Args:
+            granularity: Duration of a tick, in seconds.
+            clock: Provider of `seconds` and `callLater`, such as
+                a reactor, a twisted.internet.task.Clock or a
+                scheduler.AsyncioClock. If None, the global Twisted
+                reactor is used.
+        """
+        if clock is None:
+            from twisted.internet import reactor as clock
+        self.granularity = granularity
+        self._clock = clock
+        self._origin = self._clock.seconds()
+        self._next_tick = 0
+        self._levels = tuple(
+            [{} for _ in range(_LEVEL_SIZE)]
+            for _ in range(_LEVEL_COUNT)
+        )
+        self._count = 0
+        self._driver = None
+        self._running = False
+
+    def __len__(self):
+        """Return the number of pending timers."""
+        return self._count
+
+    @property
+    def clock(self):
+        """Get the clock driving the wheel."""
+        return self._clock
+
+    def seconds(self):
+        """Return the current time of the clock driving the wheel."""
+        return self._clock.seconds()
+
+    def wall_seconds(self):
+        """
+        Return the time of the wall clock, in seconds since the epoch,
+        to which ban expirations are compared. Clocks without a
+        `wall_seconds` method, such as Twisted's, tell it by `seconds`.
+        """
+        wall_seconds = getattr(self._clock, 'wall_seconds', None)
+        if wall_seconds is None:
+            return self._clock.seconds()
+        return wall_seconds()
+
+    def call_later(self, delay, func, *args, **kwargs):
+        """
+        Schedule a callback, in O(1).
+        Args:
+            delay: Seconds until func is invoked, as a float.
+            func: The callable to invoke.
+            args, kwargs: Arguments to invoke func with.
+        Returns:
+            A Timer handle, which can be cancelled or reset.
+        """
+        # Most callbacks take no keyword arguments; not keeping the
+        # empty dict saves about 250 bytes per pending timer.
+        timer = Timer(
+            self,
+            self._expiry_tick(delay),
+            func,
+            args,
+            kwargs or None
+        )
+        self._add(timer)
+        return timer
+
+    def stop(self):
+        """Cancel all pending timers and stop driving the wheel."""
+        for level in self._levels:
+            for slot in level:
+                for timer in slot:
+                    timer._slot = None
+                slot.clear()
+        self._count = 0
+        self._stop_driver()
+
+    def _current_tick(self):
+        """Return the tick the clock is currently in."""
+        elapsed = self._clock.seconds() - self._origin
+        return int(elapsed / self.granularity + _EPSILON)
+
+    def _expiry_tick(self, delay):
+        """Return the first tick on which `delay` has fully elapsed."""
+        deadline = self._clock.seconds() - self._origin + delay
+        return int(math.ceil(deadline / self.granularity - _EPSILON))
+
+    def _add(self, timer):
+        """Hash a timer into the appropriate slot."""
+        if not self._count and self._driver is None and not self._running:
+            # All slots are empty; fast-forward over the idle period.
+            self._next_tick = max(self._next_tick, self._current_tick())
+
+        expires = timer.expires
+        delta = expires - self._next_tick
+        if delta < 0:
+            slot = self._levels[0][self._next_tick & _LEVEL_MASK]
+        else:
+            level = 0
+            while (
+                level < _LEVEL_COUNT - 1 and
+                delta >= 1 << (_LEVEL_BITS * (level + 1))
+            ):
+                level += 1
+            if delta >= _WHEEL_SPAN:
+                # Clamp timers beyond the span of the wheel.
+                expires = self._next_tick + _WHEEL_SPAN - 1
+            index = (expires >> (_LEVEL_BITS * level)) & _LEVEL_MASK
+            slot = self._levels[level][index]
+
+        slot[timer] = None
+        timer._slot = slot
+        self._count += 1
+        self._start_driver()
+
+    def _remove(self, timer):
+        """Unhash a timer from its slot."""
+        del timer._slot[timer]
+        timer._slot = None
+        self._count -= 1
+        if not self._count:
+            self._stop_driver()
+
+    def _cascade(self, level):
+        """
+        Redistribute the timers of the current slot of a level
+        into the lower levels.
+        Returns:
+            The index of the cascaded slot.
+        """
+        index = (self._next_tick >> (_LEVEL_BITS * level)) & _LEVEL_MASK
+        slot = self._levels[level][index]
+        if slot:
+            timers = tuple(slot)
+            slot.clear()
+            self._count -= len(timers)
+            for timer in timers:
+                self._add(timer)
+        return index
+
+    def _run(self):
+        """Fire all timers that expired since the last run."""
+        self._running = True
+        current_tick = self._current_tick()
+        level0 = self._levels[0]
+        while self._count and self._next_tick <= current_tick:
+            index = self._next_tick & _LEVEL_MASK
+            if not index:
+                level = 1
+                while level < _LEVEL_COUNT and not self._cascade(level):
+                    level += 1
+            self._next_tick += 1
+
+            slot = level0[index]
+            if not slot:
+                continue
+            # Detach the slot, so that timers scheduled by callbacks
+            # go to a fresh one, while timers cancelled by callbacks
+            # are still removed from this one.
+            level0[index] = {}
+            for timer in tuple(slot):
+                if timer._slot is slot:
+                    del slot[timer]
+                    timer._slot = None
+                    self._count -= 1
+                    if timer.kwargs is None:
+                        timer.func(*timer.args)
+                    else:
+                        timer.func(*timer.args, **timer.kwargs)
+
+        if not self._count:
+            self._next_tick = max(self._next_tick, current_tick + 1)
+        self._running = False
+        self._driver = None
+        self._start_driver()
+
+    def _start_driver(self):
+        """Ensure a call of the clock is pending for the next tick boundary."""
+        if self._driver is None and self._count and not self._running:
+            boundary = self._origin + self._next_tick * self.granularity
+            delay = max(0, boundary - self._clock.seconds())
+            self._driver = self._clock.callLater(delay, self._run)
+
+    def _stop_driver(self):
+        """Cancel the pending call of the clock, if any."""
+        if self._driver is not None:
+            if self._driver.active():
+                self._driver.cancel()
+            self._driver = None
@@ -0,0 +1,148 @@
+"""Circular send window of in-flight packets."""
+
+import collections
+
+from leviathan.network.engine import constants
+
+
+class SendWindow(collections.Container, collections.Sized):
+
+    """
+    A fixed-capacity ring of in-flight packets, indexed by sequence
+    number.
+    The window spans `capacity` sequence numbers from the lowest
+    packet it holds. Packets are stored in slot `seqnum % capacity`
+    of a list allocated once, so that storing, looking up and
+    retiring a packet cost O(1) and allocate nothing.
+    """
+
+    def __init__(self, capacity=constants.WINDOW_SIZE):
+        """
+        Create a new (empty) SendWindow.
+        Args:
+            capacity: Number of slots.
+        Raises:
+            ValueError: The capacity is not positive.
+        """
+        if capacity <= 0:
+            raise ValueError('Capacity must be positive.')
+        self._slots = [None] * capacity
+        self._capacity = capacity
+        self._base = 0
+        self._end = 0
+        self._count = 0
+
+    def __contains__(self, sequence_number):
+        """
+        Check whether the window holds a packet with given seqnum.
+        Args:
+            sequence_number: The sequence_number, as an integer.
+        """
+        return (
+            self._base <= sequence_number < self._end and
+            self._slots[sequence_number % self._capacity] is not None
+        )
+
+    def __len__(self):
+        """Return the number of packets in the window."""
+        return self._count
+
+    def __iter__(self):
+        """Return iterator over the held seqnums, in increasing order."""
+        slots = self._slots
+        capacity = self._capacity
+        for seqnum in range(self._base, self._end):
+            if slots[seqnum % capacity] is not None:
+                yield seqnum
+
+    def __getitem__(self, sequence_number):
+        """
+        Return the packet with given seqnum.
+        Args:
+            sequence_number: The sequence_number, as an integer.
+        Raises:
+            KeyError: No such packet is held.
+        """
+        item = None
+        if self._base <= sequence_number < self._end:
+            item = self._slots[sequence_number % self._capacity]
+        if item is None:
+            raise KeyError(sequence_number)
+        return item
+
+    def __setitem__(self, sequence_number, item):
+        """
+        Store a packet under a new seqnum.
+        Args:
+            sequence_number: The sequence_number, as an integer.
+            item: The packet, or any object standing for it.
+        Raises:
+            ValueError: The seqnum is already held, or lies beyond
+                the capacity of the window.
+        """
+        if not self._count:
+            self._base = self._end = sequence_number
+        elif not self._base <= sequence_number < self._base + self._capacity:
+            raise ValueError('Seqnum {0} outside window.'.format(sequence_number))
+        index = sequence_number % self._capacity
+        if self._slots[index] is not None:
+            raise ValueError('Seqnum {0} already held.'.format(sequence_number))
+        self._slots[index] = item
+        self._count += 1
+        if sequence_number >= self._end:
+            self._end = sequence_number + 1
+
+    @property
+    def capacity(self):
+        """Get the number of slots."""
+        return self._capacity
+
+    @property
+    def lowest(self):
+        """Get the lowest seqnum held, or None if empty."""
+        return self._base if self._count else None
+
+    def pop(self, sequence_number, default=None):
+        """
+        Remove the packet with given seqnum.
+        Args:
+            sequence_number: The sequence_number, as an integer.
+            default: Value returned if no such packet is held.
+        Returns:
+            The removed packet, or `default`.
+        """
+        if not self._base <= sequence_number < self._end:
+            return default
+        slots = self._slots
+        capacity = self._capacity
+        index = sequence_number % capacity
+        item = slots[index]
+        if item is None:
+            return default
+        slots[index] = None
+        self._count -= 1
+        if not self._count:
+            self._base = self._end
+        elif sequence_number == self._base:
+            base = sequence_number + 1
+            while slots[base % capacity] is None:
+                base += 1
+            self._base = base
+        return item
+
+    def values(self):
+        """Return iterator over the held packets, by increasing seqnum."""
+        slots = self._slots
+        capacity = self._capacity
+        for seqnum in range(self._base, self._end):
+            item = slots[seqnum % capacity]
+            if item is not None:
+                yield item
+
+    def clear(self):
+        """Remove all packets, keeping the slots allocated."""
+        slots = self._slots
+        for index in range(self._capacity):
+            slots[index] = None
+        self._base = self._end
+        self._count = 0
@@ -0,0 +1,461 @@
+"""
+Sharding of a UDP port over worker processes.
+Classes:
+    WorkerPool: Launches worker processes sharing a port, and
+        aggregates their reports.
+    WorkerControl: Worker side of the control channel.
+Functions:
+    bind_reuseport: Bind a UDP socket sharing its port.
+    run_worker: Entry point of a worker process.
+"""
+
+import collections
+import ipaddress
+import multiprocessing
+import os
+import select
+import signal
+import socket
+import time
+
+from leviathan.network.engine import aiorudp, constants, stats
+
+# Commands of the launcher to its workers, sent with a network and
+# the time the rule expires at, and the message of worker reports.
+_BAN = 'ban'
+_ALLOW = 'allow'
+_REMOVE = 'remove'
+_STOP = 'stop'
+_REPORT = 'report'
+
+# Latest state of a worker: its number of connections and of ban
+# and allow rules, and the stats.AggregateStats of its multiplexer.
+WorkerReport = collections.namedtuple(
+    'WorkerReport',
+    ('connections', 'ip_rules', 'stats')
+)
+
+
+def bind_reuseport(host, port):
+    """
+    Bind a non-blocking UDP socket with SO_REUSEPORT.
+    Args:
+        host: The IPv4/IPv6 address to bind to.
+        port: The port to bind to; 0 picks a free one.
+    Returns:
+        The bound socket.socket.
+    Raises:
+        OSError: The platform lacks SO_REUSEPORT, or binding failed.
+    """
+    if not hasattr(socket, 'SO_REUSEPORT'):
+        raise OSError('SO_REUSEPORT is not supported on this platform.')
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_DGRAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((host, port))
+    except OSError:
+        sock.close()
+        raise
+    sock.setblocking(False)
+    return sock
+
+
+class WorkerControl(object):
+
+    """
+    Worker side of the control channel to the launcher.
+    Each poll applies the pending ban commands to the worker's
+    multiplexer and sends a WorkerReport, unless the channel is full,
+    as when the launcher is busy; the worker's event loop is never
+    blocked on the launcher. The worker shuts down when told to
+    stop, or when the launcher is gone.
+    """
+
+    def __init__(self, multiplexer, channel, stop):
+        """
+        Create a new control.
+        Args:
+            multiplexer: The multiplexer of the worker.
+            channel: The worker's end of the control pipe, as a
+                multiprocessing Connection.
+            stop: Callable stopping the worker's event loop.
+        """
+        self.multiplexer = multiplexer
+        self._channel = channel
+        self._stop = stop
+        self.stopped = False
+
+    def poll(self):
+        """Apply pending commands, then report, unless stopped."""
+        try:
+            while not self.stopped and self._channel.poll():
+                self._apply(*self._channel.recv())
+            if not self.stopped and self._is_writable():
+                multiplexer = self.multiplexer
+                self._channel.send((
+                    _REPORT,
+                    WorkerReport(
+                        len(multiplexer),
+                        len(multiplexer.ip_filter),
+                        multiplexer.stats
+                    )
+                ))
+        except (EOFError, OSError):
+            self.shutdown()
+
+    def _is_writable(self):
+        """
+        Check whether a report can be sent without blocking; reports
+        are much smaller than the space a writable channel has left.
+        """
+        return bool(select.select((), (self._channel,), (), 0)[1])
+
+    def shutdown(self):
+        """Shutdown the multiplexer and stop the event loop, once."""
+        if not self.stopped:
+            self.stopped = True
+            self.multiplexer.shutdown()
+            self._stop()
+
+    def _apply(self, command, network=None, until=None):
+        """Apply a command of the launcher."""
+        ip_filter = self.multiplexer.ip_filter
+        if command == _BAN:
+            ip_filter.ban(network, until)
+        elif command == _ALLOW:
+            ip_filter.allow(network, until)
+        elif command == _REMOVE:
+            try:
+                ip_filter.remove(network)
+            except KeyError:
+                pass
+        elif command == _STOP:
+            self.shutdown()
+
+
+def run_worker(index, sock, channel, multiplexer_factory, report_interval):
+    """
+    Serve a shared socket with a new multiplexer, until the launcher
+    stops the worker. Twisted multiplexers run on the reactor, and
+    asyncio ones on the loop they were created for.
+    Interrupts are left to the launcher, which stops its workers.
+    Args:
+        index: The index of the worker in the pool.
+        sock: The socket.socket bound by the launcher.
+        channel: The worker's end of the control pipe.
+        multiplexer_factory: Callable returning a new
+            rudp.ConnectionMultiplexer or
+            aiorudp.AsyncioConnectionMultiplexer, given the index.
+        report_interval: Seconds between reports.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    multiplexer = multiplexer_factory(index)
+    if isinstance(multiplexer, aiorudp.AsyncioConnectionMultiplexer):
+        _serve_asyncio(multiplexer, sock, channel, report_interval)
+    else:
+        _serve_twisted(multiplexer, sock, channel, report_interval)
+
+
+def _serve_twisted(multiplexer, sock, channel, report_interval):
+    """Serve a socket on the Twisted reactor, until stopped."""
+    from twisted.internet import reactor, task
+
+    reactor.adoptDatagramPort(sock.fileno(), sock.family, multiplexer)
+    sock.close()
+    control = WorkerControl(multiplexer, channel, reactor.stop)
+    task.LoopingCall(control.poll).start(report_interval)
+    reactor.run()
+
+
+def _serve_asyncio(multiplexer, sock, channel, report_interval):
+    """Serve a socket on the multiplexer's event loop, until stopped."""
+    loop = multiplexer.timer_wheel.clock.loop
+    loop.run_until_complete(
+        aiorudp.create_batching_endpoint(
+            lambda: multiplexer,
+            sock=sock,
+            loop=loop
+        )
+    )
+    control = WorkerControl(multiplexer, channel, loop.stop)
+
+    def poll():
+        control.poll()
+        if not control.stopped:
+            loop.call_later(report_interval, poll)
+
+    poll()
+    try:
+        loop.run_forever()
+    finally:
+        loop.close()
+
+
+class WorkerPool(object):
+
+    """
+    Launcher of worker processes sharing a UDP port.
+    A multiplexer on a single event loop is bound to one core; a pool
+    runs one per worker process instead, each on its own socket
+    bound to the same port with SO_REUSEPORT. The kernel spreads
+    datagrams over the sockets by a hash of their addresses, so that
+    a given remote address always reaches the same worker. All
+    sockets are bound before any worker starts, and stay open in the
+    launcher: a worker that dies is restarted on the same socket,
+    and the addresses it served keep reaching it.
+    Workers are spawned afresh rather than forked, so that they do
+    not inherit the launcher's event loop; the multiplexer factory
+    must thus be picklable, such as a module-level function, and
+    the launcher's main module must only start the pool under an
+    `if __name__ == '__main__'` guard.
+    Bans and exemptions are sent to every worker, and replayed to
+    restarted ones. Each worker limits and caps source IPs on its
+    own, if it uses admission control.
+    """
+
+    def __init__(
+        self,
+        multiplexer_factory,
+        port,
+        host='0.0.0.0',
+        workers=None,
+        report_interval=constants.WORKER_REPORT_INTERVAL
+    ):
+        """
+        Create a new pool, without starting it.
+        Args:
+            multiplexer_factory: Picklable callable returning a new
+                rudp.ConnectionMultiplexer, or an
+                aiorudp.AsyncioConnectionMultiplexer, given the index
+                of the worker.
+            port: The UDP port shared by the workers; 0 picks a
+                free one on start.
+            host: The IPv4/IPv6 address to bind to.
+            workers: Number of worker processes; if None, one per
+                CPU.
+            report_interval: Seconds between reports of a worker.
+        """
+        self.multiplexer_factory = multiplexer_factory
+        self.port = port
+        self.host = host
+        self.workers = workers or os.cpu_count() or 1
+        self.report_interval = report_interval
+        self.restarts = 0
+        self._context = multiprocessing.get_context('spawn')
+        self._sockets = []
+        self._processes = []
+        self._channels = []
+        self._reports = []
+
+        # Commands setting the current rule on each network, in the
+        # order they were issued, to replay to restarted workers.
+        self._rules = collections.OrderedDict()
+
+        # Counters of the workers that exited, and totals over all
+        # workers, refreshed in place.
+        self._retired_stats = stats.AggregateStats()
+        self._stats = stats.AggregateStats()
+
+    def __repr__(self):
+        return '{0}(host={1}, port={2}, workers={3})'.format(
+            self.__class__.__name__,
+            self.host,
+            self.port,
+            self.workers
+        )
+
+    @property
+    def reports(self):
+        """
+        Get the latest WorkerReport of each worker, or None for the
+        workers that have not reported since they started.
+        """
+        return list(self._reports)
+
+    @property
+    def connections(self):
+        """Get the number of connections of all workers."""
+        return sum(
+            report.connections
+            for report in self._reports
+            if report is not None
+        )
+
+    @property
+    def stats(self):
+        """
+        Get the stats.AggregateStats of all workers, as of their
+        latest reports. Counters include those of exited workers.
+        """
+        aggregate = self._stats
+        aggregate.reset(self._retired_stats)
+        for report in self._reports:
+            if report is not None:
+                aggregate.merge(report.stats)
+        return aggregate
+
+    def start(self):
+        """
+        Bind the sockets and start the workers.
+        Raises:
+            OSError: The sockets cannot be bound.
+        """
+        for _ in range(self.workers):
+            sock = bind_reuseport(self.host, self.port)
+            self.port = sock.getsockname()[1]
+            self._sockets.append(sock)
+        for index in range(self.workers):
+            self._processes.append(None)
+            self._channels.append(None)
+            self._reports.append(None)
+            self._spawn(index)
+
+    def poll(self):
+        """
+        Collect the reports of the workers, and restart the workers
+        that exited. Meant to be called periodically, such as every
+        server tick; it never blocks.
+        """
+        for index, channel in enumerate(self._channels):
+            try:
+                while channel.poll():
+                    message, report = channel.recv()
+                    if message == _REPORT:
+                        self._reports[index] = report
+            except (EOFError, OSError):
+                pass
+            if not self._processes[index].is_alive():
+                self._restart(index)
+
+    def stop(self, timeout=constants.WORKER_STOP_TIMEOUT):
+        """
+        Stop the workers, killing those that do not exit in time,
+        and close the sockets.
+        Args:
+            timeout: Seconds to wait for the workers to exit.
+        """
+        self._broadcast((_STOP,))
+        deadline = time.monotonic() + timeout
+        for process in self._processes:
+            process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        for channel in self._channels:
+            channel.close()
+        for sock in self._sockets:
+            sock.close()
+        self._processes = []
+        self._channels = []
+        self._reports = []
+        self._sockets = []
+
+    def ban_ip(self, ip_address, duration=None):
+        """
+        Ban an IP address or network in all workers.
+        Args:
+            ip_address: a `String` IP address (without port), or
+                network in CIDR notation.
+            duration: Seconds until the ban expires, or None if it
+                never does.
+        Raises:
+            ValueError: The address is malformed.
+        """
+        self._set_rule(_BAN, ip_address, duration)
+
+    def allow_ip(self, ip_address, duration=None):
+        """
+        Exempt an IP address or network from the bans of the larger
+        networks it is part of, in all workers.
+        Args:
+            ip_address: a `String` IP address (without port), or
+                network in CIDR notation.
+            duration: Seconds until the exemption expires, or None if
+                it never does.
+        Raises:
+            ValueError: The address is malformed.
+        """
+        self._set_rule(_ALLOW, ip_address, duration)
+
+    def remove_ip_ban(self, ip_address):
+        """
+        Remove the ban, or exemption, of an IP address or network in
+        all workers.
+        Args:
+            ip_address: a `String` IP address (without port), or
+                network in CIDR notation.
+        """
+        try:
+            network = self._normalize(ip_address)
+        except ValueError:
+            return
+        self._rules.pop(network, None)
+        self._broadcast((_REMOVE, network))
+
+    @staticmethod
+    def _normalize(ip_address):
+        """Return a network in CIDR notation, without host bits."""
+        try:
+            return str(ipaddress.ip_network(ip_address, strict=False))
+        except (TypeError, ValueError):
+            raise ValueError('Bad network: {0}.'.format(ip_address))
+
+    def _set_rule(self, command, ip_address, duration):
+        """
+        Send a rule to all workers, and keep it for restarted ones.
+        Expirations are sent as times of the wall clock, to which
+        the workers compare ban expirations.
+        """
+        network = self._normalize(ip_address)
+        until = None
+        if duration is not None:
+            until = time.time() + duration
+        self._rules.pop(network, None)
+        self._rules[network] = (command, network, until)
+        self._broadcast(self._rules[network])
+
+    def _broadcast(self, command):
+        """Send a command to all workers; dead ones get none."""
+        for channel in self._channels:
+            try:
+                channel.send(command)
+            except OSError:
+                pass
+
+    def _spawn(self, index):
+        """Start the worker of a socket, and replay the live rules to it."""
+        channel, worker_channel = self._context.Pipe()
+        process = self._context.Process(
+            target=run_worker,
+            args=(
+                index,
+                self._sockets[index],
+                worker_channel,
+                self.multiplexer_factory,
+                self.report_interval
+            ),
+            name='leviathan-worker-{0}'.format(index),
+            daemon=True
+        )
+        process.start()
+        worker_channel.close()
+        now = time.time()
+        for network, command in list(self._rules.items()):
+            until = command[2]
+            if until is not None and until <= now:
+                del self._rules[network]
+            else:
+                channel.send(command)
+        self._processes[index] = process
+        self._channels[index] = channel
+
+    def _restart(self, index):
+        """Restart an exited worker, keeping its last counters."""
+        report = self._reports[index]
+        if report is not None:
+            self._retired_stats.add_counters(report.stats)
+        self._reports[index] = None
+        self._channels[index].close()
+        self.restarts += 1
+        self._spawn(index)
@@ -1,24 +1,76 @@
 from logzero import logger
 import mock
-from leviathan.network.engine import connection, rudp
+from leviathan.network.engine import aiorudp, connection, workers
+
+
+def make_connection_multiplexer(index=None):
+    # module-level, so that worker processes can be spawned with it
+    connection_factory = mock.Mock(spec_set=connection.ConnectionFactory)
+    return aiorudp.AsyncioConnectionMultiplexer(
+        connection_factory,
+        '123.45.67.89',
+        logger=logger
+    )
 
 
 class NetworkInterface:
 
-    def __init__(self):
+    def __init__(self, worker_processes=None):
+        # worker_processes: if None, the interface serves its port on
+        # the server loop; else it launches that many worker
+        # processes sharing the port, 0 meaning one per CPU
         print('interface initialized')
-        connection_factory = mock.Mock(spec_set=connection.ConnectionFactory)
-        self.connection_multiplexer = rudp.ConnectionMultiplexer(
-            connection_factory,
-            '123.45.67.89',
-            logger=logger
+        self.worker_processes = worker_processes
+        self.connection_multiplexer = None
+        self.worker_pool = None
+        if worker_processes is None:
+            self.connection_multiplexer = make_connection_multiplexer()
+        else:
+            self.worker_pool = workers.WorkerPool(
+                make_connection_multiplexer,
+                19132,
+                workers=worker_processes
+            )
+
+    async def start(self, host='0.0.0.0', port=19132):
+        if self.worker_pool is not None:
+            self.worker_pool.host = host
+            self.worker_pool.port = port
+            self.worker_pool.start()
+            return
+        loop = self.connection_multiplexer.timer_wheel.clock.loop
+        await aiorudp.create_batching_endpoint(
+            lambda: self.connection_multiplexer,
+            local_addr=(host, port),
+            loop=loop
         )
 
     def process(self):
         print('process is ticking')
+        if self.worker_pool is not None:
+            # collect worker reports, and restart dead workers
+            self.worker_pool.poll()
+
+    def block_address(self, address, timeout=None):
+        if self.worker_pool is not None:
+            self.worker_pool.ban_ip(address, timeout)
+        else:
+            self.connection_multiplexer.ban_ip(address, timeout)
+
+    def unblock_address(self, address):
+        if self.worker_pool is not None:
+            self.worker_pool.remove_ip_ban(address)
+        else:
+            self.connection_multiplexer.remove_ip_ban(address)
 
     def shutdown(self):
-        self.connection_multiplexer.shutdown()
+        if self.worker_pool is not None:
+            self.worker_pool.stop()
+        else:
+            self.connection_multiplexer.shutdown()
 
     def emergency_shutdown(self):
-        self.connection_multiplexer.shutdown()
+        if self.worker_pool is not None:
+            self.worker_pool.stop(timeout=0)
+        else:
+            self.connection_multiplexer.shutdown()
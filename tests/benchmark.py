@@ -2,8 +2,11 @@
 
 import collections
 import random
+import sys
 import time
 
+from twisted.internet import reactor
+
 from leviathan.network.engine import rudp, constants, connection
 
 
@@ -51,19 +54,19 @@ class BenchmarkLocalFullDuplex(object):
             self.relay_addr
         )
 
-        self.socket_handle = connection.REACTOR.listenUDP(
+        self.socket_handle = reactor.listenUDP(
             port=self.relay_addr[1],
             protocol=cm,
             interface=self.relay_addr[0]
         )
 
     def run(self, repetitions, timeout):
-        connection.REACTOR.callLater(timeout, self.stop)
+        reactor.callLater(timeout, self.stop)
         self.stuff_connections(repetitions)
-        connection.REACTOR.run()
+        reactor.run()
 
     def packet_from_repetition(self, rep):
-        return str(rep)
+        return str(rep).encode()
 
     def stuff_connections(self, repetitions):
         for i in range(repetitions):
@@ -71,13 +74,13 @@ class BenchmarkLocalFullDuplex(object):
             self.con2.send_message(self.packet_from_repetition(i))
 
     def stop(self):
-        connection.REACTOR.stop()
+        reactor.stop()
 
 
 class BenchmarkLocalFullDuplexBigPacket(
     BenchmarkLocalFullDuplex
 ):
-    big_message = constants.UDP_SAFE_SEGMENT_SIZE * 'a'
+    big_message = constants.UDP_SAFE_SEGMENT_SIZE * b'a'
 
     def packet_from_repetition(self, rep):
         return self.big_message
@@ -86,7 +89,7 @@ class BenchmarkLocalFullDuplexBigPacket(
 class BenchmarkLocalFullDuplexOversizedPacket(
     BenchmarkLocalFullDuplex
 ):
-    oversized_message = 20 * constants.UDP_SAFE_SEGMENT_SIZE * 'a'
+    oversized_message = 20 * constants.UDP_SAFE_SEGMENT_SIZE * b'a'
 
     def packet_from_repetition(self, rep):
         return self.oversized_message
@@ -106,12 +109,30 @@ class BadConnectionMultiplexer(rudp.ConnectionMultiplexer):
             super(BadConnectionMultiplexer, self).send_datagram(datagram, addr)
 
 
+# Benchmark class and repetitions, by scenario name.
+BENCHMARKS = {
+    'small': (BenchmarkLocalFullDuplex, 20000),
+    'big': (BenchmarkLocalFullDuplexBigPacket, 20000),
+    'oversized': (BenchmarkLocalFullDuplexOversizedPacket, 2000),
+}
+
+
 def main():
-    cf = connection.CryptoConnectionFactory(StubHandlerFactory())
+    """
+    Run a benchmark scenario.
+    Usage: benchmark.py [small|big|oversized] [send budget]
+    """
+    scenario = sys.argv[1] if len(sys.argv) > 1 else 'big'
+    benchmark_class, repetitions = BENCHMARKS[scenario]
+
+    cf = connection.ConnectionFactory(StubHandlerFactory())
     cm = BadConnectionMultiplexer(cf, '127.0.0.1', relaying=False)
-    benchmark = BenchmarkLocalFullDuplexBigPacket(cm)
+    benchmark = benchmark_class(cm)
+    if len(sys.argv) > 2:
+        benchmark.con1.send_budget = int(sys.argv[2])
+        benchmark.con2.send_budget = int(sys.argv[2])
     sec_start = int(time.time())
-    benchmark.run(20000, 10)
+    benchmark.run(repetitions, 10)
     sec_end = int(time.time())
 
     rec1 = benchmark.con1.handler.received_count
@@ -119,12 +140,16 @@ def main():
     duration = sec_end - sec_start
 
     print(
-        """Stats:
+        """Stats ({5}):
             Duration: {0} seconds
             Connection 1: Received {1} packets; {2} packets/second
             Connection 2: Received {3} packets; {4} packets/second
+            Connection 1: Sent {6} messages in {7} datagrams
+            Connection 2: Sent {8} messages in {9} datagrams
             """.format(
-            duration, rec1, rec1 / duration, rec2, rec2 / duration
+            duration, rec1, rec1 / duration, rec2, rec2 / duration, scenario,
+            benchmark.con1.stats.sent_messages, benchmark.con1.stats.sent_datagrams,
+            benchmark.con2.stats.sent_messages, benchmark.con2.stats.sent_datagrams
         )
     )
 
@@ -0,0 +1,99 @@
+#! /usr/bin/env python
+
+import asyncio
+import sys
+import time
+
+from leviathan.network.engine import aiorudp, connection
+
+import benchmark
+
+# Options of batchio.DatagramSocket, by mode name.
+MODES = {
+    'single': {'mmsg': False, 'gso': False},
+    'mmsg': {'mmsg': True, 'gso': False},
+    'gso': {'mmsg': True, 'gso': True},
+}
+
+
+async def open_endpoint(loop, mode):
+    """Return a multiplexer listening on a batching endpoint."""
+    cm = aiorudp.AsyncioConnectionMultiplexer(
+        connection.ConnectionFactory(benchmark.StubHandlerFactory()),
+        '127.0.0.1',
+        loop=loop
+    )
+    await aiorudp.create_batching_endpoint(
+        lambda: cm,
+        local_addr=('127.0.0.1', 0),
+        loop=loop,
+        **MODES[mode]
+    )
+    return cm
+
+
+async def exchange(loop, mode, messages, size, timeout):
+    """
+    Send `messages` messages of `size` bytes each way between two
+    multiplexers, and return the duration, the messages received and
+    the transports.
+    """
+    server = await open_endpoint(loop, mode)
+    client = await open_endpoint(loop, mode)
+    server_addr = ('127.0.0.1', server.port)
+    client_addr = ('127.0.0.1', client.port)
+    con1 = client.make_new_connection(client_addr, server_addr)
+    while client_addr not in server:
+        await asyncio.sleep(0.001)
+    con2 = server[client_addr]
+
+    start = time.perf_counter()
+    for _ in range(messages):
+        con1.send_message(size * b'a')
+        con2.send_message(size * b'a')
+    while (
+        con1.handler.received_count < messages or
+        con2.handler.received_count < messages
+    ) and time.perf_counter() - start < timeout:
+        await asyncio.sleep(0.001)
+    duration = time.perf_counter() - start
+    received = con1.handler.received_count + con2.handler.received_count
+    transports = (server.transport, client.transport)
+    server.shutdown()
+    client.shutdown()
+    return duration, received, transports
+
+
+def main():
+    """
+    Measure the system calls per 1000 datagrams of the batching
+    transport, and the throughput, with each batching mode.
+    Usage: benchmark_batching.py [messages] [message size]
+    """
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    loop = asyncio.get_event_loop()
+    for mode in MODES:
+        duration, received, transports = loop.run_until_complete(
+            exchange(loop, mode, messages, size, 30)
+        )
+        sockets = [t.get_extra_info('datagram_socket') for t in transports]
+        syscalls = sum(s.syscalls for s in sockets)
+        packets = sum(s.received + s.sent for s in sockets)
+        print(
+            """Stats ({0}):
+            Received {1} messages in {2:.2f} seconds; {3:.0f} messages/second
+            Datagrams: {4} sent, {5} received
+            System calls: {6}; {7:.1f} per 1000 datagrams
+            """.format(
+                mode, received, duration, received / duration,
+                sum(s.sent for s in sockets), sum(s.received for s in sockets),
+                syscalls, 1000 * syscalls / packets if packets else 0
+            )
+        )
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
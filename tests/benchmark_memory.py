@@ -0,0 +1,92 @@
+#! /usr/bin/env python
+
+import gc
+import sys
+import tracemalloc
+
+from twisted.internet import task
+
+from leviathan.network.engine import connection, packet, rudp
+
+import benchmark
+
+
+class StubTransport(object):
+
+    """Transport discarding every datagram."""
+
+    def write(self, datagram, addr):
+        pass
+
+
+def traced_bytes():
+    """Return the bytes currently allocated, after a full collection."""
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def make_connections(cm, clock, count):
+    """Create `count` established connections, with nothing in flight."""
+    own_addr = (cm.public_ip, cm.port)
+    connections = []
+    for i in range(count):
+        con = cm.make_new_connection(own_addr, ('10.0.{0}.{1}'.format(i // 250, i % 250), 5000))
+        connections.append(con)
+    clock.advance(0)
+    for con in connections:
+        synack_packet = packet.Packet.from_data(
+            1,
+            con.own_addr,
+            con.dest_addr,
+            ack=con._next_sequence_number,
+            syn=True
+        )
+        con.receive_packet(synack_packet, con.relay_addr)
+    clock.advance(0)
+    return connections
+
+
+def send_segments(connections, clock, count, size):
+    """Put `count` unACKed segments of `size` bytes in flight per connection."""
+    message = b'a' * size
+    for _ in range(count):
+        for con in connections:
+            con.send_message(message)
+        clock.advance(0)
+
+
+def main():
+    """
+    Measure the memory held per connection and per segment in flight.
+    Usage: benchmark_memory.py [connections] [segments per connection]
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    segments = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    size = 100
+
+    clock = task.Clock()
+    cf = connection.ConnectionFactory(benchmark.StubHandlerFactory())
+    cm = rudp.ConnectionMultiplexer(cf, '127.0.0.1', clock=clock)
+    cm.transport = StubTransport()
+    cm.port = 12345
+
+    tracemalloc.start()
+    start = traced_bytes()
+    connections = make_connections(cm, clock, count)
+    idle = traced_bytes()
+    send_segments(connections, clock, segments, size)
+    in_flight = traced_bytes()
+    tracemalloc.stop()
+
+    datagram_size = len(next(iter(connections[0]._sending_window.values())).rudp_packet)
+    per_segment = (in_flight - idle) / (count * segments)
+    print('Idle connection: {0:.0f} bytes'.format((idle - start) / count))
+    print(
+        'Segment in flight: {0:.0f} bytes, of which {1} bytes of datagram'.format(
+            per_segment, datagram_size
+        )
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+#! /usr/bin/env python
+
+import sys
+import timeit
+
+from leviathan.network.engine import packet
+
+# Destination and source addresses, by address family.
+ADDRESSES = {
+    'ipv4': (('123.45.67.89', 12345), ('98.76.54.32', 54321)),
+    'ipv6': (('2001:db8::1', 12345), ('2001:db8::2', 54321)),
+}
+
+
+def make_packet(dest_addr, source_addr, size):
+    """Create a data segment of `size` bytes, as sent when connected."""
+    return packet.Packet.from_data(
+        2 ** 20,
+        dest_addr,
+        source_addr,
+        payload=b'a' * size,
+        ack=2 ** 20,
+        order_index=2 ** 10
+    )
+
+
+def main():
+    """
+    Compare the encoding and decoding of data segments in each
+    header format.
+    Usage: benchmark_packet.py [packets] [payload size]
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    for family, addrs in sorted(ADDRESSES.items()):
+        for header_format in packet.HeaderFormat:
+            rudp_packet = make_packet(addrs[0], addrs[1], size)
+            rudp_packet.header_format = header_format
+            datagram = rudp_packet.to_bytes()
+            encode = min(
+                timeit.repeat(rudp_packet.to_bytes, number=count, repeat=5)
+            )
+            decode = min(timeit.repeat(
+                lambda: packet.Packet.from_bytes(datagram),
+                number=count,
+                repeat=5
+            ))
+            print(
+                '{0} {1}: {2} bytes of header; '
+                'encode {3:.2f} us, decode {4:.2f} us'.format(
+                    family, header_format.name, len(datagram) - size,
+                    1e6 * encode / count, 1e6 * decode / count
+                )
+            )
+
+
+if __name__ == '__main__':
+    main()
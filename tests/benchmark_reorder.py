@@ -0,0 +1,73 @@
+#! /usr/bin/env python
+
+import random
+import sys
+import timeit
+
+from leviathan.network.engine import constants, heap, packet, reorder
+
+
+def make_packets(count, fragments, reorder_distance):
+    """
+    Create the packets of `count` messages, shuffled in arrival
+    order as if reordered by the network.
+    """
+    packets = []
+    for seqnum in range(1, count * fragments + 1):
+        rudp_packet = packet.Packet.from_data(
+            seqnum,
+            ('123.45.67.89', 12345),
+            ('98.76.54.32', 54321),
+            payload=b'a',
+            more_fragments=(fragments - seqnum) % fragments
+        )
+        packets.append(rudp_packet)
+
+    arrival = sorted(
+        packets,
+        key=lambda p: p.sequence_number + random.uniform(0, reorder_distance)
+    )
+    return arrival
+
+
+def receive(buf, arrival):
+    """Feed packets to a receive buffer, popping messages eagerly."""
+    delivered = 0
+    for rudp_packet in arrival:
+        buf.push(rudp_packet)
+        while buf.pop_min_and_all_fragments() is not None:
+            delivered += 1
+    return delivered
+
+
+# Receive buffer factory, by implementation name.
+IMPLEMENTATIONS = {
+    'heap': heap.Heap,
+    'ring': lambda: reorder.ReorderBuffer(base=1),
+}
+
+
+def main():
+    """
+    Compare the receive buffers on reordered packets.
+    Usage: benchmark_reorder.py [messages] [fragments] [reorder distance]
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    fragments = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    distance = int(sys.argv[3]) if len(sys.argv) > 3 else constants.WINDOW_SIZE
+
+    random.seed(0)
+    arrival = make_packets(count, fragments, distance)
+    for name, factory in sorted(IMPLEMENTATIONS.items()):
+        seconds = min(
+            timeit.repeat(lambda: receive(factory(), arrival), number=1, repeat=5)
+        )
+        print(
+            '{0}: {1} packets in {2:.3f} seconds; {3:.0f} packets/second'.format(
+                name, len(arrival), seconds, len(arrival) / seconds
+            )
+        )
+
+
+if __name__ == '__main__':
+    main()
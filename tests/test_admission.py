@@ -0,0 +1,98 @@
+import unittest
+
+from leviathan.network.engine import admission, constants
+
+
+class TestAdmissionControlAPI(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.ip1 = '132.54.76.98'
+        cls.ip2 = '231.76.45.89'
+
+    def test_init(self):
+        control = admission.AdmissionControl()
+        self.assertEqual(control.datagram_rate, constants.ADMISSION_DATAGRAM_RATE)
+        self.assertEqual(control.max_connections, constants.ADMISSION_MAX_CONNECTIONS)
+        self.assertEqual(control.dropped_datagrams, 0)
+        self.assertTrue(control.admit(self.ip1, 100, 0))
+
+    def test_limit_datagram_rate(self):
+        control = admission.AdmissionControl(datagram_rate=10, burst=0.5)
+        for _ in range(5):
+            self.assertTrue(control.admit(self.ip1, 100, 0))
+        self.assertFalse(control.admit(self.ip1, 100, 0))
+        self.assertEqual(control.dropped_datagrams, 1)
+
+        # Other IPs have buckets of their own.
+        self.assertTrue(control.admit(self.ip2, 100, 0))
+        self.assertTrue(control.admit(self.ip1, 100, 0.1))
+
+    def test_limit_byte_rate(self):
+        control = admission.AdmissionControl(byte_rate=1000, burst=1)
+        self.assertTrue(control.admit(self.ip1, 600, 0))
+        self.assertFalse(control.admit(self.ip1, 600, 0))
+        self.assertTrue(control.admit(self.ip1, 400, 0))
+        self.assertTrue(control.admit(self.ip1, 600, 0.6))
+
+    def test_ban_after_violations(self):
+        control = admission.AdmissionControl(
+            datagram_rate=1,
+            burst=1,
+            ban_threshold=3,
+            ban_window=10,
+            ban_duration=60
+        )
+        self.assertTrue(control.admit(self.ip1, 100, 0))
+        for _ in range(4):
+            self.assertFalse(control.admit(self.ip1, 100, 0))
+        self.assertTrue(control.is_banned(self.ip1, 0))
+        self.assertEqual(control.bans, 1)
+
+        # Banned IPs are refused even with tokens to spare.
+        self.assertFalse(control.admit(self.ip1, 100, 59))
+        self.assertTrue(control.admit(self.ip1, 100, 60))
+        self.assertFalse(control.is_banned(self.ip1, 60))
+
+    def test_violations_expire(self):
+        control = admission.AdmissionControl(ban_threshold=2, ban_window=10)
+        control.on_violation(self.ip1, 0)
+        control.on_violation(self.ip1, 0)
+        control.on_violation(self.ip1, 5)
+        self.assertFalse(control.is_banned(self.ip1, 5))
+        control.on_violation(self.ip1, 5)
+        self.assertTrue(control.is_banned(self.ip1, 5))
+
+    def test_cap_connections(self):
+        control = admission.AdmissionControl(max_connections=2)
+        control.on_connection_made(self.ip1)
+        self.assertTrue(control.can_connect(self.ip1))
+        control.on_connection_made(self.ip1)
+        self.assertFalse(control.can_connect(self.ip1))
+        self.assertTrue(control.can_connect(self.ip2))
+        control.on_connection_lost(self.ip1)
+        self.assertTrue(control.can_connect(self.ip1))
+        control.on_connection_lost(self.ip1)
+        self.assertEqual(len(control._connections), 0)
+
+    def test_bounded_tables(self):
+        control = admission.AdmissionControl(
+            datagram_rate=1,
+            burst=1,
+            ban_threshold=0,
+            max_sources=2,
+            max_bans=2
+        )
+        control.admit(self.ip1, 100, 0)
+        control.admit(self.ip2, 100, 0)
+        control.admit('1.2.3.4', 100, 0)
+        self.assertEqual(len(control._sources), 2)
+
+        # The forgotten IP starts over with a full bucket.
+        self.assertTrue(control.admit(self.ip1, 100, 0))
+
+        for ip in (self.ip1, self.ip2, '1.2.3.4'):
+            control.on_violation(ip, 0)
+        self.assertEqual(len(control._bans), 2)
+        self.assertFalse(control.is_banned(self.ip1, 0))
+        self.assertTrue(control.is_banned('1.2.3.4', 0))
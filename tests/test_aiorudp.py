@@ -0,0 +1,276 @@
+import asyncio
+import collections
+import logging
+import subprocess
+import sys
+import unittest
+
+import mock
+
+from leviathan.network.engine import aiorudp, connection, multiplexer
+
+
+class RecordingHandler(connection.Handler):
+
+    def __init__(self, own_addr, remote_addr, messages):
+        self.messages = messages
+
+    def receive_message(self, message):
+        self.messages.append(message)
+
+    def handle_shutdown(self):
+        pass
+
+
+class RecordingHandlerFactory(connection.HandlerFactory):
+
+    def __init__(self):
+        self.messages = collections.defaultdict(list)
+
+    def make_new_handler(self, own_addr, remote_addr, relay_addr):
+        return RecordingHandler(own_addr, remote_addr, self.messages[remote_addr])
+
+
+class TestAsyncioConnectionMultiplexerAPI(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def _make_cm(self, handler_factory=None):
+        cm = aiorudp.AsyncioConnectionMultiplexer(
+            connection.ConnectionFactory(handler_factory),
+            '127.0.0.1',
+            loop=self.loop,
+            logger=logging.Logger('CM')
+        )
+        self.addCleanup(cm.timer_wheel.stop)
+        return cm
+
+    def _listen(self, cm):
+        self.loop.run_until_complete(
+            self.loop.create_datagram_endpoint(
+                lambda: cm,
+                local_addr=('127.0.0.1', 0)
+            )
+        )
+        self.addCleanup(cm.shutdown)
+
+    def _run_until(self, predicate, timeout=5):
+        deadline = self.loop.time() + timeout
+        while not predicate():
+            self.assertLess(self.loop.time(), deadline, 'Timed out.')
+            self.loop.run_until_complete(asyncio.sleep(0.01))
+
+    def test_init(self):
+        cm = self._make_cm()
+        self.assertIsInstance(cm, asyncio.DatagramProtocol)
+        self.assertIsInstance(cm, multiplexer.BaseConnectionMultiplexer)
+        self.assertIs(cm.timer_wheel.clock.loop, self.loop)
+        self.assertIsNone(cm.port)
+        self.assertIsNone(cm.transport)
+
+    def test_connection_made(self):
+        cm = self._make_cm()
+        transport = mock.Mock(spec_set=asyncio.DatagramTransport)
+        transport.get_extra_info.return_value = ('::1', 19132, 0, 0)
+        cm.connection_made(transport)
+        self.assertIs(cm.transport, transport)
+        self.assertEqual(cm.port, 19132)
+        transport.get_extra_info.assert_called_once_with('sockname')
+
+        cm.send_datagram(b'datagram', ('132.54.76.98', 54321))
+        transport.sendto.assert_called_once_with(b'datagram', ('132.54.76.98', 54321))
+
+        cm.shutdown()
+        transport.close.assert_called_once_with()
+        cm.connection_lost(None)
+        self.assertIsNone(cm.transport)
+
+    def test_datagram_received(self):
+        cm = self._make_cm()
+        cm.datagramReceived = mock.Mock()
+        cm.datagram_received(b'datagram', ('::1', 54321, 0, 0))
+        cm.datagramReceived.assert_called_once_with(b'datagram', ('::1', 54321))
+
+    def test_error_received(self):
+        cm = self._make_cm()
+        cm.error_received(ConnectionRefusedError())
+
+    def test_shutdown_without_transport(self):
+        self._make_cm().shutdown()
+
+    def test_exchange_messages(self):
+        handler_factory = RecordingHandlerFactory()
+        server = self._make_cm(handler_factory)
+        client = self._make_cm(handler_factory)
+        self._listen(server)
+        self._listen(client)
+        server_addr = ('127.0.0.1', server.port)
+        client_addr = ('127.0.0.1', client.port)
+
+        con = client.make_new_connection(client_addr, server_addr)
+        con.send_message(b'hello')
+        self._run_until(lambda: handler_factory.messages[client_addr])
+        self.assertEqual(handler_factory.messages[client_addr], [b'hello'])
+        self.assertIn(client_addr, server)
+        self.assertEqual(con.state, connection.State.CONNECTED)
+
+        server[client_addr].send_message(b'world')
+        self._run_until(lambda: handler_factory.messages[server_addr])
+        self.assertEqual(handler_factory.messages[server_addr], [b'world'])
+
+    def test_import_without_twisted(self):
+        code = (
+            'import sys\n'
+            'from leviathan.network.engine import aiorudp\n'
+            'assert not any(m.startswith("twisted") for m in sys.modules), '
+            'sorted(m for m in sys.modules if m.startswith("twisted"))\n'
+        )
+        subprocess.run([sys.executable, '-c', code], check=True)
+
+
+class TestBatchingDatagramTransportAPI(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def _open(self, protocol=None, **kwargs):
+        if protocol is None:
+            protocol = mock.Mock(spec_set=asyncio.DatagramProtocol)
+        transport, _ = self.loop.run_until_complete(
+            aiorudp.create_batching_endpoint(
+                lambda: protocol,
+                local_addr=('127.0.0.1', 0),
+                loop=self.loop,
+                **kwargs
+            )
+        )
+        self.addCleanup(transport.abort)
+        return transport, protocol
+
+    def _run_until(self, predicate, timeout=5):
+        deadline = self.loop.time() + timeout
+        while not predicate():
+            self.assertLess(self.loop.time(), deadline, 'Timed out.')
+            self.loop.run_until_complete(asyncio.sleep(0.01))
+
+    def test_create(self):
+        transport, protocol = self._open()
+        protocol.connection_made.assert_called_once_with(transport)
+        self.assertIs(transport.get_protocol(), protocol)
+        self.assertFalse(transport.is_closing())
+        sockname = transport.get_extra_info('sockname')
+        self.assertEqual(sockname[0], '127.0.0.1')
+        self.assertIsNone(transport.get_extra_info('peername'))
+        self.assertEqual(
+            transport.get_extra_info('datagram_socket').sock.getsockname(),
+            sockname
+        )
+
+    def test_bind_error(self):
+        transport, _ = self._open()
+        self.assertRaises(
+            OSError,
+            self.loop.run_until_complete,
+            aiorudp.create_batching_endpoint(
+                mock.Mock,
+                local_addr=transport.get_extra_info('sockname'),
+                loop=self.loop
+            )
+        )
+
+    def test_writes_batched_per_turn(self):
+        sender, _ = self._open()
+        receiver, protocol = self._open()
+        addr = receiver.get_extra_info('sockname')
+        datagram_socket = sender.get_extra_info('datagram_socket')
+        for i in range(10):
+            sender.sendto(bytes((i,)), addr)
+        self.assertEqual(sender.get_write_buffer_size(), 10)
+        self.assertEqual(datagram_socket.syscalls, 0)
+
+        self._run_until(lambda: protocol.datagram_received.call_count == 10)
+        self.assertEqual(sender.get_write_buffer_size(), 0)
+        self.assertEqual(
+            [c[0] for c in protocol.datagram_received.call_args_list],
+            [(bytes((i,)), sender.get_extra_info('sockname')) for i in range(10)]
+        )
+        if datagram_socket.mmsg:
+            self.assertEqual(datagram_socket.syscalls, 1)
+        self.assertRaises(ValueError, sender.sendto, b'a')
+
+    def test_resume_when_writable(self):
+        sender, _ = self._open()
+        receiver, protocol = self._open()
+        addr = receiver.get_extra_info('sockname')
+        datagram_socket = sender.get_extra_info('datagram_socket')
+        datagram_socket.send_batch = mock.Mock(side_effect=[1, 2])
+        sender.sendto(b'a', addr)
+        sender.sendto(b'b', addr)
+        sender.sendto(b'c', addr)
+        self._run_until(lambda: not sender.get_write_buffer_size())
+        self.assertEqual(datagram_socket.send_batch.call_count, 2)
+        self.assertEqual(
+            datagram_socket.send_batch.call_args[0][0],
+            [(b'b', addr), (b'c', addr)]
+        )
+
+    def test_write_error(self):
+        sender, protocol = self._open()
+        sender.sendto(b'a' * 70000, ('127.0.0.1', 9))
+        self._run_until(lambda: protocol.error_received.called)
+        (exc,), _ = protocol.error_received.call_args
+        self.assertIsInstance(exc, OSError)
+        self.assertEqual(sender.get_write_buffer_size(), 0)
+
+    def test_close_flushes(self):
+        sender, protocol = self._open()
+        receiver, receiver_protocol = self._open()
+        sender.sendto(b'a', receiver.get_extra_info('sockname'))
+        sender.close()
+        self.assertTrue(sender.is_closing())
+        sender.sendto(b'b', receiver.get_extra_info('sockname'))
+        self._run_until(lambda: protocol.connection_lost.called)
+        protocol.connection_lost.assert_called_once_with(None)
+        self.assertEqual(sender.get_extra_info('socket').fileno(), -1)
+        self._run_until(lambda: receiver_protocol.datagram_received.called)
+        receiver_protocol.datagram_received.assert_called_once_with(
+            b'a',
+            sender.get_extra_info('sockname')
+        )
+
+    def test_abort_drops(self):
+        sender, protocol = self._open()
+        sender.sendto(b'a', ('127.0.0.1', 9))
+        sender.abort()
+        self._run_until(lambda: protocol.connection_lost.called)
+        self.assertEqual(sender.get_extra_info('datagram_socket').sent, 0)
+
+    def test_exchange_messages(self):
+        handler_factory = RecordingHandlerFactory()
+        server = aiorudp.AsyncioConnectionMultiplexer(
+            connection.ConnectionFactory(handler_factory),
+            '127.0.0.1',
+            loop=self.loop
+        )
+        client = aiorudp.AsyncioConnectionMultiplexer(
+            connection.ConnectionFactory(handler_factory),
+            '127.0.0.1',
+            loop=self.loop
+        )
+        for cm in (server, client):
+            self._open(cm)
+            self.addCleanup(cm.shutdown)
+        server_addr = ('127.0.0.1', server.port)
+        client_addr = ('127.0.0.1', client.port)
+
+        con = client.make_new_connection(client_addr, server_addr)
+        messages = [bytes((i,)) * 900 for i in range(100)]
+        for message in messages:
+            con.send_message(message)
+        self._run_until(lambda: len(handler_factory.messages[client_addr]) == 100)
+        self.assertEqual(handler_factory.messages[client_addr], messages)
+        datagram_socket = client.transport.get_extra_info('datagram_socket')
+        self.assertLess(datagram_socket.syscalls, datagram_socket.sent)
@@ -0,0 +1,207 @@
+import errno
+import socket
+import time
+import unittest
+
+import mock
+
+from leviathan.network.engine import batchio, constants
+
+
+def _bind(host='127.0.0.1'):
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_DGRAM)
+    sock.bind((host, 0))
+    sock.setblocking(False)
+    return sock
+
+
+class TestAddressAPI(unittest.TestCase):
+
+    def test_encode_decode(self):
+        for addr, family in (
+            (('123.45.67.89', 12345), socket.AF_INET),
+            (('2001:db8::1', 12345, 0, 0), socket.AF_INET6),
+        ):
+            name = batchio._encode_address(addr, family)
+            self.assertEqual(batchio._decode_address(name), addr)
+
+    def test_map_ipv4_on_ipv6(self):
+        name = batchio._encode_address(('123.45.67.89', 12345), socket.AF_INET6)
+        self.assertEqual(
+            batchio._decode_address(name),
+            ('::ffff:123.45.67.89', 12345, 0, 0)
+        )
+
+
+class TestDatagramSocketAPI(unittest.TestCase):
+
+    modes = (
+        {'mmsg': True, 'gso': True},
+        {'mmsg': True, 'gso': False},
+        {'mmsg': False, 'gso': False},
+    )
+
+    def _make_pair(self, host='127.0.0.1', **kwargs):
+        sender = batchio.DatagramSocket(_bind(host), **kwargs)
+        receiver = batchio.DatagramSocket(_bind(host), **kwargs)
+        self.addCleanup(sender.sock.close)
+        self.addCleanup(receiver.sock.close)
+        return sender, receiver
+
+    def _recv_all(self, receiver, count):
+        datagrams = []
+        deadline = time.monotonic() + 5
+        while len(datagrams) < count and time.monotonic() < deadline:
+            datagrams.extend(receiver.recv_batch(count - len(datagrams)))
+        return datagrams
+
+    def test_init(self):
+        sock = batchio.DatagramSocket(_bind())
+        self.addCleanup(sock.sock.close)
+        self.assertEqual(sock.syscalls, 0)
+        self.assertEqual(sock.received, 0)
+        self.assertEqual(sock.sent, 0)
+        self.assertEqual(sock.syscalls_per_1000_packets, 0)
+        self.assertEqual(sock.recv_batch(), [])
+        self.assertEqual(sock.syscalls, 1)
+
+    def test_exchange(self):
+        for mode in self.modes:
+            sender, receiver = self._make_pair(**mode)
+            addr = receiver.sock.getsockname()
+            datagrams = [(bytes((i,)) * 1000, addr) for i in range(40)]
+            datagrams.append((b'a' * 10, addr))
+            datagrams.extend((b'b' * (i + 1), addr) for i in range(20))
+
+            self.assertEqual(sender.send_batch(datagrams), len(datagrams))
+            self.assertEqual(sender.sent, len(datagrams))
+            received = self._recv_all(receiver, len(datagrams))
+            self.assertEqual(
+                received,
+                [(data, sender.sock.getsockname()) for data, _ in datagrams]
+            )
+            self.assertEqual(receiver.received, len(datagrams))
+            if sender.mmsg:
+                # All datagrams fit a batch each way.
+                self.assertEqual(sender.syscalls, 1)
+                self.assertLessEqual(receiver.syscalls, 3)
+            else:
+                self.assertEqual(sender.syscalls, len(datagrams))
+                self.assertEqual(sender.syscalls_per_1000_packets, 1000)
+
+    def test_receive_budget(self):
+        for mode in self.modes:
+            sender, receiver = self._make_pair(**mode)
+            addr = receiver.sock.getsockname()
+            sender.send_batch([(b'a', addr)] * 10)
+            time.sleep(0.01)
+            self.assertEqual(len(receiver.recv_batch(4)), 4)
+            self.assertEqual(len(receiver.recv_batch()), 6)
+
+    def test_drop_truncated(self):
+        for mode in self.modes:
+            sender, receiver = self._make_pair(**mode)
+            addr = receiver.sock.getsockname()
+            sender.send_batch([
+                (b'a' * (constants.BATCH_BUFFER_SIZE + 1), addr),
+                (b'b', addr)
+            ])
+            self.assertEqual(self._recv_all(receiver, 1), [(b'b', sender.sock.getsockname())])
+
+    def test_ipv6(self):
+        if not socket.has_ipv6:
+            self.skipTest('IPv6 is not available.')
+        try:
+            sender, receiver = self._make_pair('::1')
+        except OSError:
+            self.skipTest('IPv6 loopback is not available.')
+        sender.send_batch([(b'a', receiver.sock.getsockname()[:2])])
+        self.assertEqual(
+            self._recv_all(receiver, 1),
+            [(b'a', sender.sock.getsockname())]
+        )
+
+    def test_drop_on_error(self):
+        for mode in self.modes:
+            sender, receiver = self._make_pair(**mode)
+            addr = receiver.sock.getsockname()
+            on_error = mock.Mock()
+            self.assertEqual(
+                sender.send_batch([(b'a' * 70000, addr), (b'b', addr)], on_error),
+                2
+            )
+            (exc,), _ = on_error.call_args
+            self.assertEqual(exc.errno, errno.EMSGSIZE)
+            self.assertEqual(sender.sent, 1)
+            self.assertEqual(self._recv_all(receiver, 1)[0][0], b'b')
+
+    def test_gso_runs(self):
+        addr1 = ('127.0.0.1', 12345)
+        addr2 = ('127.0.0.1', 54321)
+        datagrams = [
+            (b'a' * 100, addr1), (b'a' * 100, addr1), (b'a' * 50, addr1),
+            (b'a' * 100, addr1), (b'a' * 100, addr2), (b'a' * 200, addr2)
+        ]
+        self.assertEqual(batchio.DatagramSocket._gso_run(datagrams, 0), 3)
+        self.assertEqual(batchio.DatagramSocket._gso_run(datagrams, 3), 1)
+        self.assertEqual(batchio.DatagramSocket._gso_run(datagrams, 4), 1)
+        self.assertEqual(
+            batchio.DatagramSocket._gso_run([(b'a', addr1)] * 100, 0),
+            constants.GSO_MAX_SEGMENTS
+        )
+
+    def test_gso_unsupported(self):
+        sender, receiver = self._make_pair(mmsg=False)
+        sender.gso = True
+        addr = receiver.sock.getsockname()
+        sender.sock = mock.Mock(wraps=sender.sock)
+        sender.sock.sendmsg.side_effect = OSError(errno.EIO, 'I/O error')
+        datagrams = [(b'a' * 100, addr)] * 3
+        self.assertEqual(sender.send_batch(datagrams), 3)
+        self.assertFalse(sender.gso)
+        self.assertEqual(sender.sent, 3)
+        self.assertEqual(len(self._recv_all(receiver, 3)), 3)
+
+    def test_full_buffer(self):
+        sender, receiver = self._make_pair(mmsg=False, gso=False)
+        addr = receiver.sock.getsockname()
+        sender.sock = mock.Mock(wraps=sender.sock)
+        sender.sock.sendto.side_effect = [None, None, BlockingIOError]
+        self.assertEqual(sender.send_batch([(b'a', addr)] * 5), 2)
+        self.assertEqual(sender.sent, 2)
+        self.assertEqual(sender.syscalls, 3)
+
+    def test_send_bytearray(self):
+        for mode in self.modes:
+            sender, receiver = self._make_pair(**mode)
+            addr = receiver.sock.getsockname()
+            datagrams = [(bytearray(b'a' * 100), addr)] * 3 + [(bytearray(b'b'), addr)]
+            self.assertEqual(sender.send_batch(datagrams), len(datagrams))
+            self.assertEqual(
+                [data for data, _ in self._recv_all(receiver, len(datagrams))],
+                [bytes(data) for data, _ in datagrams]
+            )
+
+    def test_address_cache_limit(self):
+        sender = batchio.DatagramSocket(_bind())
+        self.addCleanup(sender.sock.close)
+        if not sender.mmsg:
+            self.skipTest('sendmmsg is not available.')
+        receivers = [batchio.DatagramSocket(_bind()) for _ in range(4)]
+        for receiver in receivers:
+            self.addCleanup(receiver.sock.close)
+        datagrams = [
+            (bytes((i,)), receiver.sock.getsockname())
+            for i, receiver in enumerate(receivers)
+        ]
+        with mock.patch.object(batchio, '_MAX_CACHED_ADDRESSES', 2):
+            for _ in range(3):
+                self.assertEqual(sender.send_batch(datagrams), len(datagrams))
+                self.assertLessEqual(len(sender._names), len(datagrams))
+        self.assertEqual(sender.sent, 3 * len(datagrams))
+        for i, receiver in enumerate(receivers):
+            self.assertEqual(
+                [data for data, _ in self._recv_all(receiver, 3)],
+                [bytes((i,))] * 3
+            )
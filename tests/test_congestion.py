@@ -0,0 +1,122 @@
+import unittest
+
+from leviathan.network.engine import congestion, constants
+
+
+class TestNewRenoAPI(unittest.TestCase):
+
+    def setUp(self):
+        self.cc = congestion.NewReno(
+            segment_size=100,
+            initial_cwnd=4,
+            max_cwnd=64
+        )
+
+    def test_init(self):
+        self.assertEqual(self.cc.cwnd, 400)
+        self.assertEqual(self.cc.ssthresh, 6400)
+        self.assertEqual(self.cc.loss_events, 0)
+        self.assertEqual(self.cc.timeout_events, 0)
+
+    def test_can_send(self):
+        self.assertTrue(self.cc.can_send(0))
+        self.assertTrue(self.cc.can_send(399))
+        self.assertFalse(self.cc.can_send(400))
+
+    def test_slow_start(self):
+        self.cc.on_ack(100, 300)
+        self.assertEqual(self.cc.cwnd, 500)
+        # Byte counting is limited to two segments per ACK.
+        self.cc.on_ack(1000, 0)
+        self.assertEqual(self.cc.cwnd, 700)
+
+    def test_congestion_avoidance(self):
+        self.cc.ssthresh = 400
+        for _ in range(3):
+            self.cc.on_ack(100, 300)
+        self.assertEqual(self.cc.cwnd, 400)
+        self.cc.on_ack(100, 300)
+        self.assertEqual(self.cc.cwnd, 500)
+
+    def test_max_cwnd(self):
+        for _ in range(100):
+            self.cc.on_ack(200, 0)
+        self.assertEqual(self.cc.cwnd, 6400)
+
+    def test_loss(self):
+        self.cc.on_loss(400)
+        self.assertEqual(self.cc.ssthresh, 200)
+        self.assertEqual(self.cc.cwnd, 200)
+        self.assertEqual(self.cc.loss_events, 1)
+
+        self.cc.on_loss(100)
+        self.assertEqual(self.cc.cwnd, 200)
+
+    def test_timeout(self):
+        self.cc.on_timeout(1000)
+        self.assertEqual(self.cc.ssthresh, 500)
+        self.assertEqual(self.cc.cwnd, 100)
+        self.assertEqual(self.cc.loss_events, 1)
+        self.assertEqual(self.cc.timeout_events, 1)
+
+    def test_set_segment_size(self):
+        self.cc.ssthresh = 1000
+        self.cc.set_segment_size(150)
+        self.assertEqual(self.cc.segment_size, 150)
+        self.assertEqual(self.cc.cwnd, 600)
+        self.assertEqual(self.cc.ssthresh, 1500)
+        self.assertEqual(self.cc.max_cwnd, 9600)
+
+        self.cc.set_segment_size(100)
+        self.assertEqual(self.cc.cwnd, 400)
+        self.assertEqual(self.cc.max_cwnd, 6400)
+
+
+class TestVegasAPI(unittest.TestCase):
+
+    def setUp(self):
+        self.cc = congestion.Vegas(
+            segment_size=100,
+            initial_cwnd=10,
+            max_cwnd=64
+        )
+        self.cc.ssthresh = self.cc.cwnd
+
+    def test_grow_without_queueing(self):
+        self.cc.on_rtt_sample(0.1, 0)
+        self.assertEqual(self.cc.cwnd, 1100)
+        # At most one adjustment per round trip.
+        self.cc.on_rtt_sample(0.1, 0.05)
+        self.assertEqual(self.cc.cwnd, 1100)
+        self.cc.on_rtt_sample(0.1, 0.1)
+        self.assertEqual(self.cc.cwnd, 1200)
+
+    def test_clamp_zero_rtt_sample(self):
+        self.cc.on_rtt_sample(0.0, 1.0)
+        self.assertEqual(self.cc.base_rtt, constants.TIMER_GRANULARITY)
+        self.assertEqual(self.cc.cwnd, 1100)
+
+    def test_shrink_on_queueing(self):
+        self.cc.on_rtt_sample(0.1, 0)
+        # Half of the window is queued.
+        self.cc.on_rtt_sample(0.2, 0.1)
+        self.assertEqual(self.cc.cwnd, 1000)
+        self.assertEqual(self.cc.base_rtt, 0.1)
+
+    def test_hold_with_moderate_queueing(self):
+        self.cc.on_rtt_sample(0.1, 0)
+        # Three segments out of 11 are queued.
+        self.cc.on_rtt_sample(0.1 * 11 / 8, 0.1)
+        self.assertEqual(self.cc.cwnd, 1100)
+
+    def test_slow_start_exit(self):
+        self.cc.ssthresh = 6400
+        self.cc.on_rtt_sample(0.1, 0)
+        self.cc.on_rtt_sample(0.2, 0.1)
+        self.assertEqual(self.cc.cwnd, 900)
+        self.assertEqual(self.cc.ssthresh, 900)
+
+    def test_loss(self):
+        self.cc.on_loss(1000)
+        self.assertEqual(self.cc.cwnd, 750)
+        self.assertEqual(self.cc.loss_events, 1)
@@ -2,7 +2,9 @@ import mock
 from twisted.internet import reactor, task
 from twisted.trial import unittest
 
-from leviathan.network.engine import connection, constants, packet, rudp
+from leviathan.network.engine import (
+    connection, constants, cookie, fec, packet, pacing, pmtu, rudp, timer
+)
 
 
 class TestScheduledPacketAPI(unittest.TestCase):
@@ -80,9 +82,9 @@ class TestConnectionAPI(unittest.TestCase):
 
     def setUp(self):
         self.clock = task.Clock()
-        connection.REACTOR.callLater = self.clock.callLater
 
         self.proto_mock = mock.Mock(spec_set=rudp.ConnectionMultiplexer)
+        self.proto_mock.timer_wheel = timer.TimerWheel(clock=self.clock)
         self.handler_mock = mock.Mock(spec_set=connection.Handler)
         self.con = connection.Connection(
             self.proto_mock,
@@ -145,12 +147,15 @@ class TestConnectionAPI(unittest.TestCase):
 
     def test_send_syn_during_connecting(self):
         self.clock.advance(0)
-        connection.REACTOR.runUntilCurrent()
+        self.clock.advance(0)
 
         self._advance_to_fin()
 
         m_calls = self.proto_mock.send_datagram.call_args_list
-        self.assertEqual(len(m_calls), constants.MAX_RETRANSMISSIONS + 1)
+        self.assertEqual(
+            len(m_calls),
+            self._count_transmissions(constants.PACKET_TIMEOUT) + 1
+        )
 
         first_syn_call = m_calls[0]
         syn_packet = packet.Packet.from_bytes(first_syn_call[0][0])
@@ -164,7 +169,8 @@ class TestConnectionAPI(unittest.TestCase):
             syn_packet.sequence_number,
             self.con.dest_addr,
             self.con.own_addr,
-            syn=True
+            syn=True,
+            cookie=bytes(1 + cookie.MAC_SIZE)
         ).to_bytes()
 
         for call in m_calls[:-1]:
@@ -181,22 +187,33 @@ class TestConnectionAPI(unittest.TestCase):
         self.assertEqual(m_calls[-1][0][0], expected_fin_packet)
         self.assertEqual(m_calls[-1][0][1], address)
 
-    def _advance_to_fin(self):
-        for _ in range(constants.MAX_RETRANSMISSIONS):
-            # Each advance forces a SYN packet retransmission.
-            self.clock.advance(constants.PACKET_TIMEOUT)
+    @staticmethod
+    def _count_transmissions(timeout):
+        """Count the sends of a packet until MAX_PACKET_DELAY expires."""
+        count = 0
+        elapsed = 0
+        while elapsed < constants.MAX_PACKET_DELAY:
+            elapsed += timeout
+            timeout = min(2 * timeout, constants.MAX_RTO)
+            count += 1
+        return count
 
-        # Force transmission of FIN packet and shutdown.
-        self.clock.advance(constants.PACKET_TIMEOUT)
+    def _advance_to_fin(self):
+        # Backed-off timeouts never exceed MAX_RTO, so this reaches
+        # the retransmission expiring MAX_PACKET_DELAY, which forces
+        # transmission of FIN packet and shutdown.
+        delay = constants.MAX_PACKET_DELAY + 2 * constants.MAX_RTO
+        for _ in range(int(delay / constants.MIN_RTO)):
+            self.clock.advance(constants.MIN_RTO)
 
         # Trap any calls after shutdown.
         self.clock.advance(100 * constants.PACKET_TIMEOUT)
-        connection.REACTOR.runUntilCurrent()
+        self.clock.advance(0)
 
     def test_send_casual_during_connecting(self):
         self.con.send_message('Yellow Submarine')
         self.clock.advance(100 * constants.PACKET_TIMEOUT)
-        connection.REACTOR.runUntilCurrent()
+        self.clock.advance(0)
         m_calls = self.proto_mock.send_datagram.call_args_list
         self.assertEqual(len(m_calls), 1)
         self.assertTrue(packet.Packet.from_bytes(m_calls[0][0][0]).syn)
@@ -211,7 +228,7 @@ class TestConnectionAPI(unittest.TestCase):
 
         self.con.receive_packet(fin_rudp_packet, self.con.relay_addr)
         self.clock.advance(0)
-        connection.REACTOR.runUntilCurrent()
+        self.clock.advance(0)
 
         self.assertEqual(self.con.state, connection.State.SHUTDOWN)
         self.handler_mock.handle_shutdown.assert_called_once_with()
@@ -230,7 +247,7 @@ class TestConnectionAPI(unittest.TestCase):
 
         self.con.receive_packet(remote_syn_packet, self.con.relay_addr)
         self.clock.advance(0)
-        connection.REACTOR.runUntilCurrent()
+        self.clock.advance(0)
         self.assertEqual(self.con.state, connection.State.CONNECTED)
 
     def test_receive_synack_during_connecting(self):
@@ -245,6 +262,33 @@ class TestConnectionAPI(unittest.TestCase):
         self.con.receive_packet(remote_synack_packet, self.con.relay_addr)
         self.assertEqual(self.con.state, connection.State.CONNECTED)
 
+    def test_echo_cookie_during_connecting(self):
+        self.clock.advance(0)
+        syn_packet, = self._sent_packets()
+        self.proto_mock.reset_mock()
+
+        cookie_packet = packet.Packet.from_data(
+            0,
+            self.con.own_addr,
+            self.con.dest_addr,
+            cookie=b'Yellow submarine'
+        )
+        self.con.receive_packet(cookie_packet, self.con.relay_addr)
+
+        echo_packet, = self._sent_packets()
+        self.assertTrue(echo_packet.syn)
+        self.assertEqual(echo_packet.sequence_number, syn_packet.sequence_number)
+        self.assertEqual(echo_packet.cookie, b'Yellow submarine')
+        self.assertEqual(self.con.stats.retransmissions, 0)
+        self.assertEqual(
+            self.con.bytes_in_flight,
+            len(self.proto_mock.send_datagram.call_args[0][0])
+        )
+
+        # The echo is retransmitted like the SYN it replaces.
+        self.clock.advance(constants.PACKET_TIMEOUT)
+        self.assertEqual(self._sent_packets()[-1].cookie, b'Yellow submarine')
+
     def test_receive_casual_during_connecting(self):
         remote_casual_packet = packet.Packet.from_data(
             42,
@@ -255,14 +299,14 @@ class TestConnectionAPI(unittest.TestCase):
 
         self.con.receive_packet(remote_casual_packet, self.con.relay_addr)
         self.clock.advance(0)
-        connection.REACTOR.runUntilCurrent()
+        self.clock.advance(0)
 
         self.assertEqual(self.con.state, connection.State.CONNECTING)
         self.handler_mock.receive_message.assert_not_called()
 
     # == Test CONNECTED state ==
 
-    def _connecting_to_connected(self):
+    def _connecting_to_connected(self, header_format=packet.HeaderFormat.COMPACT):
         remote_synack_packet = packet.Packet.from_data(
             42,
             self.con.own_addr,
@@ -270,15 +314,20 @@ class TestConnectionAPI(unittest.TestCase):
             ack=0,
             syn=True
         )
+        remote_synack_packet.header_format = header_format
         self.con.receive_packet(remote_synack_packet, self.con.relay_addr)
 
         self.clock.advance(0)
-        connection.REACTOR.runUntilCurrent()
+        self.clock.advance(0)
 
         self.next_remote_seqnum = 43
 
         m_calls = self.proto_mock.send_datagram.call_args_list
-        sent_syn_packet = packet.Packet.from_bytes(m_calls[0][0][0])
+        sent_syn_packet = next(
+            p
+            for p in (packet.Packet.from_bytes(call[0][0]) for call in m_calls)
+            if p.syn
+        )
         seqnum = sent_syn_packet.sequence_number
 
         self.handler_mock.reset_mock()
@@ -286,6 +335,28 @@ class TestConnectionAPI(unittest.TestCase):
 
         self.next_seqnum = seqnum + 1
 
+    def test_give_up_after_max_packet_delay_with_min_rto(self):
+        self._connecting_to_connected()
+        self.con._rtt.update(0)
+        self.assertEqual(self.con._rtt.rto, constants.MIN_RTO)
+
+        self.con.send_message(b'Yellow Submarine')
+        self.clock.advance(0)
+        steps = int(constants.MAX_PACKET_DELAY / constants.MIN_RTO)
+        for _ in range(steps - 10):
+            self.clock.advance(constants.MIN_RTO)
+
+        self.assertEqual(self.con.state, connection.State.CONNECTED)
+        self.assertGreater(
+            len(self._sent_packets()),
+            self._count_transmissions(constants.PACKET_TIMEOUT)
+        )
+
+        for _ in range(int(2 * constants.MAX_RTO / constants.MIN_RTO)):
+            self.clock.advance(constants.MIN_RTO)
+
+        self.assertEqual(self.con.state, connection.State.SHUTDOWN)
+
     def test_send_casual_message_during_connected(self):
         self._connecting_to_connected()
         self.con.send_message(b'Yellow Submarine')
@@ -304,7 +375,7 @@ class TestConnectionAPI(unittest.TestCase):
 
         self.assertEqual(
             len(sent_casual_datagrams),
-            constants.MAX_RETRANSMISSIONS
+            self._count_transmissions(constants.PACKET_TIMEOUT)
         )
 
         expected_casual_datagram = packet.Packet.from_data(
@@ -329,7 +400,7 @@ class TestConnectionAPI(unittest.TestCase):
     #     self.con.send_message(big_message)
     #
     #     self.clock.advance(constants.PACKET_TIMEOUT)
-    #     connection.REACTOR.runUntilCurrent()
+    #     self.clock.advance(0)
     #     m_calls = self.proto_mock.send_datagram.call_args_list
     #
     #     # Filter casual packets.
@@ -358,6 +429,324 @@ class TestConnectionAPI(unittest.TestCase):
     #
     #     self.assertEqual(sent_casual_datagrams, expected_casual_datagrams)
 
+    def _count_sent_casual_datagrams(self):
+        return sum(
+            1
+            for call in self.proto_mock.send_datagram.call_args_list
+            if packet.Packet.from_bytes(call[0][0]).payload
+        )
+
+    def _receive_bare_ack(self, acknum):
+        remote_ack_packet = packet.Packet.from_data(
+            0,
+            self.con.own_addr,
+            self.con.dest_addr,
+            ack=acknum
+        )
+        self.con.receive_packet(remote_ack_packet, self.con.relay_addr)
+
+    def test_rtt_sample_from_ack(self):
+        self._connecting_to_connected()
+        self.con.send_message(b'Yellow Submarine')
+        self.clock.advance(0)
+        self.clock.advance(0.05)
+        self._receive_bare_ack(self.next_seqnum + 1)
+
+        self.assertAlmostEqual(self.con.rtt.srtt, 0.05)
+        self.assertLess(self.con.rtt.rto, constants.PACKET_TIMEOUT)
+
+    def test_no_rtt_sample_from_retransmission(self):
+        self._connecting_to_connected()
+        self.con.send_message(b'Yellow Submarine')
+        self.clock.advance(0)
+        self.clock.advance(constants.PACKET_TIMEOUT)
+        self.assertEqual(self._count_sent_casual_datagrams(), 2)
+
+        self._receive_bare_ack(self.next_seqnum + 1)
+        self.assertIsNone(self.con.rtt.srtt)
+
+    def test_retransmission_backoff(self):
+        self._connecting_to_connected()
+        self.con.send_message(b'Yellow Submarine')
+        self.clock.advance(0)
+        self.assertEqual(self._count_sent_casual_datagrams(), 1)
+
+        self.clock.advance(constants.PACKET_TIMEOUT)
+        self.assertEqual(self._count_sent_casual_datagrams(), 2)
+
+        self.clock.advance(constants.PACKET_TIMEOUT)
+        self.assertEqual(self._count_sent_casual_datagrams(), 2)
+
+        self.clock.advance(constants.PACKET_TIMEOUT)
+        self.assertEqual(self._count_sent_casual_datagrams(), 3)
+
+    def _receive_casual_packet(self, seqnum, payload=b'a'):
+        remote_casual_packet = packet.Packet.from_data(
+            seqnum,
+            self.con.own_addr,
+            self.con.dest_addr,
+            payload=payload,
+            ack=self.next_seqnum
+        )
+        self.con.receive_packet(remote_casual_packet, self.con.relay_addr)
+
+    def test_send_sack_on_out_of_order_packet(self):
+        self._connecting_to_connected()
+        self._receive_casual_packet(self.next_remote_seqnum + 1)
+        self._receive_casual_packet(self.next_remote_seqnum + 2)
+
+        m_calls = self.proto_mock.send_datagram.call_args_list
+        self.assertEqual(len(m_calls), 2)
+        sent_packet = packet.Packet.from_bytes(m_calls[-1][0][0])
+        self.assertEqual(sent_packet.ack, self.next_remote_seqnum)
+        self.assertEqual(
+            sent_packet.sack,
+            ((self.next_remote_seqnum + 1, self.next_remote_seqnum + 3),)
+        )
+
+    def test_drop_segment_beyond_reorder_buffer(self):
+        self._connecting_to_connected()
+        self._receive_casual_packet(
+            self.next_remote_seqnum + constants.REORDER_BUFFER_SIZE
+        )
+        self.proto_mock.send_datagram.assert_not_called()
+
+    def _receive_sack(self, acknum, sack):
+        remote_ack_packet = packet.Packet.from_data(
+            0,
+            self.con.own_addr,
+            self.con.dest_addr,
+            ack=acknum,
+            sack=sack
+        )
+        self.con.receive_packet(remote_ack_packet, self.con.relay_addr)
+
+    def _sent_casual_seqnums(self):
+        return [
+            p.sequence_number
+            for p in (
+                packet.Packet.from_bytes(call[0][0])
+                for call in self.proto_mock.send_datagram.call_args_list
+            )
+            if p.payload
+        ]
+
+    def test_retire_sacked_packets(self):
+        self._connecting_to_connected()
+        for message in (b'a', b'b', b'c'):
+            self.con.send_message(message)
+        self.clock.advance(0)
+
+        self._receive_sack(
+            self.next_seqnum,
+            ((self.next_seqnum + 1, self.next_seqnum + 3),)
+        )
+        self.proto_mock.reset_mock()
+
+        # Only the hole is retransmitted on timeout.
+        self.clock.advance(constants.PACKET_TIMEOUT)
+        self.assertEqual(self._sent_casual_seqnums(), [self.next_seqnum])
+
+    def test_fast_retransmit_after_duplicate_sacks(self):
+        self._connecting_to_connected()
+        for message in (b'a', b'b', b'c', b'd', b'e'):
+            self.con.send_message(message)
+        self.clock.advance(0)
+        self.proto_mock.reset_mock()
+
+        # The first ACK is not a duplicate.
+        for i in range(constants.DUP_ACK_THRESHOLD + 1):
+            self.assertEqual(self._sent_casual_seqnums(), [])
+            self._receive_sack(
+                self.next_seqnum,
+                ((self.next_seqnum + 1, self.next_seqnum + 2 + i),)
+            )
+        self.assertEqual(self._sent_casual_seqnums(), [self.next_seqnum])
+
+        # No more fast retransmits until recovery is over.
+        self._receive_sack(
+            self.next_seqnum,
+            ((self.next_seqnum + 1, self.next_seqnum + 5),)
+        )
+        self._receive_sack(
+            self.next_seqnum,
+            ((self.next_seqnum + 1, self.next_seqnum + 5),)
+        )
+        self.assertEqual(self._sent_casual_seqnums(), [self.next_seqnum])
+
+    def test_congestion_window_bounds_sending(self):
+        self._connecting_to_connected()
+        for _ in range(2 * constants.INITIAL_CWND):
+            self.con.send_message(b'a' * constants.UDP_SAFE_SEGMENT_SIZE)
+        self.clock.advance(0)
+
+        sent = len(self._sent_casual_seqnums())
+        self.assertLessEqual(sent, constants.INITIAL_CWND)
+        self.assertGreater(sent, 0)
+        self.assertFalse(
+            self.con.congestion.can_send(self.con.bytes_in_flight)
+        )
+
+        # ACKing everything opens the window again.
+        self.proto_mock.reset_mock()
+        self._receive_bare_ack(self.next_seqnum + sent)
+        self.assertGreater(len(self._sent_casual_seqnums()), 0)
+
+    def test_congestion_loss_event_on_timeout(self):
+        self._connecting_to_connected()
+        for message in (b'a', b'b', b'c'):
+            self.con.send_message(message)
+        self.clock.advance(0)
+
+        self.clock.advance(self.con.rtt.rto)
+        self.assertEqual(self.con.congestion.loss_events, 1)
+        self.assertEqual(self.con.congestion.timeout_events, 1)
+        self.assertEqual(
+            self.con.congestion.cwnd,
+            self.con.congestion.segment_size
+        )
+
+    def test_send_burst_in_single_turn(self):
+        self._connecting_to_connected()
+        self.con.send_message(b'a' * 5 * constants.UDP_SAFE_SEGMENT_SIZE)
+        self.con.flush()
+
+        # All segments leave in a single flush.
+        self.assertEqual(
+            self._sent_casual_seqnums(),
+            [self.next_seqnum + i for i in range(5)]
+        )
+
+    def test_send_budget_per_turn(self):
+        self._connecting_to_connected()
+        self.con.send_budget = 2
+        self.con.send_message(b'a' * 5 * constants.UDP_SAFE_SEGMENT_SIZE)
+        self.con.flush()
+        self.assertEqual(len(self._sent_casual_seqnums()), 2)
+
+        # The rest is sent on later turns of the reactor.
+        self.clock.advance(0)
+        self.assertEqual(len(self._sent_casual_seqnums()), 5)
+
+    def test_segment_message_lazily(self):
+        message = b'a' * 1000 * constants.UDP_SAFE_SEGMENT_SIZE
+        self.con.send_message(message)
+
+        # No segment exists before the message is sent.
+        self.assertEqual(len(self.con._segment_queue), 1)
+        channel, reliability, order_index, queued, segments = self.con._segment_queue[0]
+        self.assertIs(queued, message)
+        self.assertEqual(channel, constants.DEFAULT_CHANNEL)
+        self.assertEqual(reliability, packet.Reliability.RELIABLE_ORDERED)
+        self.assertEqual(order_index, 0)
+        fragment_index, more_fragments, segment = next(segments)
+        self.assertEqual(fragment_index, 0)
+        self.assertEqual(more_fragments, 999)
+        self.assertIsInstance(segment, memoryview)
+        self.assertIs(segment.obj, message)
+
+    def test_send_mutable_message(self):
+        self._connecting_to_connected()
+        message = bytearray(b'Yellow Submarine')
+        self.con.send_budget = 0
+        self.con.send_message(message)
+        message[:] = b'Octopus Garden'
+
+        self.con.send_budget = constants.SEND_BUDGET
+        self.clock.advance(0)
+        m_calls = self.proto_mock.send_datagram.call_args_list
+        sent_packet = packet.Packet.from_bytes(m_calls[0][0][0])
+        self.assertEqual(sent_packet.payload, b'Yellow Submarine')
+
+    def test_pace_segments(self):
+        self.con.shutdown()
+        self.clock.advance(0)
+        self.proto_mock.reset_mock()
+
+        self.con = connection.Connection(
+            self.proto_mock,
+            self.handler_mock,
+            self.own_addr,
+            self.addr1,
+            pacer=pacing.Pacer(max_rate=100 * constants.UDP_SAFE_SEGMENT_SIZE)
+        )
+        self._connecting_to_connected()
+        self.con.send_message(b'a' * 10 * constants.UDP_SAFE_SEGMENT_SIZE)
+        self.con.flush()
+        burst = len(self._sent_casual_seqnums())
+        self.assertLess(burst, 10)
+        self.assertEqual(self.con.pacer.paced_packets, 1)
+
+        # The rest leaves at the capped rate.
+        self.clock.advance(0.05)
+        self.assertLess(len(self._sent_casual_seqnums()), 10)
+        self.clock.advance(0.1)
+        self.assertEqual(len(self._sent_casual_seqnums()), 10)
+        self.assertGreater(self.con.pacer.paced_packets, 1)
+
+    def _sent_bare_acknums(self):
+        return [
+            p.ack
+            for p in (
+                packet.Packet.from_bytes(call[0][0])
+                for call in self.proto_mock.send_datagram.call_args_list
+            )
+            if not p.payload
+        ]
+
+    def test_ack_every_n_segments(self):
+        self._connecting_to_connected()
+        for i in range(2 * constants.ACK_FREQUENCY):
+            self._receive_casual_packet(self.next_remote_seqnum + i)
+
+        # ACKs are sent without waiting for the ACK timeout.
+        self.assertEqual(
+            self._sent_bare_acknums(),
+            [
+                self.next_remote_seqnum + constants.ACK_FREQUENCY,
+                self.next_remote_seqnum + 2 * constants.ACK_FREQUENCY
+            ]
+        )
+        self.clock.advance(constants.BARE_ACK_TIMEOUT)
+        self.assertEqual(len(self._sent_bare_acknums()), 2)
+
+    @mock.patch.object(constants, 'ACK_FREQUENCY', 3)
+    def test_ack_timeout_is_not_pushed_back(self):
+        self._connecting_to_connected()
+        self._receive_casual_packet(self.next_remote_seqnum)
+        self.clock.advance(constants.BARE_ACK_TIMEOUT / 2)
+        self._receive_casual_packet(self.next_remote_seqnum + 1)
+        self.assertFalse(self._sent_bare_acknums())
+
+        # The timeout runs from the first unACKed segment.
+        self.clock.advance(constants.BARE_ACK_TIMEOUT / 2)
+        self.assertEqual(
+            self._sent_bare_acknums(),
+            [self.next_remote_seqnum + 2]
+        )
+
+    def test_piggyback_ack_on_outbound_data(self):
+        self._connecting_to_connected()
+        self._receive_casual_packet(self.next_remote_seqnum)
+        self.con.send_message(b'Yellow Submarine')
+        self.clock.advance(constants.BARE_ACK_TIMEOUT)
+
+        self.assertFalse(self._sent_bare_acknums())
+        m_calls = self.proto_mock.send_datagram.call_args_list
+        sent_packet = packet.Packet.from_bytes(m_calls[0][0][0])
+        self.assertEqual(sent_packet.ack, self.next_remote_seqnum + 1)
+
+    def test_ack_duplicate_immediately(self):
+        self._connecting_to_connected()
+        self._receive_casual_packet(self.next_remote_seqnum)
+        self.clock.advance(constants.BARE_ACK_TIMEOUT)
+        self._receive_casual_packet(self.next_remote_seqnum)
+
+        self.assertEqual(
+            self._sent_bare_acknums(),
+            [self.next_remote_seqnum + 1] * 2
+        )
+
     def test_send_ack_during_connected(self):
         self._connecting_to_connected()
 
@@ -371,7 +760,7 @@ class TestConnectionAPI(unittest.TestCase):
         self.con.receive_packet(remote_casual_packet, self.con.relay_addr)
 
         self.clock.advance(constants.BARE_ACK_TIMEOUT)
-        connection.REACTOR.runUntilCurrent()
+        self.clock.advance(0)
 
         m_calls = self.proto_mock.send_datagram.call_args_list
 
@@ -412,7 +801,7 @@ class TestConnectionAPI(unittest.TestCase):
         self.con.receive_packet(remote_casual_packet, self.con.relay_addr)
 
         self.clock.advance(0)
-        connection.REACTOR.runUntilCurrent()
+        self.clock.advance(0)
 
         self.handler_mock.receive_message.assert_called_once_with(
             b'Yellow Submarine'
@@ -428,7 +817,8 @@ class TestConnectionAPI(unittest.TestCase):
                 self.con.own_addr,
                 self.con.dest_addr,
                 payload=payload,
-                ack=self.next_seqnum
+                ack=self.next_seqnum,
+                order_index=i
             )
             for i, payload in enumerate(payloads)
         )
@@ -437,7 +827,7 @@ class TestConnectionAPI(unittest.TestCase):
             self.con.receive_packet(p, self.con.relay_addr)
 
         self.clock.advance(0)
-        connection.REACTOR.runUntilCurrent()
+        self.clock.advance(0)
 
         r_calls = self.handler_mock.receive_message.call_args_list
         messages = tuple(call[0][0] for call in r_calls)
@@ -458,7 +848,8 @@ class TestConnectionAPI(unittest.TestCase):
                 self.con.dest_addr,
                 payload=payload,
                 ack=self.next_seqnum,
-                more_fragments=len(messages) - i - 1
+                more_fragments=len(messages) - i - 1,
+                fragment_index=i
             )
             for i, payload in enumerate(messages)
         )
@@ -467,12 +858,826 @@ class TestConnectionAPI(unittest.TestCase):
             self.con.receive_packet(p, self.con.relay_addr)
 
         self.clock.advance(0)
-        connection.REACTOR.runUntilCurrent()
+        self.clock.advance(0)
 
         self.handler_mock.receive_message.assert_called_once_with(
             b''.join(messages)
         )
 
+    def _make_fragments(self, payloads):
+        return [
+            packet.Packet.from_data(
+                self.next_remote_seqnum + i,
+                self.con.own_addr,
+                self.con.dest_addr,
+                payload=payload,
+                ack=self.next_seqnum,
+                more_fragments=len(payloads) - i - 1,
+                fragment_index=i
+            )
+            for i, payload in enumerate(payloads)
+        ]
+
+    def test_receive_message_larger_than_reorder_buffer(self):
+        self._connecting_to_connected()
+        capacity = constants.REORDER_BUFFER_SIZE
+        payloads = [
+            bytes((i % 256,)) * 10 for i in range(2 * capacity + 5)
+        ]
+        fragments = self._make_fragments(payloads)
+
+        # The fragments after a hole fill the buffer, and those
+        # beyond it are dropped.
+        for p in fragments[1:capacity + 1]:
+            self.con.receive_packet(p, self.con.relay_addr)
+        self.clock.advance(0)
+        self.handler_mock.receive_message.assert_not_called()
+
+        # Filling the hole frees the buffer for the next fragments.
+        for p in fragments[:1] + fragments[capacity:]:
+            self.con.receive_packet(p, self.con.relay_addr)
+        self.clock.advance(0)
+        self.clock.advance(0)
+        message, = self._received_messages()
+        self.assertEqual(bytes(message), b''.join(payloads))
+        self.assertFalse(self.con._large_message)
+        self.assertEqual(len(self.con._receive_buffer), 0)
+
+    def test_refuse_message_beyond_max_size(self):
+        self._connecting_to_connected()
+        fragment, = self._make_fragments((b'a',))
+        fragment.more_fragments = constants.MAX_MESSAGE_SEGMENTS
+        self.con.receive_packet(fragment, self.con.relay_addr)
+        self.assertEqual(self.con.state, connection.State.SHUTDOWN)
+        self.handler_mock.receive_message.assert_not_called()
+
+    def test_reassemble_fragments_into_single_buffer(self):
+        payloads = (b'a' * 10, b'b' * 10, b'c' * 3)
+        fragments = tuple(
+            packet.Packet.from_data(
+                i + 1,
+                self.con.own_addr,
+                self.con.dest_addr,
+                payload=payload,
+                more_fragments=len(payloads) - i - 1
+            )
+            for i, payload in enumerate(payloads)
+        )
+
+        message = self.con._reassemble(fragments)
+        self.assertIsInstance(message, memoryview)
+        self.assertEqual(message.tobytes(), b''.join(payloads))
+
+        # Irregular segmentation cannot overflow the buffer.
+        fragments[0].payload = b'a'
+        self.assertEqual(
+            self.con._reassemble(fragments),
+            b'a' + b''.join(payloads[1:])
+        )
+
+    def _receive_channel_packet(self, seqnum, payload, channel, order_index):
+        remote_casual_packet = packet.Packet.from_data(
+            seqnum,
+            self.con.own_addr,
+            self.con.dest_addr,
+            payload=payload,
+            ack=self.next_seqnum,
+            channel=channel,
+            order_index=order_index
+        )
+        self.con.receive_packet(remote_casual_packet, self.con.relay_addr)
+        self.clock.advance(0)
+
+    def _received_messages(self):
+        return [
+            call[0][0]
+            for call in self.handler_mock.receive_message.call_args_list
+        ]
+
+    def test_gap_does_not_block_other_channels(self):
+        self._connecting_to_connected()
+        seqnum = self.next_remote_seqnum
+
+        # The first message of channel 1 is lost.
+        self._receive_channel_packet(seqnum + 1, b'b', 2, 0)
+        self._receive_channel_packet(seqnum + 2, b'c', 1, 1)
+        self._receive_channel_packet(seqnum + 3, b'd', 2, 1)
+        self.assertEqual(self._received_messages(), [b'b', b'd'])
+
+        self._receive_channel_packet(seqnum, b'a', 1, 0)
+        self.assertEqual(self._received_messages(), [b'b', b'd', b'a', b'c'])
+
+        # The ACK number covers all packets, whichever their channel.
+        sent_packet = packet.Packet.from_bytes(
+            self.proto_mock.send_datagram.call_args[0][0]
+        )
+        self.assertEqual(sent_packet.ack, seqnum + 4)
+
+    def test_receive_fragmented_message_ahead_of_gap(self):
+        self._connecting_to_connected()
+        seqnum = self.next_remote_seqnum
+        for i, payload in enumerate((b'b', b'c')):
+            remote_casual_packet = packet.Packet.from_data(
+                seqnum + 1 + i,
+                self.con.own_addr,
+                self.con.dest_addr,
+                payload=payload,
+                more_fragments=1 - i,
+                channel=2,
+                fragment_index=i
+            )
+            self.con.receive_packet(remote_casual_packet, self.con.relay_addr)
+        self.clock.advance(0)
+
+        self.assertEqual(
+            [bytes(message) for message in self._received_messages()],
+            [b'bc']
+        )
+
+    def test_send_message_on_channel(self):
+        self._connecting_to_connected()
+        self.con.send_message(b'a', channel=3)
+        self.con.send_message(b'b')
+        self.con.send_message(b'c', channel=3)
+        self.clock.advance(0)
+
+        sent_packets = [
+            packet.Packet.from_bytes(call[0][0])
+            for call in self.proto_mock.send_datagram.call_args_list
+        ]
+        self.assertEqual(
+            [(p.payload, p.channel, p.order_index) for p in sent_packets],
+            [(b'a', 3, 0), (b'b', 0, 0), (b'c', 3, 1)]
+        )
+
+    def test_send_message_on_bad_channel(self):
+        self.assertRaises(
+            ValueError,
+            self.con.send_message,
+            b'a',
+            constants.MAX_CHANNELS
+        )
+
+    def test_send_message_too_large(self):
+        self.clock.advance(0)
+        self.proto_mock.reset_mock()
+        self.assertRaises(
+            ValueError,
+            self.con.send_message,
+            b'a' * (constants.MAX_MESSAGE_SIZE + 1)
+        )
+        self.clock.advance(0)
+        self.assertFalse(self.proto_mock.send_datagram.called)
+
+    def test_send_largest_message(self):
+        self._connecting_to_connected()
+        self.con.send_message(b'a' * constants.MAX_MESSAGE_SIZE)
+        self.clock.advance(0)
+        sent_packets = self._sent_packets()
+        self.assertTrue(sent_packets)
+        self.assertEqual(
+            sent_packets[0].more_fragments,
+            constants.MAX_MESSAGE_SIZE // self.con.segment_size
+        )
+
+    def _sent_packets(self):
+        return [
+            packet.Packet.from_bytes(call[0][0])
+            for call in self.proto_mock.send_datagram.call_args_list
+        ]
+
+    def test_send_unreliable_message(self):
+        self._connecting_to_connected()
+        sending_window = tuple(self.con._sending_window)
+        self.con.send_message(
+            b'a',
+            channel=3,
+            reliability=packet.Reliability.UNRELIABLE_SEQUENCED
+        )
+        self.con.send_message(b'b', reliability=packet.Reliability.UNRELIABLE)
+        self.con.send_message(
+            b'c',
+            channel=3,
+            reliability=packet.Reliability.UNRELIABLE_SEQUENCED
+        )
+
+        # Sent at once, outside the send window, and never again.
+        self.assertEqual(tuple(self.con._sending_window), sending_window)
+        self.clock.advance(10 * constants.MAX_RTO)
+        self.assertEqual(
+            [
+                (p.payload, p.sequence_number, p.channel, p.order_index, p.reliability)
+                for p in self._sent_packets()
+                if p.payload
+            ],
+            [
+                (b'a', 0, 3, 0, packet.Reliability.UNRELIABLE_SEQUENCED),
+                (b'b', 0, 0, 0, packet.Reliability.UNRELIABLE),
+                (b'c', 0, 3, 1, packet.Reliability.UNRELIABLE_SEQUENCED),
+            ]
+        )
+
+    def test_send_unreliable_during_connecting(self):
+        self.con.send_message(b'a', reliability=packet.Reliability.UNRELIABLE)
+        self.proto_mock.send_datagram.assert_not_called()
+        self.assertFalse(self.con._segment_queue)
+
+    def test_send_oversized_unreliable_message_reliably(self):
+        self._connecting_to_connected()
+        message = b'a' * (constants.UDP_SAFE_SEGMENT_SIZE + 1)
+        self.con.send_message(message, reliability=packet.Reliability.UNRELIABLE)
+        self.clock.advance(0)
+
+        sent_packets = self._sent_packets()
+        self.assertEqual(len(sent_packets), 2)
+        self.assertEqual(
+            tuple(self.con._sending_window)[-2:],
+            tuple(p.sequence_number for p in sent_packets)
+        )
+        for p in sent_packets:
+            self.assertEqual(p.reliability, packet.Reliability.RELIABLE)
+
+    def _receive_unreliable_packet(self, payload, reliability, order_index=0):
+        remote_unreliable_packet = packet.Packet.from_data(
+            0,
+            self.con.own_addr,
+            self.con.dest_addr,
+            payload=payload,
+            channel=3,
+            order_index=order_index,
+            reliability=reliability
+        )
+        self.con.receive_packet(remote_unreliable_packet, self.con.relay_addr)
+        self.clock.advance(0)
+
+    def test_receive_unreliable_message(self):
+        self._connecting_to_connected()
+        self._receive_unreliable_packet(b'a', packet.Reliability.UNRELIABLE)
+        self._receive_unreliable_packet(b'a', packet.Reliability.UNRELIABLE)
+
+        self.assertEqual(self._received_messages(), [b'a', b'a'])
+        self.clock.advance(10 * constants.BARE_ACK_TIMEOUT)
+        self.proto_mock.send_datagram.assert_not_called()
+
+    def test_receive_unreliable_sequenced_message(self):
+        self._connecting_to_connected()
+        sequenced = packet.Reliability.UNRELIABLE_SEQUENCED
+        self._receive_unreliable_packet(b'b', sequenced, 1)
+        self._receive_unreliable_packet(b'a', sequenced, 0)
+        self._receive_unreliable_packet(b'c', sequenced, 2)
+        self._receive_unreliable_packet(b'c', sequenced, 2)
+
+        self.assertEqual(self._received_messages(), [b'b', b'c'])
+
+    def test_receive_reliable_unordered_message_ahead_of_gap(self):
+        self._connecting_to_connected()
+        seqnum = self.next_remote_seqnum
+        self._receive_channel_packet(seqnum + 1, b'b', 0, 1)
+        remote_casual_packet = packet.Packet.from_data(
+            seqnum + 2,
+            self.con.own_addr,
+            self.con.dest_addr,
+            payload=b'c',
+            reliability=packet.Reliability.RELIABLE
+        )
+        self.con.receive_packet(remote_casual_packet, self.con.relay_addr)
+        self.clock.advance(0)
+        self.assertEqual(self._received_messages(), [b'c'])
+
+        self._receive_channel_packet(seqnum, b'a', 0, 0)
+        self.assertEqual(self._received_messages(), [b'c', b'a', b'b'])
+
+    def test_drop_ordered_message_beyond_order_window(self):
+        self._connecting_to_connected()
+        seqnum = self.next_remote_seqnum
+        self._receive_channel_packet(
+            seqnum + 1, b'b', 0, constants.ORDER_WINDOW
+        )
+        self._receive_channel_packet(seqnum + 2, b'c', 0, 1)
+        self.assertEqual(len(self.con._pending_messages), 1)
+
+        self._receive_channel_packet(seqnum, b'a', 0, 0)
+        self.assertEqual(self._received_messages(), [b'a', b'c'])
+        self.assertFalse(self.con._pending_messages)
+
+    def test_coalesce_small_messages(self):
+        self._connecting_to_connected()
+        sent_datagrams = self.con.stats.sent_datagrams
+        for message in (b'a', b'b', b'c'):
+            self.con.send_message(message, channel=3)
+        self.con.send_message(b'd', channel=4)
+        self.con.send_message(b'e', channel=3)
+        self.proto_mock.send_datagram.assert_not_called()
+
+        self.clock.advance(0)
+        sent_packets = [p for p in self._sent_packets() if p.payload]
+        self.assertEqual(
+            [(p.channel, p.order_index, p.coalesced) for p in sent_packets],
+            [(3, 0, True), (4, 0, False), (3, 3, False)]
+        )
+        self.assertEqual(
+            [bytes(m) for m in packet.unpack_frames(sent_packets[0].payload)],
+            [b'a', b'b', b'c']
+        )
+        self.assertEqual(self.con.stats.sent_messages, 5)
+        self.assertEqual(self.con.stats.sent_datagrams - sent_datagrams, 3)
+
+    def test_coalesce_up_to_segment_size(self):
+        self._connecting_to_connected()
+        message = b'a' * (constants.UDP_SAFE_SEGMENT_SIZE // 4)
+        for _ in range(8):
+            self.con.send_message(message)
+        self.clock.advance(0)
+
+        sent_packets = [p for p in self._sent_packets() if p.payload]
+        self.assertEqual(len(sent_packets), 3)
+        for p in sent_packets:
+            self.assertLessEqual(len(p.payload), constants.UDP_SAFE_SEGMENT_SIZE)
+        self.assertEqual(
+            sum(len(packet.unpack_frames(p.payload)) for p in sent_packets),
+            8
+        )
+
+    def test_coalesce_unreliable_messages(self):
+        self._connecting_to_connected()
+        for message in (b'a', b'b'):
+            self.con.send_message(
+                message,
+                reliability=packet.Reliability.UNRELIABLE_SEQUENCED
+            )
+        self.clock.advance(0)
+
+        sent_packets = self._sent_packets()
+        self.assertEqual(len(sent_packets), 1)
+        self.assertTrue(sent_packets[0].coalesced)
+        self.assertEqual(sent_packets[0].sequence_number, 0)
+
+    def test_flush_manually(self):
+        self._connecting_to_connected()
+        self.con.auto_flush = False
+        self.con.send_message(b'a')
+        self.con.send_message(b'b', reliability=packet.Reliability.UNRELIABLE)
+        self.clock.advance(1)
+        self.assertEqual(
+            [p.payload for p in self._sent_packets() if p.payload],
+            []
+        )
+
+        self.con.flush()
+        self.assertEqual(
+            sorted(p.payload for p in self._sent_packets() if p.payload),
+            [b'a', b'b']
+        )
+
+    def test_receive_coalesced_messages(self):
+        self._connecting_to_connected()
+        received_datagrams = self.con.stats.received_datagrams
+        seqnum = self.next_remote_seqnum
+        remote_coalesced_packet = packet.Packet.from_data(
+            seqnum + 1,
+            self.con.own_addr,
+            self.con.dest_addr,
+            payload=packet.pack_frames((b'b', b'c')),
+            channel=3,
+            order_index=1,
+            coalesced=True
+        )
+        self.con.receive_packet(remote_coalesced_packet, self.con.relay_addr)
+        self._receive_channel_packet(seqnum + 2, b'd', 3, 3)
+        self.assertEqual(self._received_messages(), [])
+
+        self._receive_channel_packet(seqnum, b'a', 3, 0)
+        self.assertEqual(
+            [bytes(m) for m in self._received_messages()],
+            [b'a', b'b', b'c', b'd']
+        )
+        self.assertEqual(self.con.stats.received_messages, 4)
+        self.assertEqual(self.con.stats.received_datagrams - received_datagrams, 3)
+
+    def test_receive_coalesced_sequenced_messages(self):
+        self._connecting_to_connected()
+        sequenced = packet.Reliability.UNRELIABLE_SEQUENCED
+        self._receive_unreliable_packet(b'b', sequenced, 1)
+        remote_coalesced_packet = packet.Packet.from_data(
+            0,
+            self.con.own_addr,
+            self.con.dest_addr,
+            payload=packet.pack_frames((b'a', b'b', b'c')),
+            channel=3,
+            reliability=sequenced,
+            coalesced=True
+        )
+        self.con.receive_packet(remote_coalesced_packet, self.con.relay_addr)
+        self.clock.advance(0)
+        self._receive_unreliable_packet(b'c', sequenced, 2)
+
+        self.assertEqual(
+            [bytes(m) for m in self._received_messages()],
+            [b'b', b'c']
+        )
+
+    def test_stats(self):
+        self._connecting_to_connected()
+        connection_stats = self.con.stats
+        sent_datagrams = connection_stats.sent_datagrams
+        self.con.auto_flush = False
+        self.con.send_budget = 1
+        self.con.send_message(b'a' * 2 * constants.UDP_SAFE_SEGMENT_SIZE)
+        self.con.send_message(b'b')
+        self.con.flush()
+        self._receive_casual_packet(self.next_remote_seqnum + 1)
+        self._receive_casual_packet(self.next_remote_seqnum + 1)
+
+        self.assertIs(self.con.stats, connection_stats)
+        self.assertEqual(connection_stats.sent_datagrams - sent_datagrams, 3)
+        self.assertEqual(connection_stats.sent_messages, 2)
+        self.assertEqual(connection_stats.duplicates_received, 1)
+        self.assertEqual(connection_stats.window, len(self.con._sending_window))
+        self.assertEqual(connection_stats.queued_messages, 2)
+        self.assertEqual(connection_stats.reorder_depth, 2)
+        self.assertEqual(connection_stats.rto, self.con.rtt.rto)
+        self.assertEqual(connection_stats.srtt, self.con.rtt.srtt)
+        self.assertGreater(connection_stats.sent_bytes, constants.UDP_SAFE_SEGMENT_SIZE)
+
+        retransmissions = connection_stats.retransmissions
+        self.clock.advance(constants.PACKET_TIMEOUT)
+        self.assertGreater(self.con.stats.retransmissions, retransmissions)
+
+    def test_compact_layout(self):
+        self.assertFalse(hasattr(self.con, '__dict__'))
+        self.assertIsNone(self.con._looping_send)
+        self.assertIsNone(self.con._looping_receive)
+        self._connecting_to_connected()
+        self.assertFalse(hasattr(self.con._sending_window[self.next_seqnum - 1], '__dict__'))
+
+    def test_last_activity(self):
+        self.assertEqual(self.con.last_activity, self.clock.seconds())
+        self._connecting_to_connected()
+        self.clock.advance(5)
+        self._receive_bare_ack(self.next_seqnum)
+        self.assertEqual(self.con.last_activity, self.clock.seconds())
+
+        # Sending is not activity.
+        self.clock.advance(5)
+        self.con.send_message(b'a')
+        self.clock.advance(0)
+        self.assertEqual(self.con.last_activity, self.clock.seconds() - 5)
+
+    def test_send_keepalive(self):
+        self._connecting_to_connected()
+
+        # The SYN is still in flight.
+        self.con.send_keepalive()
+        self.proto_mock.send_datagram.assert_not_called()
+
+        self._receive_bare_ack(self.next_seqnum)
+        self.con.send_keepalive()
+        keepalive_packet, = self._sent_packets()
+        self.assertEqual(keepalive_packet.sequence_number, self.next_seqnum)
+        self.assertEqual(keepalive_packet.payload, b'')
+        self.assertEqual(keepalive_packet.reliability, packet.Reliability.RELIABLE)
+        self.assertIn(self.next_seqnum, self.con._sending_window)
+
+        # Retransmitted until ACKed.
+        self.clock.advance(constants.PACKET_TIMEOUT)
+        self.assertEqual(len(self._sent_packets()), 2)
+        self._receive_bare_ack(self.next_seqnum + 1)
+        self.assertFalse(self.con._sending_window)
+
+    def test_receive_keepalive(self):
+        self._connecting_to_connected()
+        keepalive_packet = packet.Packet.from_data(
+            self.next_remote_seqnum,
+            self.con.own_addr,
+            self.con.dest_addr,
+            ack=self.next_seqnum,
+            reliability=packet.Reliability.RELIABLE
+        )
+        self.con.receive_packet(keepalive_packet, self.con.relay_addr)
+        self._receive_casual_packet(self.next_remote_seqnum + 1)
+        self.clock.advance(0)
+
+        # ACKed, but not delivered.
+        self.assertEqual(self._sent_bare_acknums(), [self.next_remote_seqnum + 2])
+        self.assertEqual(self._received_messages(), [b'a'])
+
+    def _remake_connection(self, **kwargs):
+        self.con.shutdown()
+        for delayed_call in self.clock.getDelayedCalls():
+            delayed_call.cancel()
+        self.con = connection.Connection(
+            self.proto_mock,
+            self.handler_mock,
+            self.own_addr,
+            self.addr1,
+            **kwargs
+        )
+
+    def _make_probing_connection(self, probe_sizes=(1472, 1232), max_probes=1):
+        self._remake_connection(
+            path_mtu_search=pmtu.PathMTUSearch(probe_sizes, max_probes)
+        )
+
+    def _sent_probes(self):
+        return [p for p in self._sent_packets() if p.probe_size]
+
+    def test_probe_path_mtu(self):
+        self._make_probing_connection(max_probes=2)
+        self._connecting_to_connected()
+        probe_timeout = self.con._rtt.rto
+        self._receive_bare_ack(self.next_seqnum)
+        self.assertEqual(self.con.path_mtu_search.probes_sent, 1)
+        self.assertEqual(self.con.segment_size, constants.UDP_SAFE_SEGMENT_SIZE)
+
+        # The lost probe is sent again, neither sequenced nor kept.
+        self.clock.advance(probe_timeout)
+        probe_datagram, = [
+            call[0][0]
+            for call in self.proto_mock.send_datagram.call_args_list
+            if packet.Packet.from_bytes(call[0][0]).probe_size
+        ]
+        self.assertEqual(len(probe_datagram), 1472)
+        self.assertFalse(self.con._sending_window)
+
+        probe_ack_packet = packet.Packet.from_data(
+            0,
+            self.con.own_addr,
+            self.con.dest_addr,
+            probe_ack=1472
+        )
+        self.con.receive_packet(probe_ack_packet, self.con.relay_addr)
+        segment_size = 1472 - packet.max_header_size(self.con.dest_addr, self.con.own_addr)
+        self.assertEqual(self.con.segment_size, segment_size)
+        self.assertEqual(self.con.path_mtu_search.datagram_size, 1472)
+        self.assertEqual(self.con.congestion.segment_size, segment_size)
+        self.assertEqual(
+            self.con.congestion.max_cwnd,
+            constants.WINDOW_SIZE * segment_size
+        )
+
+        # Segments grow up to the new size, within the datagram size.
+        self.proto_mock.reset_mock()
+        self.con.send_message(b'a' * (segment_size + 1))
+        self.clock.advance(0)
+        datagrams = [
+            call[0][0]
+            for call in self.proto_mock.send_datagram.call_args_list
+        ]
+        self.assertEqual(len(datagrams), 2)
+        self.assertEqual(len(packet.Packet.from_bytes(datagrams[0]).payload), segment_size)
+        self.assertLessEqual(len(datagrams[0]), 1472)
+
+    def test_probe_smaller_sizes_after_loss(self):
+        self._make_probing_connection()
+        self._connecting_to_connected()
+        probe_timeout = self.con._rtt.rto
+        self._receive_bare_ack(self.next_seqnum)
+
+        self.clock.advance(probe_timeout)
+        probe_packet, = self._sent_probes()
+        self.assertEqual(probe_packet.probe_size, 1232)
+
+        # With every size lost, the base segment size is kept, and the
+        # search starts over later.
+        self.proto_mock.reset_mock()
+        self.clock.advance(self.con._rtt.rto)
+        self.assertIsNone(self.con.path_mtu_search.probe_size)
+        self.assertEqual(self.con.segment_size, constants.UDP_SAFE_SEGMENT_SIZE)
+        self.assertEqual(self._sent_probes(), [])
+
+        self.clock.advance(constants.PMTU_RAISE_INTERVAL)
+        probe_packet, = self._sent_probes()
+        self.assertEqual(probe_packet.probe_size, 1472)
+
+    def test_fall_back_on_black_hole(self):
+        self._make_probing_connection()
+        self._connecting_to_connected()
+        probe_ack_packet = packet.Packet.from_data(
+            0,
+            self.con.own_addr,
+            self.con.dest_addr,
+            probe_ack=1472
+        )
+        self.con.receive_packet(probe_ack_packet, self.con.relay_addr)
+        segment_size = self.con.segment_size
+        self.assertGreater(segment_size, constants.UDP_SAFE_SEGMENT_SIZE)
+
+        # A full-size segment keeps timing out.
+        self.con.send_message(b'a' * segment_size)
+        self.clock.advance(0)
+        seqnum = self.con._sending_window.lowest
+        for _ in range(constants.PMTU_BLACK_HOLE_TIMEOUTS - 1):
+            self.clock.advance(self.con._sending_window[seqnum].timeout)
+        self.assertEqual(self.con.segment_size, segment_size)
+
+        self.proto_mock.reset_mock()
+        self.clock.advance(self.con._sending_window[seqnum].timeout)
+        self.assertEqual(self.con.segment_size, constants.UDP_SAFE_SEGMENT_SIZE)
+        self.assertEqual(
+            self.con.congestion.segment_size,
+            constants.UDP_SAFE_SEGMENT_SIZE
+        )
+        self.assertEqual(
+            self.con.congestion.max_cwnd,
+            constants.WINDOW_SIZE * constants.UDP_SAFE_SEGMENT_SIZE
+        )
+        self.assertIsNone(self.con.path_mtu_search.datagram_size)
+        self.assertEqual(self.con.path_mtu_search.black_holes, 1)
+        probe_packet, = self._sent_probes()
+        self.assertEqual(probe_packet.probe_size, 1472)
+
+    def test_answer_probe(self):
+        self._connecting_to_connected()
+        probe_packet = packet.Packet.from_data(
+            0,
+            self.con.own_addr,
+            self.con.dest_addr,
+            payload=b'a' * 1000,
+            probe_size=1232
+        )
+        probe_datagram = probe_packet.to_bytes()
+        self.con.receive_packet(
+            packet.Packet.from_bytes(probe_datagram),
+            self.con.relay_addr
+        )
+        self.clock.advance(0)
+
+        probe_ack_packet, = self._sent_packets()
+        self.assertEqual(probe_ack_packet.probe_ack, len(probe_datagram))
+        self.assertEqual(probe_ack_packet.payload, b'')
+        self.handler_mock.receive_message.assert_not_called()
+
+    def test_send_parity(self):
+        self._remake_connection(fec_encoder=fec.ParityEncoder(group_size=2))
+        self._connecting_to_connected()
+        self._receive_bare_ack(self.next_seqnum)
+        for message in (b'a' * 600, b'b' * 600, b'c' * 600):
+            self.con.send_message(message)
+            self.clock.advance(0)
+
+        sent_packets = self._sent_packets()
+        self.assertEqual(len(sent_packets), 4)
+        parity_packet = sent_packets[2]
+        self.assertEqual(parity_packet.parity_base, self.next_seqnum)
+        self.assertEqual(parity_packet.parity_count, 2)
+        self.assertEqual(parity_packet.sequence_number, 0)
+        self.assertEqual(
+            len(parity_packet.payload),
+            fec.PARITY_HEADER.size + 600
+        )
+        self.assertNotIn(0, self.con._sending_window)
+        self.assertEqual(self.con.stats.parity_sent, 1)
+
+    def _receive_parity_packet(self, parity):
+        parity_base, parity_count, payload = parity
+        parity_packet = packet.Packet.from_data(
+            0,
+            self.con.own_addr,
+            self.con.dest_addr,
+            payload,
+            ack=self.next_seqnum,
+            parity_base=parity_base,
+            parity_count=parity_count
+        )
+        self.con.receive_packet(parity_packet, self.con.relay_addr)
+
+    def test_recover_lost_segment(self):
+        self._connecting_to_connected()
+        remote_segments = [
+            packet.Packet.from_data(
+                self.next_remote_seqnum + i,
+                self.con.own_addr,
+                self.con.dest_addr,
+                payload=payload,
+                ack=self.next_seqnum,
+                order_index=i
+            )
+            for i, payload in enumerate((b'a', b'b', b'c', b'd'))
+        ]
+        encoder = fec.ParityEncoder(group_size=2)
+        parities = [encoder.add(segment) for segment in remote_segments]
+
+        # The first parity packet only starts the keeping of segments.
+        self.con.receive_packet(remote_segments[0], self.con.relay_addr)
+        self._receive_parity_packet(parities[1])
+        self.assertEqual(self.con.stats.recovered_segments, 0)
+
+        self.con.receive_packet(remote_segments[3], self.con.relay_addr)
+        self._receive_parity_packet(parities[3])
+        self.clock.advance(0)
+
+        self.assertEqual(self.con.stats.recovered_segments, 1)
+        self.assertEqual(self.con._next_expected_seqnum, self.next_remote_seqnum + 1)
+        self.assertEqual(self._received_messages(), [b'a'])
+
+        # The second segment was lost before segments were kept; its
+        # retransmission releases the rebuilt one.
+        self.con.receive_packet(remote_segments[1], self.con.relay_addr)
+        self.clock.advance(0)
+        self.assertEqual(self._received_messages(), [b'a', b'b', b'c', b'd'])
+        self.assertEqual(self.con._next_expected_seqnum, self.next_remote_seqnum + 4)
+
+    def _sent_formats(self):
+        return [
+            packet.detect_format(call[0][0])
+            for call in self.proto_mock.send_datagram.call_args_list
+        ]
+
+    def test_send_in_header_format(self):
+        self.assertEqual(self.con.header_format, packet.HeaderFormat.COMPACT)
+        self.clock.advance(0)
+        self.assertEqual(self._sent_formats(), [packet.HeaderFormat.COMPACT])
+
+        self._remake_connection(header_format=packet.HeaderFormat.LEGACY)
+        self.proto_mock.reset_mock()
+        self.clock.advance(0)
+        self.assertEqual(self._sent_formats(), [packet.HeaderFormat.LEGACY])
+
+        # The format of the SYN received is taken up.
+        self._connecting_to_connected(packet.HeaderFormat.COMPACT)
+        self.con.send_message(b'Yellow Submarine')
+        self.clock.advance(0)
+        self.assertEqual(self.con.header_format, packet.HeaderFormat.COMPACT)
+        self.assertEqual(self._sent_formats(), [packet.HeaderFormat.COMPACT])
+
+    def test_follow_legacy_syn(self):
+        self._connecting_to_connected(packet.HeaderFormat.LEGACY)
+        self.assertEqual(self.con.header_format, packet.HeaderFormat.LEGACY)
+        self.con.send_message(b'Yellow Submarine')
+        self.clock.advance(0)
+        sent_packet, = self._sent_packets()
+        self.assertEqual(sent_packet.header_format, packet.HeaderFormat.LEGACY)
+        self.assertEqual(sent_packet.payload, b'Yellow Submarine')
+
+    def test_patch_ack_on_retransmission(self):
+        self._connecting_to_connected()
+        self.con.ack_delay = 2 * constants.PACKET_TIMEOUT
+        self.con.send_message(b'Yellow Submarine')
+        self.clock.advance(0)
+        first_datagram = self.proto_mock.send_datagram.call_args[0][0]
+        self.assertEqual(
+            packet.Packet.from_bytes(first_datagram).ack,
+            self.next_remote_seqnum
+        )
+
+        self._receive_casual_packet(self.next_remote_seqnum)
+        self.proto_mock.reset_mock()
+        self.clock.advance(constants.PACKET_TIMEOUT)
+        retransmission, = self._sent_packets()
+        self.assertEqual(retransmission.sequence_number, self.next_seqnum)
+        self.assertEqual(retransmission.ack, self.next_remote_seqnum + 1)
+        self.assertEqual(retransmission.payload, b'Yellow Submarine')
+        self.assertEqual(self.con.stats.retransmissions, 1)
+
+        # The retransmission carries the ACK; no bare ACK is due.
+        self.assertFalse(self.con._ack_handle.active())
+
+    def test_keep_ack_of_legacy_retransmission(self):
+        self._connecting_to_connected(packet.HeaderFormat.LEGACY)
+        self.con.send_message(b'Yellow Submarine')
+        self.clock.advance(0)
+        first_datagram = self.proto_mock.send_datagram.call_args[0][0]
+
+        self._receive_casual_packet(self.next_remote_seqnum)
+        self.clock.advance(constants.PACKET_TIMEOUT)
+        self.assertIn(
+            mock.call(first_datagram, self.con.relay_addr),
+            self.proto_mock.send_datagram.call_args_list[1:]
+        )
+
+    def test_probe_path_mtu_in_legacy_format(self):
+        self._make_probing_connection()
+        self._connecting_to_connected(packet.HeaderFormat.LEGACY)
+        probe_timeout = self.con._rtt.rto
+        self._receive_bare_ack(self.next_seqnum)
+        self.clock.advance(probe_timeout)
+        probe_datagram, = [
+            call[0][0]
+            for call in self.proto_mock.send_datagram.call_args_list
+            if packet.Packet.from_bytes(call[0][0]).probe_size
+        ]
+        self.assertEqual(len(probe_datagram), 1232)
+        self.assertEqual(
+            packet.detect_format(probe_datagram),
+            packet.HeaderFormat.LEGACY
+        )
+
+        probe_ack_packet = packet.Packet.from_data(
+            0,
+            self.con.own_addr,
+            self.con.dest_addr,
+            probe_ack=1232
+        )
+        self.con.receive_packet(probe_ack_packet, self.con.relay_addr)
+        self.assertEqual(
+            self.con.segment_size,
+            1232 - packet.max_header_size(
+                self.con.dest_addr,
+                self.con.own_addr,
+                packet.HeaderFormat.LEGACY
+            )
+        )
+
     # == Test SHUTDOWN state ==
 
     # def test_send_casual_during_shutdown(self):
@@ -482,7 +1687,7 @@ class TestConnectionAPI(unittest.TestCase):
     #     self.con.send_message("Yellow Submarine")
     #
     #     self.clock.advance(100 * constants.PACKET_TIMEOUT)
-    #     connection.REACTOR.runUntilCurrent()
+    #     self.clock.advance(0)
     #
     #     self.assertEqual(self.con.state, connection.State.SHUTDOWN)
     #     self.proto_mock.send_datagram.assert_not_called()
@@ -515,7 +1720,7 @@ class TestConnectionAPI(unittest.TestCase):
         self.con.receive_packet(casual_rudp_packet, self.con.relay_addr)
 
         self.clock.advance(100 * constants.PACKET_TIMEOUT)
-        connection.REACTOR.runUntilCurrent()
+        self.clock.advance(0)
 
         self.assertEqual(self.con.state, connection.State.SHUTDOWN)
         self.handler_mock.receive_message.assert_not_called()
@@ -0,0 +1,40 @@
+import unittest
+
+from leviathan.network.engine import constants, cookie
+
+
+class TestSynCookiesAPI(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.source_addr = ('132.45.67.89', 54321)
+        cls.relay_addr = ('231.76.45.89', 15243)
+
+    def test_init(self):
+        syn_cookies = cookie.SynCookies()
+        self.assertEqual(syn_cookies.interval, constants.SYN_COOKIE_INTERVAL)
+
+    def test_make_and_check(self):
+        syn_cookies = cookie.SynCookies(secret=b'Yellow submarine', interval=10)
+        syn_cookie = syn_cookies.make(7, self.source_addr, self.relay_addr, 105)
+        self.assertEqual(len(syn_cookie), 1 + cookie.MAC_SIZE)
+        self.assertTrue(syn_cookies.check(syn_cookie, 7, self.source_addr, self.relay_addr, 105))
+
+        # Cookies are bound to the SYN and both addresses.
+        self.assertFalse(syn_cookies.check(syn_cookie, 8, self.source_addr, self.relay_addr, 105))
+        self.assertFalse(syn_cookies.check(syn_cookie, 7, self.relay_addr, self.relay_addr, 105))
+        self.assertFalse(syn_cookies.check(syn_cookie, 7, self.source_addr, self.source_addr, 105))
+        self.assertFalse(syn_cookies.check(syn_cookie[:-1], 7, self.source_addr, self.relay_addr, 105))
+
+        # And to the secret.
+        other_cookies = cookie.SynCookies(secret=b'Yellow submarinf', interval=10)
+        self.assertFalse(other_cookies.check(syn_cookie, 7, self.source_addr, self.relay_addr, 105))
+
+    def test_expiry(self):
+        syn_cookies = cookie.SynCookies(interval=10)
+        syn_cookie = syn_cookies.make(7, self.source_addr, self.relay_addr, 109)
+        self.assertTrue(syn_cookies.check(syn_cookie, 7, self.source_addr, self.relay_addr, 119))
+        self.assertFalse(syn_cookies.check(syn_cookie, 7, self.source_addr, self.relay_addr, 120))
+
+        # Slots wrap around in the cookie, not in the MAC.
+        self.assertFalse(syn_cookies.check(syn_cookie, 7, self.source_addr, self.relay_addr, 2669))
@@ -0,0 +1,123 @@
+import unittest
+
+from leviathan.network.engine import constants, fec, packet
+
+
+class TestParityAPI(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dest_addr = ('123.45.67.89', 12345)
+        cls.source_addr = ('132.45.67.89', 54321)
+
+    def _make_segment(self, seqnum, payload, **kwargs):
+        return packet.Packet.from_data(
+            seqnum,
+            self.dest_addr,
+            self.source_addr,
+            payload,
+            ack=seqnum,
+            **kwargs
+        )
+
+    def _make_parity_packet(self, parity):
+        parity_base, parity_count, payload = parity
+        return packet.Packet.from_data(
+            0,
+            self.dest_addr,
+            self.source_addr,
+            payload,
+            parity_base=parity_base,
+            parity_count=parity_count
+        )
+
+    def _make_group(self):
+        return [
+            self._make_segment(10, b'Yellow', order_index=3),
+            self._make_segment(11, b'sub', more_fragments=1, channel=2),
+            self._make_segment(
+                12,
+                packet.pack_frames((b'a', b'marine')),
+                reliability=packet.Reliability.RELIABLE,
+                coalesced=True
+            ),
+        ]
+
+    def test_encoder_init(self):
+        encoder = fec.ParityEncoder()
+        self.assertEqual(encoder.group_size, constants.FEC_GROUP_SIZE)
+        self.assertEqual(encoder.overhead, 1 / constants.FEC_GROUP_SIZE)
+        self.assertRaises(ValueError, fec.ParityEncoder, 0)
+
+    def test_encode_group(self):
+        encoder = fec.ParityEncoder(group_size=3)
+        segments = self._make_group()
+        self.assertIsNone(encoder.add(segments[0]))
+        self.assertIsNone(encoder.add(segments[1]))
+        parity_base, parity_count, payload = encoder.add(segments[2])
+        self.assertEqual(parity_base, 10)
+        self.assertEqual(parity_count, 3)
+        self.assertEqual(
+            len(payload),
+            fec.PARITY_HEADER.size + max(len(s.payload) for s in segments)
+        )
+
+        # The next group starts afresh.
+        self.assertIsNone(encoder.add(self._make_segment(13, b'a')))
+
+    def test_gap_starts_new_group(self):
+        encoder = fec.ParityEncoder(group_size=2)
+        self.assertIsNone(encoder.add(self._make_segment(10, b'a')))
+        self.assertIsNone(encoder.add(self._make_segment(12, b'b')))
+        parity_base, parity_count, _ = encoder.add(self._make_segment(13, b'c'))
+        self.assertEqual((parity_base, parity_count), (12, 2))
+
+    def test_recover_each_segment(self):
+        segments = self._make_group()
+        encoder = fec.ParityEncoder(group_size=3)
+        for segment in segments:
+            parity = encoder.add(segment)
+
+        for lost in segments:
+            decoder = fec.ParityDecoder()
+            for segment in segments:
+                if segment is not lost:
+                    decoder.add(segment)
+            recovered = decoder.recover(self._make_parity_packet(parity))
+            self.assertEqual(recovered.sequence_number, lost.sequence_number)
+            self.assertEqual(recovered.payload, lost.payload)
+            self.assertEqual(recovered.more_fragments, lost.more_fragments)
+            self.assertEqual(recovered.channel, lost.channel)
+            self.assertEqual(recovered.order_index, lost.order_index)
+            self.assertEqual(recovered.fragment_index, lost.fragment_index)
+            self.assertEqual(recovered.reliability, lost.reliability)
+            self.assertEqual(recovered.coalesced, lost.coalesced)
+            self.assertEqual(recovered.ack, 0)
+
+            # Once rebuilt, nothing is missing.
+            self.assertIsNone(decoder.recover(self._make_parity_packet(parity)))
+
+    def test_recover_nothing_unless_one_missing(self):
+        segments = self._make_group()
+        encoder = fec.ParityEncoder(group_size=3)
+        for segment in segments:
+            parity = encoder.add(segment)
+
+        decoder = fec.ParityDecoder()
+        decoder.add(segments[0])
+        self.assertIsNone(decoder.recover(self._make_parity_packet(parity)))
+
+        # Segments evicted from the history count as missing.
+        decoder = fec.ParityDecoder(history=2)
+        for segment in segments:
+            decoder.add(segment)
+        self.assertIsNone(decoder.recover(self._make_parity_packet(parity)))
+
+    def test_recover_nothing_from_corrupt_parity(self):
+        decoder = fec.ParityDecoder()
+        decoder.add(self._make_segment(10, b'Yellow submarine'))
+        parity_packet = self._make_parity_packet((10, 2, b'\xff' * 4))
+        self.assertIsNone(decoder.recover(parity_packet))
+
+        parity_packet.payload = b'\xff' * 100
+        self.assertIsNone(decoder.recover(parity_packet))
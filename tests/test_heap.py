@@ -75,3 +75,17 @@ class TestHeapAPI(unittest.TestCase):
         self.assertNotIn(2, h)
         self.assertNotIn(3, h)
         self.assertIn(4, h)
+
+    def test_sack_blocks_from_empty_heap(self):
+        h = heap.Heap()
+        self.assertEqual(h.sack_blocks(0, 4), ())
+
+    def test_sack_blocks(self):
+        h = heap.Heap()
+        for seqnum in (1, 3, 4, 6, 8, 9, 11):
+            h.push(self._make_packet_with_seqnum(seqnum))
+
+        self.assertEqual(h.sack_blocks(2, 4), ((3, 5), (6, 7), (8, 10), (11, 12)))
+        self.assertEqual(h.sack_blocks(2, 2), ((3, 5), (6, 7)))
+        self.assertEqual(h.sack_blocks(4, 1), ((4, 5),))
+        self.assertEqual(h.sack_blocks(12, 4), ())
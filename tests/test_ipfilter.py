@@ -0,0 +1,180 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from leviathan.network.engine import ipfilter
+
+
+class TestPackIPAPI(unittest.TestCase):
+
+    def test_pack_ip(self):
+        self.assertEqual(ipfilter.pack_ip('123.45.67.89'), bytes((123, 45, 67, 89)))
+        self.assertEqual(ipfilter.pack_ip('::1'), bytes(15) + b'\x01')
+        self.assertEqual(ipfilter.pack_ip('fe80::1%eth0'), b'\xfe\x80' + bytes(13) + b'\x01')
+
+        # IPv4-mapped addresses are packed as IPv4.
+        self.assertEqual(ipfilter.pack_ip('::ffff:123.45.67.89'), bytes((123, 45, 67, 89)))
+
+    def test_pack_bad_ip(self):
+        for ip in ('123.45.67', '123.45.67.89x', 'noise', '1::2::3'):
+            self.assertRaises(ValueError, ipfilter.pack_ip, ip)
+
+
+class TestIPFilterAPI(unittest.TestCase):
+
+    def setUp(self):
+        self.ip_filter = ipfilter.IPFilter()
+
+    def _is_banned(self, ip, now=0):
+        return self.ip_filter.is_banned(ipfilter.pack_ip(ip), now)
+
+    def test_init(self):
+        self.assertEqual(len(self.ip_filter), 0)
+        self.assertFalse(self.ip_filter)
+        self.assertFalse(self._is_banned('123.45.67.89'))
+        self.assertFalse(self._is_banned('::1'))
+
+    def test_ban_address(self):
+        self.ip_filter.ban('123.45.67.89')
+        self.assertEqual(len(self.ip_filter), 1)
+        self.assertTrue(self._is_banned('123.45.67.89'))
+        self.assertTrue(self._is_banned('::ffff:123.45.67.89'))
+        self.assertFalse(self._is_banned('123.45.67.88'))
+        self.assertFalse(self._is_banned('123.45.67.90'))
+
+    def test_ban_network(self):
+        self.ip_filter.ban('123.45.0.0/16')
+        self.ip_filter.ban('2001:db8::/32')
+        self.assertTrue(self._is_banned('123.45.0.0'))
+        self.assertTrue(self._is_banned('123.45.67.89'))
+        self.assertTrue(self._is_banned('123.45.255.255'))
+        self.assertFalse(self._is_banned('123.44.255.255'))
+        self.assertFalse(self._is_banned('123.46.0.0'))
+        self.assertTrue(self._is_banned('2001:db8:1234::1'))
+        self.assertFalse(self._is_banned('2001:db9::1'))
+
+        # Families do not mix.
+        self.assertFalse(self._is_banned('7b2d::'))
+
+    def test_ban_everything(self):
+        self.ip_filter.ban('0.0.0.0/0')
+        self.assertTrue(self._is_banned('123.45.67.89'))
+        self.assertFalse(self._is_banned('::1'))
+
+    def test_host_bits_ignored(self):
+        self.ip_filter.ban('123.45.67.89/24')
+        self.assertTrue(self._is_banned('123.45.67.1'))
+        self.ip_filter.remove('123.45.67.0/24')
+        self.assertEqual(len(self.ip_filter), 0)
+
+    def test_bad_network(self):
+        for network in ('123.45.67.89/33', 'noise', None):
+            self.assertRaises(ValueError, self.ip_filter.ban, network)
+        self.assertEqual(len(self.ip_filter), 0)
+
+    def test_most_specific_rule_applies(self):
+        self.ip_filter.ban('123.45.0.0/16')
+        self.ip_filter.allow('123.45.67.0/24')
+        self.ip_filter.ban('123.45.67.89')
+        self.assertEqual(len(self.ip_filter), 3)
+        self.assertTrue(self._is_banned('123.45.1.1'))
+        self.assertFalse(self._is_banned('123.45.67.1'))
+        self.assertTrue(self._is_banned('123.45.67.89'))
+
+        # An allow rule alone bans nothing.
+        self.ip_filter.allow('132.54.76.98')
+        self.assertFalse(self._is_banned('132.54.76.98'))
+
+    def test_replace_rule(self):
+        self.ip_filter.ban('123.45.0.0/16')
+        self.ip_filter.allow('123.45.0.0/16')
+        self.assertEqual(len(self.ip_filter), 1)
+        self.assertFalse(self._is_banned('123.45.67.89'))
+
+    def test_insert_in_any_order(self):
+        networks = (
+            '10.0.0.0/8', '10.1.0.0/16', '10.1.2.0/24', '10.1.2.3',
+            '10.128.0.0/9', '11.0.0.0/8', '10.1.3.0/24'
+        )
+        for order in (networks, networks[::-1], sorted(networks)):
+            ip_filter = ipfilter.IPFilter()
+            for network in order:
+                ip_filter.ban(network)
+            self.assertEqual(len(ip_filter), len(networks))
+            for ip in ('10.0.0.1', '10.1.2.3', '10.1.3.4', '10.200.0.1', '11.1.1.1'):
+                self.assertTrue(ip_filter.is_banned(ipfilter.pack_ip(ip), 0), ip)
+            self.assertFalse(ip_filter.is_banned(ipfilter.pack_ip('12.0.0.1'), 0))
+
+    def test_remove(self):
+        self.ip_filter.ban('10.0.0.0/8')
+        self.ip_filter.ban('10.1.2.3')
+        self.ip_filter.ban('10.1.2.4')
+        self.ip_filter.remove('10.0.0.0/8')
+        self.assertEqual(len(self.ip_filter), 2)
+        self.assertFalse(self._is_banned('10.0.0.1'))
+        self.assertTrue(self._is_banned('10.1.2.3'))
+        self.assertTrue(self._is_banned('10.1.2.4'))
+
+        self.ip_filter.remove('10.1.2.3')
+        self.assertFalse(self._is_banned('10.1.2.3'))
+        self.assertTrue(self._is_banned('10.1.2.4'))
+
+        # Only exact rules can be removed.
+        self.assertRaises(KeyError, self.ip_filter.remove, '10.1.2.3')
+        self.assertRaises(KeyError, self.ip_filter.remove, '10.1.2.0/24')
+        self.assertRaises(KeyError, self.ip_filter.remove, '10.1.2.4/31')
+
+        self.ip_filter.remove('10.1.2.4')
+        self.assertEqual(len(self.ip_filter), 0)
+        for root in self.ip_filter._roots.values():
+            self.assertEqual((root.children, root.rules, root.expanded), ({}, {}, {}))
+
+    def test_expiration(self):
+        self.ip_filter.ban('123.45.0.0/16', until=10)
+        self.ip_filter.allow('123.45.67.0/24', until=5)
+        self.assertFalse(self._is_banned('123.45.67.89', now=4))
+        self.assertTrue(self._is_banned('123.45.67.89', now=5))
+        self.assertFalse(self._is_banned('123.45.67.89', now=10))
+
+        self.assertEqual(self.ip_filter.expire(5), 1)
+        self.assertEqual(len(self.ip_filter), 1)
+        self.assertEqual(self.ip_filter.expire(10), 1)
+        self.assertEqual(len(self.ip_filter), 0)
+
+    def test_load(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'banned-ips.json')
+        with open(path, 'w') as ban_list:
+            json.dump([
+                {
+                    'ip': '123.45.67.89',
+                    'created': '2019-08-01 12:00:00 +0000',
+                    'source': 'Server',
+                    'expires': 'forever',
+                    'reason': 'Banned by an operator.'
+                },
+                {'ip': '2001:db8::/32', 'expires': '2019-08-02 12:00:00 +0200'},
+            ], ban_list)
+
+        self.assertEqual(self.ip_filter.load(path), 2)
+        self.assertTrue(self._is_banned('123.45.67.89', now=2e9))
+        self.assertTrue(self._is_banned('2001:db8::1', now=1564740000 - 1))
+        self.assertFalse(self._is_banned('2001:db8::1', now=1564740000))
+
+    def test_load_bad_file(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'banned-ips.json')
+        for content in (
+            'noise',
+            '{}',
+            '[{"expires": "forever"}]',
+            '[{"ip": "123.45.67.89", "expires": "tomorrow"}]',
+            '[{"ip": "123.45.67.89", "expires": 1}]',
+        ):
+            with open(path, 'w') as ban_list:
+                ban_list.write(content)
+            self.assertRaises(ValueError, ipfilter.IPFilter().load, path)
@@ -0,0 +1,93 @@
+import unittest
+
+from leviathan.network.engine import congestion, pacing
+
+
+class TestTokenBucketAPI(unittest.TestCase):
+
+    def test_init(self):
+        bucket = pacing.TokenBucket(100, 50)
+        self.assertEqual(bucket.tokens, 50)
+        self.assertEqual(bucket.delay(0), 0)
+
+    def test_refill_up_to_capacity(self):
+        bucket = pacing.TokenBucket(100, 50)
+        bucket.consume(50, 0)
+        bucket.refill(0.2)
+        self.assertAlmostEqual(bucket.tokens, 20)
+        bucket.refill(10)
+        self.assertEqual(bucket.tokens, 50)
+
+    def test_delay_until_debt_is_repaid(self):
+        bucket = pacing.TokenBucket(100, 50)
+        bucket.consume(70, 0)
+        self.assertAlmostEqual(bucket.delay(0), 0.2)
+        self.assertAlmostEqual(bucket.delay(0.1), 0.1)
+        self.assertEqual(bucket.delay(0.2), 0)
+
+    def test_take_without_debt(self):
+        bucket = pacing.TokenBucket(100, 50)
+        self.assertTrue(bucket.take(30, 0))
+        self.assertFalse(bucket.take(30, 0))
+        self.assertAlmostEqual(bucket.tokens, 20)
+        self.assertTrue(bucket.take(30, 0.1))
+
+
+class TestPacerAPI(unittest.TestCase):
+
+    def setUp(self):
+        self.controller = congestion.NewReno(segment_size=1000, initial_cwnd=10)
+
+    def test_unpaced_without_rate(self):
+        pacer = pacing.Pacer()
+        pacer.update(self.controller, None, 0)
+        self.assertIsNone(pacer.rate)
+        for _ in range(100):
+            self.assertEqual(pacer.delay(0), 0)
+            pacer.on_send(1000, 0)
+        self.assertEqual(pacer.sent_packets, 100)
+        self.assertEqual(pacer.sent_bytes, 100000)
+        self.assertEqual(pacer.paced_packets, 0)
+
+    def test_reject_non_positive_max_rate(self):
+        self.assertRaises(ValueError, pacing.Pacer, max_rate=0)
+        self.assertRaises(ValueError, pacing.Pacer, max_rate=-1)
+
+    def test_rate_from_window(self):
+        pacer = pacing.Pacer()
+        pacer.update(self.controller, 0.1, 0)
+        self.assertAlmostEqual(
+            pacer.rate,
+            pacing.Pacer.SLOW_START_GAIN * 10000 / 0.1
+        )
+
+        self.controller.ssthresh = self.controller.cwnd
+        pacer.update(self.controller, 0.1, 0)
+        self.assertAlmostEqual(
+            pacer.rate,
+            pacing.Pacer.CONGESTION_AVOIDANCE_GAIN * 10000 / 0.1
+        )
+
+    def test_rate_capped(self):
+        pacer = pacing.Pacer(max_rate=50000)
+        pacer.update(self.controller, None, 0)
+        self.assertEqual(pacer.rate, 50000)
+        pacer.update(self.controller, 0.1, 0)
+        self.assertEqual(pacer.rate, 50000)
+
+    def test_pace_beyond_burst(self):
+        pacer = pacing.Pacer(
+            max_rate=100000,
+            burst=2,
+            segment_size=1000,
+            granularity=0.001
+        )
+        pacer.update(self.controller, None, 0)
+        for _ in range(3):
+            self.assertEqual(pacer.delay(0), 0)
+            pacer.on_send(1000, 0)
+
+        self.assertAlmostEqual(pacer.delay(0), 0.01)
+        self.assertEqual(pacer.paced_packets, 1)
+        self.assertAlmostEqual(pacer.paced_time, 0.01)
+        self.assertEqual(pacer.delay(0.01), 0)
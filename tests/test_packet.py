@@ -2,7 +2,7 @@ import unittest
 
 import six
 
-from leviathan.network.engine import packet
+from leviathan.network.engine import constants, packet, packet_pb2
 
 
 class TestPacketAPI(unittest.TestCase):
@@ -22,6 +22,15 @@ class TestPacketAPI(unittest.TestCase):
         self.assertEqual(p.ack, 0)
         self.assertFalse(p.fin)
         self.assertFalse(p.syn)
+        self.assertEqual(p.sack, ())
+        self.assertEqual(p.channel, 0)
+        self.assertEqual(p.order_index, 0)
+        self.assertEqual(p.fragment_index, 0)
+        self.assertEqual(p.reliability, packet.Reliability.RELIABLE_ORDERED)
+        self.assertFalse(p.coalesced)
+        self.assertEqual(p.probe_size, 0)
+        self.assertEqual(p.probe_ack, 0)
+        self.assertEqual(p.parity_count, 0)
 
     def test_from_data_with_all_parametres(self):
         p = packet.Packet.from_data(
@@ -32,7 +41,12 @@ class TestPacketAPI(unittest.TestCase):
             more_fragments=4,
             ack=28,
             fin=True,
-            syn=True
+            syn=True,
+            sack=((30, 32), (40, 41)),
+            channel=3,
+            order_index=7,
+            fragment_index=2,
+            reliability=packet.Reliability.RELIABLE
         )
         self.assertEqual(p.sequence_number, 1)
         self.assertEqual(p.dest_addr, self.dest_addr)
@@ -42,6 +56,26 @@ class TestPacketAPI(unittest.TestCase):
         self.assertEqual(p.ack, 28)
         self.assertTrue(p.fin)
         self.assertTrue(p.syn)
+        self.assertEqual(p.sack, ((30, 32), (40, 41)))
+        self.assertEqual(p.channel, 3)
+        self.assertEqual(p.order_index, 7)
+        self.assertEqual(p.fragment_index, 2)
+        self.assertEqual(p.reliability, packet.Reliability.RELIABLE)
+
+    def test_from_data_with_memoryview_payload(self):
+        message = b'Yellow submarine'
+        p = packet.Packet.from_data(
+            1,
+            self.dest_addr,
+            self.source_addr,
+            payload=memoryview(message)[:6]
+        )
+        self.assertEqual(p.payload, b'Yellow')
+        # The segment is not copied before it is encoded.
+        self.assertIsInstance(p.payload, memoryview)
+        for header_format in packet.HeaderFormat:
+            p.header_format = header_format
+            self.assertEqual(packet.Packet.from_bytes(p.to_bytes()).payload, b'Yellow')
 
     def _make_packet_with_seqnum(self, seqnum):
         return packet.Packet.from_data(seqnum, self.dest_addr, self.source_addr)
@@ -70,6 +104,16 @@ class TestPacketAPI(unittest.TestCase):
         self.assertEqual(p1.ack, p2.ack)
         self.assertEqual(p1.fin, p2.fin)
         self.assertEqual(p1.syn, p2.syn)
+        self.assertEqual(p1.sack, p2.sack)
+        self.assertEqual(p1.channel, p2.channel)
+        self.assertEqual(p1.order_index, p2.order_index)
+        self.assertEqual(p1.fragment_index, p2.fragment_index)
+        self.assertEqual(p1.reliability, p2.reliability)
+        self.assertEqual(p1.coalesced, p2.coalesced)
+        self.assertEqual(p1.probe_size, p2.probe_size)
+        self.assertEqual(p1.probe_ack, p2.probe_ack)
+        self.assertEqual(p1.parity_base, p2.parity_base)
+        self.assertEqual(p1.parity_count, p2.parity_count)
 
     def test_serialization_and_deserialization(self):
         p1 = packet.Packet.from_data(
@@ -80,13 +124,68 @@ class TestPacketAPI(unittest.TestCase):
             more_fragments=4,
             ack=28,
             fin=True,
-            syn=True
+            syn=True,
+            sack=((30, 32), (40, 41)),
+            channel=3,
+            order_index=7,
+            fragment_index=2,
+            reliability=packet.Reliability.UNRELIABLE_SEQUENCED
         )
         bytes1 = p1.to_bytes()
         self.assertIsInstance(bytes1, six.binary_type)
 
         p2 = packet.Packet.from_bytes(bytes1)
         self._assert_packets_entirely_equal(p1, p2)
+        self.assertEqual(p1.size, 0)
+        self.assertEqual(p2.size, len(bytes1))
+
+    def test_serialization_of_probe(self):
+        p1 = packet.Packet.from_data(
+            1,
+            self.dest_addr,
+            self.source_addr,
+            payload=bytes(100),
+            probe_size=1472,
+            probe_ack=1452
+        )
+        p2 = packet.Packet.from_bytes(p1.to_bytes())
+        self._assert_packets_entirely_equal(p1, p2)
+
+    def test_serialization_of_parity(self):
+        p1 = packet.Packet.from_data(
+            0,
+            self.dest_addr,
+            self.source_addr,
+            payload=b'Yellow submarine',
+            ack=28,
+            parity_base=2 ** 20,
+            parity_count=8
+        )
+        p2 = packet.Packet.from_bytes(p1.to_bytes())
+        self._assert_packets_entirely_equal(p1, p2)
+
+    def test_max_header_size(self):
+        p = packet.Packet.from_data(
+            2 ** 20,
+            self.dest_addr,
+            self.source_addr,
+            payload=b'a' * 1000,
+            more_fragments=30,
+            ack=2 ** 20,
+            sack=((2 ** 20 + 2, 2 ** 20 + 5),) * constants.MAX_SACK_BLOCKS,
+            channel=constants.MAX_CHANNELS - 1,
+            order_index=2 ** 20,
+            fragment_index=30,
+            reliability=packet.Reliability.UNRELIABLE_SEQUENCED
+        )
+        header_size = packet.max_header_size(self.dest_addr, self.source_addr)
+        self.assertLessEqual(len(p.to_bytes()), 1000 + header_size)
+
+        ipv6_header_size = packet.max_header_size(
+            ('2001:db8:85a3::8a2e:370:7334', 12345),
+            ('2001:db8:85a3::8a2e:370:7335', 54321)
+        )
+        self.assertGreater(ipv6_header_size, header_size)
 
     def _assert_packet_fails_validation(self, rudp_packet):
         with self.assertRaises(packet.ValidationError):
@@ -127,3 +226,222 @@ class TestPacketAPI(unittest.TestCase):
 
         p.source_addr = ('127.0.0.1', 65536)
         self._assert_packet_fails_validation(p)
+
+    def test_validate_with_bad_sack(self):
+        p = packet.Packet.from_data(1, self.dest_addr, self.source_addr)
+
+        p.sack = ((5, 5),)
+        self._assert_packet_fails_validation(p)
+
+        p.sack = ((7, 5),)
+        self._assert_packet_fails_validation(p)
+
+        # Blocks are flattened in protobuf, so their count may be odd.
+        datagram = packet_pb2.Packet(
+            dest_ip=self.dest_addr[0],
+            dest_port=self.dest_addr[1],
+            source_ip=self.source_addr[0],
+            source_port=self.source_addr[1],
+            sack=[5]
+        ).SerializeToString()
+        with self.assertRaises(packet.ValidationError):
+            packet.Packet.from_bytes(datagram)
+
+    def test_validate_with_bad_channel(self):
+        p = packet.Packet.from_data(1, self.dest_addr, self.source_addr)
+
+        p.channel = constants.MAX_CHANNELS
+        self._assert_packet_fails_validation(p)
+
+    def test_validate_with_bad_reliability(self):
+        p = packet.Packet.from_data(1, self.dest_addr, self.source_addr)
+
+        p.reliability = len(packet.Reliability)
+        self._assert_packet_fails_validation(p)
+
+    def test_pack_and_unpack_frames(self):
+        messages = (b'Yellow', b'', b'submarine')
+        payload = packet.pack_frames(messages)
+        self.assertEqual(
+            len(payload),
+            sum(len(m) for m in messages) + 3 * packet.FRAME_HEADER.size
+        )
+        self.assertEqual(
+            [bytes(m) for m in packet.unpack_frames(bytes(payload))],
+            list(messages)
+        )
+
+    def test_validate_with_bad_frames(self):
+        p = packet.Packet.from_data(
+            1,
+            self.dest_addr,
+            self.source_addr,
+            payload=packet.pack_frames((b'Yellow', b'submarine')),
+            coalesced=True
+        )
+        packet.Packet.validate(p)
+
+        p.payload = p.payload[:-1]
+        self._assert_packet_fails_validation(p)
+
+        p.payload = b'\x00'
+        self._assert_packet_fails_validation(p)
+
+        p.payload = packet.pack_frames((b'Yellow', b'submarine'))
+        p.more_fragments = 1
+        self._assert_packet_fails_validation(p)
+
+    def _make_full_packet(self, dest_addr, source_addr):
+        return packet.Packet.from_data(
+            sequence_number=2 ** 40,
+            dest_addr=dest_addr,
+            source_addr=source_addr,
+            payload=packet.pack_frames((b'Yellow', b'submarine')),
+            ack=2 ** 40 + 1,
+            syn=True,
+            sack=((2 ** 40 + 3, 2 ** 40 + 5), (2 ** 40 + 7, 2 ** 40 + 8)),
+            channel=constants.MAX_CHANNELS - 1,
+            order_index=7,
+            reliability=packet.Reliability.UNRELIABLE_SEQUENCED,
+            coalesced=True,
+            probe_size=1472,
+            probe_ack=1452,
+            parity_base=2 ** 20,
+            parity_count=8,
+            cookie=b'Yellow submarine'
+        )
+
+    def test_serialization_in_each_format(self):
+        for header_format in packet.HeaderFormat:
+            p1 = self._make_full_packet(self.dest_addr, self.source_addr)
+            p1.header_format = header_format
+            datagram = p1.to_bytes()
+            self.assertIsInstance(datagram, bytes)
+            self.assertEqual(packet.detect_format(datagram), header_format)
+
+            p2 = packet.Packet.from_bytes(datagram)
+            self._assert_packets_entirely_equal(p1, p2)
+            self.assertEqual(p2.cookie, p1.cookie)
+            self.assertEqual(p2.header_format, header_format)
+
+            p1.fin = True
+            p1.coalesced = False
+            p1.more_fragments = 3
+            p1.fragment_index = 2
+            p2 = packet.Packet.from_bytes(p1.to_bytes())
+            self._assert_packets_entirely_equal(p1, p2)
+
+    def test_compact_header_size(self):
+        p = packet.Packet.from_data(1, self.dest_addr, self.source_addr)
+        self.assertEqual(
+            len(p.to_bytes()),
+            packet.COMPACT_HEADER.size + 2 * (4 + 2)
+        )
+        self.assertLess(
+            packet.max_header_size(self.dest_addr, self.source_addr),
+            packet.max_header_size(
+                self.dest_addr,
+                self.source_addr,
+                packet.HeaderFormat.LEGACY
+            )
+        )
+
+    def test_serialization_of_ipv6(self):
+        dest_addr = ('2001:db8::1', 12345)
+        source_addr = ('FE80:0000:0000:0000:0202:B3FF:FE1E:8329', 54321)
+        for header_format in packet.HeaderFormat:
+            for addrs in ((dest_addr, source_addr), (dest_addr, self.source_addr)):
+                p1 = self._make_full_packet(*addrs)
+                p1.header_format = header_format
+                packet.Packet.validate(p1)
+                p2 = packet.Packet.from_bytes(p1.to_bytes())
+                self.assertEqual(p2.dest_addr, dest_addr)
+                self.assertEqual(p2.source_addr[1], addrs[1][1])
+                self.assertEqual(
+                    p2.source_addr[0],
+                    packet.normalize_ip(addrs[1][0])
+                )
+                self.assertEqual(p2.payload, p1.payload)
+
+    def test_normalize_ip(self):
+        self.assertEqual(packet.normalize_ip('123.45.67.89'), '123.45.67.89')
+        self.assertEqual(
+            packet.normalize_ip('FE80:0000:0000:0000:0202:B3FF:FE1E:8329'),
+            'fe80::202:b3ff:fe1e:8329'
+        )
+        for ip in ('127.0', 'FE80:0000:0000::z:B3FF:FE1E:8329', ''):
+            with self.assertRaises(packet.ValidationError):
+                packet.normalize_ip(ip)
+
+    def test_detect_format(self):
+        self.assertEqual(packet.detect_format(b''), packet.HeaderFormat.LEGACY)
+        for version in (0, 2, 7):
+            with self.assertRaises(packet.ValidationError):
+                packet.detect_format(bytes((version,)) + b'\x00' * 40)
+
+    def test_decode_truncated_compact_header(self):
+        datagram = self._make_full_packet(self.dest_addr, self.source_addr).to_bytes()
+        payload_size = len(packet.pack_frames((b'Yellow', b'submarine')))
+        for size in range(1, len(datagram) - payload_size):
+            with self.assertRaises(packet.ValidationError):
+                packet.Packet.from_bytes(datagram[:size])
+
+    def test_decode_bad_compact_header(self):
+        p = packet.Packet.from_data(1, self.dest_addr, self.source_addr)
+        datagram = bytearray(p.to_bytes())
+        packet.Packet.from_bytes(datagram)
+
+        for offset, value in ((1, 0x80), (2, 0x40)):
+            bad_datagram = bytearray(datagram)
+            bad_datagram[offset] |= value
+            with self.assertRaises(packet.ValidationError):
+                packet.Packet.from_bytes(bad_datagram)
+
+        for name, value in (
+            ('sack', ((5, 5),)),
+            ('channel', constants.MAX_CHANNELS),
+            ('reliability', len(packet.Reliability)),
+            ('dest_addr', ('127.0.0.1', 0)),
+            ('source_addr', ('127.0.0.1', 0)),
+        ):
+            bad_packet = packet.Packet.from_data(1, self.dest_addr, self.source_addr)
+            setattr(bad_packet, name, value)
+            with self.assertRaises(packet.ValidationError):
+                packet.Packet.from_bytes(bad_packet.to_bytes())
+
+    def test_encode_out_of_range(self):
+        p = packet.Packet.from_data(2 ** 64, self.dest_addr, self.source_addr)
+        with self.assertRaises(packet.ValidationError):
+            p.to_bytes()
+
+        p = packet.Packet.from_data(1, ('127.0', 1), self.source_addr)
+        with self.assertRaises(packet.ValidationError):
+            p.to_bytes()
+
+    def test_patch_ack(self):
+        p = packet.Packet.from_data(
+            1,
+            self.dest_addr,
+            self.source_addr,
+            payload=b'Yellow submarine',
+            ack=28,
+            sack=((30, 32),)
+        )
+        datagram = bytearray(p.to_bytes())
+        packet.patch_ack(datagram, 2 ** 40)
+        p.ack = 2 ** 40
+        self.assertEqual(datagram, p.to_bytes())
+        self.assertEqual(packet.Packet.from_bytes(datagram).ack, 2 ** 40)
+
+    def test_pad(self):
+        for header_format in packet.HeaderFormat:
+            for size in (1232, 1472):
+                p = packet.Packet.from_data(
+                    0,
+                    self.dest_addr,
+                    self.source_addr,
+                    probe_size=size
+                )
+                p.header_format = header_format
+                p.pad(size)
+                self.assertEqual(len(p.to_bytes()), size)
@@ -0,0 +1,70 @@
+import unittest
+
+from leviathan.network.engine import constants, pmtu
+
+
+class TestPathMTUSearchAPI(unittest.TestCase):
+
+    def test_init(self):
+        search = pmtu.PathMTUSearch()
+        self.assertIsNone(search.datagram_size)
+        self.assertEqual(search.probe_size, max(constants.PMTU_PROBE_SIZES))
+        self.assertTrue(search.can_raise)
+
+    def test_confirm_first_size(self):
+        search = pmtu.PathMTUSearch(probe_sizes=(1200, 1400))
+        search.on_probe_sent()
+        search.on_probe_acked(1400)
+        self.assertEqual(search.datagram_size, 1400)
+        self.assertIsNone(search.probe_size)
+        self.assertFalse(search.can_raise)
+
+    def test_step_down_after_lost_probes(self):
+        search = pmtu.PathMTUSearch(probe_sizes=(1400, 1200), max_probes=2)
+        for _ in range(2):
+            self.assertEqual(search.probe_size, 1400)
+            search.on_probe_sent()
+            search.on_probe_lost()
+        self.assertEqual(search.probe_size, 1200)
+        search.on_probe_sent()
+        search.on_probe_acked(1200)
+        self.assertEqual(search.datagram_size, 1200)
+        self.assertEqual(search.probes_sent, 3)
+        self.assertEqual(search.probes_lost, 2)
+        self.assertTrue(search.can_raise)
+
+    def test_give_up_when_all_probes_lost(self):
+        search = pmtu.PathMTUSearch(probe_sizes=(1400, 1200), max_probes=1)
+        for _ in range(2):
+            search.on_probe_sent()
+            search.on_probe_lost()
+        self.assertIsNone(search.probe_size)
+        self.assertIsNone(search.datagram_size)
+
+    def test_raise_after_restart(self):
+        search = pmtu.PathMTUSearch(probe_sizes=(1400, 1300, 1200), max_probes=1)
+        search.on_probe_sent()
+        search.on_probe_lost()
+        search.on_probe_sent()
+        search.on_probe_acked(1300)
+
+        # Sizes not above the confirmed one are not probed again.
+        search.restart()
+        self.assertEqual(search.probe_size, 1400)
+        search.on_probe_sent()
+        search.on_probe_lost()
+        self.assertIsNone(search.probe_size)
+        self.assertEqual(search.datagram_size, 1300)
+
+    def test_search_again_after_black_hole(self):
+        search = pmtu.PathMTUSearch(probe_sizes=(1400, 1300), max_probes=1)
+        search.on_probe_sent()
+        search.on_probe_acked(1400)
+
+        search.on_black_hole()
+        self.assertIsNone(search.datagram_size)
+        self.assertEqual(search.black_holes, 1)
+        self.assertEqual(search.probe_size, 1400)
+        search.on_probe_sent()
+        search.on_probe_lost()
+        self.assertEqual(search.probe_size, 1300)
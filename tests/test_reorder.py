@@ -0,0 +1,235 @@
+import random
+import unittest
+
+from leviathan.network.engine import constants, packet, reorder
+
+
+class TestReorderBufferAPI(unittest.TestCase):
+
+    def test_init(self):
+        b = reorder.ReorderBuffer()
+        self.assertEqual(len(b), 0)
+        self.assertEqual(b.base, 0)
+        self.assertEqual(b.capacity, constants.REORDER_BUFFER_SIZE)
+
+    def test_init_with_invalid_capacity(self):
+        self.assertRaises(ValueError, reorder.ReorderBuffer, 0)
+        self.assertRaises(ValueError, reorder.ReorderBuffer, 100)
+
+    @staticmethod
+    def _make_packet_with_seqnum(seqnum):
+        return packet.Packet.from_data(
+            seqnum,
+            ('123.45.67.89', 12345),
+            ('98.76.54.32', 54321)
+        )
+
+    def test_push(self):
+        p1 = self._make_packet_with_seqnum(1)
+        p2 = self._make_packet_with_seqnum(2)
+        b = reorder.ReorderBuffer(base=1)
+        self.assertEqual(len(b), 0)
+        self.assertTrue(b.push(p1))
+        self.assertEqual(len(b), 1)
+        self.assertIn(p1.sequence_number, b)
+        self.assertNotIn(p2.sequence_number, b)
+
+    def test_push_duplicate(self):
+        b = reorder.ReorderBuffer(base=1)
+        self.assertTrue(b.push(self._make_packet_with_seqnum(1)))
+        self.assertFalse(b.push(self._make_packet_with_seqnum(1)))
+        self.assertEqual(len(b), 1)
+
+    def test_push_outside_buffer(self):
+        b = reorder.ReorderBuffer(capacity=4, base=10)
+        self.assertFalse(b.push(self._make_packet_with_seqnum(9)))
+        self.assertFalse(b.push(self._make_packet_with_seqnum(14)))
+        self.assertTrue(b.push(self._make_packet_with_seqnum(13)))
+        self.assertEqual(len(b), 1)
+        self.assertNotIn(9, b)
+        self.assertNotIn(14, b)
+
+        # The slot of 13 is also the slot of 9 and 17.
+        self.assertNotIn(17, b)
+
+    def test_grow_up_to_capacity(self):
+        b = reorder.ReorderBuffer(base=1)
+        for seqnum in (1, 20, 300):
+            self.assertTrue(b.push(self._make_packet_with_seqnum(seqnum)))
+        self.assertFalse(
+            b.push(self._make_packet_with_seqnum(1 + constants.REORDER_BUFFER_SIZE))
+        )
+        self.assertEqual(b.capacity, constants.REORDER_BUFFER_SIZE)
+        for seqnum in (1, 20, 300):
+            self.assertIn(seqnum, b)
+        self.assertEqual(b.sack_blocks(2, 4), ((20, 21), (300, 301)))
+
+    def test_reset(self):
+        b = reorder.ReorderBuffer(base=1)
+        b.push(self._make_packet_with_seqnum(1))
+        b.reset(42)
+        self.assertEqual(len(b), 0)
+        self.assertEqual(b.base, 42)
+        self.assertNotIn(1, b)
+        self.assertTrue(b.push(self._make_packet_with_seqnum(42)))
+
+    def test_pop_all_fragments_from_empty_buffer(self):
+        b = reorder.ReorderBuffer()
+        self.assertIsNone(b.pop_min_and_all_fragments())
+
+    def test_pop_all_fragments_with_fragments_missing(self):
+        p1 = self._make_packet_with_seqnum(1)
+        p2 = self._make_packet_with_seqnum(2)
+        p4 = self._make_packet_with_seqnum(4)
+        p1.more_fragments = 3
+        p2.more_fragments = 2
+        p4.more_fragments = 0
+
+        b = reorder.ReorderBuffer(base=1)
+        b.push(p2)
+        b.push(p4)
+        b.push(p1)
+
+        self.assertIsNone(b.pop_min_and_all_fragments())
+
+        self.assertEqual(len(b), 3)
+        self.assertIn(1, b)
+        self.assertIn(2, b)
+        self.assertIn(4, b)
+        self.assertNotIn(3, b)
+
+    def test_pop_all_fragments_with_all_fragments_available(self):
+        p1 = self._make_packet_with_seqnum(1)
+        p2 = self._make_packet_with_seqnum(2)
+        p3 = self._make_packet_with_seqnum(3)
+        p4 = self._make_packet_with_seqnum(4)
+        p1.more_fragments = 2
+        p2.more_fragments = 1
+        p3.more_fragments = 0
+
+        b = reorder.ReorderBuffer(base=1)
+        b.push(p2)
+        b.push(p3)
+        b.push(p4)
+        b.push(p1)
+
+        packet_list = b.pop_min_and_all_fragments()
+        self.assertEqual(packet_list, (p1, p2, p3))
+        self.assertEqual(b.base, 4)
+
+        self.assertEqual(len(b), 1)
+        self.assertNotIn(1, b)
+        self.assertNotIn(2, b)
+        self.assertNotIn(3, b)
+        self.assertIn(4, b)
+
+    def test_pop_only_at_base(self):
+        b = reorder.ReorderBuffer(base=1)
+        b.push(self._make_packet_with_seqnum(2))
+        self.assertIsNone(b.pop_min_and_all_fragments())
+        self.assertEqual(len(b), 1)
+
+    def test_pop_across_wrap_around(self):
+        b = reorder.ReorderBuffer(capacity=4, base=3)
+        packets = tuple(self._make_packet_with_seqnum(s) for s in range(3, 7))
+        for i, p in enumerate(packets):
+            p.more_fragments = len(packets) - i - 1
+            b.push(p)
+
+        self.assertEqual(b.pop_min_and_all_fragments(), packets)
+        self.assertEqual(len(b), 0)
+        self.assertTrue(b.push(self._make_packet_with_seqnum(10)))
+
+    def test_pop_fragments_ahead_of_base(self):
+        p2 = self._make_packet_with_seqnum(2)
+        p3 = self._make_packet_with_seqnum(3)
+        p2.more_fragments = 1
+
+        b = reorder.ReorderBuffer(base=1)
+        b.push(p2)
+        self.assertIsNone(b.pop_fragments(2, 2))
+        b.push(p3)
+        self.assertEqual(b.pop_fragments(2, 2), (p2, p3))
+        self.assertEqual(len(b), 0)
+        self.assertEqual(b.base, 1)
+        self.assertEqual(b.span, 3)
+
+        # Popped packets still count as received.
+        self.assertIn(2, b)
+        self.assertIn(3, b)
+        self.assertFalse(b.push(self._make_packet_with_seqnum(3)))
+        self.assertIsNone(b.pop_fragments(2, 2))
+        self.assertEqual(b.sack_blocks(1, 4), ((2, 4),))
+
+    def test_pop_fragments_advances_base(self):
+        p1 = self._make_packet_with_seqnum(1)
+        p2 = self._make_packet_with_seqnum(2)
+        p4 = self._make_packet_with_seqnum(4)
+        b = reorder.ReorderBuffer(base=1)
+        for p in (p1, p2, p4):
+            b.push(p)
+
+        self.assertEqual(b.pop_fragments(2, 1), (p2,))
+        self.assertEqual(b.base, 1)
+        self.assertEqual(b.pop_fragments(1, 1), (p1,))
+        self.assertEqual(b.base, 3)
+        self.assertIsNone(b.pop_min_and_all_fragments())
+        self.assertIsNone(b.pop_fragments(1, 1))
+        self.assertEqual(len(b), 1)
+
+    def test_pop_min_run(self):
+        b = reorder.ReorderBuffer(capacity=4, base=1)
+        self.assertIsNone(b.peek_min())
+        self.assertEqual(b.pop_min_run(5), [])
+        for seqnum in (1, 2, 4):
+            b.push(self._make_packet_with_seqnum(seqnum))
+        self.assertEqual(b.peek_min().sequence_number, 1)
+
+        # The run stops at the hole, and frees the slots it spanned.
+        run = b.pop_min_run(5)
+        self.assertEqual([p.sequence_number for p in run], [1, 2])
+        self.assertEqual((b.base, len(b)), (3, 1))
+        self.assertTrue(b.push(self._make_packet_with_seqnum(6)))
+        self.assertTrue(b.push(self._make_packet_with_seqnum(3)))
+        run = b.pop_min_run(4)
+        self.assertEqual([p.sequence_number for p in run], [3])
+        self.assertEqual(b.base, 4)
+
+    def test_sack_blocks_from_empty_buffer(self):
+        b = reorder.ReorderBuffer()
+        self.assertEqual(b.sack_blocks(0, 4), ())
+
+    def test_sack_blocks(self):
+        b = reorder.ReorderBuffer(base=1)
+        for seqnum in (1, 3, 4, 6, 8, 9, 11):
+            b.push(self._make_packet_with_seqnum(seqnum))
+
+        self.assertEqual(b.sack_blocks(2, 4), ((3, 5), (6, 7), (8, 10), (11, 12)))
+        self.assertEqual(b.sack_blocks(2, 2), ((3, 5), (6, 7)))
+        self.assertEqual(b.sack_blocks(4, 1), ((4, 5),))
+        self.assertEqual(b.sack_blocks(12, 4), ())
+
+    def test_reassemble_reordered_stream(self):
+        packets = []
+        for seqnum in range(1, 301):
+            p = self._make_packet_with_seqnum(seqnum)
+            p.more_fragments = (3 - seqnum) % 3
+            packets.append(p)
+        rng = random.Random(0)
+        arrival = sorted(
+            packets,
+            key=lambda p: p.sequence_number + rng.uniform(0, 20)
+        )
+
+        b = reorder.ReorderBuffer(capacity=32, base=1)
+        popped = []
+        for p in arrival:
+            self.assertTrue(b.push(p))
+            fragments = b.pop_min_and_all_fragments()
+            while fragments is not None:
+                self.assertEqual(len(fragments), 3)
+                popped.extend(fragments)
+                fragments = b.pop_min_and_all_fragments()
+
+        self.assertEqual(popped, packets)
+        self.assertEqual(len(b), 0)
@@ -0,0 +1,49 @@
+import unittest
+
+from leviathan.network.engine import constants, rtt
+
+
+class TestRTTEstimatorAPI(unittest.TestCase):
+
+    def test_init(self):
+        estimator = rtt.RTTEstimator()
+        self.assertIsNone(estimator.srtt)
+        self.assertIsNone(estimator.rttvar)
+        self.assertEqual(estimator.rto, constants.PACKET_TIMEOUT)
+
+    def test_first_sample(self):
+        estimator = rtt.RTTEstimator(min_rto=0, granularity=0)
+        estimator.update(0.2)
+        self.assertAlmostEqual(estimator.srtt, 0.2)
+        self.assertAlmostEqual(estimator.rttvar, 0.1)
+        self.assertAlmostEqual(estimator.rto, 0.2 + 4 * 0.1)
+
+    def test_subsequent_samples(self):
+        estimator = rtt.RTTEstimator(min_rto=0, granularity=0)
+        estimator.update(0.2)
+        estimator.update(0.4)
+        self.assertAlmostEqual(estimator.rttvar, 0.75 * 0.1 + 0.25 * 0.2)
+        self.assertAlmostEqual(estimator.srtt, 0.875 * 0.2 + 0.125 * 0.4)
+        self.assertAlmostEqual(
+            estimator.rto,
+            estimator.srtt + 4 * estimator.rttvar
+        )
+
+    def test_stable_samples_converge(self):
+        estimator = rtt.RTTEstimator(min_rto=0, granularity=0.01)
+        for _ in range(200):
+            estimator.update(0.05)
+        self.assertAlmostEqual(estimator.srtt, 0.05)
+        self.assertAlmostEqual(estimator.rto, 0.06)
+
+    def test_rto_bounds(self):
+        estimator = rtt.RTTEstimator(min_rto=0.1, max_rto=3)
+        estimator.update(0.001)
+        self.assertEqual(estimator.rto, 0.1)
+        estimator.update(10)
+        self.assertEqual(estimator.rto, 3)
+
+    def test_backoff(self):
+        estimator = rtt.RTTEstimator(max_rto=3)
+        self.assertEqual(estimator.backoff(0.5), 1)
+        self.assertEqual(estimator.backoff(2), 3)
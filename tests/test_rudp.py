@@ -4,9 +4,12 @@ import sys
 import unittest
 
 import mock
-from twisted.internet import address, protocol, udp
+from twisted.internet import address, protocol, task, udp
 
-from leviathan.network.engine import connection, packet, rudp
+from leviathan.network.engine import (
+    admission, connection, constants, cookie, ipfilter, packet, rudp, stats,
+    timer
+)
 
 
 class TestConnectionManagerAPI(unittest.TestCase):
@@ -65,7 +68,10 @@ class TestConnectionManagerAPI(unittest.TestCase):
     def test_set_existent_connection(self):
         cm = self._make_cm()
         mock_connection1 = mock.Mock(spec_set=connection.Connection)
+        mock_connection1.stats = stats.ConnectionStats()
+        mock_connection1.stats.sent_datagrams = 10
         mock_connection2 = mock.Mock(spec_set=connection.Connection)
+        mock_connection2.stats = stats.ConnectionStats()
         cm[self.addr1] = mock_connection1
         cm[self.addr1] = mock_connection2
         self.assertIn(self.addr1, cm)
@@ -73,6 +79,14 @@ class TestConnectionManagerAPI(unittest.TestCase):
         mock_connection1.shutdown.assert_called_once_with()
         mock_connection2.shutdown.assert_not_called()
 
+        # Counters of the replaced connection are kept.
+        self.assertEqual(cm.stats.connections, 1)
+        self.assertEqual(cm.stats.sent_datagrams, 10)
+
+        # Registering the same connection again replaces nothing.
+        cm[self.addr1] = mock_connection2
+        mock_connection2.shutdown.assert_not_called()
+
     def test_del_nonexistent_connection(self):
         cm = self._make_cm()
         self.assertNotIn(self.addr1, cm)
@@ -94,6 +108,89 @@ class TestConnectionManagerAPI(unittest.TestCase):
         cm[self.addr2] = mock_connection2
         self.assertEqual(set(cm), {self.addr1, self.addr2})
 
+    def test_aggregate_stats(self):
+        cm = self._make_cm()
+        for i, addr in enumerate((self.addr1, self.addr2)):
+            mock_connection = mock.Mock(spec_set=connection.Connection)
+            mock_connection.stats = stats.ConnectionStats()
+            mock_connection.stats.sent_datagrams = 10 * (i + 1)
+            mock_connection.stats.window = i + 1
+            cm[addr] = mock_connection
+
+        aggregate = cm.stats
+        self.assertEqual(aggregate.connections, 2)
+        self.assertEqual(aggregate.sent_datagrams, 30)
+        self.assertEqual(aggregate.window, 3)
+
+        # Counters of unregistered connections are kept.
+        cm.retire_stats(cm[self.addr1].stats)
+        del cm[self.addr1]
+        self.assertIs(cm.stats, aggregate)
+        self.assertEqual(aggregate.connections, 1)
+        self.assertEqual(aggregate.sent_datagrams, 30)
+        self.assertEqual(aggregate.window, 2)
+
+    def _make_idle_connection(self, last_activity):
+        mock_connection = mock.Mock(spec_set=connection.Connection)
+        mock_connection.last_activity = last_activity
+        mock_connection.state = connection.State.CONNECTED
+        return mock_connection
+
+    def test_sweep_idle_connections(self):
+        clock = task.Clock()
+        cm = self._make_cm()
+        cm.timer_wheel = timer.TimerWheel(clock=clock)
+        cm.keepalive_interval = 15
+        clock.advance(100)
+        active = self._make_idle_connection(99)
+        quiet = self._make_idle_connection(80)
+        idle = self._make_idle_connection(39)
+        cm[self.addr1] = active
+        cm[self.addr2] = quiet
+        cm[self.addr3] = idle
+
+        clock.advance(constants.IDLE_SWEEP_INTERVAL)
+        active.send_keepalive.assert_not_called()
+        quiet.send_keepalive.assert_called_once_with()
+        idle.shutdown.assert_called_once_with()
+        idle.unregister.assert_called_once_with()
+        for mock_connection in (active, quiet):
+            mock_connection.shutdown.assert_not_called()
+            mock_connection.unregister.assert_not_called()
+
+    def test_sweep_without_keepalives(self):
+        clock = task.Clock()
+        cm = self._make_cm()
+        cm.timer_wheel = timer.TimerWheel(clock=clock)
+        clock.advance(100)
+        quiet = self._make_idle_connection(80)
+        cm[self.addr1] = quiet
+
+        clock.advance(constants.IDLE_SWEEP_INTERVAL)
+        quiet.send_keepalive.assert_not_called()
+        quiet.shutdown.assert_not_called()
+
+    def test_sweep_in_batches(self):
+        clock = task.Clock()
+        cm = self._make_cm()
+        cm.timer_wheel = timer.TimerWheel(clock=clock)
+        clock.advance(constants.IDLE_TIMEOUT)
+        count = constants.IDLE_SWEEP_BATCH + 2
+        for port in range(count):
+            cm[('132.54.76.98', port)] = self._make_idle_connection(0)
+
+        clock.advance(constants.IDLE_SWEEP_INTERVAL)
+        expired = sum(con.unregister.called for con in cm.values())
+        self.assertEqual(expired, constants.IDLE_SWEEP_BATCH)
+
+        # Connections unregistered during a pass are skipped.
+        removed = cm[('132.54.76.98', count - 1)]
+        del cm[('132.54.76.98', count - 1)]
+        clock.advance(constants.IDLE_SWEEP_INTERVAL)
+        expired = sum(con.unregister.called for con in cm.values())
+        self.assertEqual(expired, count - 1)
+        removed.shutdown.assert_not_called()
+
     def test_receive_bad_protobuf_datagram(self):
         cm = self._make_cm()
         mock_connection = mock.Mock(spec_set=connection.Connection)
@@ -106,10 +203,22 @@ class TestConnectionManagerAPI(unittest.TestCase):
         cm = self._make_cm()
         mock_connection = mock.Mock(spec_set=connection.Connection)
         cm[self.addr1] = mock_connection
-        datagram = packet.Packet.from_data(
+        rudp_packet = packet.Packet.from_data(
             1,
             ('127.0.0.1', 2**20),  # Bad port value
             self.addr1
+        )
+        # The compact header has no room for the port.
+        rudp_packet.header_format = packet.HeaderFormat.LEGACY
+        datagram = rudp_packet.to_bytes()
+
+        cm.datagramReceived(datagram, self.addr1)
+        mock_connection.receive_packet.assert_not_called()
+
+        datagram = packet.Packet.from_data(
+            1,
+            ('127.0.0.1', 0),  # Bad port value
+            self.addr1
         ).to_bytes()
 
         cm.datagramReceived(datagram, self.addr1)
@@ -147,6 +256,63 @@ class TestConnectionManagerAPI(unittest.TestCase):
         cm.datagramReceived(datagram, source_addr)
         mock_connection.receive_packet.assert_not_called()
 
+    def test_receive_from_banned_network(self):
+        cm = self._make_cm()
+        cm.ban_ip('231.76.0.0/16')
+        cm.allow_ip('231.76.45.0/24')
+        datagram = packet.Packet.from_data(
+            1,
+            (self.public_ip, self.port),
+            self.addr2
+        ).to_bytes()
+        with mock.patch.object(
+            packet.Packet,
+            'from_bytes',
+            wraps=packet.Packet.from_bytes
+        ) as from_bytes:
+            cm.datagramReceived(datagram, ('231.76.1.2', 12345))
+            cm.datagramReceived(datagram, ('::ffff:231.76.1.2', 12345))
+            from_bytes.assert_not_called()
+
+            cm.datagramReceived(datagram, self.addr3)
+            from_bytes.assert_called_once_with(datagram)
+
+        cm.remove_ip_ban('231.76.45.0/24')
+        cm.remove_ip_ban('231.76.45.0/24')
+        self.assertTrue(
+            cm.ip_filter.is_banned(
+                ipfilter.pack_ip(self.addr3[0]),
+                cm.timer_wheel.seconds()
+            )
+        )
+
+    def test_ban_expires(self):
+        clock = task.Clock()
+        cm = self._make_cm()
+        cm.timer_wheel = timer.TimerWheel(clock=clock)
+        cm.ban_ip(self.addr2[0], duration=60)
+        packed_ip = ipfilter.pack_ip(self.addr2[0])
+        self.assertTrue(cm.ip_filter.is_banned(packed_ip, clock.seconds()))
+        clock.advance(60)
+        self.assertFalse(cm.ip_filter.is_banned(packed_ip, clock.seconds()))
+
+    def test_sweep_expired_ip_rules(self):
+        clock = task.Clock()
+        cm = self._make_cm()
+        cm.timer_wheel = timer.TimerWheel(clock=clock)
+        cm.ban_ip(self.addr1[0])
+        cm.ban_ip(self.addr2[0], duration=60)
+        self.assertEqual(len(cm.ip_filter), 2)
+
+        clock.advance(60)
+        clock.advance(constants.IDLE_SWEEP_INTERVAL)
+        self.assertEqual(len(cm.ip_filter), 1)
+        self.assertTrue(clock.getDelayedCalls())
+
+        cm.remove_ip_ban(self.addr1[0])
+        clock.advance(constants.IDLE_SWEEP_INTERVAL)
+        self.assertFalse(clock.getDelayedCalls())
+
     def _make_connected_cm(self):
         cm = self._make_cm()
         transport = mock.Mock(spec_set=udp.Port)
@@ -208,6 +374,9 @@ class TestConnectionManagerAPI(unittest.TestCase):
         # cm.connection_factory.make_new_connection.assert_not_called()
         mock_connection.receive_packet.assert_called_once_with(rudp_packet, source_addr)
 
+    def _make_syn_cookie(self, cm, seqnum, source_addr, from_addr):
+        return cm._syn_cookies.make(seqnum, source_addr, from_addr, cm.timer_wheel.seconds())
+
     def test_receive_datagram_in_new_connection(self):
         cm = self._make_connected_cm()
 
@@ -216,7 +385,8 @@ class TestConnectionManagerAPI(unittest.TestCase):
             1,
             (self.public_ip, self.port),
             source_addr,
-            syn=True
+            syn=True,
+            cookie=self._make_syn_cookie(cm, 1, source_addr, source_addr)
         )
         datagram = rudp_packet.to_bytes()
 
@@ -240,7 +410,8 @@ class TestConnectionManagerAPI(unittest.TestCase):
             1,
             (self.public_ip, self.port),
             source_addr,
-            syn=True
+            syn=True,
+            cookie=self._make_syn_cookie(cm, 1, source_addr, relay_addr)
         )
         datagram = rudp_packet.to_bytes()
 
@@ -255,6 +426,189 @@ class TestConnectionManagerAPI(unittest.TestCase):
         mock_connection = cm[source_addr]
         mock_connection.receive_packet.assert_called_once_with(rudp_packet, relay_addr)
 
+    def test_answer_syn_with_cookie(self):
+        cm = self._make_connected_cm()
+        rudp_packet = packet.Packet.from_data(
+            1,
+            (self.public_ip, self.port),
+            self.addr3,
+            syn=True,
+            cookie=bytes(1 + cookie.MAC_SIZE)
+        )
+        datagram = rudp_packet.to_bytes()
+
+        cm.datagramReceived(datagram, self.addr2)
+        cm.connection_factory.make_new_connection.assert_not_called()
+        self.assertNotIn(self.addr3, cm)
+
+        (cookie_datagram, addr), _ = cm.transport.write.call_args
+        self.assertEqual(addr, self.addr2)
+        self.assertLessEqual(len(cookie_datagram), len(datagram))
+        cookie_packet = packet.Packet.from_bytes(cookie_datagram)
+        self.assertFalse(cookie_packet.syn)
+        self.assertEqual(cookie_packet.dest_addr, self.addr3)
+
+        # The SYN echoing the cookie creates the connection.
+        rudp_packet.cookie = cookie_packet.cookie
+        cm.datagramReceived(rudp_packet.to_bytes(), self.addr2)
+        cm.connection_factory.make_new_connection.assert_called_once_with(
+            cm,
+            (self.public_ip, self.port),
+            self.addr3,
+            self.addr2
+        )
+
+    def test_answer_legacy_syn_with_legacy_cookie(self):
+        cm = self._make_connected_cm()
+        rudp_packet = packet.Packet.from_data(
+            1,
+            (self.public_ip, self.port),
+            self.addr3,
+            syn=True,
+            cookie=bytes(1 + cookie.MAC_SIZE)
+        )
+        rudp_packet.header_format = packet.HeaderFormat.LEGACY
+        datagram = rudp_packet.to_bytes()
+
+        cm.datagramReceived(datagram, self.addr2)
+        (cookie_datagram, addr), _ = cm.transport.write.call_args
+        self.assertEqual(
+            packet.detect_format(cookie_datagram),
+            packet.HeaderFormat.LEGACY
+        )
+        self.assertLessEqual(len(cookie_datagram), len(datagram))
+
+    def test_normalize_public_ip(self):
+        cm = rudp.ConnectionMultiplexer(
+            mock.Mock(),
+            '2001:0DB8:0000:0000:0000:0000:0000:0001'
+        )
+        self.assertEqual(cm.public_ip, '2001:db8::1')
+        self.assertRaises(
+            packet.ValidationError,
+            rudp.ConnectionMultiplexer,
+            mock.Mock(),
+            '123.45.67'
+        )
+
+    def test_ignore_syn_smaller_than_cookie(self):
+        cm = self._make_connected_cm()
+        rudp_packet = packet.Packet.from_data(
+            1,
+            (self.public_ip, self.port),
+            self.addr3,
+            syn=True
+        )
+        cm.datagramReceived(rudp_packet.to_bytes(), self.addr3)
+        cm.transport.write.assert_not_called()
+        cm.connection_factory.make_new_connection.assert_not_called()
+
+    def test_reject_syn_with_bad_cookie(self):
+        cm = self._make_connected_cm()
+        rudp_packet = packet.Packet.from_data(
+            2,
+            (self.public_ip, self.port),
+            self.addr3,
+            syn=True,
+            cookie=self._make_syn_cookie(cm, 1, self.addr3, self.addr3)
+        )
+        cm.datagramReceived(rudp_packet.to_bytes(), self.addr3)
+        cm.connection_factory.make_new_connection.assert_not_called()
+        cm.transport.write.assert_called_once()
+
+    def test_receive_syn_without_cookies(self):
+        cm = rudp.ConnectionMultiplexer(
+            mock.Mock(spec_set=connection.ConnectionFactory),
+            self.public_ip,
+            syn_cookies=False
+        )
+        cm.port = self.port
+        rudp_packet = packet.Packet.from_data(
+            1,
+            (self.public_ip, self.port),
+            self.addr3,
+            syn=True
+        )
+        cm.datagramReceived(rudp_packet.to_bytes(), self.addr3)
+        self.assertIn(self.addr3, cm)
+
+    def _make_admission_cm(self, **kwargs):
+        cm = rudp.ConnectionMultiplexer(
+            mock.Mock(spec_set=connection.ConnectionFactory),
+            self.public_ip,
+            admission_control=admission.AdmissionControl(**kwargs)
+        )
+        cm.transport = mock.Mock(spec_set=udp.Port)
+        cm.port = self.port
+        return cm
+
+    def test_drop_before_decoding(self):
+        cm = self._make_admission_cm(datagram_rate=2, burst=1, ban_threshold=1)
+        datagram = packet.Packet.from_data(
+            1,
+            (self.public_ip, self.port),
+            self.addr3
+        ).to_bytes()
+        with mock.patch.object(
+            packet.Packet,
+            'from_bytes',
+            wraps=packet.Packet.from_bytes
+        ) as from_bytes:
+            for _ in range(4):
+                cm.datagramReceived(datagram, self.addr3)
+            self.assertEqual(from_bytes.call_count, 2)
+            self.assertTrue(cm.admission_control.is_banned(self.addr3[0], cm.timer_wheel.seconds()))
+
+            # Other IPs are unaffected.
+            cm.datagramReceived(datagram, self.addr2)
+            self.assertEqual(from_bytes.call_count, 3)
+
+    def test_bad_datagrams_count_as_violations(self):
+        cm = self._make_admission_cm(ban_threshold=1)
+        cm.datagramReceived(b'!@#4noise%^&*', self.addr3)
+        cm.datagramReceived(b'!@#4noise%^&*', self.addr3)
+        self.assertTrue(cm.admission_control.is_banned(self.addr3[0], cm.timer_wheel.seconds()))
+
+    def test_cap_connections_per_ip(self):
+        cm = self._make_admission_cm(max_connections=1)
+        source_addrs = ((self.addr3[0], 1000), (self.addr3[0], 1001))
+        for source_addr in source_addrs:
+            rudp_packet = packet.Packet.from_data(
+                1,
+                (self.public_ip, self.port),
+                source_addr,
+                syn=True,
+                cookie=self._make_syn_cookie(cm, 1, source_addr, source_addr)
+            )
+            cm.datagramReceived(rudp_packet.to_bytes(), source_addr)
+        self.assertEqual(len(cm), 1)
+        self.assertIn(source_addrs[0], cm)
+
+        # Unregistering a connection makes room for another.
+        del cm[source_addrs[0]]
+        self.assertTrue(cm.admission_control.can_connect(self.addr3[0]))
+
+    def test_cap_connections_per_sender(self):
+        cm = self._make_admission_cm(max_connections=2, ban_threshold=10)
+        # One host claims a new source IP in each SYN.
+        source_addrs = [('132.54.76.{0}'.format(i), 1000) for i in range(4)]
+        for source_addr in source_addrs:
+            rudp_packet = packet.Packet.from_data(
+                1,
+                (self.public_ip, self.port),
+                source_addr,
+                syn=True,
+                cookie=self._make_syn_cookie(cm, 1, source_addr, self.addr3)
+            )
+            cm.datagramReceived(rudp_packet.to_bytes(), self.addr3)
+        self.assertEqual(sorted(cm), source_addrs[:2])
+        self.assertFalse(cm.admission_control.can_connect(self.addr3[0]))
+        for source_addr in source_addrs:
+            self.assertTrue(cm.admission_control.can_connect(source_addr[0]))
+
+        del cm[source_addrs[0]]
+        self.assertTrue(cm.admission_control.can_connect(self.addr3[0]))
+
     def test_make_new_connection(self):
         cm = self._make_cm()
         cm.make_new_connection(self.addr1, self.addr2)
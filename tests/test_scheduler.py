@@ -0,0 +1,135 @@
+import asyncio
+import time
+import unittest
+
+import mock
+from twisted.internet import task
+
+from leviathan.network.engine import scheduler
+
+
+class TestAsyncioClockAPI(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.clock = scheduler.AsyncioClock(self.loop)
+
+    def _run_once(self):
+        self.loop.call_soon(self.loop.stop)
+        self.loop.run_forever()
+
+    def test_init(self):
+        self.assertIs(self.clock.loop, self.loop)
+        self.assertAlmostEqual(self.clock.seconds(), self.loop.time(), delta=1)
+        self.assertAlmostEqual(self.clock.wall_seconds(), time.time(), delta=1)
+
+    def test_default_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.addCleanup(asyncio.set_event_loop, None)
+        self.assertIs(scheduler.AsyncioClock().loop, self.loop)
+
+    def test_call_soon(self):
+        cb = mock.Mock()
+        call = self.clock.callLater(0, cb, 1, key=2)
+        self.assertTrue(call.active())
+        cb.assert_not_called()
+        self._run_once()
+        cb.assert_called_once_with(1, key=2)
+        self.assertFalse(call.active())
+
+    def test_call_later(self):
+        cb = mock.Mock(side_effect=lambda: self.loop.stop())
+        start = self.loop.time()
+        call = self.clock.callLater(0.05, cb)
+        self.loop.run_forever()
+        cb.assert_called_once_with()
+        self.assertGreaterEqual(self.loop.time() - start, 0.04)
+        self.assertFalse(call.active())
+
+    def test_cancel(self):
+        cb = mock.Mock()
+        call = self.clock.callLater(0, cb)
+        call.cancel()
+        self.assertFalse(call.active())
+        self._run_once()
+        cb.assert_not_called()
+
+        # Cancelling twice is harmless.
+        call.cancel()
+
+
+class TestLoopingCallAPI(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = task.Clock()
+        self.func = mock.Mock()
+        self.looping_call = scheduler.LoopingCall(self.clock, self.func)
+
+    def _stop_after(self, calls):
+        # Calls without delay all run in a single advance of the clock.
+        def count():
+            if self.func.call_count == calls:
+                self.looping_call.stop()
+        self.func.side_effect = count
+
+    def test_init(self):
+        self.assertFalse(self.looping_call.running)
+        self.assertFalse(self.clock.getDelayedCalls())
+
+    def test_start_now(self):
+        self._stop_after(3)
+        self.looping_call.start()
+        self.assertTrue(self.looping_call.running)
+        self.assertEqual(self.func.call_count, 1)
+        self.assertEqual(len(self.clock.getDelayedCalls()), 1)
+        self.clock.advance(0)
+        self.assertEqual(self.func.call_count, 3)
+        self.assertFalse(self.looping_call.running)
+        self.assertFalse(self.clock.getDelayedCalls())
+
+    def test_start_later(self):
+        self._stop_after(1)
+        self.looping_call.start(now=False)
+        self.func.assert_not_called()
+        self.clock.advance(0)
+        self.assertEqual(self.func.call_count, 1)
+
+    def test_stop(self):
+        self.looping_call.start()
+        self.looping_call.stop()
+        self.assertFalse(self.looping_call.running)
+        self.assertFalse(self.clock.getDelayedCalls())
+        self.clock.advance(0)
+        self.assertEqual(self.func.call_count, 1)
+
+        # A stopped call can be restarted.
+        self._stop_after(2)
+        self.looping_call.start(now=False)
+        self.clock.advance(0)
+        self.assertEqual(self.func.call_count, 2)
+
+    def test_restart_from_call(self):
+        def restart():
+            self.looping_call.stop()
+            if self.func.call_count < 3:
+                self.looping_call.start(now=False)
+
+        self.func.side_effect = restart
+        self.looping_call.start()
+        self.assertEqual(len(self.clock.getDelayedCalls()), 1)
+        self.clock.advance(0)
+        self.assertEqual(self.func.call_count, 3)
+        self.assertFalse(self.clock.getDelayedCalls())
+
+    def test_error_stops(self):
+        self.func.side_effect = ValueError
+        self.assertRaises(ValueError, self.looping_call.start)
+        self.assertFalse(self.looping_call.running)
+        self.assertFalse(self.clock.getDelayedCalls())
+
+    def test_bad_start_stop(self):
+        self.assertRaises(AssertionError, self.looping_call.stop)
+        self.looping_call.start()
+        self.assertRaises(AssertionError, self.looping_call.start)
+        self.looping_call.stop()
@@ -0,0 +1,68 @@
+import unittest
+
+from leviathan.network.engine import stats
+
+
+class TestConnectionStatsAPI(unittest.TestCase):
+
+    def test_init(self):
+        s = stats.ConnectionStats()
+        self.assertEqual(s.sent_datagrams, 0)
+        self.assertEqual(s.retransmissions, 0)
+        self.assertEqual(s.recovered_segments, 0)
+        self.assertIsNone(s.srtt)
+        self.assertEqual(s.window, 0)
+
+
+class TestAggregateStatsAPI(unittest.TestCase):
+
+    @staticmethod
+    def _make_stats(sent_datagrams, srtt, window):
+        s = stats.ConnectionStats()
+        s.sent_datagrams = sent_datagrams
+        s.srtt = srtt
+        s.rto = 2 * srtt if srtt is not None else 1
+        s.window = window
+        return s
+
+    def test_add(self):
+        aggregate = stats.AggregateStats()
+        aggregate.add(self._make_stats(10, None, 1))
+        aggregate.add(self._make_stats(20, 0.2, 2))
+        aggregate.add(self._make_stats(30, 0.1, 3))
+
+        self.assertEqual(aggregate.connections, 3)
+        self.assertEqual(aggregate.sent_datagrams, 60)
+        self.assertEqual(aggregate.srtt, 0.2)
+        self.assertEqual(aggregate.rto, 1)
+        self.assertEqual(aggregate.window, 6)
+
+    def test_reset_keeps_closed_counters(self):
+        closed = stats.AggregateStats()
+        closed.add_counters(self._make_stats(10, 0.1, 1))
+        self.assertEqual(closed.connections, 0)
+        self.assertEqual(closed.window, 0)
+
+        aggregate = stats.AggregateStats()
+        aggregate.add(self._make_stats(20, 0.2, 2))
+        aggregate.reset(closed)
+        self.assertEqual(aggregate.connections, 0)
+        self.assertEqual(aggregate.sent_datagrams, 10)
+        self.assertIsNone(aggregate.srtt)
+        self.assertEqual(aggregate.window, 0)
+
+    def test_merge(self):
+        first = stats.AggregateStats()
+        first.add(self._make_stats(10, 0.1, 1))
+        second = stats.AggregateStats()
+        second.add(self._make_stats(20, 0.3, 2))
+        second.add(self._make_stats(30, None, 3))
+
+        aggregate = stats.AggregateStats()
+        aggregate.merge(first)
+        aggregate.merge(second)
+        self.assertEqual(aggregate.connections, 3)
+        self.assertEqual(aggregate.sent_datagrams, 60)
+        self.assertEqual(aggregate.srtt, 0.3)
+        self.assertEqual(aggregate.rto, 1)
+        self.assertEqual(aggregate.window, 6)
@@ -0,0 +1,141 @@
+import unittest
+
+import mock
+from twisted.internet import task
+
+from leviathan.network.engine import timer
+
+
+class TestTimerWheelAPI(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = task.Clock()
+        self.wheel = timer.TimerWheel(granularity=0.01, clock=self.clock)
+
+    def test_init(self):
+        self.assertEqual(len(self.wheel), 0)
+        self.assertEqual(self.wheel.seconds(), self.clock.seconds())
+        self.assertFalse(self.clock.getDelayedCalls())
+
+    def test_wall_seconds(self):
+        self.clock.advance(5)
+        self.assertEqual(self.wheel.wall_seconds(), 5)
+        self.clock.wall_seconds = mock.Mock(return_value=1000)
+        self.assertEqual(self.wheel.wall_seconds(), 1000)
+
+    def test_call_later(self):
+        cb = mock.Mock()
+        t = self.wheel.call_later(0.6, cb, 1, key=2)
+        self.assertTrue(t.active())
+        self.assertEqual(len(self.wheel), 1)
+
+        self.clock.advance(0.59)
+        cb.assert_not_called()
+
+        self.clock.advance(0.01)
+        cb.assert_called_once_with(1, key=2)
+        self.assertFalse(t.active())
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_call_later_without_kwargs(self):
+        cb = mock.Mock()
+        t = self.wheel.call_later(0.6, cb, 1)
+        self.assertIsNone(t.kwargs)
+        self.clock.advance(0.6)
+        cb.assert_called_once_with(1)
+
+    def test_single_driver_for_many_timers(self):
+        for i in range(1000):
+            self.wheel.call_later(i * 0.01, lambda: None)
+        self.assertEqual(len(self.clock.getDelayedCalls()), 1)
+
+    def test_driver_stops_when_idle(self):
+        self.wheel.call_later(0.1, lambda: None)
+        self.clock.advance(0.1)
+        self.assertFalse(self.clock.getDelayedCalls())
+
+    def test_cancel(self):
+        cb = mock.Mock()
+        t = self.wheel.call_later(0.1, cb)
+        t.cancel()
+        self.assertFalse(t.active())
+        self.assertEqual(len(self.wheel), 0)
+        self.assertFalse(self.clock.getDelayedCalls())
+
+        # Cancelling twice is harmless.
+        t.cancel()
+
+        self.clock.advance(1)
+        cb.assert_not_called()
+
+    def test_cancel_from_callback_in_same_tick(self):
+        cb = mock.Mock()
+        later = []
+        self.wheel.call_later(0.1, lambda: later[0].cancel())
+        later.append(self.wheel.call_later(0.1, cb))
+
+        self.clock.advance(0.1)
+        cb.assert_not_called()
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_reset(self):
+        cb = mock.Mock()
+        t = self.wheel.call_later(0.1, cb)
+        self.clock.advance(0.05)
+        t.reset(0.1)
+
+        self.clock.advance(0.05)
+        cb.assert_not_called()
+        self.clock.advance(0.05)
+        cb.assert_called_once_with()
+
+    def test_fire_in_deadline_order(self):
+        fired = []
+        for delay in (0.3, 0.1, 0.2):
+            self.wheel.call_later(delay, fired.append, delay)
+        self.clock.advance(1)
+        self.assertEqual(fired, [0.1, 0.2, 0.3])
+
+    def test_cascade_long_timers(self):
+        cb = mock.Mock()
+        # Far beyond the span of the lowest level.
+        self.wheel.call_later(1000, cb)
+        self.wheel.call_later(3.5, cb)
+
+        self.clock.advance(3.49)
+        cb.assert_not_called()
+        self.clock.advance(0.01)
+        self.assertEqual(cb.call_count, 1)
+
+        for _ in range(99):
+            self.clock.advance(10)
+        self.assertEqual(cb.call_count, 1)
+        self.clock.advance(10)
+        self.assertEqual(cb.call_count, 2)
+
+    def test_schedule_after_idle_period(self):
+        cb = mock.Mock()
+        self.clock.advance(100)
+        self.wheel.call_later(0.05, cb)
+        self.clock.advance(0.04)
+        cb.assert_not_called()
+        self.clock.advance(0.01)
+        cb.assert_called_once_with()
+
+    def test_schedule_from_callback(self):
+        cb = mock.Mock()
+        self.wheel.call_later(0.1, self.wheel.call_later, 0.1, cb)
+        self.clock.advance(0.1)
+        cb.assert_not_called()
+        self.clock.advance(0.1)
+        cb.assert_called_once_with()
+
+    def test_stop(self):
+        cb = mock.Mock()
+        timers = [self.wheel.call_later(0.1, cb) for _ in range(3)]
+        self.wheel.stop()
+        self.assertEqual(len(self.wheel), 0)
+        self.assertFalse(any(t.active() for t in timers))
+        self.assertFalse(self.clock.getDelayedCalls())
+        self.clock.advance(1)
+        cb.assert_not_called()
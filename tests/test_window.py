@@ -0,0 +1,75 @@
+import unittest
+
+from leviathan.network.engine import constants, window
+
+
+class TestSendWindowAPI(unittest.TestCase):
+
+    def test_init(self):
+        w = window.SendWindow()
+        self.assertEqual(len(w), 0)
+        self.assertIsNone(w.lowest)
+        self.assertEqual(w.capacity, constants.WINDOW_SIZE)
+
+    def test_init_with_invalid_capacity(self):
+        self.assertRaises(ValueError, window.SendWindow, 0)
+
+    def test_set_and_get(self):
+        w = window.SendWindow(capacity=4)
+        w[10] = 'a'
+        w[12] = 'c'
+        self.assertEqual(len(w), 2)
+        self.assertEqual(w.lowest, 10)
+        self.assertEqual(w[10], 'a')
+        self.assertIn(12, w)
+        self.assertNotIn(11, w)
+        self.assertNotIn(14, w)
+        with self.assertRaises(KeyError):
+            _ = w[11]
+
+    def test_set_outside_window(self):
+        w = window.SendWindow(capacity=4)
+        w[10] = 'a'
+        with self.assertRaises(ValueError):
+            w[14] = 'e'
+        with self.assertRaises(ValueError):
+            w[10] = 'b'
+        w[13] = 'd'
+        self.assertEqual(tuple(w), (10, 13))
+
+    def test_pop(self):
+        w = window.SendWindow(capacity=4)
+        for seqnum, item in zip(range(10, 14), 'abcd'):
+            w[seqnum] = item
+
+        self.assertEqual(w.pop(11), 'b')
+        self.assertIsNone(w.pop(11))
+        self.assertEqual(w.lowest, 10)
+        self.assertEqual(w.pop(10), 'a')
+        self.assertEqual(w.lowest, 12)
+        self.assertEqual(tuple(w), (12, 13))
+        self.assertEqual(tuple(w.values()), ('c', 'd'))
+
+        # The slots of retired packets are reused across the ring.
+        w[14] = 'e'
+        w[15] = 'f'
+        self.assertEqual(tuple(w), (12, 13, 14, 15))
+
+    def test_pop_last(self):
+        w = window.SendWindow(capacity=4)
+        w[10] = 'a'
+        self.assertEqual(w.pop(10), 'a')
+        self.assertEqual(len(w), 0)
+        self.assertIsNone(w.lowest)
+        w[20] = 'b'
+        self.assertEqual(w.lowest, 20)
+
+    def test_clear(self):
+        w = window.SendWindow(capacity=4)
+        w[10] = 'a'
+        w[11] = 'b'
+        w.clear()
+        self.assertEqual(len(w), 0)
+        self.assertFalse(w)
+        self.assertNotIn(10, w)
+        self.assertEqual(tuple(w), ())
@@ -0,0 +1,203 @@
+import multiprocessing
+import os
+import select
+import signal
+import socket
+import time
+import unittest
+
+import mock
+
+from leviathan.network.engine import (
+    aiorudp, connection, ipfilter, rudp, stats, workers
+)
+
+
+def _make_multiplexer(index):
+    return rudp.ConnectionMultiplexer(
+        connection.ConnectionFactory(None),
+        '127.0.0.1'
+    )
+
+
+def _make_asyncio_multiplexer(index):
+    return aiorudp.AsyncioConnectionMultiplexer(
+        connection.ConnectionFactory(None),
+        '127.0.0.1'
+    )
+
+
+class TestBindReuseportAPI(unittest.TestCase):
+
+    def test_share_port(self):
+        first = workers.bind_reuseport('127.0.0.1', 0)
+        self.addCleanup(first.close)
+        port = first.getsockname()[1]
+        second = workers.bind_reuseport('127.0.0.1', port)
+        self.addCleanup(second.close)
+        self.assertEqual(second.getsockname(), ('127.0.0.1', port))
+        for sock in (first, second):
+            self.assertEqual(sock.type, socket.SOCK_DGRAM)
+            self.assertEqual(sock.gettimeout(), 0)
+            self.assertTrue(sock.getsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT))
+
+    def test_port_taken_without_reuseport(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(sock.close)
+        sock.bind(('127.0.0.1', 0))
+        self.assertRaises(
+            OSError,
+            workers.bind_reuseport,
+            '127.0.0.1',
+            sock.getsockname()[1]
+        )
+
+
+class TestWorkerControlAPI(unittest.TestCase):
+
+    def setUp(self):
+        self.multiplexer = _make_multiplexer(0)
+        self.channel, worker_channel = multiprocessing.Pipe()
+        self.stop = mock.Mock()
+        self.control = workers.WorkerControl(self.multiplexer, worker_channel, self.stop)
+
+    def tearDown(self):
+        self.multiplexer.timer_wheel.stop()
+
+    def _is_banned(self, ip):
+        return self.multiplexer.ip_filter.is_banned(ipfilter.pack_ip(ip), time.time())
+
+    def test_report(self):
+        mock_connection = mock.Mock(spec_set=connection.Connection)
+        mock_connection.stats = stats.ConnectionStats()
+        mock_connection.stats.sent_datagrams = 3
+        self.multiplexer[('132.54.76.98', 54321)] = mock_connection
+        self.control.poll()
+        message, report = self.channel.recv()
+        self.assertEqual(message, workers._REPORT)
+        self.assertEqual(report.connections, 1)
+        self.assertEqual(report.ip_rules, 0)
+        self.assertEqual(report.stats.sent_datagrams, 3)
+        self.assertFalse(self.channel.poll())
+
+    def test_skip_report_when_channel_is_full(self):
+        worker_channel = self.control._channel
+        while select.select((), (worker_channel,), (), 0)[1]:
+            worker_channel.send_bytes(b'a' * 1024)
+        self.control.poll()
+        self.assertFalse(self.control.stopped)
+        while self.channel.poll():
+            self.assertEqual(self.channel.recv_bytes(), b'a' * 1024)
+
+    def test_apply_rules(self):
+        self.channel.send((workers._BAN, '132.54.0.0/16', None))
+        self.channel.send((workers._ALLOW, '132.54.76.0/24', None))
+        self.channel.send((workers._BAN, '231.76.45.89/32', time.time() - 1))
+        self.control.poll()
+        self.assertTrue(self._is_banned('132.54.1.1'))
+        self.assertFalse(self._is_banned('132.54.76.98'))
+        self.assertFalse(self._is_banned('231.76.45.89'))
+        self.assertEqual(self.channel.recv()[1].ip_rules, 3)
+
+        self.channel.send((workers._REMOVE, '132.54.76.0/24'))
+        self.channel.send((workers._REMOVE, '132.54.76.0/24'))
+        self.control.poll()
+        self.assertTrue(self._is_banned('132.54.76.98'))
+
+    def test_stop(self):
+        self.multiplexer.shutdown = mock.Mock()
+        self.channel.send((workers._STOP,))
+        self.control.poll()
+        self.assertTrue(self.control.stopped)
+        self.multiplexer.shutdown.assert_called_once_with()
+        self.stop.assert_called_once_with()
+
+        # Nothing is reported once stopped.
+        self.assertFalse(self.channel.poll())
+        self.control.shutdown()
+        self.stop.assert_called_once_with()
+
+    def test_stop_when_launcher_is_gone(self):
+        self.multiplexer.shutdown = mock.Mock()
+        self.channel.close()
+        self.control.poll()
+        self.multiplexer.shutdown.assert_called_once_with()
+        self.stop.assert_called_once_with()
+
+
+class TestWorkerPoolAPI(unittest.TestCase):
+
+    def _poll_until(self, pool, predicate, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            pool.poll()
+            if predicate():
+                return
+            time.sleep(0.05)
+        self.fail('Workers did not report in time.')
+
+    def test_init(self):
+        pool = workers.WorkerPool(_make_multiplexer, 19132)
+        self.assertEqual(pool.workers, os.cpu_count() or 1)
+        self.assertEqual(pool.port, 19132)
+        self.assertEqual(pool.reports, [])
+        self.assertEqual(pool.connections, 0)
+        self.assertEqual(pool.stats.connections, 0)
+        self.assertRaises(ValueError, pool.ban_ip, 'noise')
+
+    def test_run_workers(self):
+        pool = workers.WorkerPool(
+            _make_multiplexer,
+            0,
+            host='127.0.0.1',
+            workers=2,
+            report_interval=0.05
+        )
+        pool.ban_ip('132.54.0.0/16')
+        pool.start()
+        self.addCleanup(pool.stop)
+        self.assertNotEqual(pool.port, 0)
+
+        # Rules issued before and after the start reach all workers.
+        pool.allow_ip('132.54.76.98', duration=60)
+        self._poll_until(
+            pool,
+            lambda: all(r is not None and r.ip_rules == 2 for r in pool.reports)
+        )
+        self.assertEqual(pool.connections, 0)
+        self.assertEqual(pool.stats.connections, 0)
+
+        # A dead worker is restarted, and gets the rules again.
+        pool.remove_ip_ban('132.54.76.98')
+        os.kill(pool._processes[0].pid, signal.SIGKILL)
+        pool._processes[0].join()
+        self._poll_until(
+            pool,
+            lambda: pool.restarts == 1 and pool.reports[0] is not None
+        )
+        self.assertEqual(pool.reports[0].ip_rules, 1)
+
+        pool.stop()
+        self.assertEqual(pool.reports, [])
+
+    def test_run_asyncio_workers(self):
+        pool = workers.WorkerPool(
+            _make_asyncio_multiplexer,
+            0,
+            host='127.0.0.1',
+            workers=2,
+            report_interval=0.05
+        )
+        pool.ban_ip('132.54.0.0/16')
+        pool.start()
+        self.addCleanup(pool.stop)
+        self._poll_until(
+            pool,
+            lambda: all(r is not None and r.ip_rules == 1 for r in pool.reports)
+        )
+
+        # Workers exit when told to stop.
+        processes = list(pool._processes)
+        pool.stop()
+        for process in processes:
+            self.assertEqual(process.exitcode, 0)